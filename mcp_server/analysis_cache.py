@@ -0,0 +1,166 @@
+"""
+Analysis Cache
+Мемоизация анализа таймфрейма по окну свечей
+
+Результат _analyze_timeframe зависит только от окна свечей и параметров,
+поэтому он кешируется по ключу (symbol, timeframe, timestamp последнего
+закрытого бара, хеш параметров). Запись проверяется отпечатком всего окна:
+любое изменение формирующегося бара или правка истории даёт промах, а новый
+закрытый бар вытесняет прежнюю запись пары. Без TTL - инвалидация только по данным.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+
+def params_hash(params: Dict[str, Any]) -> str:
+    """Короткий стабильный хеш параметров анализа"""
+    payload = repr(sorted(params.items())).encode()
+    return hashlib.blake2b(payload, digest_size=8).hexdigest()
+
+
+def window_fingerprint(ohlcv: Any) -> Tuple[Optional[float], str]:
+    """
+    (timestamp последнего закрытого бара, отпечаток окна свечей)
+
+    Последний бар окна считается формирующимся; при одном баре
+    закрытого бара нет (None).
+    """
+    candles = np.ascontiguousarray(np.asarray(ohlcv, dtype=np.float64))
+    if candles.ndim != 2 or len(candles) == 0:
+        raise ValueError(f"Expected 2-D candle window, got shape {candles.shape}")
+    closed_ts = float(candles[-2, 0]) if len(candles) >= 2 else None
+    digest = hashlib.blake2b(candles.tobytes(), digest_size=16).hexdigest()
+    return closed_ts, f"{candles.shape}:{digest}"
+
+
+class AnalysisCache:
+    """
+    LRU кеш анализов таймфреймов
+
+    На пару (symbol, timeframe, параметры) хранится одна запись - анализ
+    окна, заканчивающегося последним известным закрытым баром.
+    Thread-safe (анализ может вызываться из пула потоков).
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, enabled: Optional[bool] = None):
+        """
+        Args:
+            max_entries: Максимум записей (если None - ANALYSIS_CACHE_SIZE env, 2000)
+            enabled: Включить/выключить кеш (если None - проверяет ENABLE_ANALYSIS_CACHE env)
+        """
+        self.max_entries = max_entries or int(os.getenv("ANALYSIS_CACHE_SIZE", "2000"))
+
+        if enabled is None:
+            cache_env = os.getenv("ENABLE_ANALYSIS_CACHE", "true").lower()
+            self.enabled = cache_env in ("true", "1", "yes")
+        else:
+            self.enabled = enabled
+
+        self._entries: "OrderedDict[Hashable, Tuple[Optional[float], str, Any]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._stats = {"hits": 0, "misses": 0, "new_bar_invalidations": 0, "window_changes": 0, "evictions": 0}
+
+        logger.info(f"AnalysisCache initialized ({'enabled' if self.enabled else 'disabled'}, {self.max_entries} entries)")
+
+    @staticmethod
+    def _fingerprint(ohlcv: Any) -> Optional[Tuple[Optional[float], str]]:
+        """Отпечаток окна или None, если свечей нет или они не приводятся к массиву (N, 6)"""
+        try:
+            fingerprint = window_fingerprint(ohlcv)
+        except (TypeError, ValueError, IndexError):
+            return None
+        return fingerprint
+
+    @staticmethod
+    def _slot(symbol: str, timeframe: str, params: Dict[str, Any]) -> Hashable:
+        return (symbol, timeframe, params_hash(params))
+
+    def get(self, symbol: str, timeframe: str, ohlcv: List[List], params: Dict[str, Any]) -> Optional[Any]:
+        """
+        Анализ для окна свечей, если он уже считался
+
+        Returns:
+            Закешированный результат (общий объект - копирует вызывающий) или None
+        """
+        if not self.enabled:
+            return None
+        window = self._fingerprint(ohlcv)
+        if window is None:
+            return None
+
+        closed_ts, fingerprint = window
+        slot = self._slot(symbol, timeframe, params)
+        with self._lock:
+            entry = self._entries.get(slot)
+            if entry is not None and entry[0] == closed_ts and entry[1] == fingerprint:
+                self._entries.move_to_end(slot)
+                self._stats["hits"] += 1
+                return entry[2]
+
+            self._stats["misses"] += 1
+            if entry is not None:
+                # Новый закрытый бар (или изменился формирующийся) - запись больше не нужна
+                self._stats["new_bar_invalidations" if entry[0] != closed_ts else "window_changes"] += 1
+                del self._entries[slot]
+            return None
+
+    def put(self, symbol: str, timeframe: str, ohlcv: List[List], params: Dict[str, Any], result: Any) -> None:
+        """Сохранить анализ окна свечей"""
+        if not self.enabled:
+            return
+        window = self._fingerprint(ohlcv)
+        if window is None:
+            return
+
+        closed_ts, fingerprint = window
+        slot = self._slot(symbol, timeframe, params)
+        with self._lock:
+            entry = self._entries.get(slot)
+            # Запоздавший расчёт по более старому окну не вытесняет свежий
+            if entry is not None and closed_ts is not None and entry[0] is not None and entry[0] > closed_ts:
+                return
+            self._entries[slot] = (closed_ts, fingerprint, result)
+            self._entries.move_to_end(slot)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, symbol: Optional[str] = None) -> None:
+        """Удалить записи символа (или все)"""
+        with self._lock:
+            if symbol is None:
+                self._entries.clear()
+            else:
+                for slot in [slot for slot in self._entries if slot[0] == symbol]:
+                    del self._entries[slot]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика кеша"""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hit_rate": round(self._stats["hits"] / lookups, 3) if lookups else 0.0,
+                **self._stats
+            }
+
+
+# Глобальный экземпляр (общий для сканера, валидации и MCP инструментов)
+_analysis_cache: Optional[AnalysisCache] = None
+
+
+def get_analysis_cache() -> AnalysisCache:
+    """Получить глобальный кеш анализов"""
+    global _analysis_cache
+    if _analysis_cache is None:
+        _analysis_cache = AnalysisCache()
+    return _analysis_cache
@@ -8,21 +8,47 @@ import hashlib
 import hmac
 import time
 import socket
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 
 import ccxt.async_support as ccxt
+import numpy as np
 import aiohttp
-from aiohttp import ClientTimeout, TCPConnector
+from aiohttp import ClientTimeout
 from loguru import logger
 import json
 import re
+import heapq
 
 # Условный импорт для поддержки как пакета, так и прямого запуска
 try:
     from .cache_manager import get_cache_manager
+    from .candle_store import get_candle_store, candles_to_list
+    from .single_flight import SingleFlight
+    from .rate_limiter import get_rate_limiter
+    from .kline_stream import KlineStream, to_exchange_symbol
+    from .ticker_table import get_ticker_table, TickerSnapshot
+    from .orderbook_stream import OrderBookStream
+    from .trade_tape import TradeTape, TradeArrays, trades_to_arrays
+    from .resampler import plan_fetches, resample
+    from .request_policy import get_request_policy
+    from .bybit_rest import BybitRestClient, BybitAPIError, category_of, RATE_LIMIT_RET_CODE
 except ImportError:
     from cache_manager import get_cache_manager
+    from candle_store import get_candle_store, candles_to_list
+    from single_flight import SingleFlight
+    from rate_limiter import get_rate_limiter
+    from kline_stream import KlineStream, to_exchange_symbol
+    from ticker_table import get_ticker_table, TickerSnapshot
+    from orderbook_stream import OrderBookStream
+    from trade_tape import TradeTape, TradeArrays, trades_to_arrays
+    from resampler import plan_fetches, resample
+    from request_policy import get_request_policy
+    from bybit_rest import BybitRestClient, BybitAPIError, category_of, RATE_LIMIT_RET_CODE
+
+
+# Категории публичных потоков WebSocket (spot и USDT perpetual)
+STREAM_CATEGORIES = ("spot", "linear")
 
 
 def parse_ccxt_error(error: Exception) -> Dict[str, Any]:
@@ -87,11 +113,16 @@ class BybitClient:
         self.api_secret = api_secret
         self.testnet = testnet
         
+        # Общий для процесса лимитер запросов (делится с TradingOperations)
+        self.rate_limiter = get_rate_limiter()
+        
         # Инициализация CCXT exchange с улучшенными настройками для DNS/сети
+        # Запросы ccxt ограничивает общий лимитер - встроенный троттлинг ccxt
+        # (двойное ожидание) нужен только если лимитер выключен
         self.exchange = ccxt.bybit({
             'apiKey': api_key,
             'secret': api_secret,
-            'enableRateLimit': True,
+            'enableRateLimit': not self.rate_limiter.enabled,
             'timeout': 30000,  # 30 секунд таймаут
             'options': {
                 'defaultType': 'spot',  # По умолчанию spot
@@ -103,8 +134,38 @@ class BybitClient:
             }
         })
         
-        # Создаём aiohttp сессию с улучшенными настройками DNS и таймаутов
-        self._http_session: Optional[aiohttp.ClientSession] = None
+        # Прямой транспорт публичных эндпоинтов v5 (основной путь рыночных данных)
+        # Его aiohttp сессия (keep-alive, кеш DNS) общая для всех HTTP запросов клиента
+        self.rest = BybitRestClient(testnet=testnet)
+        
+        # Объединение одновременных одинаковых запросов рыночных данных
+        self.single_flight = SingleFlight("bybit_client")
+        
+        # Общая политика повторов: backoff с jitter, circuit breaker, hedged fallback
+        self.request_policy = get_request_policy()
+        
+        # Свечи из публичного WebSocket (get_ohlcv читает буфер, когда он тёплый).
+        # Отдельный поток на категорию: "BTC/USDT" - spot, "BTC/USDT:USDT" - linear;
+        # соединение открывается при первой подписке
+        self.kline_streams = {
+            category: KlineStream(fetcher=self._fetch_ohlcv_rest, testnet=testnet, category=category)
+            for category in STREAM_CATEGORIES
+        }
+        self.kline_stream = self.kline_streams["spot"]
+        
+        # Локальные L2 стаканы из WebSocket (get_orderbook читает их без REST), по категориям
+        self.orderbook_streams = {
+            category: OrderBookStream(testnet=testnet, category=category)
+            for category in STREAM_CATEGORIES
+        }
+        self.orderbook_stream = self.orderbook_streams["spot"]
+        
+        # Лента публичных сделок (CVD и whale-анализ без загрузки сделок через REST), по категориям
+        self.trade_tapes = {
+            category: TradeTape(testnet=testnet, category=category)
+            for category in STREAM_CATEGORIES
+        }
+        self.trade_tape = self.trade_tapes["spot"]
         
         logger.info(f"Bybit client initialized ({'testnet' if testnet else 'mainnet'})")
     
@@ -140,6 +201,7 @@ class BybitClient:
             
             for attempt in range(max_retries):
                 try:
+                    await self._throttle("market")
                     async with session.get(
                         ticker_url,
                         params={"category": "spot", "symbol": "BTCUSDT"},
@@ -228,6 +290,7 @@ class BybitClient:
                 
                 for attempt in range(max_retries):
                     try:
+                        await self._throttle("account")
                         async with session.get(
                             url, 
                             params=params, 
@@ -409,40 +472,13 @@ class BybitClient:
             logger.error(f"❌ API validation failed: {e}")
             raise
     
+    async def _throttle(self, group: str = "market", weight: float = 1.0) -> None:
+        """Дождаться токена в лимитере перед запросом к Bybit"""
+        await self.rate_limiter.acquire(group, weight)
+    
     async def _get_http_session(self) -> aiohttp.ClientSession:
-        """Получить или создать aiohttp сессию с улучшенными настройками DNS"""
-        if self._http_session is None or self._http_session.closed:
-            # DNS resolver с fallback на публичные DNS серверы
-            resolver = aiohttp.resolver.DefaultResolver()
-            
-            # TCP connector с улучшенными настройками
-            connector = TCPConnector(
-                resolver=resolver,
-                limit=100,  # Максимум соединений
-                limit_per_host=30,  # Максимум соединений на хост
-                ttl_dns_cache=300,  # Кеш DNS на 5 минут
-                use_dns_cache=True,
-                keepalive_timeout=30,
-                enable_cleanup_closed=True
-            )
-            
-            # Таймауты: connect (DNS + TCP + SSL), read, total
-            # Синхронизированы с таймаутами в validate_api_credentials
-            timeout = ClientTimeout(
-                total=60,  # Общий таймаут 60 секунд
-                connect=40,  # 40 секунд на подключение (включая DNS) - синхронизировано с валидацией
-                sock_read=30  # 30 секунд на чтение
-            )
-            
-            self._http_session = aiohttp.ClientSession(
-                connector=connector,
-                timeout=timeout,
-                headers={
-                    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)'
-                }
-            )
-        
-        return self._http_session
+        """Общая aiohttp сессия транспорта (keep-alive, кеш DNS на 5 минут)"""
+        return await self.rest.session()
     
     async def get_market_overview(self, market_type: str = "both") -> Dict[str, Any]:
         """
@@ -456,179 +492,247 @@ class BybitClient:
         """
         logger.info(f"Getting market overview for {market_type}")
         
-        # Retry логика с экспоненциальной задержкой
-        max_retries = 3
-        retry_delay = 1
+        # Основной путь: снимки общей таблицы тикеров
+        try:
+            return await self._market_overview_from_tables(market_type)
+        except Exception as e:
+            logger.warning(f"Ticker table unavailable for market overview, falling back to CCXT: {e}")
+        
+        # Запасной путь: тикеры через CCXT по общей политике запросов
+        return await self.request_policy.call(
+            "ccxt:market_overview",
+            lambda: self._market_overview_ccxt(market_type)
+        )
+    
+    async def _market_overview_ccxt(self, market_type: str) -> Dict[str, Any]:
+        """Обзор рынка по тикерам CCXT (одна попытка, повторы - в request_policy)"""
+        # Получаем все тикеры
+        spot_tickers = {}
+        futures_tickers = {}
         
-        for attempt in range(max_retries):
+        if market_type in ["spot", "both"]:
             try:
-                # Получаем все тикеры
-                spot_tickers = {}
-                futures_tickers = {}
-                
-                if market_type in ["spot", "both"]:
-                    try:
-                        self.exchange.options['defaultType'] = 'spot'
-                        spot_tickers = await self.exchange.fetch_tickers()
-                    except Exception as e:
-                        error_msg = str(e)
-                        if "asset/coin/query-info" in error_msg.lower() or "query-info" in error_msg.lower():
-                            logger.warning(f"CCXT error with query-info for spot tickers: {e}")
-                            spot_tickers = {}
-                        else:
-                            raise
-                
-                if market_type in ["futures", "both"]:
-                    try:
-                        self.exchange.options['defaultType'] = 'swap'
-                        futures_tickers = await self.exchange.fetch_tickers()
-                    except Exception as e:
-                        error_msg = str(e)
-                        if "asset/coin/query-info" in error_msg.lower() or "query-info" in error_msg.lower():
-                            logger.warning(f"CCXT error with query-info for futures tickers: {e}")
-                            futures_tickers = {}
-                        else:
-                            raise
-                
-                # Получаем BTC данные (лидер рынка)
-                try:
-                    btc_ticker = await self.exchange.fetch_ticker('BTC/USDT')
-                    btc_price = btc_ticker.get('last', 0) or 0
-                    btc_change_24h = btc_ticker.get('percentage', 0) or 0
-                except Exception as e:
-                    logger.warning(f"Error getting BTC ticker: {e}")
-                    btc_price = 0
-                    btc_change_24h = 0
-                
-                # Вычисляем market sentiment
-                all_tickers = list(spot_tickers.values()) + list(futures_tickers.values())
-                
-                # Проверяем, что есть данные
-                if not all_tickers:
-                    logger.error("No tickers received from API - this indicates a critical error")
-                    raise Exception("API Error: No tickers received from Bybit API. This may indicate API connectivity issues or rate limiting.")
-                
-                positive_changes = sum(1 for t in all_tickers if t.get('percentage', 0) and t.get('percentage', 0) > 0)
-                negative_changes = sum(1 for t in all_tickers if t.get('percentage', 0) and t.get('percentage', 0) < 0)
-                
-                if positive_changes > negative_changes * 1.5:
-                    sentiment = "bullish"
-                elif negative_changes > positive_changes * 1.5:
-                    sentiment = "bearish"
-                else:
-                    sentiment = "neutral"
-                
-                # Топ gainers и losers
-                sorted_by_change = sorted(
-                    [t for t in all_tickers if t.get('quoteVolume', 0) and t.get('quoteVolume', 0) > 100000],  # Минимум $100k объём
-                    key=lambda x: x.get('percentage', 0) or 0,
-                    reverse=True
-                )
-                
-                top_gainers = sorted_by_change[:20]
-                top_losers = sorted_by_change[-20:]
-                
-                # Топ по объёму
-                sorted_by_volume = sorted(
-                    all_tickers,
-                    key=lambda x: x.get('quoteVolume', 0) or 0,
-                    reverse=True
-                )
-                top_volume = sorted_by_volume[:20]
-                
-                # Расчёт общей волатильности
-                volatilities = [abs(t.get('percentage', 0) or 0) for t in all_tickers if t.get('percentage') is not None]
-                avg_volatility = sum(volatilities) / len(volatilities) if volatilities else 0
-                
-                if avg_volatility > 5:
-                    volatility_level = "high"
-                elif avg_volatility > 2:
-                    volatility_level = "medium"
+                self.exchange.options['defaultType'] = 'spot'
+                await self._throttle("market")
+                spot_tickers = await self.exchange.fetch_tickers()
+            except Exception as e:
+                error_msg = str(e)
+                if "asset/coin/query-info" in error_msg.lower() or "query-info" in error_msg.lower():
+                    logger.warning(f"CCXT error with query-info for spot tickers: {e}")
+                    spot_tickers = {}
                 else:
-                    volatility_level = "low"
-                
-                return {
-                    "timestamp": datetime.now().isoformat(),
-                    "market_type": market_type,
-                    "sentiment": sentiment,
-                    "btc": {
-                        "price": btc_price,
-                        "change_24h": btc_change_24h,
-                        "dominance": "N/A"  # TODO: Calculate from market caps
-                    },
-                    "statistics": {
-                        "total_pairs": len(all_tickers),
-                        "positive_changes": positive_changes,
-                        "negative_changes": negative_changes,
-                        "avg_volatility": round(avg_volatility, 2),
-                        "volatility_level": volatility_level
-                    },
-                    "top_gainers": [
-                        {
-                            "symbol": t.get('symbol', ''),
-                            "price": t.get('last', 0) or 0,
-                            "change_24h": t.get('percentage', 0) or 0,
-                            "volume_24h": t.get('quoteVolume', 0) or 0
-                        }
-                        for t in top_gainers
-                    ],
-                    "top_losers": [
-                        {
-                            "symbol": t.get('symbol', ''),
-                            "price": t.get('last', 0) or 0,
-                            "change_24h": t.get('percentage', 0) or 0,
-                            "volume_24h": t.get('quoteVolume', 0) or 0
-                        }
-                        for t in top_losers
-                    ],
-                    "top_volume": [
-                        {
-                            "symbol": t.get('symbol', ''),
-                            "price": t.get('last', 0) or 0,
-                            "volume_24h": t.get('quoteVolume', 0) or 0,
-                            "change_24h": t.get('percentage', 0) or 0
-                        }
-                        for t in top_volume
-                    ],
-                    "market_conditions": {
-                        "trend": "bullish" if btc_change_24h > 2 else "bearish" if btc_change_24h < -2 else "ranging",
-                        "volatility": volatility_level,
-                        "phase": self._determine_market_phase(sentiment, volatility_level)
-                    }
-                }
-                
+                    raise
+        
+        if market_type in ["futures", "both"]:
+            try:
+                self.exchange.options['defaultType'] = 'swap'
+                await self._throttle("market")
+                futures_tickers = await self.exchange.fetch_tickers()
             except Exception as e:
-                error_msg = str(e).lower()
-                
-                # Проверяем на DNS ошибки
-                if any(keyword in error_msg for keyword in ["dns", "could not contact dns", "name resolution", "gaierror", "cannot connect to host"]):
-                    logger.warning(f"DNS/Network error (attempt {attempt + 1}/{max_retries}): {e}")
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(retry_delay * (2 ** attempt))
-                        continue
-                    else:
-                        logger.error(f"DNS resolution failed after {max_retries} attempts: {e}")
-                        raise Exception(f"DNS/Network Error: Failed to connect to Bybit API after {max_retries} attempts. Error: {e}")
-                
-                # Фильтруем ошибки, связанные с asset/coin/query-info
-                elif "asset/coin/query-info" in error_msg or "query-info" in error_msg:
-                    logger.warning(f"CCXT error with query-info endpoint (attempt {attempt + 1}/{max_retries}): {e}")
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(retry_delay * (2 ** attempt))
-                        continue
-                    else:
-                        # Пробрасываем исключение вместо возврата пустых данных
-                        logger.error(f"Failed to get market overview after {max_retries} attempts")
-                        raise Exception(f"API Error: Failed to fetch market overview after {max_retries} attempts. CCXT query-info endpoint issue: {e}")
+                error_msg = str(e)
+                if "asset/coin/query-info" in error_msg.lower() or "query-info" in error_msg.lower():
+                    logger.warning(f"CCXT error with query-info for futures tickers: {e}")
+                    futures_tickers = {}
                 else:
-                    # Другие ошибки - пробуем retry
-                    logger.warning(f"Error getting market overview (attempt {attempt + 1}/{max_retries}): {e}")
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(retry_delay * (2 ** attempt))
-                        continue
-                    else:
-                        logger.error(f"Failed to get market overview after {max_retries} attempts: {e}", exc_info=True)
-                        raise
+                    raise
+        
+        # Получаем BTC данные (лидер рынка)
+        try:
+            await self._throttle("market")
+            btc_ticker = await self.exchange.fetch_ticker('BTC/USDT')
+            btc_price = btc_ticker.get('last', 0) or 0
+            btc_change_24h = btc_ticker.get('percentage', 0) or 0
+        except Exception as e:
+            logger.warning(f"Error getting BTC ticker: {e}")
+            btc_price = 0
+            btc_change_24h = 0
+        
+        # Вычисляем market sentiment
+        all_tickers = list(spot_tickers.values()) + list(futures_tickers.values())
+        
+        # Проверяем, что есть данные
+        if not all_tickers:
+            logger.error("No tickers received from API - this indicates a critical error")
+            raise Exception("API Error: No tickers received from Bybit API. This may indicate API connectivity issues or rate limiting.")
+        
+        positive_changes = sum(1 for t in all_tickers if t.get('percentage', 0) and t.get('percentage', 0) > 0)
+        negative_changes = sum(1 for t in all_tickers if t.get('percentage', 0) and t.get('percentage', 0) < 0)
+        
+        if positive_changes > negative_changes * 1.5:
+            sentiment = "bullish"
+        elif negative_changes > positive_changes * 1.5:
+            sentiment = "bearish"
+        else:
+            sentiment = "neutral"
+        
+        # Топ gainers и losers
+        sorted_by_change = sorted(
+            [t for t in all_tickers if t.get('quoteVolume', 0) and t.get('quoteVolume', 0) > 100000],  # Минимум $100k объём
+            key=lambda x: x.get('percentage', 0) or 0,
+            reverse=True
+        )
+        
+        top_gainers = sorted_by_change[:20]
+        top_losers = sorted_by_change[-20:]
+        
+        # Топ по объёму
+        sorted_by_volume = sorted(
+            all_tickers,
+            key=lambda x: x.get('quoteVolume', 0) or 0,
+            reverse=True
+        )
+        top_volume = sorted_by_volume[:20]
+        
+        # Расчёт общей волатильности
+        volatilities = [abs(t.get('percentage', 0) or 0) for t in all_tickers if t.get('percentage') is not None]
+        avg_volatility = sum(volatilities) / len(volatilities) if volatilities else 0
+        
+        if avg_volatility > 5:
+            volatility_level = "high"
+        elif avg_volatility > 2:
+            volatility_level = "medium"
+        else:
+            volatility_level = "low"
+        
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "market_type": market_type,
+            "sentiment": sentiment,
+            "btc": {
+                "price": btc_price,
+                "change_24h": btc_change_24h,
+                "dominance": "N/A"  # TODO: Calculate from market caps
+            },
+            "statistics": {
+                "total_pairs": len(all_tickers),
+                "positive_changes": positive_changes,
+                "negative_changes": negative_changes,
+                "avg_volatility": round(avg_volatility, 2),
+                "volatility_level": volatility_level
+            },
+            "top_gainers": [
+                {
+                    "symbol": t.get('symbol', ''),
+                    "price": t.get('last', 0) or 0,
+                    "change_24h": t.get('percentage', 0) or 0,
+                    "volume_24h": t.get('quoteVolume', 0) or 0
+                }
+                for t in top_gainers
+            ],
+            "top_losers": [
+                {
+                    "symbol": t.get('symbol', ''),
+                    "price": t.get('last', 0) or 0,
+                    "change_24h": t.get('percentage', 0) or 0,
+                    "volume_24h": t.get('quoteVolume', 0) or 0
+                }
+                for t in top_losers
+            ],
+            "top_volume": [
+                {
+                    "symbol": t.get('symbol', ''),
+                    "price": t.get('last', 0) or 0,
+                    "volume_24h": t.get('quoteVolume', 0) or 0,
+                    "change_24h": t.get('percentage', 0) or 0
+                }
+                for t in top_volume
+            ],
+            "market_conditions": {
+                "trend": "bullish" if btc_change_24h > 2 else "bearish" if btc_change_24h < -2 else "ranging",
+                "volatility": volatility_level,
+                "phase": self._determine_market_phase(sentiment, volatility_level)
+            }
+        }
+    
+    async def _market_overview_from_tables(self, market_type: str) -> Dict[str, Any]:
+        """Обзор рынка по снимкам таблицы тикеров (тот же формат, что и get_market_overview)"""
+        snapshots = []
+        if market_type in ["spot", "both"]:
+            snapshots.append(await self.get_ticker_snapshot("spot"))
+        if market_type in ["futures", "both"]:
+            snapshots.append(await self.get_ticker_snapshot("futures"))
+        
+        all_tickers = [t for snapshot in snapshots for t in snapshot.by_volume]
+        if not all_tickers:
+            raise Exception("API Error: No tickers received from Bybit API. This may indicate API connectivity issues or rate limiting.")
+        
+        btc = snapshots[0].tickers.get("BTC/USDT") or snapshots[0].tickers.get("BTC/USDT:USDT") or {}
+        btc_price = btc.get("price", 0)
+        btc_change_24h = btc.get("change_24h", 0)
+        
+        positive_changes = sum(1 for t in all_tickers if t["change_24h"] > 0)
+        negative_changes = sum(1 for t in all_tickers if t["change_24h"] < 0)
+        
+        if positive_changes > negative_changes * 1.5:
+            sentiment = "bullish"
+        elif negative_changes > positive_changes * 1.5:
+            sentiment = "bearish"
+        else:
+            sentiment = "neutral"
+        
+        # Снимки уже отсортированы - только сливаем категории
+        sorted_by_change = [
+            t for t in heapq.merge(*[s.by_change for s in snapshots], key=lambda x: x["change_24h"], reverse=True)
+            if t["volume_24h"] > 100000  # Минимум $100k объём
+        ]
+        top_gainers = sorted_by_change[:20]
+        top_losers = sorted_by_change[-20:]
+        top_volume = list(heapq.merge(*[s.by_volume for s in snapshots], key=lambda x: x["volume_24h"], reverse=True))[:20]
+        
+        avg_volatility = sum(abs(t["change_24h"]) for t in all_tickers) / len(all_tickers)
+        
+        if avg_volatility > 5:
+            volatility_level = "high"
+        elif avg_volatility > 2:
+            volatility_level = "medium"
+        else:
+            volatility_level = "low"
+        
+        def movers(tickers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            return [
+                {
+                    "symbol": t["symbol"],
+                    "price": t["price"],
+                    "change_24h": t["change_24h"],
+                    "volume_24h": t["volume_24h"]
+                }
+                for t in tickers
+            ]
+        
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "market_type": market_type,
+            "sentiment": sentiment,
+            "btc": {
+                "price": btc_price,
+                "change_24h": btc_change_24h,
+                "dominance": "N/A"
+            },
+            "statistics": {
+                "total_pairs": len(all_tickers),
+                "positive_changes": positive_changes,
+                "negative_changes": negative_changes,
+                "avg_volatility": round(avg_volatility, 2),
+                "volatility_level": volatility_level
+            },
+            "top_gainers": movers(top_gainers),
+            "top_losers": movers(top_losers),
+            "top_volume": [
+                {
+                    "symbol": t["symbol"],
+                    "price": t["price"],
+                    "volume_24h": t["volume_24h"],
+                    "change_24h": t["change_24h"]
+                }
+                for t in top_volume
+            ],
+            "market_conditions": {
+                "trend": "bullish" if btc_change_24h > 2 else "bearish" if btc_change_24h < -2 else "ranging",
+                "volatility": volatility_level,
+                "phase": self._determine_market_phase(sentiment, volatility_level)
+            },
+            "tickers_version": {s.category: s.version for s in snapshots}
+        }
     
     async def get_all_tickers(self, market_type: str = "spot", sort_by: str = "volume") -> List[Dict[str, Any]]:
         """
@@ -642,6 +746,59 @@ class BybitClient:
         Returns:
             Массив всех торговых пар с базовой информацией
         """
+        # Основной путь: общая таблица тикеров (WebSocket + REST), уже отсортирована
+        try:
+            snapshot = await self.get_ticker_snapshot(market_type)
+            if len(snapshot) > 0:
+                return list(snapshot.sorted_by(sort_by))
+        except Exception as e:
+            logger.warning(f"Ticker table unavailable for {market_type}, falling back to CCXT: {e}")
+        
+        # Одновременные вызовы с теми же параметрами ждут один запрос
+        return await self.single_flight.do(
+            ("get_all_tickers", market_type, sort_by),
+            lambda: self._fetch_all_tickers(market_type, sort_by)
+        )
+    
+    async def get_ticker_snapshot(self, market_type: str = "spot") -> TickerSnapshot:
+        """
+        Снимок общей таблицы тикеров
+        
+        Таблица обновляется потоком tickers; если поток не работает,
+        она перезагружается через REST раз в 30 секунд.
+        
+        Args:
+            market_type: "spot" или "futures"
+            
+        Returns:
+            TickerSnapshot с версией и отсортированными списками
+        """
+        category = "linear" if market_type == "futures" else "spot"
+        table = get_ticker_table(category, self.testnet)
+        
+        if not table.is_fresh():
+            await self.single_flight.do(
+                ("seed_ticker_table", category),
+                lambda: self._seed_ticker_table(category)
+            )
+        
+        return table.snapshot()
+    
+    async def _seed_ticker_table(self, category: str) -> None:
+        """Заполнить таблицу тикеров через REST и запустить поток обновлений"""
+        table = get_ticker_table(category, self.testnet)
+        rows = await self._get_tickers_raw(category)
+        if not rows:
+            raise Exception(f"Empty {category} tickers list from direct HTTP")
+        
+        table.seed(rows)
+        logger.debug(f"Ticker table {category} seeded: {len(rows)} symbols (version {table.version})")
+        
+        if table.stream_enabled:
+            await table.start_stream()
+    
+    async def _fetch_all_tickers(self, market_type: str, sort_by: str) -> List[Dict[str, Any]]:
+        """Загрузка тикеров (без объединения запросов, см. get_all_tickers)"""
         # Проверяем кеш
         cache_key = f"{market_type}_{sort_by}"
         now = datetime.now()
@@ -654,110 +811,54 @@ class BybitClient:
         
         logger.info(f"Getting all {market_type} tickers, sorted by {sort_by}")
         
-        # Retry логика с экспоненциальной задержкой
-        max_retries = 3
-        retry_delay = 1
+        ticker_list = await self.request_policy.call(
+            "http:tickers",
+            lambda: self._get_tickers_direct_http(market_type),
+            fallback=lambda: self._fetch_tickers_ccxt(market_type),
+            on_error=self._on_rest_error
+        )
+        
+        # Сортировка
+        if sort_by == "volume":
+            ticker_list.sort(key=lambda x: x['volume_24h'], reverse=True)
+        elif sort_by == "change":
+            ticker_list.sort(key=lambda x: x['change_24h'], reverse=True)
+        else:  # name
+            ticker_list.sort(key=lambda x: x['symbol'])
         
-        for attempt in range(max_retries):
+        # Обновляем кеш
+        self._tickers_cache[cache_key] = ticker_list
+        self._cache_timestamps[cache_key] = now
+        logger.debug(f"Cached tickers for {cache_key}")
+        
+        return ticker_list
+    
+    async def _fetch_tickers_ccxt(self, market_type: str) -> List[Dict[str, Any]]:
+        """Тикеры через CCXT в формате get_all_tickers (запасной путь, повторы - в request_policy)"""
+        self.exchange.options['defaultType'] = 'swap' if market_type == 'futures' else 'spot'
+        
+        await self._throttle("market")
+        tickers = await self.exchange.fetch_tickers()
+        
+        # Преобразуем в список с безопасной обработкой
+        ticker_list = []
+        for symbol, ticker in tickers.items():
             try:
-                self.exchange.options['defaultType'] = 'swap' if market_type == 'futures' else 'spot'
-                
-                # Пытаемся получить тикеры через CCXT
-                tickers = await self.exchange.fetch_tickers()
-                
-                # Преобразуем в список с безопасной обработкой
-                ticker_list = []
-                for symbol, ticker in tickers.items():
-                    try:
-                        ticker_list.append({
-                            "symbol": symbol,
-                            "price": ticker.get('last', 0) or 0,
-                            "change_24h": ticker.get('percentage', 0) or 0,
-                            "volume_24h": ticker.get('quoteVolume', 0) or 0,
-                            "high_24h": ticker.get('high', 0) or 0,
-                            "low_24h": ticker.get('low', 0) or 0,
-                            "bid": ticker.get('bid', 0) or 0,
-                            "ask": ticker.get('ask', 0) or 0
-                        })
-                    except Exception as ticker_err:
-                        logger.warning(f"Error processing ticker {symbol}: {ticker_err}")
-                        continue
-                
-                # Сортировка
-                if sort_by == "volume":
-                    ticker_list.sort(key=lambda x: x['volume_24h'], reverse=True)
-                elif sort_by == "change":
-                    ticker_list.sort(key=lambda x: x['change_24h'], reverse=True)
-                else:  # name
-                    ticker_list.sort(key=lambda x: x['symbol'])
-                
-                # Обновляем кеш
-                self._tickers_cache[cache_key] = ticker_list
-                self._cache_timestamps[cache_key] = now
-                logger.debug(f"Cached tickers for {cache_key}")
-                
-                return ticker_list
-                
-            except Exception as e:
-                error_msg = str(e).lower()
-                
-                # Проверяем на DNS ошибки
-                if any(keyword in error_msg for keyword in ["dns", "could not contact dns", "name resolution", "gaierror", "cannot connect to host"]):
-                    logger.warning(f"DNS/Network error (attempt {attempt + 1}/{max_retries}): {e}")
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(retry_delay * (2 ** attempt))
-                        continue
-                    else:
-                        # Последняя попытка - используем прямой HTTP запрос к Bybit API
-                        logger.info(f"CCXT failed due to DNS/Network error, trying direct HTTP request to Bybit API for tickers")
-                        try:
-                            ticker_list = await self._get_tickers_direct_http(market_type)
-                            if ticker_list and len(ticker_list) > 0:
-                                # Обновляем кеш
-                                self._tickers_cache[cache_key] = ticker_list
-                                self._cache_timestamps[cache_key] = now
-                                logger.debug(f"Cached tickers from direct HTTP for {cache_key}")
-                                return ticker_list
-                            else:
-                                raise Exception(f"Empty tickers list from direct HTTP")
-                        except Exception as http_error:
-                            logger.error(f"Direct HTTP also failed for tickers: {http_error}")
-                            raise Exception(f"API Error: Failed to fetch tickers after {max_retries} attempts and direct HTTP fallback. DNS/Network error: {e}, HTTP error: {http_error}")
-                
-                # Фильтруем ошибки, связанные с asset/coin/query-info
-                elif "asset/coin/query-info" in error_msg or "query-info" in error_msg:
-                    logger.warning(f"CCXT error with query-info endpoint (attempt {attempt + 1}/{max_retries}): {e}")
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(retry_delay * (2 ** attempt))
-                        continue
-                    else:
-                        # Последняя попытка - используем прямой HTTP запрос к Bybit API
-                        logger.info(f"CCXT failed, trying direct HTTP request to Bybit API for tickers")
-                        try:
-                            ticker_list = await self._get_tickers_direct_http(market_type)
-                            if ticker_list and len(ticker_list) > 0:
-                                # Обновляем кеш
-                                self._tickers_cache[cache_key] = ticker_list
-                                self._cache_timestamps[cache_key] = now
-                                logger.debug(f"Cached tickers from direct HTTP for {cache_key}")
-                                return ticker_list
-                            else:
-                                raise Exception(f"Empty tickers list from direct HTTP")
-                        except Exception as http_error:
-                            logger.error(f"Direct HTTP also failed for tickers: {http_error}")
-                            raise Exception(f"API Error: Failed to fetch tickers after {max_retries} attempts and direct HTTP fallback. CCXT error: {e}, HTTP error: {http_error}")
-                else:
-                    # Другие ошибки - пробуем retry
-                    logger.warning(f"Error getting all tickers (attempt {attempt + 1}/{max_retries}): {e}")
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(retry_delay * (2 ** attempt))
-                        continue
-                    else:
-                        logger.error(f"Failed to get tickers after {max_retries} attempts: {e}", exc_info=True)
-                        raise
+                ticker_list.append({
+                    "symbol": symbol,
+                    "price": ticker.get('last', 0) or 0,
+                    "change_24h": ticker.get('percentage', 0) or 0,
+                    "volume_24h": ticker.get('quoteVolume', 0) or 0,
+                    "high_24h": ticker.get('high', 0) or 0,
+                    "low_24h": ticker.get('low', 0) or 0,
+                    "bid": ticker.get('bid', 0) or 0,
+                    "ask": ticker.get('ask', 0) or 0
+                })
+            except Exception as ticker_err:
+                logger.warning(f"Error processing ticker {symbol}: {ticker_err}")
+                continue
         
-        # Если дошли сюда, это не должно произойти, но на всякий случай
-        raise Exception("Unexpected error: get_all_tickers failed without proper error handling")
+        return ticker_list
     
     async def get_asset_price(self, symbol: str) -> Dict[str, Any]:
         """
@@ -772,92 +873,104 @@ class BybitClient:
         """
         logger.info(f"Getting price for {symbol}")
         
-        # Retry логика с экспоненциальной задержкой
-        max_retries = 3
-        retry_delay = 1
+        return await self.request_policy.call(
+            "http:ticker",
+            lambda: self._fetch_asset_price_http(symbol),
+            fallback=lambda: self._fetch_asset_price(symbol),
+            on_error=self._on_rest_error
+        )
+    
+    async def _fetch_asset_price_http(self, symbol: str) -> Dict[str, Any]:
+        """Цена актива через /v5/market/tickers (одна попытка, повторы - в request_policy)"""
+        rows = await self.rest.tickers(category_of(symbol), symbol)
+        if not rows:
+            raise ValueError(f"No ticker data for {symbol}")
+        row = rows[0]
         
-        for attempt in range(max_retries):
-            try:
-                ticker = await self.exchange.fetch_ticker(symbol)
-                
-                return {
-                    "symbol": symbol,
-                    "price": ticker.get('last', 0) or 0,
-                    "change_24h": ticker.get('percentage', 0) or 0,
-                    "volume_24h": ticker.get('quoteVolume', 0) or 0,
-                    "high_24h": ticker.get('high', 0) or 0,
-                    "low_24h": ticker.get('low', 0) or 0,
-                    "bid": ticker.get('bid', 0) or 0,
-                    "ask": ticker.get('ask', 0) or 0,
-                    "timestamp": datetime.now().isoformat()
-                }
-                
-            except Exception as e:
-                # Парсим ошибку CCXT для извлечения retCode
-                parsed_error = parse_ccxt_error(e)
-                error_msg = str(e).lower()
-                
-                # Если нашли retCode в ошибке - обрабатываем специфично
-                if parsed_error["parsed"] and parsed_error["retCode"]:
-                    ret_code = parsed_error["retCode"]
-                    ret_msg = parsed_error["retMsg"]
-                    
-                    if ret_code == 10003:
-                        logger.error(f"❌ API Key INVALID (retCode=10003) for {symbol}")
-                        raise Exception(
-                            f"Bybit API Key is INVALID! "
-                            f"Please check your BYBIT_API_KEY and BYBIT_API_SECRET. "
-                            f"Error: {ret_msg}"
-                        )
-                    elif ret_code == 10004:
-                        logger.error(f"❌ API Key has NO PERMISSIONS (retCode=10004) for {symbol}")
-                        raise Exception(
-                            f"Bybit API Key has insufficient permissions! "
-                            f"Please enable READ permissions on Bybit API Management page. "
-                            f"Error: {ret_msg}"
-                        )
-                    elif ret_code == 10005:
-                        logger.error(f"❌ IP NOT WHITELISTED (retCode=10005) for {symbol}")
-                        raise Exception(
-                            f"IP address is not whitelisted! "
-                            f"Please add your server's IP to Bybit API whitelist. "
-                            f"Error: {ret_msg}"
-                        )
-                    else:
-                        logger.error(f"Bybit API error (retCode={ret_code}) for {symbol}: {ret_msg}")
-                        raise Exception(f"Bybit API error (retCode={ret_code}): {ret_msg}")
-                
-                # Проверяем на DNS ошибки
-                if any(keyword in error_msg for keyword in ["dns", "could not contact dns", "name resolution", "gaierror", "cannot connect to host"]):
-                    logger.warning(f"DNS/Network error for {symbol} (attempt {attempt + 1}/{max_retries}): {e}")
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(retry_delay * (2 ** attempt))
-                        continue
-                    else:
-                        logger.error(f"DNS resolution failed for {symbol} after {max_retries} attempts: {e}")
-                        raise Exception(f"DNS/Network Error: Failed to connect to Bybit API for {symbol} after {max_retries} attempts. Error: {e}")
-                
-                # Фильтруем ошибки, связанные с asset/coin/query-info
-                elif "asset/coin/query-info" in error_msg or "query-info" in error_msg:
-                    logger.warning(f"CCXT error with query-info endpoint for {symbol} (attempt {attempt + 1}/{max_retries}): {e}")
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(retry_delay * (2 ** attempt))
-                        continue
-                    else:
-                        # Пробрасываем исключение вместо возврата пустых данных
-                        error_str = str(e).replace('{', '{{').replace('}', '}}')  # Escape braces for loguru
-                        logger.error(f"Failed to get price for {symbol} after {max_retries} attempts: {error_str}")
-                        raise Exception(f"API Error: Failed to fetch price for {symbol} after {max_retries} attempts. Error: {error_str}")
-                else:
-                    # Другие ошибки - пробуем retry
-                    logger.warning(f"Error getting asset price for {symbol} (attempt {attempt + 1}/{max_retries}): {e}")
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(retry_delay * (2 ** attempt))
-                        continue
-                    else:
-                        error_str = str(e).replace('{', '{{').replace('}', '}}')  # Escape braces for loguru
-                        logger.error(f"Failed to get price for {symbol} after {max_retries} attempts: {error_str}", exc_info=True)
-                        raise
+        def field(name: str) -> float:
+            return float(row.get(name) or 0)
+        
+        return {
+            "symbol": symbol,
+            "price": field("lastPrice"),
+            "change_24h": field("price24hPcnt") * 100,
+            "volume_24h": field("turnover24h"),
+            "high_24h": field("highPrice24h"),
+            "low_24h": field("lowPrice24h"),
+            "bid": field("bid1Price"),
+            "ask": field("ask1Price"),
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    async def _fetch_asset_price(self, symbol: str) -> Dict[str, Any]:
+        """Цена актива через CCXT (запасной путь, повторы - в request_policy)"""
+        await self._throttle("market")
+        ticker = await self.exchange.fetch_ticker(symbol)
+        
+        return {
+            "symbol": symbol,
+            "price": ticker.get('last', 0) or 0,
+            "change_24h": ticker.get('percentage', 0) or 0,
+            "volume_24h": ticker.get('quoteVolume', 0) or 0,
+            "high_24h": ticker.get('high', 0) or 0,
+            "low_24h": ticker.get('low', 0) or 0,
+            "bid": ticker.get('bid', 0) or 0,
+            "ask": ticker.get('ask', 0) or 0,
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    def _on_rest_error(self, error: Exception) -> None:
+        """
+        Обработка ошибки прямого HTTP перед повтором (для request_policy)
+        
+        Ответ Bybit с retCode (неизвестный символ, неверные параметры) не
+        исправится повтором и пробрасывается сразу; превышение лимита повторяется.
+        """
+        if isinstance(error, BybitAPIError) and error.ret_code != RATE_LIMIT_RET_CODE:
+            raise error
+    
+    def _on_ccxt_error(self, error: Exception, context: str) -> None:
+        """
+        Обработка ошибки CCXT перед повтором (для request_policy)
+        
+        Сообщает лимитеру о превышении лимита; ошибки с retCode Bybit
+        (неверный ключ, нет прав, IP не в whitelist) пробрасываются без повторов.
+        """
+        if isinstance(error, ccxt.RateLimitExceeded):
+            self.rate_limiter.report_rate_limited("market")
+        
+        # Парсим ошибку CCXT для извлечения retCode
+        parsed_error = parse_ccxt_error(error)
+        if not (parsed_error["parsed"] and parsed_error["retCode"]):
+            return
+        
+        ret_code = parsed_error["retCode"]
+        ret_msg = parsed_error["retMsg"]
+        
+        if ret_code == 10003:
+            logger.error(f"❌ API Key INVALID (retCode=10003) for {context}")
+            raise Exception(
+                f"Bybit API Key is INVALID! "
+                f"Please check your BYBIT_API_KEY and BYBIT_API_SECRET. "
+                f"Error: {ret_msg}"
+            )
+        elif ret_code == 10004:
+            logger.error(f"❌ API Key has NO PERMISSIONS (retCode=10004) for {context}")
+            raise Exception(
+                f"Bybit API Key has insufficient permissions! "
+                f"Please enable READ permissions on Bybit API Management page. "
+                f"Error: {ret_msg}"
+            )
+        elif ret_code == 10005:
+            logger.error(f"❌ IP NOT WHITELISTED (retCode=10005) for {context}")
+            raise Exception(
+                f"IP address is not whitelisted! "
+                f"Please add your server's IP to Bybit API whitelist. "
+                f"Error: {ret_msg}"
+            )
+        else:
+            logger.error(f"Bybit API error (retCode={ret_code}) for {context}: {ret_msg}")
+            raise Exception(f"Bybit API error (retCode={ret_code}): {ret_msg}")
     
     async def get_ohlcv(self, symbol: str, timeframe: str = "1h", limit: int = 100) -> List[List]:
         """
@@ -873,6 +986,98 @@ class BybitClient:
         Returns:
             Массив OHLCV данных
         """
+        # Тёплый буфер WebSocket - без обращения к бирже
+        kline_stream = self._kline_stream_for(symbol)
+        candles = kline_stream.get_ohlcv(symbol, timeframe, limit)
+        if candles is not None:
+            return candles
+        
+        ohlcv = await self.single_flight.do(
+            ("get_ohlcv", symbol, timeframe, limit),
+            lambda: self._fetch_ohlcv(symbol, timeframe, limit)
+        )
+        
+        if kline_stream.is_subscribed(symbol, timeframe):
+            kline_stream.seed(symbol, timeframe, ohlcv)
+        
+        return ohlcv
+    
+    async def get_ohlcv_multi(
+        self,
+        symbol: str,
+        timeframes: List[str],
+        limit: int = 100
+    ) -> Dict[str, List[List]]:
+        """
+        Свечи нескольких таймфреймов с минимумом запросов к бирже
+        
+        Тёплые буферы WebSocket отдаются напрямую. Остальные таймфреймы
+        загружаются по плану plan_fetches: старшие собираются из загруженных
+        младших (границы баров по UTC, как у Bybit), если на это хватает
+        одного запроса.
+        
+        Args:
+            symbol: Торговая пара
+            timeframes: Таймфреймы
+            limit: Количество свечей каждого таймфрейма
+            
+        Returns:
+            {таймфрейм: свечи}; таймфреймы, которые не удалось загрузить, отсутствуют
+        """
+        result: Dict[str, List[List]] = {}
+        pending = []
+        kline_stream = self._kline_stream_for(symbol)
+        for timeframe in timeframes:
+            candles = kline_stream.get_ohlcv(symbol, timeframe, limit)
+            if candles is not None:
+                result[timeframe] = candles
+            else:
+                pending.append(timeframe)
+        if not pending:
+            return result
+        
+        fetch, derive = plan_fetches(pending, limit)
+        if derive:
+            logger.debug(f"Resampling {symbol} {sorted(derive)} from {sorted(set(derive.values()))}")
+        
+        fetched = await asyncio.gather(
+            *(self.get_ohlcv(symbol, timeframe, limit=count) for timeframe, count in fetch.items()),
+            return_exceptions=True
+        )
+        base_data = {}
+        for timeframe, candles in zip(fetch, fetched):
+            if isinstance(candles, Exception):
+                logger.warning(f"Failed to fetch {symbol} {timeframe} OHLCV: {candles}")
+                continue
+            base_data[timeframe] = candles
+            if timeframe in pending:
+                result[timeframe] = candles[-limit:]
+        
+        # Производные таймфреймы; при нехватке баров (пропуски, новый листинг) - прямой запрос
+        missing = []
+        for timeframe, base in derive.items():
+            if base not in base_data:
+                missing.append(timeframe)
+                continue
+            bars = resample(np.asarray(base_data[base], dtype=np.float64), base, timeframe)
+            if len(bars) >= limit:
+                result[timeframe] = candles_to_list(bars[-limit:])
+            else:
+                missing.append(timeframe)
+        
+        if missing:
+            fallback = await asyncio.gather(
+                *(self.get_ohlcv(symbol, timeframe, limit=limit) for timeframe in missing),
+                return_exceptions=True
+            )
+            for timeframe, candles in zip(missing, fallback):
+                if not isinstance(candles, Exception):
+                    result[timeframe] = candles
+        
+        return result
+    
+    async def _fetch_ohlcv(self, symbol: str, timeframe: str, limit: int) -> List[List]:
+        """Загрузка OHLCV (без объединения запросов, см. get_ohlcv)"""
         # Проверяем кэш
         cache = get_cache_manager()
         cached_result = cache.get("get_ohlcv", symbol=symbol, timeframe=timeframe, limit=limit)
@@ -880,300 +1085,156 @@ class BybitClient:
             logger.debug(f"Cache hit for get_ohlcv: {symbol} {timeframe}")
             return cached_result
         
-        # Retry логика с экспоненциальной задержкой
-        max_retries = 3
-        retry_delay = 1
+        # Персистентное хранилище свечей: запрашиваем только бары новее сохранённых
+        store = get_candle_store()
+        fetch_limit = store.bars_to_fetch(symbol, timeframe, limit) if store.enabled else limit
+        if fetch_limit < limit:
+            logger.debug(f"Candle store hit for {symbol} {timeframe}: fetching {fetch_limit}/{limit} bars")
         
-        for attempt in range(max_retries):
-            try:
-                ohlcv = await self.exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
-                
-                # Проверяем, что получили данные
-                if not ohlcv or len(ohlcv) == 0:
-                    raise ValueError(f"Empty OHLCV data for {symbol}")
-                
-                # Сохраняем в кэш (TTL зависит от таймфрейма: меньшие таймфреймы = короче кэш)
-                ttl_map = {
-                    "1m": 10,   # 10 секунд для 1m
-                    "5m": 30,   # 30 секунд для 5m
-                    "15m": 60,  # 1 минута для 15m
-                    "1h": 120,  # 2 минуты для 1h
-                    "4h": 300,  # 5 минут для 4h
-                    "1d": 600   # 10 минут для 1d
-                }
-                ttl = ttl_map.get(timeframe, 60)  # По умолчанию 60 секунд
-                
-                cache.set("get_ohlcv", ohlcv, ttl=ttl, symbol=symbol, timeframe=timeframe, limit=limit)
-                
-                return ohlcv
-                
-            except Exception as e:
-                # Парсим ошибку CCXT для извлечения retCode
-                parsed_error = parse_ccxt_error(e)
-                error_msg = str(e).lower()
-                
-                # Если нашли retCode в ошибке - обрабатываем специфично
-                if parsed_error["parsed"] and parsed_error["retCode"]:
-                    ret_code = parsed_error["retCode"]
-                    ret_msg = parsed_error["retMsg"]
-                    
-                    if ret_code == 10003:
-                        logger.error(f"❌ API Key INVALID (retCode=10003) for {symbol} OHLCV")
-                        raise Exception(
-                            f"Bybit API Key is INVALID! "
-                            f"Please check your BYBIT_API_KEY and BYBIT_API_SECRET. "
-                            f"Error: {ret_msg}"
-                        )
-                    elif ret_code == 10004:
-                        logger.error(f"❌ API Key has NO PERMISSIONS (retCode=10004) for {symbol} OHLCV")
-                        raise Exception(
-                            f"Bybit API Key has insufficient permissions! "
-                            f"Please enable READ permissions on Bybit API Management page. "
-                            f"Error: {ret_msg}"
-                        )
-                    elif ret_code == 10005:
-                        logger.error(f"❌ IP NOT WHITELISTED (retCode=10005) for {symbol} OHLCV")
-                        raise Exception(
-                            f"IP address is not whitelisted! "
-                            f"Please add your server's IP to Bybit API whitelist. "
-                            f"Error: {ret_msg}"
-                        )
-                    else:
-                        logger.error(f"Bybit API error (retCode={ret_code}) for {symbol} OHLCV: {ret_msg}")
-                        raise Exception(f"Bybit API error (retCode={ret_code}): {ret_msg}")
-                
-                # Проверяем на DNS ошибки
-                if any(keyword in error_msg for keyword in ["dns", "could not contact dns", "name resolution", "gaierror", "cannot connect to host"]):
-                    logger.warning(f"DNS/Network error for {symbol} (attempt {attempt + 1}/{max_retries}): {e}")
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(retry_delay * (2 ** attempt))
-                        continue
-                    else:
-                        # Последняя попытка - используем прямой HTTP запрос к Bybit API
-                        logger.info(f"CCXT failed due to DNS/Network error, trying direct HTTP request to Bybit API for {symbol}")
-                        try:
-                            # Определяем category по символу (можно расширить логику)
-                            category = "spot"  # По умолчанию spot, можно определить по символу
-                            ohlcv = await self._get_ohlcv_direct_http(symbol, timeframe, limit, category)
-                            if ohlcv and len(ohlcv) > 0:
-                                # Сохраняем в кэш
-                                ttl_map = {
-                                    "1m": 10, "5m": 30, "15m": 60,
-                                    "1h": 120, "4h": 300, "1d": 600
-                                }
-                                ttl = ttl_map.get(timeframe, 60)
-                                cache.set("get_ohlcv", ohlcv, ttl=ttl, symbol=symbol, timeframe=timeframe, limit=limit)
-                                return ohlcv
-                            else:
-                                raise Exception(f"Empty OHLCV data from direct HTTP for {symbol}")
-                        except Exception as http_error:
-                            logger.error(f"Direct HTTP also failed for {symbol}: {http_error}")
-                            raise Exception(f"API Error: Failed to fetch OHLCV for {symbol} after {max_retries} attempts and direct HTTP fallback. DNS/Network error: {e}, HTTP error: {http_error}")
-                
-                # Фильтруем ошибки, связанные с asset/coin/query-info
-                elif "asset/coin/query-info" in error_msg or "query-info" in error_msg:
-                    logger.warning(f"CCXT error with query-info endpoint for {symbol} (attempt {attempt + 1}/{max_retries}): {e}")
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(retry_delay * (2 ** attempt))
-                        continue
-                    else:
-                        # Последняя попытка - используем прямой HTTP запрос к Bybit API
-                        logger.info(f"CCXT failed, trying direct HTTP request to Bybit API for {symbol}")
-                        try:
-                            # Определяем category по символу (можно расширить логику)
-                            category = "spot"  # По умолчанию spot, можно определить по символу
-                            ohlcv = await self._get_ohlcv_direct_http(symbol, timeframe, limit, category)
-                            if ohlcv and len(ohlcv) > 0:
-                                # Сохраняем в кэш
-                                ttl_map = {
-                                    "1m": 10, "5m": 30, "15m": 60,
-                                    "1h": 120, "4h": 300, "1d": 600
-                                }
-                                ttl = ttl_map.get(timeframe, 60)
-                                cache.set("get_ohlcv", ohlcv, ttl=ttl, symbol=symbol, timeframe=timeframe, limit=limit)
-                                return ohlcv
-                            else:
-                                raise Exception(f"Empty OHLCV data from direct HTTP for {symbol}")
-                        except Exception as http_error:
-                            logger.error(f"Direct HTTP also failed for {symbol}: {http_error}")
-                            raise Exception(f"API Error: Failed to fetch OHLCV for {symbol} after {max_retries} attempts and direct HTTP fallback. CCXT error: {e}, HTTP error: {http_error}")
-                else:
-                    # Другие ошибки - пробуем retry
-                    logger.warning(f"Error getting OHLCV for {symbol} (attempt {attempt + 1}/{max_retries}): {e}")
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(retry_delay * (2 ** attempt))
-                        continue
-                    else:
-                        logger.error(f"Failed to get OHLCV for {symbol} after {max_retries} attempts: {e}", exc_info=True)
-                        raise
+        ohlcv = await self.request_policy.call(
+            "http:kline",
+            lambda: self._get_ohlcv_direct_http(symbol, timeframe, fetch_limit),
+            # CCXT - запасной путь при сбое прямого HTTP
+            fallback=lambda: self._fetch_ohlcv_ccxt(symbol, timeframe, fetch_limit),
+            on_error=self._on_rest_error
+        )
+        
+        ohlcv = self._merge_into_candle_store(symbol, timeframe, ohlcv, limit)
+        
+        # Сохраняем в кэш (TTL зависит от таймфрейма: меньшие таймфреймы = короче кэш)
+        ttl_map = {
+            "1m": 10,   # 10 секунд для 1m
+            "5m": 30,   # 30 секунд для 5m
+            "15m": 60,  # 1 минута для 15m
+            "1h": 120,  # 2 минуты для 1h
+            "4h": 300,  # 5 минут для 4h
+            "1d": 600   # 10 минут для 1d
+        }
+        ttl = ttl_map.get(timeframe, 60)  # По умолчанию 60 секунд
+        
+        cache.set("get_ohlcv", ohlcv, ttl=ttl, symbol=symbol, timeframe=timeframe, limit=limit)
+        
+        return ohlcv
+    
+    async def _fetch_ohlcv_ccxt(self, symbol: str, timeframe: str, limit: int) -> List[List]:
+        """Свечи через CCXT (запасной путь, повторы - в request_policy)"""
+        await self._throttle("market")
+        ohlcv = await self.exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
+        
+        # Проверяем, что получили данные
+        if not ohlcv or len(ohlcv) == 0:
+            raise ValueError(f"Empty OHLCV data for {symbol}")
+        return ohlcv
     
-    async def _get_ohlcv_direct_http(self, symbol: str, timeframe: str, limit: int, category: str = "spot") -> List[List]:
+    async def _fetch_ohlcv_rest(self, symbol: str, timeframe: str, limit: int) -> List[List]:
+        """Прямая загрузка свечей через REST без кэшей (докачка пропусков WebSocket)"""
+        return await self.request_policy.call(
+            "http:kline",
+            lambda: self._get_ohlcv_direct_http(symbol, timeframe, limit),
+            fallback=lambda: self._fetch_ohlcv_ccxt(symbol, timeframe, limit),
+            on_error=self._on_rest_error
+        )
+    
+    async def start_kline_stream(
+        self,
+        symbols: List[str],
+        timeframes: List[str],
+        base_timeframe: Optional[str] = None
+    ) -> int:
         """
-        Получить OHLCV данные через прямой HTTP запрос к Bybit API v5
-        Обходит проблемы CCXT с query-info endpoint
+        Подписать символы на поток свечей WebSocket
         
         Args:
-            symbol: Торговая пара
-            timeframe: Таймфрейм
-            limit: Количество свечей
-            category: "spot", "linear", или "inverse"
+            symbols: Торговые пары
+            timeframes: Таймфреймы
+            base_timeframe: Базовый таймфрейм, из которого кратные собираются локально
+            
+        Returns:
+            Количество новых подписок (0 если поток отключён)
         """
-        # Маппинг таймфреймов для Bybit API
-        interval_map = {
-            "1m": "1", "3m": "3", "5m": "5", "15m": "15", "30m": "30",
-            "1h": "60", "2h": "120", "4h": "240", "6h": "360", "12h": "720",
-            "1d": "D", "1w": "W", "1M": "M"
-        }
+        count = 0
+        for category, stream in self.kline_streams.items():
+            category_symbols = [symbol for symbol in symbols if category_of(symbol) == category]
+            if category_symbols:
+                count += await stream.subscribe(category_symbols, timeframes, base_timeframe=base_timeframe)
+        return count
+    
+    def _kline_stream_for(self, symbol: str) -> KlineStream:
+        """Поток свечей категории символа"""
+        return self.kline_streams[category_of(symbol)]
+    
+    def _merge_into_candle_store(self, symbol: str, timeframe: str, ohlcv: List[List], limit: int) -> List[List]:
+        """
+        Слить свежие бары в хранилище свечей и вернуть последние limit баров из него
         
-        interval = interval_map.get(timeframe, "60")
-        base_url = "https://api-testnet.bybit.com" if self.testnet else "https://api.bybit.com"
-        endpoint = "/v5/market/kline"
-        url = f"{base_url}{endpoint}"
-        
-        # Определяем category автоматически по символу если не указан
-        if category == "spot" and ("USDT" in symbol or "USDC" in symbol):
-            # Для spot используем spot
-            pass
-        elif category in ["linear", "inverse"]:
-            # Для фьючерсов используем указанный category
-            pass
-        else:
-            # По умолчанию spot
-            category = "spot"
+        Последний сохранённый (формирующийся) бар перезаписывается свежей версией.
+        Если хранилище отключено или недоступно - возвращает ohlcv как есть.
+        """
+        store = get_candle_store()
+        if not store.enabled:
+            return ohlcv
         
-        params = {
-            "category": category,
-            "symbol": symbol,
-            "interval": interval,
-            "limit": str(limit)
-        }
+        try:
+            series = store.merge(symbol, timeframe, ohlcv)
+        except Exception as e:
+            logger.warning(f"Candle store merge failed for {symbol} {timeframe}: {e}")
+            return ohlcv
         
-        # Retry логика с обработкой DNS ошибок
-        max_retries = 3
-        retry_delay = 1
+        return candles_to_list(series[-limit:])
+    
+    async def _get_ohlcv_direct_http(
+        self,
+        symbol: str,
+        timeframe: str,
+        limit: int,
+        category: Optional[str] = None
+    ) -> List[List]:
+        """
+        Получить OHLCV данные через прямой HTTP запрос к Bybit API v5
+        (одна попытка, повторы и fallback на CCXT - в request_policy)
         
-        for attempt in range(max_retries):
-            try:
-                session = await self._get_http_session()
-                async with session.get(url, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        if data.get("retCode") == 0:
-                            result = data.get("result", {})
-                            klines = result.get("list", [])
-                            
-                            # Конвертируем в формат CCXT: [[timestamp, open, high, low, close, volume], ...]
-                            ohlcv_list = []
-                            for kline in reversed(klines):  # Bybit возвращает в обратном порядке
-                                ohlcv_list.append([
-                                    int(kline[0]),  # timestamp
-                                    float(kline[1]),  # open
-                                    float(kline[2]),  # high
-                                    float(kline[3]),  # low
-                                    float(kline[4]),  # close
-                                    float(kline[5])   # volume
-                                ])
-                            
-                            return ohlcv_list
-                        else:
-                            raise Exception(f"Bybit API error: {data.get('retMsg', 'Unknown error')}")
-                    else:
-                        raise Exception(f"HTTP {response.status}: {await response.text()}")
-            except (aiohttp.ClientError, socket.gaierror, OSError) as e:
-                error_msg = str(e).lower()
-                # Проверяем на DNS ошибки
-                if any(keyword in error_msg for keyword in ["dns", "could not contact dns", "name resolution", "gaierror"]):
-                    logger.warning(f"DNS error on attempt {attempt + 1}/{max_retries}: {e}")
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(retry_delay * (2 ** attempt))
-                        continue
-                    else:
-                        raise Exception(f"DNS resolution failed after {max_retries} attempts: {e}")
-                else:
-                    # Другие сетевые ошибки
-                    logger.warning(f"Network error on attempt {attempt + 1}/{max_retries}: {e}")
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(retry_delay * (2 ** attempt))
-                        continue
-                    else:
-                        raise
-            except Exception as e:
-                logger.error(f"Direct HTTP request for OHLCV failed: {e}")
-                raise
+        Args:
+            symbol: Торговая пара
+            timeframe: Таймфрейм
+            limit: Количество свечей
+            category: "spot", "linear", или "inverse" (если None - по символу)
+        
+        Returns:
+            Свечи в формате CCXT: [[timestamp, open, high, low, close, volume], ...]
+        """
+        candles = await self.rest.klines(symbol, timeframe, limit, category=category)
+        if len(candles) == 0:
+            raise ValueError(f"Empty OHLCV data from direct HTTP for {symbol}")
+        return candles_to_list(candles)
     
     async def _get_tickers_direct_http(self, market_type: str) -> List[Dict[str, Any]]:
         """
         Получить тикеры через прямой HTTP запрос к Bybit API v5
         Обходит проблемы CCXT с query-info endpoint
+        
+        Returns:
+            Тикеры в формате get_all_tickers (CCXT символы, объём в котируемой валюте)
         """
         category = "linear" if market_type == "futures" else "spot"
-        base_url = "https://api-testnet.bybit.com" if self.testnet else "https://api.bybit.com"
-        endpoint = "/v5/market/tickers"
-        url = f"{base_url}{endpoint}"
+        rows = await self.rest.tickers(category)
+        if not rows:
+            raise Exception("Empty tickers list from direct HTTP")
         
-        params = {
-            "category": category,
-            "limit": "1000"  # Максимум для одного запроса
-        }
-        
-        # Retry логика с обработкой DNS ошибок
-        max_retries = 3
-        retry_delay = 1
+        snapshot = TickerSnapshot(category, 0, {row.get("symbol", ""): row for row in rows})
+        return list(snapshot.tickers.values())
+    
+    async def _get_tickers_raw(self, category: str) -> List[Dict[str, Any]]:
+        """
+        Получить тикеры категории через прямой HTTP запрос к Bybit API v5
         
-        for attempt in range(max_retries):
-            try:
-                session = await self._get_http_session()
-                async with session.get(url, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        if data.get("retCode") == 0:
-                            result = data.get("result", {})
-                            tickers = result.get("list", [])
-                            
-                            # Конвертируем в формат, совместимый с CCXT
-                            ticker_list = []
-                            for ticker in tickers:
-                                try:
-                                    ticker_list.append({
-                                        "symbol": ticker.get("symbol", ""),
-                                        "price": float(ticker.get("lastPrice", 0)) or 0,
-                                        "change_24h": float(ticker.get("price24hPcnt", 0)) * 100 or 0,  # Конвертируем в проценты
-                                        "volume_24h": float(ticker.get("volume24h", 0)) or 0,
-                                        "high_24h": float(ticker.get("highPrice24h", 0)) or 0,
-                                        "low_24h": float(ticker.get("lowPrice24h", 0)) or 0,
-                                        "bid": float(ticker.get("bid1Price", 0)) or 0,
-                                        "ask": float(ticker.get("ask1Price", 0)) or 0
-                                    })
-                                except Exception as ticker_err:
-                                    logger.warning(f"Error processing ticker from direct HTTP: {ticker_err}")
-                                    continue
-                            
-                            return ticker_list
-                        else:
-                            raise Exception(f"Bybit API error: {data.get('retMsg', 'Unknown error')}")
-                    else:
-                        raise Exception(f"HTTP {response.status}: {await response.text()}")
-            except (aiohttp.ClientError, socket.gaierror, OSError) as e:
-                error_msg = str(e).lower()
-                # Проверяем на DNS ошибки
-                if any(keyword in error_msg for keyword in ["dns", "could not contact dns", "name resolution", "gaierror"]):
-                    logger.warning(f"DNS error on attempt {attempt + 1}/{max_retries}: {e}")
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(retry_delay * (2 ** attempt))
-                        continue
-                    else:
-                        raise Exception(f"DNS resolution failed after {max_retries} attempts: {e}")
-                else:
-                    # Другие сетевые ошибки
-                    logger.warning(f"Network error on attempt {attempt + 1}/{max_retries}: {e}")
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(retry_delay * (2 ** attempt))
-                        continue
-                    else:
-                        raise
-            except Exception as e:
-                logger.error(f"Direct HTTP request for tickers failed: {e}")
-                raise
+        Returns:
+            Строки тикеров в исходном формате Bybit (lastPrice, price24hPcnt, ...)
+        """
+        return await self.request_policy.call(
+            "http:tickers",
+            lambda: self.rest.tickers(category),
+            on_error=self._on_rest_error
+        )
     
     async def get_orderbook(self, symbol: str, limit: int = 25) -> Dict[str, Any]:
         """
@@ -1186,25 +1247,85 @@ class BybitClient:
         Returns:
             Orderbook данные с bids и asks
         """
+        # Синхронизированный локальный стакан - без запроса к бирже
+        book = self._orderbook_stream_for(symbol).get_book(symbol)
+        if book is not None and limit <= book.depth:
+            return book.to_dict(limit)
+        
         logger.info(f"Getting orderbook for {symbol} (limit={limit})")
         
         try:
-            orderbook = await self.exchange.fetch_order_book(symbol, limit=limit)
+            bids, asks = await self._fetch_orderbook_levels(symbol, limit)
             
             return {
                 "symbol": symbol,
-                "bids": orderbook['bids'],  # [[price, size], ...]
-                "asks": orderbook['asks'],  # [[price, size], ...]
+                "bids": bids.tolist(),  # [[price, size], ...]
+                "asks": asks.tolist(),  # [[price, size], ...]
                 "timestamp": datetime.now().isoformat(),
-                "bid_price": orderbook['bids'][0][0] if orderbook['bids'] else None,
-                "ask_price": orderbook['asks'][0][0] if orderbook['asks'] else None,
-                "spread": (orderbook['asks'][0][0] - orderbook['bids'][0][0]) if (orderbook['asks'] and orderbook['bids']) else None
+                "bid_price": float(bids[0, 0]) if len(bids) else None,
+                "ask_price": float(asks[0, 0]) if len(asks) else None,
+                "spread": float(asks[0, 0] - bids[0, 0]) if (len(asks) and len(bids)) else None
             }
             
         except Exception as e:
             logger.error(f"Error getting orderbook: {e}", exc_info=True)
             raise
     
+    async def get_orderbook_levels(self, symbol: str, limit: int = 50) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Верхние уровни стакана в виде массивов (N, 2) [price, size]
+        
+        Из локального стакана возвращаются read-only срезы без копирования,
+        иначе стакан загружается через REST.
+        
+        Returns:
+            (bids, asks)
+        """
+        book = self._orderbook_stream_for(symbol).get_book(symbol)
+        if book is not None and limit <= book.depth:
+            return book.top(limit)
+        
+        return await self._fetch_orderbook_levels(symbol, limit)
+    
+    async def _fetch_orderbook_levels(self, symbol: str, limit: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Стакан через /v5/market/orderbook (CCXT - запасной путь)"""
+        return await self.request_policy.call(
+            "http:orderbook",
+            lambda: self.rest.orderbook(symbol, limit),
+            fallback=lambda: self._fetch_orderbook_ccxt(symbol, limit),
+            on_error=self._on_rest_error
+        )
+    
+    async def _fetch_orderbook_ccxt(self, symbol: str, limit: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Стакан через CCXT в виде массивов (bids, asks)"""
+        await self._throttle("market")
+        orderbook = await self.exchange.fetch_order_book(symbol, limit=limit)
+        bids = np.array([level[:2] for level in orderbook.get("bids", [])], dtype=np.float64).reshape(-1, 2)
+        asks = np.array([level[:2] for level in orderbook.get("asks", [])], dtype=np.float64).reshape(-1, 2)
+        return bids, asks
+    
+    def has_live_orderbook(self, symbol: str) -> bool:
+        """Есть ли синхронизированный локальный стакан для символа"""
+        return self._orderbook_stream_for(symbol).has_live_book(symbol)
+    
+    async def start_orderbook_stream(self, symbols: List[str]) -> int:
+        """
+        Подписать символы на локальные стаканы WebSocket
+        
+        Returns:
+            Количество новых подписок (0 если поток отключён)
+        """
+        count = 0
+        for category, stream in self.orderbook_streams.items():
+            category_symbols = [symbol for symbol in symbols if category_of(symbol) == category]
+            if category_symbols:
+                count += await stream.subscribe(category_symbols)
+        return count
+    
+    def _orderbook_stream_for(self, symbol: str) -> OrderBookStream:
+        """Поток стаканов категории символа"""
+        return self.orderbook_streams[category_of(symbol)]
+    
     async def get_account_info(self) -> Dict[str, Any]:
         """
         Получить информацию о счёте
@@ -1216,6 +1337,7 @@ class BybitClient:
         
         try:
             # Получаем баланс
+            await self._throttle("account")
             balance = await self.exchange.fetch_balance()
             
             # Получаем открытые позиции
@@ -1273,6 +1395,7 @@ class BybitClient:
         logger.info("Getting open positions")
         
         try:
+            await self._throttle("position")
             positions = await self.exchange.fetch_positions()
             
             # Фильтруем только открытые позиции
@@ -1335,6 +1458,7 @@ class BybitClient:
             if take_profit:
                 order_params['takeProfit'] = {'triggerPrice': take_profit}
             
+            await self._throttle("order")
             order = await self.exchange.create_order(
                 symbol=symbol,
                 type=order_type,
@@ -1376,24 +1500,12 @@ class BybitClient:
         logger.info(f"Getting funding rate for {symbol}")
         
         try:
-            # Для фьючерсов нужно использовать swap тип
-            self.exchange.options['defaultType'] = 'swap'
-            
-            # Получаем funding rate через CCXT
-            ticker = await self.exchange.fetch_ticker(symbol)
-            
-            # Funding rate обычно в info или отдельным запросом
-            funding_rate = ticker.get('info', {}).get('fundingRate', None)
-            next_funding_time = ticker.get('info', {}).get('nextFundingTime', None)
-            
-            # Если нет в ticker, пытаемся получить через fetchFundingRate
-            if funding_rate is None:
-                try:
-                    funding_info = await self.exchange.fetch_funding_rate(symbol)
-                    funding_rate = funding_info.get('fundingRate', 0) if funding_info else 0
-                    next_funding_time = funding_info.get('fundingTimestamp', None) if funding_info else None
-                except:
-                    funding_rate = 0
+            funding_rate, next_funding_time = await self.request_policy.call(
+                "http:funding",
+                lambda: self._fetch_funding_http(symbol),
+                fallback=lambda: self._fetch_funding_ccxt(symbol),
+                on_error=self._on_rest_error
+            )
             
             # Конвертируем в проценты
             funding_rate_pct = float(funding_rate) * 100 if funding_rate else 0
@@ -1435,6 +1547,36 @@ class BybitClient:
                 "timestamp": datetime.now().isoformat()
             }
     
+    async def _fetch_funding_http(self, symbol: str) -> Tuple[Any, Any]:
+        """(fundingRate, nextFundingTime) из тикера linear контракта"""
+        rows = await self.rest.tickers("linear", symbol)
+        if not rows:
+            raise ValueError(f"No linear ticker for {symbol}")
+        return rows[0].get("fundingRate"), rows[0].get("nextFundingTime")
+    
+    async def _fetch_funding_ccxt(self, symbol: str) -> Tuple[Any, Any]:
+        """(fundingRate, nextFundingTime) через CCXT (запасной путь)"""
+        # Для фьючерсов нужно использовать swap тип
+        self.exchange.options['defaultType'] = 'swap'
+        
+        await self._throttle("market")
+        ticker = await self.exchange.fetch_ticker(symbol)
+        
+        # Funding rate обычно в info или отдельным запросом
+        funding_rate = ticker.get('info', {}).get('fundingRate', None)
+        next_funding_time = ticker.get('info', {}).get('nextFundingTime', None)
+        
+        # Если нет в ticker, пытаемся получить через fetchFundingRate
+        if funding_rate is None:
+            try:
+                await self._throttle("market")
+                funding_info = await self.exchange.fetch_funding_rate(symbol)
+                funding_rate = funding_info.get('fundingRate', 0) if funding_info else 0
+                next_funding_time = funding_info.get('fundingTimestamp', None) if funding_info else None
+            except:
+                funding_rate = 0
+        return funding_rate, next_funding_time
+    
     async def get_open_interest(self, symbol: str, category: str = "linear") -> Dict[str, Any]:
         """
         Получить Open Interest для futures
@@ -1448,163 +1590,86 @@ class BybitClient:
         """
         logger.info(f"Getting Open Interest for {symbol} ({category})")
         
-        # Retry логика с обработкой DNS ошибок
-        max_retries = 3
-        retry_delay = 1
-        
-        for attempt in range(max_retries):
-            try:
-                # Используем прямой HTTP запрос к Bybit API v5
-                base_url = "https://api-testnet.bybit.com" if self.testnet else "https://api.bybit.com"
-                endpoint = "/v5/market/open-interest"
-                url = f"{base_url}{endpoint}"
+        try:
+            # 50 точек по 5 минут = ~4 часа истории, по возрастанию времени
+            _, oi_history = await self.request_policy.call(
+                "http:open-interest",
+                lambda: self.rest.open_interest(symbol, category=category, interval="5min", limit=50),
+                on_error=self._on_rest_error
+            )
+            
+            if len(oi_history) == 0:
+                raise ValueError(f"No Open Interest data for {symbol}")
+            
+            # Текущий OI (последняя точка)
+            current_oi = float(oi_history[-1])
+            
+            oi_change = 0
+            oi_change_pct = 0
+            oi_change_24h = 0
+            oi_change_24h_pct = 0
+            
+            if len(oi_history) >= 2:
+                # Самая старая точка окна
+                old_oi = float(oi_history[0])
                 
-                params = {
-                    "category": category,
-                    "symbol": symbol,
-                    "intervalTime": "5min"  # Исправлено: intervalTime вместо intervalType
-                }
+                # Изменение за период
+                oi_change = current_oi - old_oi
+                oi_change_pct = (oi_change / old_oi * 100) if old_oi > 0 else 0
                 
-                session = await self._get_http_session()
-                async with session.get(url, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        if data.get("retCode") == 0:
-                            result = data.get("result", {})
-                            oi_list = result.get("list", [])
-                            
-                            if not oi_list:
-                                raise ValueError(f"No Open Interest data for {symbol}")
-                            
-                            # Текущий OI (последний элемент)
-                            current_oi = float(oi_list[-1].get("openInterest", 0))
-                            
-                            # Получаем историю для анализа тренда
-                            # Запрашиваем больше данных для анализа
-                            params_history = {
-                                "category": category,
-                                "symbol": symbol,
-                                "intervalTime": "5min",  # Исправлено: intervalTime вместо intervalType
-                                "limit": "50"  # 50 точек = ~4 часа истории
-                            }
-                            
-                            async with session.get(url, params=params_history) as hist_response:
-                                if hist_response.status == 200:
-                                    hist_data = await hist_response.json()
-                                    if hist_data.get("retCode") == 0:
-                                        hist_result = hist_data.get("result", {})
-                                        hist_oi_list = hist_result.get("list", [])
-                                        
-                                        if len(hist_oi_list) >= 2:
-                                            # Первый элемент (старый)
-                                            old_oi = float(hist_oi_list[0].get("openInterest", 0))
-                                            
-                                            # Изменение за период
-                                            oi_change = current_oi - old_oi
-                                            oi_change_pct = (oi_change / old_oi * 100) if old_oi > 0 else 0
-                                            
-                                            # Изменение за 24 часа (если есть достаточно данных)
-                                            if len(hist_oi_list) >= 10:
-                                                oi_24h_ago = float(hist_oi_list[0].get("openInterest", 0))
-                                                oi_change_24h = current_oi - oi_24h_ago
-                                                oi_change_24h_pct = (oi_change_24h / oi_24h_ago * 100) if oi_24h_ago > 0 else 0
-                                            else:
-                                                oi_change_24h = 0
-                                                oi_change_24h_pct = 0
-                                        else:
-                                            oi_change = 0
-                                            oi_change_pct = 0
-                                            oi_change_24h = 0
-                                            oi_change_24h_pct = 0
-                                    else:
-                                        oi_change = 0
-                                        oi_change_pct = 0
-                                        oi_change_24h = 0
-                                        oi_change_24h_pct = 0
-                                else:
-                                    oi_change = 0
-                                    oi_change_pct = 0
-                                    oi_change_24h = 0
-                                    oi_change_24h_pct = 0
-                            
-                            # Интерпретация изменения OI
-                            if oi_change_24h_pct > 5:
-                                interpretation = "Сильное накопление позиций. Вероятен сильный движение."
-                                trend = "accumulation"
-                                signal_strength = "strong"
-                            elif oi_change_24h_pct > 2:
-                                interpretation = "Умеренное накопление. Поддержка текущего тренда."
-                                trend = "accumulation"
-                                signal_strength = "moderate"
-                            elif oi_change_24h_pct < -5:
-                                interpretation = "Сильное распределение. Возможен разворот."
-                                trend = "distribution"
-                                signal_strength = "strong"
-                            elif oi_change_24h_pct < -2:
-                                interpretation = "Умеренное распределение. Ослабление тренда."
-                                trend = "distribution"
-                                signal_strength = "moderate"
-                            else:
-                                interpretation = "Стабильный OI. Консолидация."
-                                trend = "stable"
-                                signal_strength = "weak"
-                            
-                            return {
-                                "symbol": symbol,
-                                "category": category,
-                                "open_interest": current_oi,
-                                "change_24h": round(oi_change_24h, 2),
-                                "change_24h_pct": round(oi_change_24h_pct, 2),
-                                "change_recent": round(oi_change, 2),
-                                "change_recent_pct": round(oi_change_pct, 2),
-                                "trend": trend,
-                                "signal_strength": signal_strength,
-                                "interpretation": interpretation,
-                                "timestamp": datetime.now().isoformat()
-                            }
-                        else:
-                            raise Exception(f"Bybit API error: {data.get('retMsg', 'Unknown error')}")
-                    else:
-                        raise Exception(f"HTTP {response.status}: {await response.text()}")
-                        
-            except (aiohttp.ClientError, socket.gaierror, OSError) as e:
-                error_msg = str(e).lower()
-                # Проверяем на DNS ошибки
-                if any(keyword in error_msg for keyword in ["dns", "could not contact dns", "name resolution", "gaierror"]):
-                    logger.warning(f"DNS error on attempt {attempt + 1}/{max_retries}: {e}")
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(retry_delay * (2 ** attempt))
-                        continue
-                    else:
-                        logger.error(f"DNS resolution failed after {max_retries} attempts: {e}")
-                        return {
-                            "symbol": symbol,
-                            "category": category,
-                            "open_interest": 0.0,
-                            "change_24h_pct": 0.0,
-                            "trend": "unknown",
-                            "interpretation": f"DNS/Network Error: Failed to connect to Bybit API after {max_retries} attempts. Error: {e}",
-                            "timestamp": datetime.now().isoformat()
-                        }
-                else:
-                    # Другие сетевые ошибки
-                    logger.warning(f"Network error on attempt {attempt + 1}/{max_retries}: {e}")
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(retry_delay * (2 ** attempt))
-                        continue
-                    else:
-                        raise
-            except Exception as e:
-                logger.error(f"Error getting Open Interest for {symbol}: {e}", exc_info=True)
-                return {
-                    "symbol": symbol,
-                    "category": category,
-                    "open_interest": 0.0,
-                    "change_24h_pct": 0.0,
-                    "trend": "unknown",
-                    "interpretation": f"Ошибка получения Open Interest: {str(e)}",
-                    "timestamp": datetime.now().isoformat()
-                }
+                # Изменение за 24 часа (если есть достаточно данных)
+                if len(oi_history) >= 10:
+                    oi_24h_ago = old_oi
+                    oi_change_24h = current_oi - oi_24h_ago
+                    oi_change_24h_pct = (oi_change_24h / oi_24h_ago * 100) if oi_24h_ago > 0 else 0
+            
+            # Интерпретация изменения OI
+            if oi_change_24h_pct > 5:
+                interpretation = "Сильное накопление позиций. Вероятен сильный движение."
+                trend = "accumulation"
+                signal_strength = "strong"
+            elif oi_change_24h_pct > 2:
+                interpretation = "Умеренное накопление. Поддержка текущего тренда."
+                trend = "accumulation"
+                signal_strength = "moderate"
+            elif oi_change_24h_pct < -5:
+                interpretation = "Сильное распределение. Возможен разворот."
+                trend = "distribution"
+                signal_strength = "strong"
+            elif oi_change_24h_pct < -2:
+                interpretation = "Умеренное распределение. Ослабление тренда."
+                trend = "distribution"
+                signal_strength = "moderate"
+            else:
+                interpretation = "Стабильный OI. Консолидация."
+                trend = "stable"
+                signal_strength = "weak"
+            
+            return {
+                "symbol": symbol,
+                "category": category,
+                "open_interest": current_oi,
+                "change_24h": round(oi_change_24h, 2),
+                "change_24h_pct": round(oi_change_24h_pct, 2),
+                "change_recent": round(oi_change, 2),
+                "change_recent_pct": round(oi_change_pct, 2),
+                "trend": trend,
+                "signal_strength": signal_strength,
+                "interpretation": interpretation,
+                "timestamp": datetime.now().isoformat()
+            }
+        
+        except Exception as e:
+            logger.error(f"Error getting Open Interest for {symbol}: {e}")
+            return {
+                "symbol": symbol,
+                "category": category,
+                "open_interest": 0.0,
+                "change_24h_pct": 0.0,
+                "trend": "unknown",
+                "interpretation": f"Ошибка получения Open Interest: {str(e)}",
+                "timestamp": datetime.now().isoformat()
+            }
     
     async def close_position(self, symbol: str, reason: str = "Manual close") -> Dict[str, Any]:
         """
@@ -1621,6 +1686,7 @@ class BybitClient:
         
         try:
             # Получаем текущую позицию
+            await self._throttle("position")
             positions = await self.exchange.fetch_positions([symbol])
             position = next((p for p in positions if p['symbol'] == symbol and p['contracts'] > 0), None)
             
@@ -1629,6 +1695,7 @@ class BybitClient:
             
             # Закрываем позицию (размещаем противоположный ордер)
             close_side = 'sell' if position['side'] == 'long' else 'buy'
+            await self._throttle("order")
             close_order = await self.exchange.create_market_order(
                 symbol=symbol,
                 side=close_side,
@@ -1674,41 +1741,113 @@ class BybitClient:
         Returns:
             Список сделок
         """
+        # Копия списка: вызывающие сортируют сделки на месте
+        return await self.single_flight.do(
+            ("get_public_trade_history", symbol, limit),
+            lambda: self._fetch_public_trade_history(symbol, limit),
+            share=list
+        )
+    
+    async def _fetch_public_trade_history(self, symbol: str, limit: int) -> List[Dict[str, Any]]:
+        """Загрузка публичных сделок (без объединения запросов, см. get_public_trade_history)"""
         logger.info(f"Getting public trades for {symbol} (limit={limit})")
         
-        try:
-            # Используем CCXT fetch_trades
-            trades = await self.exchange.fetch_trades(symbol, limit=limit)
-            return trades
-        except Exception as e:
-            # Парсим ошибку CCXT для извлечения retCode
-            parsed_error = parse_ccxt_error(e)
-            
-            if parsed_error["parsed"] and parsed_error["retCode"]:
-                ret_code = parsed_error["retCode"]
-                ret_msg = parsed_error["retMsg"]
-                
-                if ret_code == 10003:
-                    logger.error(f"❌ API Key INVALID (retCode=10003) when getting public trades for {symbol}")
-                    raise Exception(
-                        f"Bybit API Key is INVALID! "
-                        f"Please check your BYBIT_API_KEY and BYBIT_API_SECRET. "
-                        f"Error: {ret_msg}"
-                    )
-                else:
-                    logger.error(f"Bybit API error (retCode={ret_code}) when getting public trades: {ret_msg}")
-                    raise Exception(f"Bybit API error (retCode={ret_code}): {ret_msg}")
-            
-            logger.error(f"Error getting public trades: {e}")
-            raise
+        return await self.request_policy.call(
+            "ccxt:fetch_trades",
+            lambda: self._fetch_trades_ccxt(symbol, limit),
+            on_error=lambda e: self._on_ccxt_error(e, f"{symbol} public trades")
+        )
+    
+    async def _fetch_trades_ccxt(self, symbol: str, limit: int) -> List[Dict[str, Any]]:
+        """Публичные сделки через CCXT (одна попытка, повторы - в request_policy)"""
+        await self._throttle("market")
+        return await self.exchange.fetch_trades(symbol, limit=limit)
+    
+    async def get_trade_arrays(
+        self,
+        symbol: str,
+        limit: int = 1000,
+        since_ms: Optional[int] = None
+    ) -> TradeArrays:
+        """
+        Окно публичных сделок в виде массивов (ts, price, size, side)
+        
+        Если лента сделок покрывает окно, данные читаются из неё,
+        иначе последние limit сделок загружаются через /v5/market/recent-trade
+        (и дозаполняют ленту, если символ на неё подписан). Bybit отдаёт
+        не больше 60 последних сделок spot и 1000 сделок linear.
+        
+        Args:
+            symbol: Торговая пара
+            limit: Количество последних сделок
+            since_ms: Только сделки начиная с этого времени (ms)
+        
+        Returns:
+            Массивы, упорядоченные по времени; side: +1 покупка, -1 продажа
+        """
+        trade_tape = self.trade_tapes[category_of(symbol)]
+        window = trade_tape.get_window(symbol, limit=limit, since_ms=since_ms)
+        if window is not None:
+            return window
+        
+        ts, price, size, side = await self.single_flight.do(
+            ("get_trade_arrays", symbol, limit),
+            lambda: self.request_policy.call(
+                "http:recent-trade",
+                lambda: self.rest.recent_trades(symbol, limit),
+                fallback=lambda: self._fetch_trade_arrays_ccxt(symbol, limit),
+                on_error=self._on_rest_error
+            )
+        )
+        if trade_tape.is_subscribed(symbol):
+            trade_tape.seed(symbol, ts, price, size, side)
+        
+        if since_ms is not None:
+            start = int(np.searchsorted(ts, since_ms, side="left"))
+            ts, price, size, side = ts[start:], price[start:], size[start:], side[start:]
+        return ts, price, size, side
+    
+    async def _fetch_trade_arrays_ccxt(self, symbol: str, limit: int) -> TradeArrays:
+        """Публичные сделки через CCXT в виде массивов (запасной путь)"""
+        trades = await self._fetch_trades_ccxt(symbol, limit)
+        return trades_to_arrays(trades or [])
+    
+    async def start_trade_tape(self, symbols: List[str]) -> int:
+        """
+        Подписать символы на ленту публичных сделок
+        
+        Returns:
+            Количество новых подписок (0 если лента отключена)
+        """
+        count = 0
+        for category, tape in self.trade_tapes.items():
+            category_symbols = [symbol for symbol in symbols if category_of(symbol) == category]
+            if category_symbols:
+                count += await tape.subscribe(category_symbols)
+        return count
+
+    def get_request_stats(self) -> Dict[str, Any]:
+        """Статистика политики запросов: повторы, breaker'ы, fallback и хеджирование"""
+        return {**self.request_policy.get_stats(), "transport": self.rest.get_stats()}
+
+    def get_coalescing_stats(self) -> Dict[str, Any]:
+        """Статистика объединённых (поглощённых) дублирующих запросов"""
+        return self.single_flight.get_stats()
 
     async def close(self):
         """Закрыть соединение"""
+        for stream in self.kline_streams.values():
+            stream.stop()
+        for stream in self.orderbook_streams.values():
+            stream.stop()
+        for tape in self.trade_tapes.values():
+            tape.stop()
+        for category in ("spot", "linear"):
+            get_ticker_table(category, self.testnet).stop()
+        
         await self.exchange.close()
         
-        # Закрываем HTTP сессию если она была создана
-        if self._http_session and not self._http_session.closed:
-            await self._http_session.close()
-            self._http_session = None
+        # Закрываем HTTP сессию транспорта если она была создана
+        await self.rest.close()
         
         logger.info("Bybit client closed")
@@ -0,0 +1,303 @@
+"""
+Bybit REST
+Лёгкий асинхронный транспорт публичных эндпоинтов Bybit v5 (market data)
+
+Одна aiohttp сессия с keep-alive и кешем DNS на процесс клиента; ответы
+разбираются сразу в numpy массивы без загрузки рынков и построчных словарей CCXT.
+Одна попытка на вызов - повторы и fallback выполняет request_policy.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+import numpy as np
+from aiohttp import ClientTimeout, TCPConnector
+from loguru import logger
+
+# Условный импорт для поддержки как пакета, так и прямого запуска
+try:
+    from .kline_stream import to_exchange_symbol, category_of
+    from .rate_limiter import get_rate_limiter
+    from .trade_tape import TradeArrays, SIDE_BUY, SIDE_SELL
+except ImportError:
+    from kline_stream import to_exchange_symbol, category_of
+    from rate_limiter import get_rate_limiter
+    from trade_tape import TradeArrays, SIDE_BUY, SIDE_SELL
+
+
+MAINNET_URL = "https://api.bybit.com"
+TESTNET_URL = "https://api-testnet.bybit.com"
+
+# Таймфрейм CCXT -> interval Bybit v5
+INTERVAL_MAP = {
+    "1m": "1", "3m": "3", "5m": "5", "15m": "15", "30m": "30",
+    "1h": "60", "2h": "120", "4h": "240", "6h": "360", "12h": "720",
+    "1d": "D", "1w": "W", "1M": "M"
+}
+
+# Максимальный limit одного запроса по категориям
+MAX_KLINE_LIMIT = 1000
+MAX_TRADES_LIMIT = {"spot": 60, "linear": 1000, "inverse": 1000}
+MAX_ORDERBOOK_LIMIT = {"spot": 200, "linear": 500, "inverse": 500}
+
+# retCode превышения лимита запросов
+RATE_LIMIT_RET_CODE = 10006
+
+
+class BybitAPIError(Exception):
+    """Ответ Bybit с retCode != 0"""
+
+    def __init__(self, ret_code: int, ret_msg: str, endpoint: str):
+        super().__init__(f"Bybit API error (retCode={ret_code}) on {endpoint}: {ret_msg}")
+        self.ret_code = ret_code
+        self.ret_msg = ret_msg
+        self.endpoint = endpoint
+
+
+class BybitHTTPError(Exception):
+    """Ответ с HTTP статусом != 200"""
+
+    def __init__(self, status: int, body: str, endpoint: str):
+        super().__init__(f"HTTP {status}: {body}")
+        self.status = status
+        self.endpoint = endpoint
+
+
+def _column(rows: List[Dict[str, Any]], field: str, dtype: Any) -> np.ndarray:
+    """Поле списка строк Bybit (строковые числа) -> массив"""
+    return np.array([row.get(field) or 0 for row in rows], dtype=dtype)
+
+
+class BybitRestClient:
+    """
+    Публичный market data API Bybit v5
+
+    Все методы возвращают данные по возрастанию времени (Bybit отдаёт
+    свечи, сделки и open interest от новых к старым).
+    """
+
+    def __init__(self, testnet: bool = False, rate_limiter: Any = None):
+        """
+        Args:
+            testnet: Использовать testnet
+            rate_limiter: Лимитер запросов (если None - общий get_rate_limiter())
+        """
+        self.testnet = testnet
+        self.base_url = TESTNET_URL if testnet else MAINNET_URL
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._stats = {"requests": 0, "errors": 0, "rate_limited": 0}
+
+    async def session(self) -> aiohttp.ClientSession:
+        """Получить или создать общую aiohttp сессию (keep-alive, кеш DNS)"""
+        if self._session is None or self._session.closed:
+            connector = TCPConnector(
+                resolver=aiohttp.resolver.DefaultResolver(),
+                limit=100,  # Максимум соединений
+                limit_per_host=30,  # Максимум соединений на хост
+                ttl_dns_cache=300,  # Кеш DNS на 5 минут
+                use_dns_cache=True,
+                keepalive_timeout=30,
+                enable_cleanup_closed=True
+            )
+            # Таймауты: connect (DNS + TCP + SSL), read, total
+            timeout = ClientTimeout(total=60, connect=40, sock_read=30)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=timeout,
+                headers={
+                    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)'
+                }
+            )
+        return self._session
+
+    async def get(self, endpoint: str, params: Dict[str, Any], group: str = "market") -> Dict[str, Any]:
+        """
+        Один GET запрос к публичному эндпоинту
+
+        Returns:
+            Поле result ответа
+
+        Raises:
+            BybitAPIError: retCode != 0
+        """
+        session = await self.session()
+        await self.rate_limiter.acquire(group)
+        self._stats["requests"] += 1
+        query = {key: str(value) for key, value in params.items() if value is not None}
+
+        try:
+            async with session.get(f"{self.base_url}{endpoint}", params=query) as response:
+                if response.status == 403:
+                    # Превышен лимит по IP
+                    self._stats["rate_limited"] += 1
+                    self.rate_limiter.report_rate_limited(group)
+                if response.status != 200:
+                    raise BybitHTTPError(response.status, await response.text(), endpoint)
+                data = await response.json(content_type=None)
+        except Exception:
+            self._stats["errors"] += 1
+            raise
+
+        ret_code = data.get("retCode")
+        if ret_code != 0:
+            self._stats["errors"] += 1
+            if ret_code == RATE_LIMIT_RET_CODE:
+                self._stats["rate_limited"] += 1
+                self.rate_limiter.report_rate_limited(group)
+            raise BybitAPIError(ret_code, data.get("retMsg", "Unknown error"), endpoint)
+        return data.get("result") or {}
+
+    async def klines(
+        self,
+        symbol: str,
+        timeframe: str,
+        limit: int = 200,
+        category: Optional[str] = None,
+        end_ms: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        Свечи /v5/market/kline
+
+        Args:
+            symbol: CCXT или Bybit символ
+            timeframe: Таймфрейм ("1m" ... "1M")
+            limit: Количество свечей (не больше 1000)
+            category: Категория (если None - по символу)
+            end_ms: Последний бар не позже этого времени
+
+        Returns:
+            Массив (N, 6) [timestamp, open, high, low, close, volume] по возрастанию времени
+        """
+        if timeframe not in INTERVAL_MAP:
+            raise ValueError(f"Unsupported timeframe for Bybit kline: {timeframe}")
+        result = await self.get("/v5/market/kline", {
+            "category": category or category_of(symbol),
+            "symbol": to_exchange_symbol(symbol),
+            "interval": INTERVAL_MAP[timeframe],
+            "limit": min(limit, MAX_KLINE_LIMIT),
+            "end": end_ms
+        })
+        rows = result.get("list") or []
+        if not rows:
+            return np.empty((0, 6))
+        # [start, open, high, low, close, volume, turnover] строками, от новых к старым
+        return np.array(rows, dtype=np.float64)[::-1, :6].copy()
+
+    async def tickers(self, category: str = "spot", symbol: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Тикеры /v5/market/tickers
+
+        Returns:
+            Строки в исходном формате Bybit (lastPrice, price24hPcnt, fundingRate, ...)
+        """
+        result = await self.get("/v5/market/tickers", {
+            "category": category,
+            "symbol": to_exchange_symbol(symbol) if symbol else None
+        })
+        return result.get("list") or []
+
+    async def orderbook(
+        self,
+        symbol: str,
+        limit: int = 50,
+        category: Optional[str] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Стакан /v5/market/orderbook
+
+        Returns:
+            (bids, asks) массивы (N, 2) [price, size]; bids по убыванию цены, asks по возрастанию
+        """
+        category = category or category_of(symbol)
+        result = await self.get("/v5/market/orderbook", {
+            "category": category,
+            "symbol": to_exchange_symbol(symbol),
+            "limit": min(limit, MAX_ORDERBOOK_LIMIT.get(category, 200))
+        })
+        bids = np.array(result.get("b") or [], dtype=np.float64).reshape(-1, 2)
+        asks = np.array(result.get("a") or [], dtype=np.float64).reshape(-1, 2)
+        return bids, asks
+
+    async def recent_trades(
+        self,
+        symbol: str,
+        limit: int = 1000,
+        category: Optional[str] = None
+    ) -> TradeArrays:
+        """
+        Последние публичные сделки /v5/market/recent-trade
+
+        Bybit отдаёт не больше 60 сделок spot и 1000 сделок linear/inverse.
+
+        Returns:
+            (ts, price, size, side) по возрастанию времени; side: +1 покупка, -1 продажа
+        """
+        category = category or category_of(symbol)
+        result = await self.get("/v5/market/recent-trade", {
+            "category": category,
+            "symbol": to_exchange_symbol(symbol),
+            "limit": min(limit, MAX_TRADES_LIMIT.get(category, 60))
+        })
+        rows = (result.get("list") or [])[::-1]
+
+        ts = _column(rows, "time", np.int64)
+        price = _column(rows, "price", np.float64)
+        size = _column(rows, "size", np.float64)
+        side = np.array([SIDE_BUY if row.get("side") == "Buy" else SIDE_SELL for row in rows], dtype=np.int8)
+
+        order = np.argsort(ts, kind="stable")
+        return ts[order], price[order], size[order], side[order]
+
+    async def open_interest(
+        self,
+        symbol: str,
+        category: str = "linear",
+        interval: str = "5min",
+        limit: int = 50
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        История open interest /v5/market/open-interest
+
+        Returns:
+            (ts, open_interest) по возрастанию времени
+        """
+        result = await self.get("/v5/market/open-interest", {
+            "category": category,
+            "symbol": to_exchange_symbol(symbol),
+            "intervalTime": interval,
+            "limit": min(limit, 200)
+        })
+        rows = (result.get("list") or [])[::-1]
+        return _column(rows, "timestamp", np.int64), _column(rows, "openInterest", np.float64)
+
+    async def funding_history(
+        self,
+        symbol: str,
+        category: str = "linear",
+        limit: int = 200
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        История funding rate /v5/market/funding/history
+
+        Returns:
+            (ts, funding_rate) по возрастанию времени
+        """
+        result = await self.get("/v5/market/funding/history", {
+            "category": category,
+            "symbol": to_exchange_symbol(symbol),
+            "limit": min(limit, 200)
+        })
+        rows = (result.get("list") or [])[::-1]
+        return _column(rows, "fundingRateTimestamp", np.int64), _column(rows, "fundingRate", np.float64)
+
+    async def close(self) -> None:
+        """Закрыть HTTP сессию"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.debug("Bybit REST session closed")
+        self._session = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика транспорта"""
+        return {"base_url": self.base_url, **self._stats}
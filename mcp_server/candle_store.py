@@ -0,0 +1,323 @@
+"""
+Candle Store
+Персистентное хранилище OHLCV свечей на диске (колоночный .npy, memory-mapped)
+Позволяет докачивать только новые бары вместо полной перезагрузки истории
+"""
+
+import atexit
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+
+# Длительность таймфреймов в миллисекундах (только фиксированные интервалы)
+TIMEFRAME_MS: Dict[str, int] = {
+    "1m": 60_000,
+    "3m": 3 * 60_000,
+    "5m": 5 * 60_000,
+    "15m": 15 * 60_000,
+    "30m": 30 * 60_000,
+    "1h": 60 * 60_000,
+    "2h": 2 * 60 * 60_000,
+    "4h": 4 * 60 * 60_000,
+    "6h": 6 * 60 * 60_000,
+    "12h": 12 * 60 * 60_000,
+    "1d": 24 * 60 * 60_000,
+    "1w": 7 * 24 * 60 * 60_000,
+}
+
+# Колонки: timestamp, open, high, low, close, volume
+OHLCV_COLUMNS = 6
+
+
+def timeframe_to_ms(timeframe: str) -> Optional[int]:
+    """Длительность таймфрейма в мс (None для нефиксированных, например 1M)"""
+    return TIMEFRAME_MS.get(timeframe)
+
+
+def candles_to_list(candles: np.ndarray) -> List[List]:
+    """Конвертация массива свечей в формат CCXT: [[timestamp(int), o, h, l, c, v], ...]"""
+    return [
+        [int(row[0]), float(row[1]), float(row[2]), float(row[3]), float(row[4]), float(row[5])]
+        for row in candles.tolist()
+    ]
+
+
+class CandleStore:
+    """
+    Хранилище свечей по ключу (symbol, timeframe)
+
+    Каждая серия хранится отдельным .npy файлом формы (N, 6) float64,
+    отсортированным по timestamp. Чтение идёт через memory-map,
+    запись - атомарно через временный файл в фоновом потоке (write-behind):
+    merge() не ждёт диска, несколько слияний серии до записи дают одну запись.
+    """
+
+    def __init__(
+        self,
+        base_dir: Optional[str] = None,
+        max_bars: int = 5000,
+        enabled: Optional[bool] = None
+    ):
+        """
+        Args:
+            base_dir: Директория хранилища (если None - CANDLE_STORE_DIR env или data/candles)
+            max_bars: Максимум баров на серию (старые отбрасываются)
+            enabled: Включить/выключить хранилище (если None - проверяет ENABLE_CANDLE_STORE env)
+        """
+        if base_dir is None:
+            base_dir = os.getenv(
+                "CANDLE_STORE_DIR",
+                str(Path(__file__).parent.parent / "data" / "candles")
+            )
+        self.base_dir = Path(base_dir)
+        self.max_bars = max_bars
+
+        if enabled is None:
+            store_env = os.getenv("ENABLE_CANDLE_STORE", "true").lower()
+            self.enabled = store_env in ("true", "1", "yes")
+        else:
+            self.enabled = enabled
+
+        self._series: Dict[Tuple[str, str], np.ndarray] = {}
+        self._lock = threading.RLock()
+        self._stats = {
+            "reads": 0, "disk_loads": 0, "merges": 0, "bars_written": 0, "resets": 0,
+            "writes": 0, "unchanged_merges": 0
+        }
+        
+        # Отложенная запись: {ключ: последняя версия серии}, один поток-писатель
+        self._pending: Dict[Tuple[str, str], np.ndarray] = {}
+        self._writing = 0
+        self._write_cond = threading.Condition()
+        self._writer: Optional[threading.Thread] = None
+
+        status = "ENABLED ✅" if self.enabled else "DISABLED ⚠️"
+        logger.info(f"CandleStore initialized: {status} ({self.base_dir})")
+
+    def _path(self, symbol: str, timeframe: str) -> Path:
+        """Путь к файлу серии"""
+        safe_symbol = re.sub(r"[^A-Za-z0-9]+", "_", symbol).strip("_")
+        return self.base_dir / safe_symbol / f"{timeframe}.npy"
+
+    def load(self, symbol: str, timeframe: str) -> np.ndarray:
+        """
+        Получить всю сохранённую серию
+
+        Returns:
+            Массив (N, 6), пустой если данных нет
+        """
+        key = (symbol, timeframe)
+        with self._lock:
+            self._stats["reads"] += 1
+            series = self._series.get(key)
+            if series is None:
+                # Серия выгружена clear(), но ещё не записана - файл на диске устарел
+                with self._write_cond:
+                    series = self._pending.get(key)
+            if series is not None:
+                self._series[key] = series
+                return series
+
+            path = self._path(symbol, timeframe)
+            if path.exists():
+                try:
+                    series = np.load(path, mmap_mode="r")
+                    if series.ndim != 2 or series.shape[1] != OHLCV_COLUMNS:
+                        raise ValueError(f"unexpected shape {series.shape}")
+                    self._stats["disk_loads"] += 1
+                except Exception as e:
+                    logger.warning(f"Corrupted candle file {path}: {e}. Ignoring it.")
+                    series = np.empty((0, OHLCV_COLUMNS))
+            else:
+                series = np.empty((0, OHLCV_COLUMNS))
+
+            self._series[key] = series
+            return series
+
+    def last_timestamp(self, symbol: str, timeframe: str) -> Optional[int]:
+        """Timestamp последнего сохранённого бара (он может быть ещё формирующимся)"""
+        series = self.load(symbol, timeframe)
+        if len(series) == 0:
+            return None
+        return int(series[-1, 0])
+
+    def bars_to_fetch(self, symbol: str, timeframe: str, limit: int, now_ms: Optional[int] = None) -> int:
+        """
+        Сколько последних баров нужно запросить у биржи чтобы серия стала актуальной
+
+        Включает перезапрос последнего сохранённого бара (он мог быть незакрыт).
+        Если сохранено меньше limit баров или разрыв слишком большой - возвращает limit.
+        """
+        tf_ms = timeframe_to_ms(timeframe)
+        series = self.load(symbol, timeframe)
+        if tf_ms is None or len(series) < limit:
+            return limit
+
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        last_ts = int(series[-1, 0])
+        missing = max(0, (now_ms - last_ts) // tf_ms) + 1
+
+        # +1 бар запаса на случай смены бара во время запроса
+        return int(min(limit, missing + 1))
+
+    def merge(self, symbol: str, timeframe: str, candles: Any) -> np.ndarray:
+        """
+        Слить новые бары с сохранённой серией и поставить её в очередь записи на диск
+
+        Если новые бары совпадают с сохранёнными, серия и файл не меняются.
+
+        Бары с timestamp >= первого нового бара заменяются (исправление
+        формирующегося бара). Если новые бары не стыкуются с историей
+        (пропуск), история сбрасывается.
+
+        Args:
+            candles: Список [[timestamp, o, h, l, c, v], ...] или массив (N, 6)
+
+        Returns:
+            Обновлённая серия
+        """
+        new = np.asarray(candles, dtype=np.float64).reshape(-1, OHLCV_COLUMNS)
+        if len(new) == 0:
+            return self.load(symbol, timeframe)
+
+        if not np.all(np.diff(new[:, 0]) > 0):
+            # Сортируем и оставляем последнюю версию каждого бара
+            new = new[np.argsort(new[:, 0], kind="stable")]
+            is_last = np.append(new[1:, 0] != new[:-1, 0], True)
+            new = new[is_last]
+
+        key = (symbol, timeframe)
+        tf_ms = timeframe_to_ms(timeframe)
+
+        with self._lock:
+            existing = self.load(symbol, timeframe)
+            first_new_ts = new[0, 0]
+
+            if len(existing) == 0:
+                merged = new
+            elif tf_ms is not None and first_new_ts > existing[-1, 0] + tf_ms:
+                # Разрыв в истории - хранить несмежные серии нельзя
+                logger.debug(f"Candle gap for {symbol} {timeframe}, resetting stored series")
+                self._stats["resets"] += 1
+                merged = new
+            else:
+                keep = int(np.searchsorted(existing[:, 0], first_new_ts, side="left"))
+                if keep + len(new) == len(existing) and np.array_equal(existing[keep:], new):
+                    # Повторный запрос без новых баров и изменений формирующегося - диск не трогаем
+                    self._stats["unchanged_merges"] += 1
+                    return existing
+                merged = np.concatenate([np.asarray(existing[:keep]), new])
+
+            if len(merged) > self.max_bars:
+                merged = merged[-self.max_bars:]
+            merged = np.ascontiguousarray(merged)
+
+            self._series[key] = merged
+            self._schedule_write(key, merged)
+            self._stats["merges"] += 1
+            self._stats["bars_written"] += len(new)
+            return merged
+
+    def _schedule_write(self, key: Tuple[str, str], series: np.ndarray) -> None:
+        """Поставить серию в очередь записи (более новая версия заменяет ожидающую)"""
+        with self._write_cond:
+            self._pending[key] = series
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name="candle-store-writer", daemon=True)
+                self._writer.start()
+            self._write_cond.notify_all()
+
+    def _write_loop(self) -> None:
+        """Поток-писатель: записывает отложенные серии по одной"""
+        while True:
+            with self._write_cond:
+                self._write_cond.wait_for(lambda: bool(self._pending))
+                key = next(iter(self._pending))
+                series = self._pending.pop(key)
+                self._writing += 1
+            try:
+                self._write(key[0], key[1], series)
+            finally:
+                with self._write_cond:
+                    self._writing -= 1
+                    self._write_cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Дождаться записи отложенных серий на диск
+
+        Returns:
+            True если очередь записи пуста (False - истёк timeout)
+        """
+        with self._write_cond:
+            return self._write_cond.wait_for(lambda: not self._pending and not self._writing, timeout)
+
+    def _write(self, symbol: str, timeframe: str, series: np.ndarray) -> None:
+        """Атомарная запись серии на диск"""
+        path = self._path(symbol, timeframe)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp.npy")
+            np.save(tmp_path, series)
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._stats["writes"] += 1
+        except Exception as e:
+            # Диск недоступен - продолжаем работать из памяти
+            logger.warning(f"Failed to persist candles for {symbol} {timeframe}: {e}")
+
+    def get_window(self, symbol: str, timeframe: str, limit: int) -> Optional[np.ndarray]:
+        """
+        Последние limit баров серии
+
+        Returns:
+            Массив (limit, 6) или None если сохранено меньше limit баров
+        """
+        series = self.load(symbol, timeframe)
+        if len(series) < limit:
+            return None
+        return series[-limit:]
+
+    def clear(self, symbol: Optional[str] = None) -> None:
+        """Очистить кэш в памяти (файлы на диске не удаляются)"""
+        with self._lock:
+            if symbol is None:
+                self._series.clear()
+            else:
+                for key in [k for k in self._series if k[0] == symbol]:
+                    del self._series[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика хранилища"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "base_dir": str(self.base_dir),
+                "series_in_memory": len(self._series),
+                "pending_writes": len(self._pending),
+                **self._stats
+            }
+
+
+# Глобальный экземпляр хранилища (использует переменные окружения ENABLE_CANDLE_STORE / CANDLE_STORE_DIR)
+_candle_store: Optional[CandleStore] = None
+_candle_store_lock = threading.Lock()
+
+
+def get_candle_store() -> CandleStore:
+    """Получить глобальный экземпляр хранилища свечей"""
+    global _candle_store
+    if _candle_store is None:
+        with _candle_store_lock:
+            if _candle_store is None:
+                _candle_store = CandleStore()
+                # Отложенные записи не теряются при остановке сервера
+                atexit.register(_candle_store.flush, 10.0)
+    return _candle_store
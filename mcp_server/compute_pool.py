@@ -0,0 +1,114 @@
+"""
+Compute Pool
+Пул исполнителей для CPU-bound расчётов анализа
+
+Индикаторы, паттерны и структура рынка считаются вне event loop, поэтому
+сервер отвечает на вызовы инструментов и обрабатывает WebSocket во время
+сканирования. Режимы (ANALYSIS_POOL env):
+    thread  - пул потоков; массивы свечей передаются без копирования,
+              numpy отпускает GIL на векторных операциях
+    process - пул процессов (spawn); масштабируется по ядрам, окно свечей
+              (N x 6 float64, ~10 КБ на 200 баров) передаётся pickle
+    off     - расчёт прямо в event loop (отладка)
+"""
+
+import asyncio
+import functools
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from loguru import logger
+
+T = TypeVar("T")
+
+POOL_MODES = ("thread", "process", "off")
+
+
+def get_pool_workers() -> int:
+    """Число исполнителей пула (ANALYSIS_WORKERS env, по умолчанию - число ядер)"""
+    value = os.getenv("ANALYSIS_WORKERS", "")
+    if value.strip():
+        return max(1, int(value))
+    return os.cpu_count() or 1
+
+
+class ComputePool:
+    """
+    Исполнитель CPU-bound функций для асинхронного кода
+
+    Пул создаётся при первом вызове. Для режима process функция и
+    аргументы должны сериализоваться pickle (функции уровня модуля).
+    """
+
+    def __init__(self, mode: Optional[str] = None, workers: Optional[int] = None):
+        """
+        Args:
+            mode: "thread", "process" или "off" (если None - ANALYSIS_POOL env, thread)
+            workers: Число исполнителей (если None - ANALYSIS_WORKERS env / число ядер)
+        """
+        mode = (mode or os.getenv("ANALYSIS_POOL", "thread")).lower()
+        if mode not in POOL_MODES:
+            logger.warning(f"Unknown ANALYSIS_POOL mode '{mode}', using thread")
+            mode = "thread"
+        self.mode = mode
+        self.workers = workers or get_pool_workers()
+        self._executor: Optional[Executor] = None
+        self._stats = {"tasks": 0, "errors": 0, "inline": 0}
+
+        logger.info(f"ComputePool initialized ({self.mode}, {self.workers} workers)")
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.mode == "process":
+                # spawn: fork процесса с потоками WebSocket может унаследовать захваченные блокировки
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="analysis")
+        return self._executor
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        Выполнить func(*args, **kwargs) в пуле и дождаться результата
+
+        Returns:
+            Результат функции (исключение пробрасывается вызывающему)
+        """
+        if self.mode == "off":
+            self._stats["inline"] += 1
+            return func(*args, **kwargs)
+
+        loop = asyncio.get_running_loop()
+        self._stats["tasks"] += 1
+        try:
+            return await loop.run_in_executor(self._get_executor(), functools.partial(func, *args, **kwargs))
+        except Exception:
+            self._stats["errors"] += 1
+            raise
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Остановить исполнителей (новый пул создастся при следующем вызове)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+            logger.info("ComputePool stopped")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика пула"""
+        return {"mode": self.mode, "workers": self.workers, "started": self._executor is not None, **self._stats}
+
+
+# Глобальный экземпляр (один пул на процесс сервера)
+_compute_pool: Optional[ComputePool] = None
+
+
+def get_compute_pool() -> ComputePool:
+    """Получить глобальный пул расчётов"""
+    global _compute_pool
+    if _compute_pool is None:
+        _compute_pool = ComputePool()
+    return _compute_pool
@@ -0,0 +1,261 @@
+"""
+Correlation Matrix
+Матрица корреляций и бет доходностей для всего сканируемого universe
+
+Закрытия всех символов выравниваются по общей сетке закрытых баров,
+матрица доходностей пересчитывается один раз за бар и корреляции/беты
+всех пар считаются одним векторным проходом (матричные произведения
+по парно-полным наблюдениям, как pandas.Series.corr). Поиск корреляции
+пары после этого - O(1) без обращений к бирже.
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+# Условный импорт для поддержки как пакета, так и прямого запуска
+try:
+    from .candle_store import timeframe_to_ms
+    from .resampler import bucket_start
+except ImportError:
+    from candle_store import timeframe_to_ms
+    from resampler import bucket_start
+
+
+def pairwise_stats(returns: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Корреляции и беты всех пар рядов по парно-полным наблюдениям
+
+    Args:
+        returns: Матрица (символы x бары) доходностей, NaN - нет данных
+
+    Returns:
+        (corr, beta, n): corr[i, j] - корреляция i и j, beta[i, j] - бета i
+        относительно j (cov / var j), n[i, j] - число общих наблюдений;
+        NaN где общих наблюдений меньше двух или дисперсия нулевая
+    """
+    valid = ~np.isnan(returns)
+    mask = valid.astype(np.float64)
+    x = np.where(valid, returns, 0.0)
+
+    n = mask @ mask.T
+    sum_x = x @ mask.T          # сумма x_i по барам, где есть и j
+    sum_y = sum_x.T             # сумма x_j по барам, где есть и i
+    sum_xx = (x * x) @ mask.T
+    sum_yy = sum_xx.T
+    sum_xy = x @ x.T
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = sum_xy - sum_x * sum_y / n
+        var_x = sum_xx - sum_x ** 2 / n
+        var_y = sum_yy - sum_y ** 2 / n
+        corr = cov / np.sqrt(var_x * var_y)
+        beta = cov / var_y
+
+    enough = n >= 2
+    corr = np.where(enough & (var_x > 0) & (var_y > 0), np.clip(corr, -1.0, 1.0), np.nan)
+    beta = np.where(enough & (var_y > 0), beta, np.nan)
+    return corr, beta, n
+
+
+class CorrelationMatrix:
+    """
+    Корреляции доходностей universe на одном таймфрейме
+
+    Хранит закрытия period последних закрытых баров не более max_symbols
+    символов (давно не запрошенные вытесняются). ensure() догружает только
+    запрошенные символы, которых нет в текущем баре: после смены бара
+    остальные символы universe перезагружаются, когда их запросят снова.
+    После загрузки матрица пересчитывается одним проходом.
+    """
+
+    def __init__(
+        self,
+        fetcher: Callable[[str, str, int], Awaitable[List[List]]],
+        timeframe: str = "1h",
+        period: int = 24,
+        concurrency: int = 20,
+        max_symbols: int = 300,
+        clock: Callable[[], float] = time.time
+    ):
+        """
+        Args:
+            fetcher: Корутина загрузки свечей (symbol, timeframe, limit)
+            timeframe: Таймфрейм доходностей
+            period: Число закрытых баров (доходностей на одну меньше)
+            concurrency: Одновременных загрузок при обновлении
+            max_symbols: Максимум символов в матрице (LRU по запросам ensure)
+            clock: Источник текущего времени в секундах (для тестов)
+        """
+        self.tf_ms = timeframe_to_ms(timeframe)
+        if self.tf_ms is None:
+            raise ValueError(f"Unsupported timeframe for correlation matrix: {timeframe}")
+        self.fetcher = fetcher
+        self.timeframe = timeframe
+        self.period = period
+        self.concurrency = concurrency
+        self.max_symbols = max_symbols
+        self.clock = clock
+
+        self._bar: Optional[int] = None
+        # Закрытия текущего бара в порядке последнего запроса (LRU: первые - давние)
+        self._closes: Dict[str, np.ndarray] = {}
+        self._index: Dict[str, int] = {}
+        self._corr = np.empty((0, 0))
+        self._beta = np.empty((0, 0))
+        self._mean = np.empty(0)
+        self._lock = asyncio.Lock()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # Загрузки текущего бара в процессе: {символ: future завершения}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._stats = {"refreshes": 0, "recomputes": 0, "fetches": 0, "fetch_errors": 0, "lookups": 0,
+                       "evictions": 0}
+
+    def grid(self, now_ms: Optional[int] = None) -> np.ndarray:
+        """Время открытия period последних закрытых баров"""
+        now_ms = int(self.clock() * 1000) if now_ms is None else now_ms
+        forming = int(bucket_start(np.int64(now_ms), self.tf_ms))
+        return forming - self.tf_ms * np.arange(self.period, 0, -1, dtype=np.int64)
+
+    def align(self, candles: Any, grid: np.ndarray) -> np.ndarray:
+        """Закрытия свечей на сетке grid (NaN для отсутствующих баров)"""
+        candles = np.asarray(candles, dtype=np.float64).reshape(-1, 6)
+        closes = np.full(len(grid), np.nan)
+        if len(candles) == 0:
+            return closes
+        ts = candles[:, 0].astype(np.int64)
+        pos = np.clip(np.searchsorted(ts, grid), 0, len(ts) - 1)
+        hit = ts[pos] == grid
+        closes[hit] = candles[pos[hit], 4]
+        return closes
+
+    async def ensure(self, symbols: Iterable[str]) -> None:
+        """
+        Подготовить матрицу для символов
+
+        Загружаются только запрошенные символы, которых нет в текущем
+        баре: после закрытия бара первый вызов перезагружает свои символы,
+        а не весь universe. Блокировка держится только на выборе символов
+        и подмене данных - загрузки идут без неё, поэтому параллельные
+        вызовы не ждут друг друга, а символ, который уже грузит другой
+        вызов, не запрашивается повторно. До конца загрузки поиск отвечает
+        по прошлой матрице.
+        """
+        symbols = list(dict.fromkeys(symbols))
+        async with self._lock:
+            grid = self.grid()
+            bar = int(grid[-1])
+            if bar != self._bar:
+                self._bar = bar
+                self._closes = {}
+                self._inflight = {}
+                self._stats["refreshes"] += 1
+            for symbol in symbols:
+                if symbol in self._closes:
+                    self._closes[symbol] = self._closes.pop(symbol)
+            to_fetch = [s for s in symbols if s not in self._closes and s not in self._inflight]
+            waiting = [self._inflight[s] for s in symbols if s in self._inflight]
+            loop = asyncio.get_running_loop()
+            inflight = self._inflight
+            for symbol in to_fetch:
+                inflight[symbol] = loop.create_future()
+
+        if to_fetch:
+            async def load(symbol: str) -> Optional[np.ndarray]:
+                async with self._semaphore:
+                    try:
+                        self._stats["fetches"] += 1
+                        # +1: формирующийся бар, который в сетку не входит
+                        candles = await self.fetcher(symbol, self.timeframe, self.period + 1)
+                        return self.align(candles, grid)
+                    except Exception as e:
+                        self._stats["fetch_errors"] += 1
+                        logger.debug(f"Correlation matrix: no {self.timeframe} candles for {symbol}: {e}")
+                        return None
+
+            try:
+                loaded = await asyncio.gather(*(load(symbol) for symbol in to_fetch))
+                async with self._lock:
+                    # За время загрузки начался новый бар - данные устарели, их догрузит новый вызов
+                    if self._bar == bar:
+                        for symbol, closes in zip(to_fetch, loaded):
+                            if closes is not None:
+                                self._closes[symbol] = closes
+                        self._evict(keep=set(symbols))
+                        self._recompute()
+            finally:
+                for symbol in to_fetch:
+                    future = inflight.pop(symbol, None)
+                    if future is not None and not future.done():
+                        future.set_result(None)
+
+        if waiting:
+            await asyncio.gather(*waiting)
+
+    def _evict(self, keep: set) -> None:
+        """Вытеснить давно не запрошенные символы сверх max_symbols"""
+        excess = len(self._closes) - self.max_symbols
+        for symbol in list(self._closes):
+            if excess <= 0:
+                break
+            if symbol not in keep:
+                del self._closes[symbol]
+                self._stats["evictions"] += 1
+                excess -= 1
+
+    def _recompute(self) -> None:
+        """Доходности universe и матрицы корреляций/бет одним проходом"""
+        symbols = list(self._closes)
+        self._index = {symbol: i for i, symbol in enumerate(symbols)}
+        if not symbols:
+            self._corr = self._beta = np.empty((0, 0))
+            self._mean = np.empty(0)
+            return
+        closes = np.vstack([self._closes[symbol] for symbol in symbols])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns = closes[:, 1:] / closes[:, :-1] - 1
+        self._corr, self._beta, _ = pairwise_stats(returns)
+        with np.errstate(invalid="ignore"):
+            counts = (~np.isnan(returns)).sum(axis=1)
+            self._mean = np.where(counts > 0, np.nansum(returns, axis=1) / np.maximum(counts, 1), np.nan)
+        self._stats["recomputes"] += 1
+
+    def _lookup(self, matrix: np.ndarray, symbol_a: str, symbol_b: str) -> Optional[float]:
+        self._stats["lookups"] += 1
+        i = self._index.get(symbol_a)
+        j = self._index.get(symbol_b)
+        if i is None or j is None:
+            return None
+        value = float(matrix[i, j])
+        return None if np.isnan(value) else value
+
+    def correlation(self, symbol_a: str, symbol_b: str) -> Optional[float]:
+        """Корреляция доходностей пары (None если нет данных)"""
+        return self._lookup(self._corr, symbol_a, symbol_b)
+
+    def beta(self, symbol: str, benchmark: str) -> Optional[float]:
+        """Бета доходностей symbol относительно benchmark (None если нет данных)"""
+        return self._lookup(self._beta, symbol, benchmark)
+
+    def mean_return(self, symbol: str) -> Optional[float]:
+        """Средняя доходность за бар (доля, None если нет данных)"""
+        i = self._index.get(symbol)
+        if i is None or np.isnan(self._mean[i]):
+            return None
+        return float(self._mean[i])
+
+    def symbols(self) -> List[str]:
+        return list(self._index)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика матрицы"""
+        return {
+            "timeframe": self.timeframe,
+            "period": self.period,
+            "symbols": len(self._index),
+            "bar": self._bar,
+            **self._stats
+        }
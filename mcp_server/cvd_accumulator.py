@@ -0,0 +1,337 @@
+"""
+CVD Accumulator
+Инкрементальный Cumulative Volume Delta по символам
+
+Сделки символа дописываются в массивы префиксных сумм (дельта, число
+покупок, объёмы покупок/продаж) начиная с курсора последней учтённой
+сделки, поэтому повторные запросы не пересчитывают окно заново.
+CVD, изменение цены и aggressive ratio любого окна - разность двух
+префиксных сумм после бинарного поиска границы. Более глубокая история
+подгружается только когда запрошено окно длиннее накопленного.
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+# Условный импорт для поддержки как пакета, так и прямого запуска
+try:
+    from .trade_tape import TradeArrays, order_flow
+except ImportError:
+    from trade_tape import TradeArrays, order_flow
+
+
+CVD_WINDOWS = {"1m": 60, "5m": 300, "1h": 3600}
+
+
+def cvd_signal(flow: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Сигнал по order flow окна (дивергенция цены и CVD, перекос агрессоров)
+
+    Args:
+        flow: Результат order_flow / CvdSeries.flow
+    """
+    price_change = flow["price_change"]
+    cvd_change = flow["cvd_delta"]
+    aggressive_sells = flow["aggressive_sells"]
+    sell_volume = flow["sell_volume"]
+    aggressive_ratio = flow["aggressive_buys"] / aggressive_sells if aggressive_sells > 0 else 0
+    volume_ratio = flow["buy_volume"] / sell_volume if sell_volume > 0 else 0
+
+    signal = "NONE"
+    details = "No divergence"
+
+    # Цена падает, CVD растет (Bullish Absorption)
+    if price_change < -0.005 and cvd_change > 0:
+        signal = "BULLISH_ABSORPTION"
+        details = "Price dropping, but aggressive buying detected (Limit Buy Absorption)"
+    # Цена растет, CVD падает (Bearish Absorption)
+    elif price_change > 0.005 and cvd_change < 0:
+        signal = "BEARISH_ABSORPTION"
+        details = "Price rising, but aggressive selling detected (Limit Sell Absorption)"
+    # Aggressive Dominance (без дивергенции, но сильный перекос)
+    elif aggressive_ratio > 2.5:
+        signal = "AGGRESSIVE_BUYING"
+        details = f"Strong buying pressure (ratio: {aggressive_ratio:.2f})"
+    elif aggressive_ratio < 0.4:
+        signal = "AGGRESSIVE_SELLING"
+        details = f"Strong selling pressure (ratio: {aggressive_ratio:.2f})"
+
+    return {
+        "signal": signal,
+        "price_change_pct": round(price_change * 100, 2),
+        "cvd_delta": round(cvd_change, 2),
+        "aggressive_ratio": round(aggressive_ratio, 2),
+        "volume_ratio": round(volume_ratio, 2),
+        "aggressive_buys": flow["aggressive_buys"],
+        "aggressive_sells": aggressive_sells,
+        "details": details,
+        "trades_count": flow["trades_count"]
+    }
+
+
+class CvdSeries:
+    """
+    Префиксные суммы order flow одного символа
+
+    Курсор - время последней сделки и число уже учтённых сделок в эту
+    миллисекунду (execId Bybit не упорядочены, поэтому курсор временной).
+    Пакет, не перекрывающий курсор, означает пропуск - серия начинается заново.
+    """
+
+    def __init__(self, max_trades: int = 50_000):
+        self.max_trades = max_trades
+        self._start = 0
+        self._end = 0
+        self._allocate(1024)
+        self.covered_from: Optional[int] = None
+        self.exhausted = False  # Глубже истории у источника нет
+        self.resets = 0
+
+    def _allocate(self, capacity: int) -> None:
+        self.ts = np.zeros(capacity, dtype=np.int64)
+        self.price = np.zeros(capacity, dtype=np.float64)
+        # prefix[k] - сумма по первым k сделкам буфера (prefix[0] = 0)
+        self.prefix = np.zeros((capacity + 1, 4), dtype=np.float64)  # delta, buys, buy volume, sell volume
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    @property
+    def last_ts(self) -> Optional[int]:
+        return int(self.ts[self._end - 1]) if len(self) else None
+
+    def _seen_at_last(self) -> int:
+        ts = self.ts[self._start:self._end]
+        return len(ts) - int(np.searchsorted(ts, ts[-1], side="left"))
+
+    @staticmethod
+    def _rows(size: np.ndarray, side: np.ndarray) -> np.ndarray:
+        # Сделки без стороны считаются продажами, как в order_flow
+        is_buy = side > 0
+        return np.column_stack([
+            np.where(is_buy, size, -size),
+            is_buy,
+            np.where(is_buy, size, 0.0),
+            np.where(is_buy, 0.0, size)
+        ])
+
+    def _append(self, ts: np.ndarray, price: np.ndarray, rows: np.ndarray) -> None:
+        count = len(ts)
+        if self._end + count > len(self.ts):
+            # Сдвигаем данные в начало буфера и при необходимости расширяем его
+            length = len(self)
+            capacity = len(self.ts)
+            while length + count > capacity // 2:
+                capacity *= 2
+            old_ts, old_price = self.ts[self._start:self._end], self.price[self._start:self._end]
+            old_prefix = self.prefix[self._start:self._end + 1]
+            if capacity != len(self.ts):
+                self._allocate(capacity)
+            self.ts[:length] = old_ts.copy()
+            self.price[:length] = old_price.copy()
+            self.prefix[:length + 1] = old_prefix.copy()
+            self._start, self._end = 0, length
+
+        self.ts[self._end:self._end + count] = ts
+        self.price[self._end:self._end + count] = price
+        self.prefix[self._end + 1:self._end + count + 1] = self.prefix[self._end] + np.cumsum(rows, axis=0)
+        self._end += count
+
+        # Хранение ограничено max_trades: старые сделки отбрасываются сдвигом начала
+        if len(self) > self.max_trades:
+            self._start = self._end - self.max_trades
+            self.covered_from = int(self.ts[self._start])
+            self.exhausted = False
+
+    def reset(self) -> None:
+        self._start = self._end = 0
+        self.covered_from = None
+        self.exhausted = False
+
+    def ingest(self, ts: np.ndarray, price: np.ndarray, size: np.ndarray, side: np.ndarray) -> int:
+        """
+        Добавить пакет сделок (по возрастанию времени) после курсора
+
+        Returns:
+            Число новых сделок
+        """
+        if len(ts) == 0:
+            return 0
+        start = 0
+        if len(self):
+            last = self.last_ts
+            if ts[0] > last:
+                logger.debug(f"CVD: trade batch starts after cursor ({ts[0]} > {last}), restarting series")
+                self.reset()
+                self.resets += 1
+            else:
+                after = int(np.searchsorted(ts, last, side="right"))
+                at_last = after - int(np.searchsorted(ts, last, side="left"))
+                start = after - max(0, at_last - self._seen_at_last())
+        if not len(self):
+            self.covered_from = int(ts[0])
+        new = slice(start, len(ts))
+        if start < len(ts):
+            self._append(ts[new], price[new], self._rows(size[new], side[new]))
+        return len(ts) - start
+
+    def prepend(self, ts: np.ndarray, price: np.ndarray, size: np.ndarray, side: np.ndarray) -> int:
+        """
+        Добавить более старые сделки перед началом серии
+
+        Пакет должен доходить до начала серии, иначе между ними пропуск.
+
+        Returns:
+            Число добавленных сделок
+        """
+        if not len(self) or len(ts) == 0 or ts[-1] < self.covered_from:
+            return 0
+        older = int(np.searchsorted(ts, self.covered_from, side="left"))
+        if older == 0:
+            self.exhausted = True
+            return 0
+        current_ts = self.ts[self._start:self._end].copy()
+        current_price = self.price[self._start:self._end].copy()
+        current_rows = np.diff(self.prefix[self._start:self._end + 1], axis=0)
+        self.reset()
+        self._append(ts[:older], price[:older], self._rows(size[:older], side[:older]))
+        self._append(current_ts, current_price, current_rows)
+        self.covered_from = int(self.ts[self._start])
+        return older
+
+    def covers(self, since_ms: int) -> bool:
+        return self.covered_from is not None and self.covered_from <= since_ms
+
+    def _flow(self, a: int, b: int) -> Dict[str, Any]:
+        """Order flow сделок [a, b) буфера (формат order_flow)"""
+        count = b - a
+        if count <= 0:
+            return order_flow(np.empty(0), np.empty(0), np.empty(0))
+        first_price = self.price[a]
+        delta, buys, buy_volume, sell_volume = self.prefix[b] - self.prefix[a]
+        aggressive_buys = int(round(buys))
+        return {
+            "trades_count": count,
+            "price_change": float((self.price[b - 1] - first_price) / first_price) if first_price else 0.0,
+            # Как в order_flow: изменение CVD от первой до последней сделки окна
+            "cvd_delta": float(self.prefix[b, 0] - self.prefix[a + 1, 0]),
+            "aggressive_buys": aggressive_buys,
+            "aggressive_sells": count - aggressive_buys,
+            "buy_volume": float(buy_volume),
+            "sell_volume": float(sell_volume)
+        }
+
+    def last(self, n: int) -> Dict[str, Any]:
+        """Order flow последних n сделок"""
+        return self._flow(max(self._start, self._end - n), self._end)
+
+    def since(self, since_ms: int) -> Dict[str, Any]:
+        """Order flow сделок начиная с since_ms"""
+        a = self._start + int(np.searchsorted(self.ts[self._start:self._end], since_ms, side="left"))
+        return self._flow(a, self._end)
+
+
+class CvdAccumulator:
+    """
+    Накопители CVD по символам поверх источника сделок
+
+    update() дочитывает сделки после курсора не чаще min_interval;
+    window() при необходимости один раз углубляет историю.
+    """
+
+    def __init__(
+        self,
+        fetcher: Callable[[str, int, Optional[int]], Awaitable[TradeArrays]],
+        batch_limit: int = 1000,
+        history_limit: int = 5000,
+        max_trades: int = 50_000,
+        min_interval: float = 1.0,
+        clock: Callable[[], float] = time.time
+    ):
+        """
+        Args:
+            fetcher: Корутина (symbol, limit, since_ms) -> (ts, price, size, side)
+            batch_limit: Сделок за одно дочитывание (Bybit REST отдаёт до 1000 linear)
+            history_limit: Сделок при углублении истории (лента сделок хранит больше REST)
+            max_trades: Сделок на символ в памяти
+            min_interval: Минимальный интервал между дочитываниями символа (сек)
+            clock: Источник времени в секундах (для тестов)
+        """
+        self.fetcher = fetcher
+        self.batch_limit = batch_limit
+        self.history_limit = history_limit
+        self.max_trades = max_trades
+        self.min_interval = min_interval
+        self.clock = clock
+        self._series: Dict[str, CvdSeries] = {}
+        self._updated: Dict[str, float] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._stats = {"fetches": 0, "deep_fetches": 0, "trades": 0, "throttled": 0}
+
+    def series(self, symbol: str) -> CvdSeries:
+        if symbol not in self._series:
+            self._series[symbol] = CvdSeries(self.max_trades)
+        return self._series[symbol]
+
+    async def update(self, symbol: str) -> CvdSeries:
+        """Дочитать сделки символа после курсора"""
+        lock = self._locks.setdefault(symbol, asyncio.Lock())
+        async with lock:
+            series = self.series(symbol)
+            now = self.clock()
+            if len(series) and now - self._updated.get(symbol, 0.0) < self.min_interval:
+                self._stats["throttled"] += 1
+                return series
+            self._stats["fetches"] += 1
+            ts, price, size, side = await self.fetcher(symbol, self.batch_limit, series.last_ts)
+            self._stats["trades"] += series.ingest(ts, price, size, side)
+            self._updated[symbol] = now
+            return series
+
+    async def window(self, symbol: str, seconds: float) -> Tuple[Dict[str, Any], bool]:
+        """
+        Order flow за последние seconds секунд
+
+        Returns:
+            (flow, covered): covered=False если история источника короче окна
+        """
+        series = await self.update(symbol)
+        since_ms = int((self.clock() - seconds) * 1000)
+        if not series.covers(since_ms) and not series.exhausted and len(series):
+            lock = self._locks[symbol]
+            async with lock:
+                self._stats["deep_fetches"] += 1
+                ts, price, size, side = await self.fetcher(symbol, self.history_limit, None)
+                added = series.prepend(ts, price, size, side)
+                self._stats["trades"] += added
+                if not series.covers(since_ms):
+                    series.exhausted = True
+        return series.since(since_ms), series.covers(since_ms)
+
+    def windows(self, symbol: str, windows: Optional[Dict[str, float]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Сигналы order flow по нескольким окнам из уже накопленных сделок
+
+        Без запросов к бирже; окно длиннее истории помечается covered=False.
+        """
+        series = self._series.get(symbol)
+        if series is None:
+            return {}
+        now_ms = int(self.clock() * 1000)
+        result = {}
+        for name, seconds in (windows or CVD_WINDOWS).items():
+            since_ms = now_ms - int(seconds * 1000)
+            result[name] = {**cvd_signal(series.since(since_ms)), "covered": series.covers(since_ms)}
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "symbols": len(self._series),
+            "trades_stored": sum(len(s) for s in self._series.values()),
+            "resets": sum(s.resets for s in self._series.values()),
+            **self._stats
+        }
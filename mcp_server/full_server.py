@@ -47,6 +47,7 @@ from trading_operations import (
     get_account_type_for_category
 )
 from technical_analysis import TechnicalAnalysis
+from compute_pool import get_compute_pool
 from market_scanner import MarketScanner
 from position_monitor import PositionMonitor
 from bybit_client import BybitClient
@@ -267,7 +268,11 @@ async def list_tools() -> List[Tool]:
                         "items": {"type": "string"},
                         "default": ["5m", "15m", "1h", "4h", "1d"]
                     },
-                    "include_patterns": {"type": "boolean", "default": True}
+                    "include_patterns": {"type": "boolean", "default": True},
+                    "deadline": {
+                        "type": "number",
+                        "description": "Максимальное время анализа в секундах; не успевшие шаги вернутся с ошибкой timeout"
+                    }
                 },
                 "required": ["symbol"]
             }
@@ -779,7 +784,14 @@ async def list_tools() -> List[Tool]:
                 "properties": {
                     "symbol": {"type": "string", "description": "Торговая пара"},
                     "timeframe": {"type": "string", "default": "1h", "description": "Таймфрейм для расчета"},
-                    "lookback": {"type": "integer", "default": 100, "description": "Количество свечей"}
+                    "lookback": {"type": "integer", "default": 100, "description": "Количество свечей"},
+                    "bins": {"type": "integer", "description": "Число ценовых корзин (по умолчанию VOLUME_PROFILE_BINS)"},
+                    "anchor": {
+                        "type": "string",
+                        "enum": ["composite", "session"],
+                        "default": "composite",
+                        "description": "composite - всё окно, session - от начала текущих суток UTC"
+                    }
                 },
                 "required": ["symbol"]
             }
@@ -836,8 +848,11 @@ async def call_tool(name: str, arguments: Any) -> List[TextContent]:
             result = await technical_analysis.analyze_asset(
                 symbol=arguments["symbol"],
                 timeframes=arguments.get("timeframes", ["5m", "15m", "1h", "4h", "1d"]),
-                include_patterns=arguments.get("include_patterns", True)
+                include_patterns=arguments.get("include_patterns", True),
+                deadline=arguments.get("deadline")
             )
+            # Ленивые секции досчитываются в пуле до сериализации ответа
+            await technical_analysis.resolve_sections(result)
         
         elif name == "calculate_indicators":
             result = await technical_analysis._analyze_timeframe(
@@ -845,6 +860,7 @@ async def call_tool(name: str, arguments: Any) -> List[TextContent]:
                 timeframe=arguments.get("timeframe", "1h"),
                 include_patterns=False
             )
+            await technical_analysis.resolve_sections(result)
         
         elif name == "detect_patterns":
             # Получаем данные
@@ -987,7 +1003,8 @@ async def call_tool(name: str, arguments: Any) -> List[TextContent]:
             # Получаем балансы со всех типов счетов (SPOT, CONTRACT, UNIFIED)
             try:
                 # Используем вспомогательную функцию для получения всех балансов
-                all_balances = get_all_account_balances(trading_ops.session, coin="USDT")
+                # Синхронная функция с блокирующими запросами pybit - в потоке, не на event loop
+                all_balances = await asyncio.to_thread(get_all_account_balances, trading_ops.session, coin="USDT")
                 
                 # Получаем позиции (пробуем через известные символы)
                 # Если нет позиций - возвращаем пустой список
@@ -996,7 +1013,7 @@ async def call_tool(name: str, arguments: Any) -> List[TextContent]:
                 
                 for test_symbol in test_symbols:
                     try:
-                        test_response = trading_ops.session.get_positions(
+                        test_response = await trading_ops.session_call("get_positions",
                             category="linear",
                             symbol=test_symbol
                         )
@@ -1054,7 +1071,7 @@ async def call_tool(name: str, arguments: Any) -> List[TextContent]:
                 all_positions = []
                 for test_symbol in test_symbols:
                     try:
-                        test_response = trading_ops.session.get_positions(
+                        test_response = await trading_ops.session_call("get_positions",
                             category="linear",
                             symbol=test_symbol
                         )
@@ -1107,7 +1124,7 @@ async def call_tool(name: str, arguments: Any) -> List[TextContent]:
             # limit уже строка из схемы MCP
             limit = arguments.get("limit", "50")
             try:
-                response = trading_ops.session.get_order_history(
+                response = await trading_ops.session_call("get_order_history",
                     category=arguments.get("category", "spot"),
                     limit=limit
                 )
@@ -1560,7 +1577,13 @@ async def call_tool(name: str, arguments: Any) -> List[TextContent]:
                     symbol = arguments.get("symbol")
                     timeframe = arguments.get("timeframe", "1h")
                     lookback = arguments.get("lookback", 100)
-                    result = await volume_profile.calculate_volume_profile(symbol, timeframe, lookback)
+                    result = await volume_profile.calculate_volume_profile(
+                        symbol,
+                        timeframe,
+                        lookback,
+                        num_bins=arguments.get("bins"),
+                        anchor=arguments.get("anchor", "composite")
+                    )
             except Exception as e:
                 logger.error(f"Error in get_volume_profile: {e}", exc_info=True)
                 result = {
@@ -1907,6 +1930,15 @@ async def main():
     asyncio.create_task(signal_monitor.start_monitoring())
     logger.info("✅ Signal monitoring started (background task)")
     
+    # Поток свечей WebSocket для базового набора символов (сканер добавляет кандидатов сам)
+    if bybit_client.kline_stream.enabled:
+        stream_symbols = [s.strip() for s in os.getenv("KLINE_STREAM_SYMBOLS", "BTC/USDT,ETH/USDT").split(",") if s.strip()]
+        stream_timeframes = [t.strip() for t in os.getenv("KLINE_STREAM_TIMEFRAMES", "5m,15m,1h,4h,1d").split(",") if t.strip()]
+        # Базовый таймфрейм (например 1m): кратные ему таймфреймы собираются из его потока
+        base_timeframe = os.getenv("KLINE_STREAM_BASE_TIMEFRAME", "").strip() or None
+        subscribed = await bybit_client.start_kline_stream(stream_symbols, stream_timeframes, base_timeframe)
+        logger.info(f"✅ Kline stream started ({subscribed} topics)")
+    
     logger.info("✅ All components initialized")
     logger.info("=" * 50)
     # Подсчет ресурсов для логирования
@@ -1986,6 +2018,12 @@ async def cleanup_resources():
             except Exception as e:
                 logger.warning(f"Error closing Bybit client: {e}")
         
+        # Останавливаем пул расчётов анализа
+        try:
+            get_compute_pool().shutdown(wait=False)
+        except Exception as e:
+            logger.warning(f"Error stopping compute pool: {e}")
+        
         logger.info("✅ All resources cleaned up")
     except Exception as e:
         logger.error(f"Error during cleanup: {e}", exc_info=True)
@@ -0,0 +1,419 @@
+"""
+Indicator Engine
+Векторизованный расчёт индикаторов на numpy массивах за один проход
+
+Результаты совпадают с библиотекой ta (те же формулы, сиды и значения
+по умолчанию для коротких рядов), но каждая величина считается один раз:
+true range общий для ATR и ADX, приросты/падения - для всех RSI,
+EMA строятся одной рекуррентной функцией без циклов по барам.
+
+Все функции работают вдоль последней оси, поэтому матрица
+(символы x бары) считается за один вызов для всего списка тикеров.
+"""
+
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+# Точность блочного решения рекуррентности: внутри блока множитель a^-k не превышает 1e4
+_BLOCK_PRECISION = 1e-4
+
+EMA_PERIODS = (9, 20, 50, 100, 200)
+RSI_PERIODS = (7, 14, 21)
+ATR_PERIODS = (14, 7)
+
+# Колонки массива свечей (как в candle_store)
+TS, OPEN, HIGH, LOW, CLOSE, VOLUME = range(6)
+
+
+def linear_recurrence(seed: Any, x: np.ndarray, a: float) -> np.ndarray:
+    """
+    Решение y[0] = seed, y[i] = a * y[i-1] + x[i-1] без цикла по барам
+
+    Ряд делится на блоки, в которых a^-k ограничен; внутри блока
+    y = a^k * (y_prev + cumsum(x * a^-k)). Так считаются EMA, сглаживание
+    Уайлдера (RSI, ATR) и суммы ADX.
+
+    Args:
+        seed: Начальное значение (скаляр или массив формы x.shape[:-1])
+        x: Входы, рекуррентность идёт вдоль последней оси
+        a: Коэффициент затухания
+
+    Returns:
+        Массив формы (..., len + 1)
+    """
+    x = np.asarray(x, dtype=np.float64)
+    steps = x.shape[-1]
+    y = np.empty(x.shape[:-1] + (steps + 1,))
+    y[..., 0] = seed
+    if steps == 0:
+        return y
+    if a <= 0.0:
+        y[..., 1:] = x
+        return y
+    if a >= 1.0:
+        y[..., 1:] = y[..., :1] + np.cumsum(x, axis=-1)
+        return y
+
+    block = max(1, int(np.log(_BLOCK_PRECISION) / np.log(a)))
+    powers = a ** np.arange(1, min(block, steps) + 1)
+    prev = y[..., :1]
+    for start in range(0, steps, block):
+        segment = x[..., start:start + block]
+        pw = powers[:segment.shape[-1]]
+        end = start + 1 + segment.shape[-1]
+        y[..., start + 1:end] = pw * (prev + np.cumsum(segment / pw, axis=-1))
+        prev = y[..., end - 1:end]
+    return y
+
+
+def rolling_max(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Максимум скользящего окна за O(n) (алгоритм van Herk / Gil-Werman)
+
+    Ряд делится на блоки длины window; максимум окна [j, j + window)
+    равен максимуму суффикса блока с j и префикса следующего блока.
+
+    Returns:
+        Массив длины len - window + 1: y[j] = max(values[j:j + window])
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = values.shape[-1]
+    if window < 1 or n < window:
+        return np.empty(values.shape[:-1] + (0,))
+    blocks = -(-n // window)
+    padded = np.full(values.shape[:-1] + (blocks * window,), -np.inf)
+    padded[..., :n] = values
+    shaped = padded.reshape(values.shape[:-1] + (blocks, window))
+    prefix = np.maximum.accumulate(shaped, axis=-1).reshape(padded.shape)
+    suffix = np.maximum.accumulate(shaped[..., ::-1], axis=-1)[..., ::-1].reshape(padded.shape)
+    count = n - window + 1
+    return np.maximum(suffix[..., :count], prefix[..., window - 1:window - 1 + count])
+
+
+def rolling_min(values: np.ndarray, window: int) -> np.ndarray:
+    """Минимум скользящего окна за O(n), см. rolling_max"""
+    return -rolling_max(-np.asarray(values, dtype=np.float64), window)
+
+
+def trailing_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Среднее предыдущих баров через кумулятивные суммы
+
+    Returns:
+        y[i] = mean(values[max(0, i - window):i]); NaN для первого бара
+        и для окон, содержащих NaN
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = values.shape[-1]
+    missing = np.isnan(values)
+    zeros = np.zeros(values.shape[:-1] + (1,))
+    sums = np.concatenate([zeros, np.cumsum(np.where(missing, 0.0, values), axis=-1)], axis=-1)
+    gaps = np.concatenate([zeros, np.cumsum(missing, axis=-1)], axis=-1)
+    end = np.arange(n)
+    start = np.maximum(end - window, 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = (sums[..., end] - sums[..., start]) / (end - start)
+    return np.where(gaps[..., end] - gaps[..., start] > 0, np.nan, mean)
+
+
+def ewm(values: np.ndarray, alpha: float) -> np.ndarray:
+    """pandas ewm(alpha=alpha, adjust=False).mean() для рядов без NaN"""
+    values = np.asarray(values, dtype=np.float64)
+    if values.shape[-1] == 0:
+        return values.copy()
+    return linear_recurrence(values[..., 0], alpha * values[..., 1:], 1.0 - alpha)
+
+
+def ema(close: np.ndarray, span: int) -> np.ndarray:
+    """EMA как ta.trend.ema_indicator (NaN до span баров)"""
+    result = ewm(close, 2.0 / (span + 1))
+    result[..., :span - 1] = np.nan
+    return result
+
+
+def true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    """True range; для первого бара - high - low"""
+    prev_close = np.concatenate([np.full(close.shape[:-1] + (1,), np.nan), close[..., :-1]], axis=-1)
+    return np.fmax(high, prev_close) - np.fmin(low, prev_close)
+
+
+def rsi_last(gains: np.ndarray, losses: np.ndarray, window: int) -> np.ndarray:
+    """Последнее значение RSI как ta.momentum.rsi по готовым приростам/падениям"""
+    if gains.shape[-1] < window:
+        return np.full(gains.shape[:-1], np.nan)
+    alpha = 1.0 / window
+    up = ewm(gains, alpha)[..., -1]
+    down = ewm(losses, alpha)[..., -1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(down == 0, 100.0, 100 - 100 / (1 + up / down))
+
+
+def atr_last(tr: np.ndarray, window: int) -> np.ndarray:
+    """Последний ATR Уайлдера как ta.volatility.average_true_range (0 для коротких рядов)"""
+    if tr.shape[-1] < window:
+        return np.zeros(tr.shape[:-1])
+    seed = tr[..., :window].mean(axis=-1)
+    return linear_recurrence(seed, tr[..., window:] / window, (window - 1) / window)[..., -1]
+
+
+def adx_last(
+    high: np.ndarray,
+    low: np.ndarray,
+    tr: np.ndarray,
+    window: int = 14
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Последние ADX, +DI, -DI как ta.trend.ADXIndicator
+
+    Повторяет схему ta: суммы Уайлдера по барам window..N-2,
+    последний элемент внутренних массивов ta не заполняется.
+    """
+    n = high.shape[-1]
+    m = n - (window - 1)
+    if m <= window:
+        zeros = np.zeros(high.shape[:-1])
+        return zeros, zeros.copy(), zeros.copy()
+
+    nan_column = np.full(high.shape[:-1] + (1,), np.nan)
+    diff_up = np.concatenate([nan_column, np.diff(high, axis=-1)], axis=-1)
+    diff_down = np.concatenate([nan_column, -np.diff(low, axis=-1)], axis=-1)
+    with np.errstate(invalid="ignore"):
+        pos = np.where((diff_up > diff_down) & (diff_up > 0), diff_up, 0.0)
+        neg = np.where((diff_down > diff_up) & (diff_down > 0), diff_down, 0.0)
+
+    decay = 1.0 - 1.0 / window
+
+    def wilder_sums(values: np.ndarray) -> np.ndarray:
+        sums = np.zeros(values.shape[:-1] + (m,))
+        seed = values[..., 1:window + 1].sum(axis=-1)
+        sums[..., :m - 1] = linear_recurrence(seed, values[..., window + 1:window + m - 1], decay)
+        return sums
+
+    trs = wilder_sums(tr)
+    dip = wilder_sums(pos)
+    din = wilder_sums(neg)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        di_pos = np.where(trs != 0, 100 * dip / trs, 0.0)
+        di_neg = np.where(trs != 0, 100 * din / trs, 0.0)
+        di_sum = di_pos + di_neg
+        dx = np.where(di_sum != 0, 100 * np.abs((di_pos - di_neg) / di_sum), 0.0)
+
+    adx = linear_recurrence(dx[..., :window].mean(axis=-1), dx[..., window:m - 1] / window, (window - 1) / window)
+    return adx[..., -1], di_pos[..., m - 2], di_neg[..., m - 2]
+
+
+def stochastic_last(
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    window: int = 14,
+    smooth: int = 3
+) -> Tuple[np.ndarray, np.ndarray]:
+    """(%K, %D) последнего бара как ta.momentum.StochasticOscillator"""
+    n = close.shape[-1]
+    if n < window:
+        nan = np.full(close.shape[:-1], np.nan)
+        return nan, nan.copy()
+
+    count = min(smooth, n - window + 1)
+    k_values = np.empty(close.shape[:-1] + (count,))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for offset in range(count):
+            end = n - offset
+            lowest = low[..., end - window:end].min(axis=-1)
+            highest = high[..., end - window:end].max(axis=-1)
+            k_values[..., count - 1 - offset] = 100 * (close[..., end - 1] - lowest) / (highest - lowest)
+
+    if count == smooth:
+        stoch_d = k_values.mean(axis=-1)
+    else:
+        stoch_d = np.full(close.shape[:-1], np.nan)
+    return k_values[..., -1], stoch_d
+
+
+def compute_indicators_batch(
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    volume: np.ndarray,
+    volume_window: int = 20
+) -> Dict[str, np.ndarray]:
+    """
+    Индикаторы последнего бара для набора рядов одинаковой длины
+
+    Args:
+        high, low, close, volume: Массивы (символы x бары) по возрастанию времени
+        volume_window: Окно средней объёма
+
+    Returns:
+        {имя: массив значений по символам}: close, rsi_*, macd_line, signal_line,
+        histogram, bb_upper/bb_middle/bb_lower/bb_width, ema_*, atr_*, adx,
+        adx_pos, adx_neg, stoch_k, stoch_d, obv, volume_sma, current_volume,
+        volume_ratio и vwap (только если баров не меньше 20)
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    volume = np.asarray(volume, dtype=np.float64)
+    n = close.shape[-1]
+    nan = np.full(close.shape[:-1], np.nan)
+    if n == 0:
+        raise ValueError("Cannot compute indicators for empty series")
+
+    batch: Dict[str, np.ndarray] = {"close": close[..., -1]}
+
+    # RSI: приросты и падения считаются один раз для всех периодов
+    diff = np.diff(close, axis=-1, prepend=close[..., :1])
+    gains = np.where(diff > 0, diff, 0.0)
+    losses = np.where(diff < 0, -diff, 0.0)
+    for period in RSI_PERIODS:
+        batch[f"rsi_{period}"] = rsi_last(gains, losses, period)
+
+    # MACD (12, 26, 9): сигнальная EMA считается от первого значения MACD
+    macd_line = ema(close, 12) - ema(close, 26)
+    batch["macd_line"] = macd_line[..., -1]
+    batch["signal_line"] = ewm(macd_line[..., 25:], 2.0 / 10)[..., -1] if n >= 26 + 8 else nan
+    batch["histogram"] = batch["macd_line"] - batch["signal_line"]
+
+    # Bollinger Bands (20, 2)
+    if n >= 20:
+        middle = close[..., -20:].mean(axis=-1)
+        std = close[..., -20:].std(axis=-1)
+    else:
+        middle = std = nan
+    batch["bb_upper"] = middle + 2 * std
+    batch["bb_middle"] = middle
+    batch["bb_lower"] = middle - 2 * std
+    with np.errstate(divide="ignore", invalid="ignore"):
+        batch["bb_width"] = (batch["bb_upper"] - batch["bb_lower"]) / middle * 100
+
+    # EMA (множественные периоды)
+    for period in EMA_PERIODS:
+        batch[f"ema_{period}"] = ema(close, period)[..., -1]
+
+    # ATR и ADX используют общий true range
+    tr = true_range(high, low, close)
+    for period in ATR_PERIODS:
+        batch[f"atr_{period}"] = atr_last(tr, period)
+    batch["adx"], batch["adx_pos"], batch["adx_neg"] = adx_last(high, low, tr, 14)
+
+    # Stochastic (14, 3)
+    batch["stoch_k"], batch["stoch_d"] = stochastic_last(high, low, close, 14, 3)
+
+    # Volume indicators
+    signed = np.where(close[..., 1:] < close[..., :-1], -volume[..., 1:], volume[..., 1:])
+    batch["obv"] = volume[..., 0] + signed.sum(axis=-1)
+    batch["volume_sma"] = volume[..., -max(volume_window, 1):].mean(axis=-1)
+    batch["current_volume"] = volume[..., -1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        batch["volume_ratio"] = np.where(batch["volume_sma"] > 0, batch["current_volume"] / batch["volume_sma"], 1.0)
+
+    # VWAP (для интрадей)
+    if n >= 20:
+        typical_price = (high + low + close) / 3
+        with np.errstate(divide="ignore", invalid="ignore"):
+            batch["vwap"] = (typical_price * volume).sum(axis=-1) / volume.sum(axis=-1)
+
+    return batch
+
+
+def compute_indicators_stack(candles: np.ndarray, volume_window: int = 20) -> Dict[str, np.ndarray]:
+    """
+    Индикаторы по 3-D массиву свечей (символы x бары x [timestamp, o, h, l, c, v])
+
+    Returns:
+        См. compute_indicators_batch
+    """
+    candles = np.asarray(candles, dtype=np.float64)
+    return compute_indicators_batch(
+        candles[..., HIGH], candles[..., LOW], candles[..., CLOSE], candles[..., VOLUME],
+        volume_window=volume_window
+    )
+
+
+def indicators_at(batch: Dict[str, np.ndarray], index: Any = ()) -> Dict[str, Any]:
+    """
+    Индикаторы одного символа из результата compute_indicators_batch
+
+    Returns:
+        Словарь в формате TechnicalAnalysis._calculate_all_indicators
+        (volume.window_used = None, его знает только вызывающий)
+    """
+    value = {name: float(values[index]) for name, values in batch.items()}
+    indicators: Dict[str, Any] = {}
+
+    indicators['rsi'] = {f'rsi_{p}': value[f'rsi_{p}'] for p in RSI_PERIODS}
+
+    indicators['macd'] = {
+        'macd_line': value['macd_line'],
+        'signal_line': value['signal_line'],
+        'histogram': value['histogram'],
+        'crossover': 'bullish' if value['macd_line'] > value['signal_line'] else 'bearish'
+    }
+
+    indicators['bollinger_bands'] = {
+        'upper': value['bb_upper'],
+        'middle': value['bb_middle'],
+        'lower': value['bb_lower'],
+        'width': value['bb_width'],
+        'squeeze': bool(value['bb_width'] < 2.0)  # Squeeze если ширина < 2% - конвертируем в bool для JSON
+    }
+
+    indicators['ema'] = {f'ema_{p}': value[f'ema_{p}'] for p in EMA_PERIODS}
+    ema_values = [value['close'], value['ema_9'], value['ema_20'], value['ema_50'], value['ema_200']]
+    is_bullish_alignment = all(ema_values[i] > ema_values[i + 1] for i in range(len(ema_values) - 1))
+    is_bearish_alignment = all(ema_values[i] < ema_values[i + 1] for i in range(len(ema_values) - 1))
+    indicators['ema']['alignment'] = 'bullish' if is_bullish_alignment else 'bearish' if is_bearish_alignment else 'mixed'
+
+    indicators['atr'] = {f'atr_{p}': value[f'atr_{p}'] for p in ATR_PERIODS}
+
+    indicators['adx'] = {
+        'adx': value['adx'],
+        'adx_pos': value['adx_pos'],
+        'adx_neg': value['adx_neg'],
+        'trend_strength': 'strong' if value['adx'] > 25 else 'weak'
+    }
+
+    indicators['stochastic'] = {
+        'stoch_k': value['stoch_k'],
+        'stoch_d': value['stoch_d'],
+        'crossover': 'bullish' if value['stoch_k'] > value['stoch_d'] else 'bearish'
+    }
+
+    indicators['volume'] = {
+        'obv': value['obv'],
+        'volume_sma': value['volume_sma'],
+        'current_volume': value['current_volume'],
+        'volume_ratio': value['volume_ratio'],
+        'window_used': None
+    }
+
+    if 'vwap' in value:
+        indicators['vwap'] = value['vwap']
+
+    return indicators
+
+
+def compute_indicators(
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    volume: np.ndarray,
+    volume_window: int = 20
+) -> Dict[str, Any]:
+    """
+    Все индикаторы анализа таймфрейма за один проход
+
+    Args:
+        high, low, close, volume: Массивы OHLCV по возрастанию времени
+        volume_window: Окно средней объёма (adaptive_window)
+
+    Returns:
+        Словарь в формате TechnicalAnalysis._calculate_all_indicators
+    """
+    batch = compute_indicators_batch(high, low, close, volume, volume_window=volume_window)
+    indicators = indicators_at(batch)
+    indicators['volume']['window_used'] = volume_window  # Для отладки
+    return indicators
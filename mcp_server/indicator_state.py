@@ -0,0 +1,389 @@
+"""
+Indicator State
+Инкрементальное состояние индикаторов пары (symbol, timeframe)
+
+Каждый закрытый бар обновляет EMA, RSI и ATR Уайлдера, суммы ADX, MACD,
+Stochastic, OBV и VWAP за O(1) без пересчёта истории. Формирующийся бар
+применяется к копии состояния (preview), поэтому его обновления не
+накапливаются. Значения совпадают с indicator_engine.compute_indicators
+по всей истории, переданной состоянию с момента создания.
+
+Состояние сериализуется в JSON (to_dict / save_states) и переживает перезапуск.
+"""
+
+import copy
+import json
+import math
+import os
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+# Условный импорт для поддержки как пакета, так и прямого запуска
+try:
+    from .indicator_engine import EMA_PERIODS, RSI_PERIODS, ATR_PERIODS, indicators_at
+except ImportError:
+    from indicator_engine import EMA_PERIODS, RSI_PERIODS, ATR_PERIODS, indicators_at
+
+
+# EMA для MACD (12, 26) считаются вместе с остальными
+EMA_SPANS = tuple(sorted(set(EMA_PERIODS) | {12, 26}))
+MACD_SIGNAL = 9
+BB_WINDOW = 20
+ADX_WINDOW = 14
+STOCH_WINDOW = 14
+STOCH_SMOOTH = 3
+VWAP_MIN_BARS = 20
+
+STATE_VERSION = 1
+
+
+def _div(numerator: float, denominator: float) -> float:
+    """Деление с семантикой numpy: x/0 -> ±inf, 0/0 -> nan"""
+    if denominator != 0:
+        return numerator / denominator
+    if numerator == 0 or math.isnan(numerator):
+        return math.nan
+    return math.copysign(math.inf, numerator) * math.copysign(1.0, denominator)
+
+
+class IndicatorState:
+    """
+    Состояние индикаторов одной пары (symbol, timeframe)
+
+    update() принимает только закрытые бары по возрастанию времени;
+    бар не новее последнего применённого игнорируется.
+    """
+
+    def __init__(self, symbol: str, timeframe: str, volume_window: int = 20):
+        """
+        Args:
+            symbol: Символ
+            timeframe: Таймфрейм
+            volume_window: Окно средней объёма
+        """
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.volume_window = max(int(volume_window), 1)
+
+        self.count = 0
+        self.last_ts: Optional[float] = None
+        self.prev_high = 0.0
+        self.prev_low = 0.0
+        self.prev_close = 0.0
+
+        self.ema = {span: 0.0 for span in EMA_SPANS}
+        self.signal = 0.0
+        # [среднее приростов, среднее падений] по периодам RSI
+        self.rsi = {period: [0.0, 0.0] for period in RSI_PERIODS}
+        # Сумма true range первых period баров, затем ATR
+        self.atr = {period: 0.0 for period in ATR_PERIODS}
+
+        # Суммы Уайлдера ADX [tr, +dm, -dm], сумма первых DX, ADX и последние DI
+        self.adx_sums = [0.0, 0.0, 0.0]
+        self.adx = 0.0
+        self.di_pos = 0.0
+        self.di_neg = 0.0
+
+        self.closes: deque = deque(maxlen=BB_WINDOW)
+        self.highs: deque = deque(maxlen=STOCH_WINDOW)
+        self.lows: deque = deque(maxlen=STOCH_WINDOW)
+        self.stoch: deque = deque(maxlen=STOCH_SMOOTH)
+        self.volumes: deque = deque(maxlen=self.volume_window)
+
+        self.obv = 0.0
+        self.pv_sum = 0.0
+        self.v_sum = 0.0
+
+    def seed(self, candles: Iterable[List[float]]) -> int:
+        """
+        Применить историю закрытых баров
+
+        Returns:
+            Сколько баров применено
+        """
+        return sum(1 for bar in np.asarray(candles, dtype=np.float64).reshape(-1, 6) if self.update(bar))
+
+    def update(self, bar: List[float]) -> bool:
+        """
+        Применить закрытый бар [timestamp, open, high, low, close, volume]
+
+        Returns:
+            True если бар применён (False - бар не новее последнего)
+        """
+        ts, _, high, low, close, volume = (float(value) for value in bar)
+        if self.last_ts is not None and ts <= self.last_ts:
+            return False
+
+        i = self.count
+        if i == 0:
+            tr = high - low
+            gain = loss = 0.0
+        else:
+            tr = max(high, self.prev_close) - min(low, self.prev_close)
+            diff = close - self.prev_close
+            gain = diff if diff > 0 else 0.0
+            loss = -diff if diff < 0 else 0.0
+
+        for span in EMA_SPANS:
+            alpha = 2.0 / (span + 1)
+            self.ema[span] = close if i == 0 else (1 - alpha) * self.ema[span] + alpha * close
+
+        # Сигнальная EMA MACD начинается с первого полного значения MACD (бар 26)
+        if i >= 25:
+            macd = self.ema[12] - self.ema[26]
+            self.signal = macd if i == 25 else 0.8 * self.signal + 0.2 * macd
+
+        for period, averages in self.rsi.items():
+            alpha = 1.0 / period
+            averages[0] = (1 - alpha) * averages[0] + alpha * gain
+            averages[1] = (1 - alpha) * averages[1] + alpha * loss
+
+        for period in ATR_PERIODS:
+            if i < period:
+                self.atr[period] += tr
+                if i == period - 1:
+                    self.atr[period] /= period
+            else:
+                self.atr[period] = (1 - 1.0 / period) * self.atr[period] + tr / period
+
+        self._update_adx(i, high, low, tr)
+
+        self.closes.append(close)
+        self.highs.append(high)
+        self.lows.append(low)
+        if i >= STOCH_WINDOW - 1:
+            lowest = min(self.lows)
+            self.stoch.append(_div(100 * (close - lowest), max(self.highs) - lowest))
+
+        if i == 0:
+            self.obv = volume
+        else:
+            self.obv += -volume if close < self.prev_close else volume
+        self.volumes.append(volume)
+        self.pv_sum += (high + low + close) / 3 * volume
+        self.v_sum += volume
+
+        self.count = i + 1
+        self.last_ts = ts
+        self.prev_high, self.prev_low, self.prev_close = high, low, close
+        return True
+
+    def _update_adx(self, i: int, high: float, low: float, tr: float) -> None:
+        """
+        Шаг ADX по схеме ta.trend.ADXIndicator
+
+        Суммы Уайлдера начинаются с суммы баров 1..window, DX считается
+        с бара window, ADX - среднее первых window значений DX и далее сглаживание.
+        """
+        window = ADX_WINDOW
+        if i == 0:
+            return
+
+        up = high - self.prev_high
+        down = self.prev_low - low
+        pos = up if up > down and up > 0 else 0.0
+        neg = down if down > up and down > 0 else 0.0
+
+        decay = 1.0 - 1.0 / window if i > window else 1.0
+        self.adx_sums = [decay * total + value for total, value in zip(self.adx_sums, (tr, pos, neg))]
+        if i < window:
+            return
+
+        trs, dip, din = self.adx_sums
+        self.di_pos = 100 * dip / trs if trs != 0 else 0.0
+        self.di_neg = 100 * din / trs if trs != 0 else 0.0
+        di_sum = self.di_pos + self.di_neg
+        dx = 100 * abs((self.di_pos - self.di_neg) / di_sum) if di_sum != 0 else 0.0
+
+        k = i - window
+        if k < window:
+            self.adx += dx
+            if k == window - 1:
+                self.adx /= window
+        else:
+            self.adx = (1 - 1.0 / window) * self.adx + dx / window
+
+    def values(self) -> Dict[str, float]:
+        """Индикаторы последнего применённого бара в формате compute_indicators_batch"""
+        if self.count == 0:
+            raise ValueError(f"No bars applied to indicator state {self.symbol} {self.timeframe}")
+
+        n = self.count
+        nan = math.nan
+        values: Dict[str, float] = {"close": self.prev_close}
+
+        for period, (up, down) in self.rsi.items():
+            values[f"rsi_{period}"] = nan if n < period else 100.0 if down == 0 else 100 - 100 / (1 + up / down)
+
+        values["macd_line"] = self.ema[12] - self.ema[26] if n >= 26 else nan
+        values["signal_line"] = self.signal if n >= 26 + MACD_SIGNAL - 1 else nan
+        values["histogram"] = values["macd_line"] - values["signal_line"]
+
+        if n >= BB_WINDOW:
+            closes = np.fromiter(self.closes, dtype=np.float64, count=BB_WINDOW)
+            middle, std = float(closes.mean()), float(closes.std())
+        else:
+            middle = std = nan
+        values["bb_upper"] = middle + 2 * std
+        values["bb_middle"] = middle
+        values["bb_lower"] = middle - 2 * std
+        values["bb_width"] = _div(values["bb_upper"] - values["bb_lower"], middle) * 100
+
+        for period in EMA_PERIODS:
+            values[f"ema_{period}"] = self.ema[period] if n >= period else nan
+
+        for period in ATR_PERIODS:
+            values[f"atr_{period}"] = self.atr[period] if n >= period else 0.0
+
+        if n >= 2 * ADX_WINDOW:
+            values["adx"], values["adx_pos"], values["adx_neg"] = self.adx, self.di_pos, self.di_neg
+        else:
+            values["adx"] = values["adx_pos"] = values["adx_neg"] = 0.0
+
+        values["stoch_k"] = self.stoch[-1] if n >= STOCH_WINDOW else nan
+        values["stoch_d"] = sum(self.stoch) / STOCH_SMOOTH if n >= STOCH_WINDOW + STOCH_SMOOTH - 1 else nan
+
+        values["obv"] = self.obv
+        values["volume_sma"] = float(np.fromiter(self.volumes, dtype=np.float64).mean())
+        values["current_volume"] = self.volumes[-1]
+        values["volume_ratio"] = values["current_volume"] / values["volume_sma"] if values["volume_sma"] > 0 else 1.0
+
+        if n >= VWAP_MIN_BARS:
+            values["vwap"] = _div(self.pv_sum, self.v_sum)
+        return values
+
+    def indicators(self) -> Dict[str, Any]:
+        """Индикаторы последнего закрытого бара в формате TechnicalAnalysis._calculate_all_indicators"""
+        indicators = indicators_at({name: np.float64(value) for name, value in self.values().items()})
+        indicators['volume']['window_used'] = self.volume_window
+        return indicators
+
+    def preview(self, bar: List[float]) -> Dict[str, Any]:
+        """
+        Индикаторы с учётом формирующегося бара без изменения состояния
+
+        Бар не новее последнего закрытого не применяется.
+        """
+        forming = self.copy()
+        forming.update(bar)
+        return forming.indicators()
+
+    def copy(self) -> "IndicatorState":
+        """Независимая копия состояния"""
+        clone = copy.copy(self)
+        clone.ema = dict(self.ema)
+        clone.rsi = {period: list(averages) for period, averages in self.rsi.items()}
+        clone.atr = dict(self.atr)
+        clone.adx_sums = list(self.adx_sums)
+        for name in ("closes", "highs", "lows", "stoch", "volumes"):
+            setattr(clone, name, copy.copy(getattr(self, name)))
+        return clone
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Состояние в виде JSON-совместимого словаря"""
+        return {
+            "version": STATE_VERSION,
+            "symbol": self.symbol,
+            "timeframe": self.timeframe,
+            "volume_window": self.volume_window,
+            "count": self.count,
+            "last_ts": self.last_ts,
+            "prev": [self.prev_high, self.prev_low, self.prev_close],
+            "ema": {str(span): value for span, value in self.ema.items()},
+            "signal": self.signal,
+            "rsi": {str(period): list(averages) for period, averages in self.rsi.items()},
+            "atr": {str(period): value for period, value in self.atr.items()},
+            "adx_sums": list(self.adx_sums),
+            "adx": [self.adx, self.di_pos, self.di_neg],
+            "closes": list(self.closes),
+            "highs": list(self.highs),
+            "lows": list(self.lows),
+            "stoch": list(self.stoch),
+            "volumes": list(self.volumes),
+            "obv": self.obv,
+            "vwap_sums": [self.pv_sum, self.v_sum]
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "IndicatorState":
+        """
+        Восстановить состояние из to_dict()
+
+        Raises:
+            ValueError: Неподдерживаемая версия формата
+        """
+        if data.get("version") != STATE_VERSION:
+            raise ValueError(f"Unsupported indicator state version: {data.get('version')}")
+
+        state = cls(data["symbol"], data["timeframe"], data["volume_window"])
+        state.count = int(data["count"])
+        state.last_ts = data["last_ts"]
+        state.prev_high, state.prev_low, state.prev_close = data["prev"]
+        state.ema = {int(span): float(value) for span, value in data["ema"].items()}
+        state.signal = float(data["signal"])
+        state.rsi = {int(period): [float(v) for v in averages] for period, averages in data["rsi"].items()}
+        state.atr = {int(period): float(value) for period, value in data["atr"].items()}
+        state.adx_sums = [float(v) for v in data["adx_sums"]]
+        state.adx, state.di_pos, state.di_neg = data["adx"]
+        state.closes.extend(data["closes"])
+        state.highs.extend(data["highs"])
+        state.lows.extend(data["lows"])
+        state.stoch.extend(data["stoch"])
+        state.volumes.extend(data["volumes"])
+        state.obv = float(data["obv"])
+        state.pv_sum, state.v_sum = data["vwap_sums"]
+        return state
+
+
+def save_states(states: Iterable[IndicatorState], path: Any) -> int:
+    """
+    Сохранить состояния в JSON файл (атомарная замена)
+
+    Returns:
+        Сколько состояний сохранено
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = [state.to_dict() for state in states]
+    tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp.json")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+    logger.debug(f"Saved {len(payload)} indicator states to {path}")
+    return len(payload)
+
+
+def load_states(path: Any) -> Dict[Tuple[str, str], IndicatorState]:
+    """
+    Загрузить состояния из файла save_states
+
+    Повреждённый файл или несовместимые записи пропускаются - состояние
+    будет построено заново по истории свечей.
+
+    Returns:
+        {(symbol, timeframe): состояние}
+    """
+    path = Path(path)
+    if not path.exists():
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+    except Exception as e:
+        logger.warning(f"Failed to load indicator states from {path}: {e}")
+        return {}
+
+    states: Dict[Tuple[str, str], IndicatorState] = {}
+    for data in payload:
+        try:
+            state = IndicatorState.from_dict(data)
+        except Exception as e:
+            logger.debug(f"Skipping indicator state record: {e}")
+            continue
+        states[(state.symbol, state.timeframe)] = state
+    return states
@@ -0,0 +1,503 @@
+"""
+Kline Stream
+Приём свечей через публичный WebSocket Bybit (kline.{interval}.{symbol})
+Держит актуальный буфер свечей в памяти для каждой пары (symbol, timeframe),
+обнаруживает пропуски и докачивает их через REST.
+Старшие таймфреймы могут собираться из базового потока без отдельных подписок.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from pybit.unified_trading import WebSocket
+from loguru import logger
+
+# Условный импорт для поддержки как пакета, так и прямого запуска
+try:
+    from .candle_store import timeframe_to_ms, candles_to_list, OHLCV_COLUMNS
+    from .indicator_state import IndicatorState
+    from .interval_utils import convert_interval_to_bybit_format
+    from .resampler import IncrementalResampler, can_resample, resample
+except ImportError:
+    from candle_store import timeframe_to_ms, candles_to_list, OHLCV_COLUMNS
+    from indicator_state import IndicatorState
+    from interval_utils import convert_interval_to_bybit_format
+    from resampler import IncrementalResampler, can_resample, resample
+
+
+# Bybit принимает не больше 10 топиков в одном запросе subscribe (spot)
+MAX_TOPICS_PER_REQUEST = 10
+
+
+def to_exchange_symbol(symbol: str) -> str:
+    """CCXT символ -> символ Bybit ("BTC/USDT" / "BTC/USDT:USDT" -> "BTCUSDT")"""
+    return symbol.split(":")[0].replace("/", "")
+
+
+def category_of(symbol: str) -> str:
+    """Категория по CCXT символу: "BTC/USDT:USDT" -> linear, "BTC/USDT" -> spot"""
+    return "linear" if ":" in symbol else "spot"
+
+
+def merge_bars(existing: np.ndarray, new: np.ndarray, tf_ms: int) -> np.ndarray:
+    """
+    Слить две серии свечей по timestamp
+
+    Бары из new заменяют бары existing с тем же timestamp. Если результат
+    не непрерывен (есть пропуск), возвращается только непрерывный хвост.
+    """
+    if len(existing) == 0:
+        merged = new
+    elif len(new) == 0:
+        merged = existing
+    else:
+        merged = np.concatenate([existing, new])
+        order = np.argsort(merged[:, 0], kind="stable")
+        merged = merged[order]
+        # Оставляем последнюю версию каждого бара (new идёт после existing)
+        is_last = np.append(merged[1:, 0] != merged[:-1, 0], True)
+        merged = merged[is_last]
+
+    if len(merged) > 1:
+        breaks = np.nonzero(np.diff(merged[:, 0]) != tf_ms)[0]
+        if len(breaks) > 0:
+            merged = merged[breaks[-1] + 1:]
+    return np.ascontiguousarray(merged, dtype=np.float64)
+
+
+class KlineStream:
+    """
+    Сервис приёма свечей из публичного WebSocket
+
+    Сообщения приходят в потоке pybit, буферы защищены блокировкой.
+    Докачка пропусков выполняется корутиной в event loop сервера.
+    Буфер считается тёплым, если в нём достаточно баров, нет незакрытого
+    пропуска и поток недавно присылал обновления.
+    """
+
+    def __init__(
+        self,
+        fetcher: Optional[Callable[[str, str, int], Awaitable[List[List]]]] = None,
+        testnet: bool = False,
+        category: str = "spot",
+        max_bars: int = 1000,
+        stale_after: float = 90.0,
+        enabled: Optional[bool] = None
+    ):
+        """
+        Args:
+            fetcher: Корутина REST загрузки свечей (symbol, timeframe, limit) для докачки пропусков
+            testnet: Использовать testnet
+            category: Категория публичного потока ("spot", "linear")
+            max_bars: Максимум баров в буфере
+            stale_after: Через сколько секунд без обновлений буфер считается устаревшим
+            enabled: Включить/выключить поток (если None - проверяет ENABLE_KLINE_STREAM env)
+        """
+        self.fetcher = fetcher
+        self.testnet = testnet
+        self.category = category
+        self.max_bars = max_bars
+        self.stale_after = stale_after
+
+        if enabled is None:
+            stream_env = os.getenv("ENABLE_KLINE_STREAM", "true").lower()
+            self.enabled = stream_env in ("true", "1", "yes")
+        else:
+            self.enabled = enabled
+
+        self.ws = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.RLock()
+
+        self._buffers: Dict[Tuple[str, str], np.ndarray] = {}
+        self._last_update: Dict[Tuple[str, str], float] = {}
+        self._gaps: Set[Tuple[str, str]] = set()
+        self._subscribed: Set[Tuple[str, str]] = set()
+        self._symbol_map: Dict[str, str] = {}  # BTCUSDT -> BTC/USDT
+        self._interval_map: Dict[str, str] = {}  # "60" -> "1h"
+        # (symbol, базовый таймфрейм) -> {производный таймфрейм: сборщик}
+        self._derived: Dict[Tuple[str, str], Dict[str, IncrementalResampler]] = {}
+        # Инкрементальные индикаторы по закрытым барам буфера (строятся при первом запросе)
+        self._indicators: Dict[Tuple[str, str], IndicatorState] = {}
+
+        self._stats = {"messages": 0, "bars_appended": 0, "gaps": 0, "backfills": 0, "backfill_errors": 0,
+                       "warm_hits": 0, "cold_misses": 0}
+
+        logger.info(f"KlineStream initialized ({'enabled' if self.enabled else 'disabled'}, {category})")
+
+    async def subscribe(
+        self,
+        symbols: List[str],
+        timeframes: List[str],
+        base_timeframe: Optional[str] = None
+    ) -> int:
+        """
+        Подписаться на свечи для символов и таймфреймов
+
+        Args:
+            symbols: Символы в формате CCXT ("BTC/USDT")
+            timeframes: Таймфреймы ("5m", "1h", ...)
+            base_timeframe: Если задан - кратные ему таймфреймы собираются
+                из его потока локально, подписка идёт только на базовый
+
+        Returns:
+            Количество новых подписок
+        """
+        if not self.enabled:
+            return 0
+
+        # Символы другой категории в этом соединении получили бы чужие свечи (spot вместо linear)
+        foreign = [symbol for symbol in symbols if category_of(symbol) != self.category]
+        if foreign:
+            logger.debug(f"Kline stream ({self.category}) skips {len(foreign)} symbols of another category")
+            symbols = [symbol for symbol in symbols if category_of(symbol) == self.category]
+
+        self._loop = asyncio.get_running_loop()
+
+        if base_timeframe:
+            derived = [tf for tf in timeframes if can_resample(base_timeframe, tf)]
+            if derived:
+                with self._lock:
+                    for symbol in symbols:
+                        resamplers = self._derived.setdefault((symbol, base_timeframe), {})
+                        for timeframe in derived:
+                            if timeframe not in resamplers:
+                                resamplers[timeframe] = IncrementalResampler(base_timeframe, timeframe)
+                                self._subscribed.add((symbol, timeframe))
+                timeframes = [base_timeframe] + [tf for tf in timeframes if tf not in derived and tf != base_timeframe]
+
+        new_topics: Dict[str, List[str]] = {}
+        with self._lock:
+            for timeframe in timeframes:
+                if timeframe_to_ms(timeframe) is None:
+                    continue
+                interval = convert_interval_to_bybit_format(timeframe)
+                self._interval_map[interval] = timeframe
+                for symbol in symbols:
+                    if (symbol, timeframe) in self._subscribed:
+                        continue
+                    exchange_symbol = to_exchange_symbol(symbol)
+                    self._symbol_map[exchange_symbol] = symbol
+                    self._subscribed.add((symbol, timeframe))
+                    new_topics.setdefault(interval, []).append(exchange_symbol)
+
+        if not new_topics:
+            return 0
+
+        # pybit подключается и подписывается синхронно - выносим из event loop
+        try:
+            await asyncio.to_thread(self._subscribe_blocking, new_topics)
+        except Exception as e:
+            logger.error(f"Kline stream subscription failed: {e}")
+            with self._lock:
+                for interval, exchange_symbols in new_topics.items():
+                    timeframe = self._interval_map[interval]
+                    for exchange_symbol in exchange_symbols:
+                        self._subscribed.discard((self._symbol_map[exchange_symbol], timeframe))
+            return 0
+
+        count = sum(len(v) for v in new_topics.values())
+        logger.info(f"Kline stream subscribed to {count} new topics ({len(self._subscribed)} total)")
+        return count
+
+    def _subscribe_blocking(self, topics: Dict[str, List[str]]) -> None:
+        """Создать WebSocket (если нужно) и отправить подписки пачками"""
+        if self.ws is None:
+            self.ws = WebSocket(testnet=self.testnet, channel_type=self.category)
+
+        for interval, exchange_symbols in topics.items():
+            ws_interval = int(interval) if interval.isdigit() else interval
+            for i in range(0, len(exchange_symbols), MAX_TOPICS_PER_REQUEST):
+                self.ws.kline_stream(
+                    interval=ws_interval,
+                    symbol=exchange_symbols[i:i + MAX_TOPICS_PER_REQUEST],
+                    callback=self._handle_message
+                )
+
+    def _handle_message(self, message: Dict[str, Any]) -> None:
+        """Обработка сообщения kline (вызывается в потоке WebSocket)"""
+        try:
+            topic = message.get("topic", "")
+            parts = topic.split(".")
+            if len(parts) != 3:
+                return
+
+            timeframe = self._interval_map.get(parts[1])
+            symbol = self._symbol_map.get(parts[2])
+            if timeframe is None or symbol is None:
+                return
+
+            self._stats["messages"] += 1
+            for kline in message.get("data", []):
+                bar = [
+                    float(kline["start"]),
+                    float(kline["open"]),
+                    float(kline["high"]),
+                    float(kline["low"]),
+                    float(kline["close"]),
+                    float(kline["volume"])
+                ]
+                if self.apply_bar(symbol, timeframe, bar):
+                    self._schedule_backfill(symbol, timeframe)
+        except Exception as e:
+            logger.error(f"Error handling kline message: {e}")
+
+    def apply_bar(self, symbol: str, timeframe: str, bar: List[float]) -> bool:
+        """
+        Применить бар из потока к буферу
+
+        Бар с тем же timestamp заменяет последний (формирующийся) бар,
+        следующий бар добавляется. Более поздний бар означает пропуск.
+
+        Returns:
+            True если обнаружен новый пропуск (нужна докачка)
+        """
+        with self._lock:
+            gap = self._apply_row(symbol, timeframe, bar)
+
+            for target, resampler in self._derived.get((symbol, timeframe), {}).items():
+                if gap:
+                    # Производный бар неполон, пока базовый пропуск не докачан
+                    self._gaps.add((symbol, target))
+                derived_bar = resampler.update(bar)
+                # Бар, начатый с середины периода (до seed базового буфера), не публикуем
+                if derived_bar is None or not resampler.complete:
+                    continue
+                if self._apply_row(symbol, target, derived_bar):
+                    self._schedule_backfill(symbol, target)
+            return gap
+
+    def _apply_row(self, symbol: str, timeframe: str, bar: List[float]) -> bool:
+        """Применить бар к буферу (вызывается под блокировкой, см. apply_bar)"""
+        key = (symbol, timeframe)
+        tf_ms = timeframe_to_ms(timeframe)
+        row = np.asarray(bar, dtype=np.float64).reshape(1, OHLCV_COLUMNS)
+        ts = row[0, 0]
+
+        self._last_update[key] = time.monotonic()
+        buffer = self._buffers.get(key)
+
+        if buffer is None or len(buffer) == 0:
+            self._buffers[key] = row
+            self._indicators.pop(key, None)
+            return False
+
+        last_ts = buffer[-1, 0]
+        if ts == last_ts:
+            buffer[-1] = row[0]
+            return False
+        if ts < last_ts:
+            # Запоздавшее обновление уже закрытого бара
+            idx = int(np.searchsorted(buffer[:, 0], ts))
+            if idx < len(buffer) and buffer[idx, 0] == ts:
+                buffer[idx] = row[0]
+                # Закрытый бар изменился - состояние индикаторов строится заново
+                self._indicators.pop(key, None)
+            return False
+
+        state = self._indicators.get(key)
+        if state is not None:
+            # Предыдущий формирующийся бар закрыт
+            state.update(buffer[-1])
+
+        buffer = np.concatenate([buffer, row])
+        if len(buffer) > self.max_bars:
+            buffer = buffer[-self.max_bars:]
+        self._buffers[key] = buffer
+        self._stats["bars_appended"] += 1
+
+        if ts != last_ts + tf_ms and key not in self._gaps:
+            self._indicators.pop(key, None)
+            self._gaps.add(key)
+            self._stats["gaps"] += 1
+            logger.debug(f"Kline gap for {symbol} {timeframe}: {int(last_ts)} -> {int(ts)}")
+            return True
+        return False
+
+    def seed(self, symbol: str, timeframe: str, candles: List[List]) -> None:
+        """
+        Заполнить буфер историей, полученной через REST
+
+        Бары потока новее REST данных сохраняются.
+        """
+        tf_ms = timeframe_to_ms(timeframe)
+        if tf_ms is None or not candles:
+            return
+
+        key = (symbol, timeframe)
+        new = np.asarray(candles, dtype=np.float64).reshape(-1, OHLCV_COLUMNS)
+
+        with self._lock:
+            if key not in self._subscribed:
+                return
+            existing = self._buffers.get(key, np.empty((0, OHLCV_COLUMNS)))
+            # Бары из потока свежее REST - они идут вторыми и перекрывают REST версию
+            merged = merge_bars(new, existing, tf_ms)
+            if len(merged) > self.max_bars:
+                merged = merged[-self.max_bars:]
+            self._buffers[key] = merged
+            self._indicators.pop(key, None)
+            if len(merged) > 1 and np.all(np.diff(merged[:, 0]) == tf_ms):
+                self._gaps.discard(key)
+
+            if key not in self._gaps:
+                for target, resampler in self._derived.get(key, {}).items():
+                    self._rebuild_derived(symbol, timeframe, target, merged)
+                    resampler.reset(merged)
+
+    def _rebuild_derived(self, symbol: str, base_timeframe: str, timeframe: str, base: np.ndarray) -> None:
+        """Пересобрать производный буфер из базового (под блокировкой, после seed)"""
+        key = (symbol, timeframe)
+        tf_ms = timeframe_to_ms(timeframe)
+        rebuilt = resample(base, base_timeframe, timeframe)
+        if len(rebuilt) == 0:
+            return
+        existing = self._buffers.get(key, np.empty((0, OHLCV_COLUMNS)))
+        # Собранные из базовых баров версии точнее ранее сохранённых
+        merged = merge_bars(existing, rebuilt, tf_ms)
+        if len(merged) > self.max_bars:
+            merged = merged[-self.max_bars:]
+        self._buffers[key] = merged
+        self._indicators.pop(key, None)
+        self._last_update[key] = time.monotonic()
+        if np.all(np.diff(merged[:, 0]) == tf_ms):
+            self._gaps.discard(key)
+
+    def _schedule_backfill(self, symbol: str, timeframe: str) -> None:
+        """Запустить докачку пропуска в event loop сервера"""
+        if self._loop is None or self.fetcher is None or self._loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self.backfill(symbol, timeframe), self._loop)
+
+    async def backfill(self, symbol: str, timeframe: str) -> bool:
+        """
+        Докачать пропущенные бары через REST
+
+        Returns:
+            True если пропуск закрыт
+        """
+        key = (symbol, timeframe)
+        tf_ms = timeframe_to_ms(timeframe)
+        if self.fetcher is None:
+            return False
+
+        with self._lock:
+            buffer = self._buffers.get(key)
+            if buffer is None or len(buffer) == 0:
+                return False
+            # Запрашиваем столько баров, чтобы перекрыть пропуск и снова набрать буфер
+            span = int((buffer[-1, 0] - buffer[0, 0]) // tf_ms) + 1
+            limit = int(min(max(span, 2), self.max_bars, 1000))
+
+        try:
+            candles = await self.fetcher(symbol, timeframe, limit)
+            self._stats["backfills"] += 1
+        except Exception as e:
+            self._stats["backfill_errors"] += 1
+            logger.warning(f"Kline backfill failed for {symbol} {timeframe}: {e}")
+            return False
+
+        self.seed(symbol, timeframe, candles)
+        with self._lock:
+            closed = key not in self._gaps
+        if closed:
+            logger.debug(f"Kline gap closed for {symbol} {timeframe} ({len(candles)} bars)")
+        return closed
+
+    def is_warm(self, symbol: str, timeframe: str, limit: int) -> bool:
+        """Можно ли отдать limit баров из буфера без обращения к бирже"""
+        key = (symbol, timeframe)
+        with self._lock:
+            buffer = self._buffers.get(key)
+            if buffer is None or len(buffer) < limit or key in self._gaps:
+                return False
+            last_update = self._last_update.get(key)
+            return last_update is not None and time.monotonic() - last_update <= self.stale_after
+
+    def get_ohlcv(self, symbol: str, timeframe: str, limit: int) -> Optional[List[List]]:
+        """
+        Последние limit свечей из буфера
+
+        Returns:
+            Свечи в формате CCXT или None если буфер не тёплый
+        """
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            if not self.is_warm(symbol, timeframe, limit):
+                if (symbol, timeframe) in self._subscribed:
+                    self._stats["cold_misses"] += 1
+                return None
+            self._stats["warm_hits"] += 1
+            return candles_to_list(self._buffers[(symbol, timeframe)][-limit:])
+
+    def get_indicators(
+        self,
+        symbol: str,
+        timeframe: str,
+        min_bars: int = 200,
+        volume_window: int = 20
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Индикаторы по буферу с учётом формирующегося бара
+
+        Состояние строится по закрытым барам буфера при первом запросе,
+        дальше каждый закрытый бар из потока применяется за O(1).
+        Значения соответствуют расчёту по всей истории с момента построения
+        состояния (а не по последним limit барам, как в get_ohlcv).
+
+        Returns:
+            Словарь в формате TechnicalAnalysis._calculate_all_indicators
+            или None если буфер не тёплый
+        """
+        if not self.enabled:
+            return None
+
+        key = (symbol, timeframe)
+        with self._lock:
+            if not self.is_warm(symbol, timeframe, max(min_bars, 2)):
+                return None
+            buffer = self._buffers[key]
+            state = self._indicators.get(key)
+            if state is None or state.volume_window != volume_window:
+                state = IndicatorState(symbol, timeframe, volume_window)
+                state.seed(buffer[:-1])
+                self._indicators[key] = state
+            return state.preview(buffer[-1])
+
+    def is_subscribed(self, symbol: str, timeframe: str) -> bool:
+        """Есть ли подписка на пару (symbol, timeframe)"""
+        return (symbol, timeframe) in self._subscribed
+
+    def stop(self) -> None:
+        """Закрыть WebSocket"""
+        if self.ws is not None:
+            try:
+                self.ws.exit()
+            except Exception as e:
+                logger.debug(f"Error closing kline stream: {e}")
+            self.ws = None
+            logger.info("Kline stream stopped")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика потока"""
+        with self._lock:
+            warm = sum(
+                1 for (symbol, timeframe) in self._buffers
+                if self.is_warm(symbol, timeframe, 1)
+            )
+            return {
+                "enabled": self.enabled,
+                "connected": self.ws is not None,
+                "subscriptions": len(self._subscribed),
+                "buffers": len(self._buffers),
+                "warm_buffers": warm,
+                "pending_gaps": len(self._gaps),
+                "indicator_states": len(self._indicators),
+                **self._stats
+            }
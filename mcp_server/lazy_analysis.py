@@ -0,0 +1,149 @@
+"""
+Lazy Analysis
+Секции анализа, вычисляемые при первом чтении
+
+LazySections - dict, часть значений которого задана функциями: секция
+считается при первом обращении по ключу и запоминается. Итерация,
+сравнение, json.dumps и pickle видят полный словарь (все секции
+досчитываются), поэтому схема ответа MCP не меняется, а потребитель,
+читающий несколько полей (сканер), платит только за них.
+"""
+
+import os
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional
+
+
+def lazy_sections_enabled() -> bool:
+    """Ленивые секции анализа (ENABLE_LAZY_ANALYSIS env, по умолчанию включены)"""
+    return os.getenv("ENABLE_LAZY_ANALYSIS", "true").lower() in ("true", "1", "yes")
+
+
+class LazySections(dict):
+    """
+    Словарь с отложенными секциями
+
+    Thread-safe: секция считается один раз, даже если читается из
+    нескольких потоков одновременно.
+    """
+
+    def __init__(self, eager: Dict[str, Any], pending: Optional[Dict[str, Callable[[], Any]]] = None):
+        """
+        Args:
+            eager: Уже посчитанные поля
+            pending: {ключ: функция без аргументов, вычисляющая секцию}
+        """
+        super().__init__(eager)
+        self._pending = dict(pending or {})
+        self._lock = threading.RLock()
+
+    def _resolve(self, key: Any) -> None:
+        if key not in self._pending:
+            return
+        with self._lock:
+            compute = self._pending.get(key)
+            if compute is not None:
+                super().__setitem__(key, compute())
+                del self._pending[key]
+
+    def resolve(self, keys: Optional[Iterable[Any]] = None) -> None:
+        """Досчитать секции keys (все несчитанные, если None)"""
+        for key in list(self._pending if keys is None else keys):
+            self._resolve(key)
+
+    def materialize(self) -> Dict[str, Any]:
+        """Досчитать все секции и вернуть обычный dict"""
+        for key in list(self._pending):
+            self._resolve(key)
+        return dict(super().items())
+
+    @property
+    def pending(self) -> tuple:
+        """Ещё не посчитанные секции"""
+        return tuple(self._pending)
+
+    def __getitem__(self, key: Any) -> Any:
+        self._resolve(key)
+        return super().__getitem__(key)
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        self._resolve(key)
+        return super().get(key, default)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self._pending or super().__contains__(key)
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        with self._lock:
+            self._pending.pop(key, None)
+            super().__setitem__(key, value)
+
+    def __delitem__(self, key: Any) -> None:
+        with self._lock:
+            if self._pending.pop(key, None) is None or super().__contains__(key):
+                super().__delitem__(key)
+
+    def pop(self, key: Any, *default: Any) -> Any:
+        self._resolve(key)
+        return super().pop(key, *default)
+
+    def setdefault(self, key: Any, default: Any = None) -> Any:
+        self._resolve(key)
+        return super().setdefault(key, default)
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def __len__(self) -> int:
+        return super().__len__() + len(self._pending)
+
+    def __iter__(self):
+        self.materialize()
+        return super().__iter__()
+
+    def keys(self):
+        self.materialize()
+        return super().keys()
+
+    def values(self):
+        self.materialize()
+        return super().values()
+
+    def items(self):
+        self.materialize()
+        return super().items()
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, LazySections):
+            other = other.materialize()
+        return self.materialize() == other
+
+    def __ne__(self, other: Any) -> bool:
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        # repr не досчитывает секции: его зовут логирование и asyncio (repr результата future)
+        pending = ", ".join(f"{key!r}: <pending>" for key in self._pending)
+        eager = dict.__repr__(self)
+        if not pending:
+            return eager
+        return f"{eager[:-1]}, {pending}}}" if len(eager) > 2 else f"{{{pending}}}"
+
+    def copy(self) -> "LazySections":
+        """
+        Поверхностная копия
+
+        Несчитанные секции копии читаются через оригинал, поэтому
+        результат запоминается и в нём (например, в кеше анализов).
+        """
+        with self._lock:
+            eager = dict(super().items())
+            pending = {key: (lambda key=key: self[key]) for key in self._pending}
+        return LazySections(eager, pending)
+
+    def __reduce__(self):
+        # pickle / deepcopy получают обычный словарь со всеми секциями
+        return dict, (self.materialize(),)
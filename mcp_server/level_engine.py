@@ -0,0 +1,256 @@
+"""
+Level Engine
+Уровни поддержки/сопротивления по плотности swing точек
+
+Swing highs/lows всех таймфреймов складываются в гистограмму на
+логарифмической ценовой сетке (вес пивота растёт с таймфреймом) и
+сглаживаются гауссовым ядром; локальные максимумы плотности - уровни.
+Карта уровней символа обновляется инкрементально по новым закрытым
+барам, ближайший уровень выше/ниже цены ищется бинарным поиском.
+"""
+
+import math
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from loguru import logger
+
+# Условный импорт для поддержки как пакета, так и прямого запуска
+try:
+    from .candle_store import timeframe_to_ms
+    from .structure_analyzer import StructureAnalyzer
+except ImportError:
+    from candle_store import timeframe_to_ms
+    from structure_analyzer import StructureAnalyzer
+
+
+PIVOT_STRENGTH = 3
+MIN_LEVEL_STRENGTH = 0.1
+
+
+def timeframe_weight(timeframe: str) -> float:
+    """Вес пивота таймфрейма: sqrt(минут), 1m = 1, 1h ~ 7.7, 1d ~ 38"""
+    tf_ms = timeframe_to_ms(timeframe) or 60_000
+    return math.sqrt(tf_ms / 60_000)
+
+
+class LevelMap:
+    """
+    Карта уровней одного символа
+
+    Гистограмма пивотов хранится на сетке с шагом bin_pct в логарифме
+    цены; сетка расширяется при выходе цены за её пределы. Уровни
+    пересчитываются лениво - при первом запросе после обновления.
+    """
+
+    def __init__(
+        self,
+        bin_pct: float = 0.001,
+        bandwidth: float = 3.0,
+        strength: int = PIVOT_STRENGTH,
+        min_strength: float = MIN_LEVEL_STRENGTH
+    ):
+        """
+        Args:
+            bin_pct: Ширина корзины (доля цены)
+            bandwidth: Сигма гауссова ядра в корзинах
+            strength: Баров с каждой стороны swing точки
+            min_strength: Минимальная плотность уровня относительно сильнейшего
+        """
+        self.step = math.log1p(bin_pct)
+        self.bandwidth = bandwidth
+        self.strength = strength
+        self.min_strength = min_strength
+        self.origin: Optional[int] = None
+        self.weights = np.zeros(0)
+        self.counts = np.zeros(0)
+        self.pivots = 0
+        self._last_ts: Dict[str, float] = {}
+        self._dirty = False
+        self._prices = np.empty(0)
+        self._strengths = np.empty(0)
+        self._touches = np.empty(0, dtype=np.int64)
+
+    def _bins(self, prices: np.ndarray) -> np.ndarray:
+        return np.floor(np.log(prices) / self.step).astype(np.int64)
+
+    def _extend(self, low_bin: int, high_bin: int) -> None:
+        """Расширить сетку до корзин [low_bin, high_bin]"""
+        if self.origin is None:
+            self.origin = low_bin
+            self.weights = np.zeros(high_bin - low_bin + 1)
+            self.counts = np.zeros(high_bin - low_bin + 1)
+            return
+        below = max(0, self.origin - low_bin)
+        above = max(0, high_bin - (self.origin + len(self.weights) - 1))
+        if below or above:
+            self.weights = np.concatenate([np.zeros(below), self.weights, np.zeros(above)])
+            self.counts = np.concatenate([np.zeros(below), self.counts, np.zeros(above)])
+            self.origin -= below
+
+    def add_levels(self, prices: Any, weight: float = 1.0) -> None:
+        """Добавить цены пивотов с весом weight"""
+        prices = np.asarray(prices, dtype=np.float64)
+        prices = prices[np.isfinite(prices) & (prices > 0)]
+        if len(prices) == 0:
+            return
+        bins = self._bins(prices)
+        self._extend(int(bins.min()), int(bins.max()))
+        index = bins - self.origin
+        self.weights += np.bincount(index, minlength=len(self.weights)) * weight
+        self.counts += np.bincount(index, minlength=len(self.counts))
+        self.pivots += len(prices)
+        self._dirty = True
+
+    def add_candles(self, candles: Any, timeframe: str = "1h") -> int:
+        """
+        Добавить пивоты закрытых баров (N, 6) [timestamp, open, high, low, close, volume]
+
+        Учитываются только бары новее уже обработанных для таймфрейма,
+        поэтому повторная передача перекрывающегося окна безопасна.
+
+        Returns:
+            Число добавленных пивотов
+        """
+        candles = np.asarray(candles, dtype=np.float64).reshape(-1, 6)
+        evaluated = len(candles) - self.strength
+        if evaluated <= self.strength:
+            return 0
+        ts = candles[:, 0]
+        last = self._last_ts.get(timeframe)
+        if last is not None and ts[evaluated - 1] <= last:
+            # Нового закрытого бара нет (повторный анализ того же окна) - swing'и не ищем
+            return 0
+        highs = StructureAnalyzer._swing_points(candles[:, 2], self.strength, self.strength, highs=True)
+        lows = StructureAnalyzer._swing_points(candles[:, 3], self.strength, self.strength, highs=False)
+
+        if last is not None:
+            highs = highs[ts[highs] > last]
+            lows = lows[ts[lows] > last]
+        # Последний бар, для которого swing уже определён (справа есть strength баров)
+        self._last_ts[timeframe] = max(float(ts[evaluated - 1]), last if last is not None else -np.inf)
+
+        prices = np.concatenate([candles[highs, 2], candles[lows, 3]])
+        self.add_levels(prices, timeframe_weight(timeframe))
+        return len(prices)
+
+    def _recompute(self) -> None:
+        """Сглаживание гистограммы и поиск пиков плотности"""
+        self._dirty = False
+        if len(self.weights) == 0:
+            return
+        radius = int(math.ceil(3 * self.bandwidth))
+        kernel = np.exp(-0.5 * (np.arange(-radius, radius + 1) / self.bandwidth) ** 2)
+        padded = np.pad(self.weights, radius)
+        density = np.convolve(padded, kernel, mode="same")
+        # Пики: строго выше левого соседа и не ниже правого (плато даёт один пик)
+        is_peak = (density[1:-1] > density[:-2]) & (density[1:-1] >= density[2:])
+        peaks = np.flatnonzero(is_peak) + 1
+        peaks = peaks[density[peaks] > 0]
+        strengths = density[peaks] / density[peaks].max() if len(peaks) else np.empty(0)
+        peaks = peaks[strengths >= self.min_strength]
+
+        self._prices = np.exp((self.origin - radius + peaks + 0.5) * self.step)
+        self._strengths = strengths[strengths >= self.min_strength]
+        # Пивоты в пределах ядра вокруг пика (префиксные суммы в координатах density)
+        filled = np.concatenate([[0.0], np.cumsum(np.pad(self.counts, radius))])
+        upper = np.minimum(peaks + radius + 1, len(filled) - 1)
+        self._touches = (filled[upper] - filled[np.maximum(peaks - radius, 0)]).astype(np.int64)
+
+    def _level(self, i: int) -> Dict[str, Any]:
+        return {
+            "price": float(self._prices[i]),
+            "strength": round(float(self._strengths[i]), 3),
+            "touches": int(self._touches[i])
+        }
+
+    def levels(self) -> List[Dict[str, Any]]:
+        """Все уровни по возрастанию цены"""
+        if self._dirty:
+            self._recompute()
+        return [self._level(i) for i in range(len(self._prices))]
+
+    def nearest_below(self, price: float) -> Optional[Dict[str, Any]]:
+        """Ближайший уровень ниже цены (O(log n))"""
+        if self._dirty:
+            self._recompute()
+        i = int(np.searchsorted(self._prices, price, side="left")) - 1
+        return self._level(i) if i >= 0 else None
+
+    def nearest_above(self, price: float) -> Optional[Dict[str, Any]]:
+        """Ближайший уровень выше цены (O(log n))"""
+        if self._dirty:
+            self._recompute()
+        i = int(np.searchsorted(self._prices, price, side="right"))
+        return self._level(i) if i < len(self._prices) else None
+
+    def support_resistance(self, price: float, count: int = 5) -> Dict[str, List[float]]:
+        """count ближайших уровней ниже (support) и выше (resistance) цены, по возрастанию"""
+        if self._dirty:
+            self._recompute()
+        below = int(np.searchsorted(self._prices, price, side="left"))
+        above = int(np.searchsorted(self._prices, price, side="right"))
+        return {
+            "support": [float(x) for x in self._prices[max(0, below - count):below]],
+            "resistance": [float(x) for x in self._prices[above:above + count]]
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        if self._dirty:
+            self._recompute()
+        return {
+            "pivots": self.pivots,
+            "bins": len(self.weights),
+            "levels": len(self._prices),
+            "timeframes": sorted(self._last_ts)
+        }
+
+
+class LevelEngine:
+    """
+    Карты уровней по символам (LRU)
+
+    Обновляется из анализа таймфреймов; Thread-safe.
+    """
+
+    def __init__(self, max_symbols: int = 500):
+        self.max_symbols = max_symbols
+        self._maps: "OrderedDict[str, LevelMap]" = OrderedDict()
+        self._lock = threading.Lock()
+        logger.info(f"Level engine initialized (max_symbols={max_symbols})")
+
+    def update(self, symbol: str, timeframe: str, candles: Any) -> LevelMap:
+        """Добавить закрытые бары таймфрейма в карту символа"""
+        with self._lock:
+            level_map = self._maps.get(symbol)
+            if level_map is None:
+                level_map = LevelMap()
+                self._maps[symbol] = level_map
+                while len(self._maps) > self.max_symbols:
+                    self._maps.popitem(last=False)
+            self._maps.move_to_end(symbol)
+            level_map.add_candles(candles, timeframe)
+            return level_map
+
+    def get(self, symbol: str) -> Optional[LevelMap]:
+        """Карта символа (None если ещё не строилась)"""
+        with self._lock:
+            return self._maps.get(symbol)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"symbols": len(self._maps), "max_symbols": self.max_symbols}
+
+
+# Глобальный экземпляр
+_level_engine: Optional[LevelEngine] = None
+
+
+def get_level_engine() -> LevelEngine:
+    """Получить глобальный движок уровней"""
+    global _level_engine
+    if _level_engine is None:
+        _level_engine = LevelEngine()
+    return _level_engine
@@ -4,7 +4,10 @@ Market Scanner
 """
 
 import asyncio
+import os
 from typing import Dict, List, Any, Optional
+
+import numpy as np
 from loguru import logger
 
 # Импорты для advanced features
@@ -12,10 +15,26 @@ try:
     from .whale_detector import WhaleDetector
     from .volume_profile import VolumeProfileAnalyzer
     from .session_manager import SessionManager
+    from .rate_limiter import get_scan_concurrency
+    from .kline_stream import KlineStream
+    from .orderbook_stream import OrderBookStream
+    from .trade_tape import TradeTape
+    from .indicator_engine import compute_indicators_stack
+    from .staged_scan import (
+        PROMOTION_MARGIN, SMC_SECTIONS, StageStats, staged_scan_enabled, upper_bound, without_sections
+    )
 except ImportError:
     from whale_detector import WhaleDetector
     from volume_profile import VolumeProfileAnalyzer
     from session_manager import SessionManager
+    from rate_limiter import get_scan_concurrency
+    from kline_stream import KlineStream
+    from orderbook_stream import OrderBookStream
+    from trade_tape import TradeTape
+    from indicator_engine import compute_indicators_stack
+    from staged_scan import (
+        PROMOTION_MARGIN, SMC_SECTIONS, StageStats, staged_scan_enabled, upper_bound, without_sections
+    )
 
 # NEW: Institutional modules imports
 try:
@@ -38,6 +57,18 @@ except ImportError:
     MLProbabilityPredictor = None
 
 
+# Свечей 4h на символ для предфильтра (столько же загружает analyze_asset)
+PREFILTER_BARS = 200
+
+
+def get_prefilter_pool(default: int = 300) -> int:
+    """Сколько тикеров (топ по объёму) проходит векторный предфильтр (BYBIT_SCAN_PREFILTER_POOL env)"""
+    try:
+        return max(1, int(os.getenv("BYBIT_SCAN_PREFILTER_POOL", str(default))))
+    except ValueError:
+        return default
+
+
 class MarketScanner:
     """Сканер рынка для поиска торговых возможностей"""
     
@@ -50,6 +81,10 @@ class MarketScanner:
         self.volume_profile = VolumeProfileAnalyzer(bybit_client)
         self.session_manager = SessionManager()
         
+        # Поэтапная оценка кандидатов: накопленные счётчики отсечений по этапам
+        self.staged_scan = staged_scan_enabled()
+        self.stage_stats = StageStats()
+        
         # NEW: Institutional modules
         self.tier_classifier = TierClassifier()
         self.regime_detector = RegimeDetector()
@@ -207,12 +242,53 @@ class MarketScanner:
                 
                 filtered.append(ticker)
             
+            # Индикаторные критерии проверяются сразу для всего пула одним векторным расчётом,
+            # поэтому детальный анализ получают только подходящие тикеры
+            indicator_criteria = criteria.get('indicators', {})
+            if indicator_criteria:
+                filtered = await self._prefilter_by_indicators(filtered[:get_prefilter_pool()], indicator_criteria)
+            
             # Детальный анализ для отфильтрованных с параллелизацией
             # Ограничиваем количество для анализа (топ по объёму)
             candidates = filtered[:min(limit * 5, 100)]  # Максимум 100 кандидатов (было 50)
             
+            # Подписываем кандидатов на поток свечей - следующие сканы читают их из буфера
+            kline_stream = getattr(self.client, "kline_stream", None)
+            if isinstance(kline_stream, KlineStream) and kline_stream.enabled:
+                await self.client.start_kline_stream([t['symbol'] for t in candidates], ["1h", "4h"])
+            
+            # Локальные стаканы кандидатов: whale-анализ стакана больше не требует REST запроса
+            if criteria.get('include_whale_analysis', False) and self._orderbook_stream() is not None:
+                await self.client.start_orderbook_stream([t['symbol'] for t in candidates])
+            
+            # Лента сделок кандидатов: CVD и крупные сделки читаются из буфера
+            trade_tape = getattr(self.client, "trade_tape", None)
+            if isinstance(trade_tape, TradeTape) and trade_tape.enabled:
+                await self.client.start_trade_tape([t['symbol'] for t in candidates])
+            
+            # Корреляции кандидатов с открытыми позициями: одна матрица на весь скан,
+            # дальше проверка пары - поиск в матрице без запросов к бирже.
+            # Без позиций корреляцию с BTC грузит этап order_flow только для прошедших отсечение
+            correlations = None
+            if open_positions_symbols:
+                correlations = self.ta.correlation_matrix()
+                await correlations.ensure([t['symbol'] for t in candidates] + open_positions_symbols)
+            
+            # Get regime and adaptive thresholds
+            # (до анализа кандидатов: поэтапная оценка отсекает тех, кто не дотягивает до порога)
+            btc_full = await self.ta.analyze_asset("BTC/USDT", timeframes=["1h", "4h", "1d"])
+            market_regime = self.regime_detector.detect(btc_full)
+            adaptive_thresholds = AdaptiveThresholds.calculate(market_regime)
+            
+            logger.info(
+                f"Regime: {market_regime['type']}, "
+                f"Thresholds: LONG={adaptive_thresholds['long']:.1f}, SHORT={adaptive_thresholds['short']:.1f}"
+            )
+            stage_stats = StageStats()
+            
             # Параллельный анализ с ограничением одновременных запросов
-            semaphore = asyncio.Semaphore(10)  # Максимум 10 параллельно (было 5)
+            # Скорость запросов ограничивает общий RateLimiter, семафор - только число одновременных анализов
+            semaphore = asyncio.Semaphore(get_scan_concurrency())
             
             async def analyze_ticker(ticker: Dict[str, Any]) -> Optional[Dict[str, Any]]:
                 """Анализ одного тикера с обработкой ошибок"""
@@ -231,10 +307,10 @@ class MarketScanner:
                 async with semaphore:
                     try:
                         # Correlation Check
-                        if open_positions_symbols:
+                        if correlations is not None:
                             is_correlated = False
                             for pos_symbol in open_positions_symbols:
-                                corr = await self.ta.get_correlation(ticker['symbol'], pos_symbol)
+                                corr = correlations.correlation(ticker['symbol'], pos_symbol) or 0.0
                                 if corr > 0.7:
                                     # logger.debug(f"Skipping {ticker['symbol']} - high correlation ({corr:.2f}) with {pos_symbol}")
                                     is_correlated = True
@@ -242,62 +318,9 @@ class MarketScanner:
                             if is_correlated:
                                 return None
 
-                        analysis = await self.ta.analyze_asset(
-                            ticker['symbol'],
-                            timeframes=["1h", "4h"],
-                            include_patterns=True
+                        return await self._evaluate_ticker(
+                            ticker, criteria, btc_trend, account_balance, adaptive_thresholds, stage_stats
                         )
-                        
-                        # Проверка индикаторных критериев
-                        indicator_criteria = criteria.get('indicators', {})
-                        if not self._check_indicator_criteria(analysis, indicator_criteria):
-                            return None
-                        
-                        # Whale Analysis (опционально, если enabled и volume достаточен)
-                        enable_whale_analysis = criteria.get('include_whale_analysis', False)
-                        if enable_whale_analysis and ticker.get('volume_24h', 0) > 5000000:
-                            try:
-                                whale_data = await self.whale_detector.detect_whale_activity(ticker['symbol'])
-                                analysis['whale_analysis'] = whale_data
-                                logger.debug(f"Whale analysis added for {ticker['symbol']}")
-                            except Exception as e:
-                                logger.warning(f"Failed whale analysis for {ticker['symbol']}: {e}")
-                        
-                        # Volume Profile (для топ по volume или если enabled)
-                        enable_volume_profile = criteria.get('include_volume_profile', False)
-                        if enable_volume_profile or (enable_whale_analysis and ticker.get('volume_24h', 0) > 5000000):
-                            try:
-                                vp_data = await self.volume_profile.calculate_volume_profile(
-                                    ticker['symbol'],
-                                    timeframe="4h"
-                                )
-                                # Добавляем VP в h4 data для использования в scoring
-                                if '4h' in analysis.get('timeframes', {}):
-                                    analysis['timeframes']['4h']['volume_profile'] = vp_data
-                                logger.debug(f"Volume profile added for {ticker['symbol']}")
-                            except Exception as e:
-                                logger.warning(f"Failed volume profile for {ticker['symbol']}: {e}")
-                        
-                        # Entry plan (FIRST) - Pass account_balance
-                        # ВАЖНО: Если баланс недоступен, entry_plan будет с предупреждением
-                        entry_plan = self._generate_entry_plan(analysis, ticker, account_balance)
-                        
-                        # Scoring (SECOND) - Pass risk_reward from plan
-                        score_data = self._calculate_opportunity_score(analysis, ticker, btc_trend, entry_plan)
-                        score = score_data["total"]
-                        
-                        return {
-                            "symbol": ticker['symbol'],
-                            "current_price": ticker['price'],
-                            "change_24h": ticker['change_24h'],
-                            "volume_24h": ticker['volume_24h'],
-                            "score": score,
-                            "score_breakdown": score_data["breakdown"],
-                            "probability": self._estimate_probability(score, analysis),
-                            "entry_plan": entry_plan,
-                            "analysis": analysis,
-                            "why": self._generate_reasoning(analysis, score)
-                        }
                     except Exception as e:
                         logger.warning(f"Error analyzing {ticker['symbol']}: {e}")
                         return None
@@ -306,6 +329,10 @@ class MarketScanner:
             tasks = [analyze_ticker(ticker) for ticker in candidates]
             results = await asyncio.gather(*tasks, return_exceptions=True)
             
+            if self.staged_scan:
+                stage_stats.log_summary()
+                self.stage_stats.merge(stage_stats)
+            
             # Фильтруем успешные результаты и исключения
             opportunities = []
             for result in results:
@@ -322,16 +349,6 @@ class MarketScanner:
             # NEW: Institutional pipeline - NO HARD FILTERING!
             # ═══════════════════════════════════════════════════════
             
-            # Get regime and adaptive thresholds
-            btc_full = await self.ta.analyze_asset("BTC/USDT", timeframes=["1h", "4h", "1d"])
-            market_regime = self.regime_detector.detect(btc_full)
-            adaptive_thresholds = AdaptiveThresholds.calculate(market_regime)
-            
-            logger.info(
-                f"Regime: {market_regime['type']}, "
-                f"Thresholds: LONG={adaptive_thresholds['long']:.1f}, SHORT={adaptive_thresholds['short']:.1f}"
-            )
-            
             # Normalize ALL scores immediately (20-point → 10-point)
             for opp in opportunities:
                 raw_score = opp.get("score", 0)
@@ -504,6 +521,7 @@ class MarketScanner:
                 "tier_distribution": tier_distribution,
                 "total_scanned": len(candidates),
                 "total_analyzed": len(opportunities),
+                "stage_stats": stage_stats.get_stats() if self.staged_scan else None,
                 "error": None,
                 "scanned_count": len(candidates),  # Backward compatibility
                 "found_count": len(final_opportunities)  # Backward compatibility
@@ -520,6 +538,121 @@ class MarketScanner:
                 "found_count": 0
             }
     
+    async def _evaluate_ticker(
+        self,
+        ticker: Dict[str, Any],
+        criteria: Dict[str, Any],
+        btc_trend: str,
+        account_balance: Optional[float],
+        thresholds: Dict[str, Any],
+        stage_stats: StageStats
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Оценка кандидата сканера
+        
+        При staged_scan этапы выполняются от дешёвых к дорогим (см. staged_scan):
+        после каждого кандидат отсекается, если верхняя граница его score
+        ниже адаптивного порога направления (с запасом PROMOTION_MARGIN).
+        
+        Returns:
+            Возможность для scan_market или None (не прошёл критерии / отсечён)
+        """
+        symbol = ticker['symbol']
+        staged = self.staged_scan
+        
+        analysis = await self.ta.analyze_asset(
+            symbol,
+            timeframes=["1h", "4h"],
+            include_patterns=True,
+            include_order_flow=not staged
+        )
+        
+        # Проверка индикаторных критериев
+        indicator_criteria = criteria.get('indicators', {})
+        if not self._check_indicator_criteria(analysis, indicator_criteria):
+            if staged:
+                stage_stats.record("indicators", pruned=True)
+            return None
+        
+        # Whale Analysis (опционально, если enabled и volume достаточен)
+        enable_whale_analysis = criteria.get('include_whale_analysis', False)
+        # С локальным стаканом анализ дешёвый - выполняем для любого объёма
+        run_whale = enable_whale_analysis and (ticker.get('volume_24h', 0) > 5000000 or self._has_live_orderbook(symbol))
+        # Volume Profile (для топ по volume или если enabled)
+        enable_volume_profile = criteria.get('include_volume_profile', False)
+        run_volume_profile = enable_volume_profile or (enable_whale_analysis and ticker.get('volume_24h', 0) > 5000000)
+        
+        # Entry plan (FIRST) - Pass account_balance
+        # ВАЖНО: Если баланс недоступен, entry_plan будет с предупреждением
+        # План строится по индикаторам и уровням, whale/VP на него не влияют
+        entry_plan = self._generate_entry_plan(analysis, ticker, account_balance)
+        
+        if staged:
+            extended = bool(run_whale or run_volume_profile)
+            
+            def pruned(stage: str, view: Dict) -> bool:
+                partial = self._calculate_opportunity_score(view, ticker, btc_trend, entry_plan, partial=True)
+                bound = upper_bound(partial["total"], stage, extended)
+                bar = thresholds.get(entry_plan.get("side", "long"), 7.0) - PROMOTION_MARGIN
+                stage_stats.record(stage, pruned=bound < bar)
+                if bound < bar:
+                    logger.debug(f"{symbol}: pruned after {stage} (upper bound {bound:.2f} < {bar:.2f})")
+                return bound < bar
+            
+            # Индикаторы: SMC секции не читаются (ленивые - не считаются)
+            if pruned("indicators", without_sections(analysis, SMC_SECTIONS)):
+                return None
+            await self.ta.resolve_sections(analysis, SMC_SECTIONS)
+            if pruned("smc", analysis):
+                return None
+            analysis.update(await self.ta.analyze_order_flow(symbol))
+            if pruned("order_flow", analysis):
+                return None
+            if extended:
+                stage_stats.record("extended")
+        
+        if run_whale:
+            try:
+                whale_data = await self.whale_detector.detect_whale_activity(symbol)
+                analysis['whale_analysis'] = whale_data
+                logger.debug(f"Whale analysis added for {symbol}")
+            except Exception as e:
+                logger.warning(f"Failed whale analysis for {symbol}: {e}")
+        
+        if run_volume_profile:
+            try:
+                vp_data = await self.volume_profile.calculate_volume_profile(
+                    symbol,
+                    timeframe="4h"
+                )
+                # Добавляем VP в h4 data для использования в scoring
+                if '4h' in analysis.get('timeframes', {}):
+                    analysis['timeframes']['4h']['volume_profile'] = vp_data
+                logger.debug(f"Volume profile added for {symbol}")
+            except Exception as e:
+                logger.warning(f"Failed volume profile for {symbol}: {e}")
+        
+        # Анализ уходит в результат скана (его сериализуют в event loop) -
+        # несчитанные ленивые секции досчитываются в пуле
+        await self.ta.resolve_sections(analysis)
+        
+        # Scoring (SECOND) - Pass risk_reward from plan
+        score_data = self._calculate_opportunity_score(analysis, ticker, btc_trend, entry_plan)
+        score = score_data["total"]
+        
+        return {
+            "symbol": symbol,
+            "current_price": ticker['price'],
+            "change_24h": ticker['change_24h'],
+            "volume_24h": ticker['volume_24h'],
+            "score": score,
+            "score_breakdown": score_data["breakdown"],
+            "probability": self._estimate_probability(score, analysis),
+            "entry_plan": entry_plan,
+            "analysis": analysis,
+            "why": self._generate_reasoning(analysis, score)
+        }
+    
     @staticmethod
     def _is_stable_stable_pair(symbol: str) -> bool:
         """
@@ -560,6 +693,83 @@ class MarketScanner:
         
         return False
     
+    def _orderbook_stream(self) -> Optional[OrderBookStream]:
+        """Поток локальных стаканов клиента (если включён)"""
+        stream = getattr(self.client, "orderbook_stream", None)
+        if isinstance(stream, OrderBookStream) and stream.enabled:
+            return stream
+        return None
+    
+    def _has_live_orderbook(self, symbol: str) -> bool:
+        """Есть ли синхронизированный локальный стакан для символа"""
+        return self._orderbook_stream() is not None and self.client.has_live_orderbook(symbol)
+    
+    async def _prefilter_by_indicators(
+        self,
+        tickers: List[Dict[str, Any]],
+        criteria: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """
+        Векторная предфильтрация тикеров по индикаторным критериям (4h)
+        
+        Свечи 4h всех тикеров складываются в массив (символы x бары x OHLCV)
+        и индикаторы считаются одним вызовом compute_indicators_stack.
+        Тикеры без полной истории не отбрасываются - их проверит полный анализ.
+        """
+        if not tickers:
+            return tickers
+        
+        semaphore = asyncio.Semaphore(get_scan_concurrency())
+        
+        async def load(symbol: str) -> Optional[List[List]]:
+            async with semaphore:
+                try:
+                    return await self.client.get_ohlcv(symbol, "4h", limit=PREFILTER_BARS)
+                except Exception as e:
+                    logger.debug(f"Prefilter: no 4h candles for {symbol}: {e}")
+                    return None
+        
+        candles = await asyncio.gather(*(load(t['symbol']) for t in tickers))
+        complete = [i for i, c in enumerate(candles) if c is not None and len(c) == PREFILTER_BARS]
+        if not complete:
+            return tickers
+        
+        stack = np.array([candles[i] for i in complete], dtype=np.float64)
+        passed = self._indicator_criteria_mask(compute_indicators_stack(stack), criteria)
+        rejected = {complete[j] for j in np.flatnonzero(~passed)}
+        
+        logger.info(
+            f"Indicator prefilter: {len(tickers) - len(rejected)}/{len(tickers)} tickers passed "
+            f"({len(complete)} evaluated)"
+        )
+        return [t for i, t in enumerate(tickers) if i not in rejected]
+    
+    @staticmethod
+    def _indicator_criteria_mask(batch: Dict[str, np.ndarray], criteria: Dict) -> np.ndarray:
+        """Векторная версия _check_indicator_criteria по результату compute_indicators_batch"""
+        mask = np.ones(len(batch['close']), dtype=bool)
+        
+        # RSI range
+        rsi_range = criteria.get('rsi_range')
+        if rsi_range:
+            rsi = batch['rsi_14']
+            mask &= ~((rsi < rsi_range[0]) | (rsi > rsi_range[1]))
+        
+        # MACD crossover
+        macd_cross = criteria.get('macd_crossover')
+        if macd_cross:
+            actual_cross = np.where(batch['macd_line'] > batch['signal_line'], 'bullish', 'bearish')
+            mask &= actual_cross == macd_cross
+        
+        # Price vs EMA50
+        price_vs_ema = criteria.get('price_vs_ema50')
+        if price_vs_ema == 'above':
+            mask &= ~(batch['close'] <= batch['ema_50'])
+        elif price_vs_ema == 'below':
+            mask &= ~(batch['close'] >= batch['ema_50'])
+        
+        return mask
+    
     def _check_indicator_criteria(self, analysis: Dict, criteria: Dict) -> bool:
         """Проверка индикаторных критериев"""
         
@@ -598,11 +808,13 @@ class MarketScanner:
         return True
     
     
-    def _calculate_opportunity_score(self, analysis: Dict, ticker: Dict, btc_trend: str = "neutral", entry_plan: Dict = None) -> Dict[str, Any]:
+    def _calculate_opportunity_score(self, analysis: Dict, ticker: Dict, btc_trend: str = "neutral", entry_plan: Dict = None, partial: bool = False) -> Dict[str, Any]:
         """
         20-POINT CONFLUENCE MATRIX с PENALTIES для слабых сигналов
         
         ВАЖНО: Penalties применяются ПЕРЕД основным scoring!
+        partial=True - промежуточная оценка этапа сканера (без логирования),
+        отсутствующие в analysis компоненты дают 0.
         """
         score = 0.0
         breakdown = {}
@@ -925,13 +1137,13 @@ class MarketScanner:
         
         # Логируем финальный score с penalties
         symbol = ticker.get('symbol', 'UNKNOWN')
-        if penalties:
+        if penalties and not partial:
             logger.info(
                 f"{symbol}: Applied {len(penalties)} penalties, "
                 f"total: {breakdown.get('penalties_total', 0):.1f}, "
                 f"final score: {final_score:.2f}/20"
             )
-        else:
+        elif not partial:
             logger.info(f"{symbol}: 20-point score = {final_score:.2f}/20")
         
         return {
@@ -1200,6 +1412,26 @@ class MarketScanner:
             take_profit = current_price + (atr * 4)
             side = "long"
         
+        # Уровни карты символа: стоп за ближайшим уровнем, цель перед встречным
+        stop_anchor = "atr"
+        level_map = self.ta.level_engine.get(ticker['symbol']) if hasattr(self.ta, "level_engine") else None
+        support = level_map.nearest_below(current_price) if level_map else None
+        resistance = level_map.nearest_above(current_price) if level_map else None
+        if is_short:
+            if resistance and resistance['price'] - current_price <= atr * 3:
+                level_stop = resistance['price'] + atr * 0.5
+                if level_stop > stop_loss:
+                    stop_loss, stop_anchor = level_stop, "level"
+            if support and take_profit < support['price'] < current_price - atr:
+                take_profit = support['price'] + atr * 0.1
+        else:
+            if support and current_price - support['price'] <= atr * 3:
+                level_stop = support['price'] - atr * 0.5
+                if level_stop < stop_loss:
+                    stop_loss, stop_anchor = level_stop, "level"
+            if resistance and current_price + atr < resistance['price'] < take_profit:
+                take_profit = resistance['price'] - atr * 0.1
+        
         risk_per_share = abs(current_price - stop_loss)
         reward_per_share = abs(take_profit - current_price)
         risk_reward = reward_per_share / risk_per_share if risk_per_share > 0 else 0
@@ -1244,7 +1476,10 @@ class MarketScanner:
             "max_risk_allowed": round(risk_usd, 2),
             "leverage_hint": "Use 1x-3x max",
             "position_size_calc": f"Risk ${risk_usd:.2f} / Stop Dist {risk_per_share:.4f} = {qty} units" if account_balance else "BALANCE UNAVAILABLE - CANNOT CALCULATE",
-            "entry_timeframe": "5m"  # По умолчанию для скальпинга (может быть переопределен)
+            "entry_timeframe": "5m",  # По умолчанию для скальпинга (может быть переопределен)
+            "stop_anchor": stop_anchor,
+            "nearest_support": support['price'] if support else None,
+            "nearest_resistance": resistance['price'] if resistance else None
         }
         
         if warning:
@@ -1492,7 +1727,7 @@ class MarketScanner:
             ][:100]
             
             # Parallel analysis
-            semaphore = asyncio.Semaphore(10)
+            semaphore = asyncio.Semaphore(get_scan_concurrency())
             
             async def check_breakout(ticker: Dict[str, Any]) -> Optional[Dict[str, Any]]:
                 """Check one ticker for BB squeeze"""
@@ -1511,6 +1746,7 @@ class MarketScanner:
                         if bb.get('squeeze', False):
                             # Generate entry plan before scoring
                             entry_plan = self._generate_entry_plan(analysis, ticker, account_balance)
+                            await self.ta.resolve_sections(analysis, SMC_SECTIONS)
                             
                             # Calculate score
                             score_data = self._calculate_opportunity_score(analysis, ticker, btc_trend, entry_plan)
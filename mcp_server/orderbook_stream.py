@@ -0,0 +1,319 @@
+"""
+Order Book Stream
+Локальный L2 стакан, собираемый из snapshot/delta сообщений orderbook.{depth}.{symbol}
+С проверкой последовательности обновлений и автоматической пересинхронизацией
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from pybit.unified_trading import WebSocket
+from loguru import logger
+
+# Условный импорт для поддержки как пакета, так и прямого запуска
+try:
+    from .kline_stream import to_exchange_symbol, category_of, MAX_TOPICS_PER_REQUEST
+except ImportError:
+    from kline_stream import to_exchange_symbol, category_of, MAX_TOPICS_PER_REQUEST
+
+
+EMPTY_LEVELS = np.empty((0, 2))
+EMPTY_LEVELS.flags.writeable = False
+
+
+def _to_levels(entries: List[List[str]]) -> np.ndarray:
+    """[[price, size], ...] (строки Bybit) -> массив (N, 2) float64"""
+    if not entries:
+        return EMPTY_LEVELS
+    return np.asarray(entries, dtype=np.float64).reshape(-1, 2)
+
+
+def apply_levels(levels: np.ndarray, updates: np.ndarray, descending: bool, depth: int) -> np.ndarray:
+    """
+    Применить изменения уровней к стороне стакана
+
+    Размер 0 удаляет уровень, иначе уровень вставляется или обновляется.
+    Всегда возвращает новый массив (старый не меняется - читатели могут
+    держать ссылки на предыдущую версию без копирования).
+    """
+    if len(updates) == 0:
+        return levels
+
+    merged = np.concatenate([levels, updates])
+    price_key = -merged[:, 0] if descending else merged[:, 0]
+    # Сортировка по цене, при равной цене - по позиции (обновление идёт последним)
+    order = np.lexsort((np.arange(len(merged)), price_key))
+    merged = merged[order]
+
+    is_last = np.append(merged[1:, 0] != merged[:-1, 0], True)
+    merged = merged[is_last]
+    merged = merged[merged[:, 1] > 0][:depth]
+
+    merged = np.ascontiguousarray(merged)
+    merged.flags.writeable = False
+    return merged
+
+
+class LocalOrderBook:
+    """
+    L2 стакан одного символа
+
+    bids отсортированы по убыванию цены, asks - по возрастанию.
+    Массивы неизменяемы: каждое обновление создаёт новые, поэтому
+    top() отдаёт срезы без копирования.
+    """
+
+    def __init__(self, symbol: str, depth: int = 50):
+        self.symbol = symbol
+        self.depth = depth
+        self.bids: np.ndarray = EMPTY_LEVELS
+        self.asks: np.ndarray = EMPTY_LEVELS
+        self.update_id: Optional[int] = None
+        self.synced = False
+        self.updated_at = 0.0
+
+    def apply(self, message: Dict[str, Any]) -> bool:
+        """
+        Применить snapshot или delta сообщение
+
+        Returns:
+            False если последовательность нарушена (нужна пересинхронизация)
+        """
+        data = message.get("data", {})
+        update_id = data.get("u")
+        msg_type = message.get("type")
+
+        # u=1 - снимок после перезапуска сервиса Bybit, всегда перезаписываем книгу
+        if msg_type == "snapshot" or update_id == 1:
+            bids = apply_levels(EMPTY_LEVELS, _to_levels(data.get("b", [])), True, self.depth)
+            asks = apply_levels(EMPTY_LEVELS, _to_levels(data.get("a", [])), False, self.depth)
+            self.bids, self.asks = bids, asks
+            self.update_id = update_id
+            self.synced = True
+            self.updated_at = time.time()
+            return True
+
+        if not self.synced:
+            # Delta до снимка - ждём снимок
+            return True
+
+        if self.update_id is not None and update_id is not None and update_id != self.update_id + 1:
+            logger.warning(
+                f"Order book sequence gap for {self.symbol}: expected u={self.update_id + 1}, got u={update_id}"
+            )
+            self.synced = False
+            return False
+
+        self.bids = apply_levels(self.bids, _to_levels(data.get("b", [])), True, self.depth)
+        self.asks = apply_levels(self.asks, _to_levels(data.get("a", [])), False, self.depth)
+        self.update_id = update_id
+        self.updated_at = time.time()
+
+        # Перекрещенный стакан означает потерянное обновление
+        if len(self.bids) and len(self.asks) and self.bids[0, 0] >= self.asks[0, 0]:
+            logger.warning(f"Crossed order book for {self.symbol}, resyncing")
+            self.synced = False
+            return False
+        return True
+
+    def top(self, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Верхние n уровней (bids, asks) - read-only срезы без копирования"""
+        bids, asks = self.bids, self.asks
+        return bids[:n], asks[:n]
+
+    def to_dict(self, limit: int) -> Dict[str, Any]:
+        """Стакан в формате BybitClient.get_orderbook"""
+        bids, asks = self.top(limit)
+        bid_price = float(bids[0, 0]) if len(bids) else None
+        ask_price = float(asks[0, 0]) if len(asks) else None
+        return {
+            "symbol": self.symbol,
+            "bids": bids.tolist(),
+            "asks": asks.tolist(),
+            "timestamp": datetime.fromtimestamp(self.updated_at).isoformat(),
+            "bid_price": bid_price,
+            "ask_price": ask_price,
+            "spread": (ask_price - bid_price) if (bid_price is not None and ask_price is not None) else None,
+            "source": "websocket"
+        }
+
+
+class _OrderBookWebSocket(WebSocket):
+    """
+    pybit WebSocket, передающий сырые snapshot/delta сообщения стакана
+
+    Штатная обработка pybit собирает книгу сама и копирует её целиком
+    на каждое сообщение - нам нужны исходные дельты с номером обновления.
+    """
+
+    def _process_normal_message(self, message):
+        callback = self._get_callback(message["topic"])
+        callback(message)
+
+    def resubscribe_topic(self, topic: str) -> None:
+        """Переподписка на один топик - биржа пришлёт новый снимок"""
+        self.ws.send(json.dumps({"op": "unsubscribe", "args": [topic]}))
+        self.ws.send(json.dumps({"op": "subscribe", "args": [topic]}))
+
+
+class OrderBookStream:
+    """
+    Сервис локальных стаканов для набора символов
+
+    Сообщения обрабатываются в потоке WebSocket. При разрыве
+    последовательности книга помечается несинхронизированной и
+    топик переподписывается; до нового снимка читатели получают None
+    (и BybitClient использует REST).
+    """
+
+    def __init__(
+        self,
+        testnet: bool = False,
+        category: str = "spot",
+        depth: int = 50,
+        enabled: Optional[bool] = None
+    ):
+        """
+        Args:
+            testnet: Использовать testnet
+            category: Категория публичного потока ("spot", "linear")
+            depth: Глубина стакана (1, 50, 200 для spot)
+            enabled: Включить поток (если None - проверяет ENABLE_ORDERBOOK_STREAM env)
+        """
+        self.testnet = testnet
+        self.category = category
+        self.depth = depth
+
+        if enabled is None:
+            stream_env = os.getenv("ENABLE_ORDERBOOK_STREAM", "true").lower()
+            self.enabled = stream_env in ("true", "1", "yes")
+        else:
+            self.enabled = enabled
+
+        self.ws = None
+        self._lock = threading.Lock()
+        self._books: Dict[str, LocalOrderBook] = {}  # BTCUSDT -> книга
+        self._symbol_map: Dict[str, str] = {}  # BTC/USDT -> BTCUSDT
+        self._stats = {"messages": 0, "resyncs": 0, "reads": 0}
+
+    async def subscribe(self, symbols: List[str]) -> int:
+        """
+        Подписаться на стаканы символов
+
+        Returns:
+            Количество новых подписок
+        """
+        if not self.enabled:
+            return 0
+
+        new_symbols = []
+        with self._lock:
+            for symbol in symbols:
+                # Стакан BTCUSDT spot не является стаканом BTC/USDT:USDT
+                if symbol in self._symbol_map or category_of(symbol) != self.category:
+                    continue
+                exchange_symbol = to_exchange_symbol(symbol)
+                self._symbol_map[symbol] = exchange_symbol
+                if exchange_symbol not in self._books:
+                    self._books[exchange_symbol] = LocalOrderBook(symbol, self.depth)
+                    new_symbols.append(exchange_symbol)
+
+        if not new_symbols:
+            return 0
+
+        try:
+            await asyncio.to_thread(self._subscribe_blocking, new_symbols)
+        except Exception as e:
+            logger.error(f"Order book stream subscription failed: {e}")
+            with self._lock:
+                for symbol in [s for s, ex in self._symbol_map.items() if ex in new_symbols]:
+                    del self._symbol_map[symbol]
+                for exchange_symbol in new_symbols:
+                    self._books.pop(exchange_symbol, None)
+            return 0
+
+        logger.info(f"Order book stream subscribed to {len(new_symbols)} symbols (depth {self.depth})")
+        return len(new_symbols)
+
+    def _subscribe_blocking(self, exchange_symbols: List[str]) -> None:
+        """Создать WebSocket (если нужно) и подписаться пачками"""
+        if self.ws is None:
+            self.ws = _OrderBookWebSocket(testnet=self.testnet, channel_type=self.category)
+        for i in range(0, len(exchange_symbols), MAX_TOPICS_PER_REQUEST):
+            self.ws.orderbook_stream(
+                depth=self.depth,
+                symbol=exchange_symbols[i:i + MAX_TOPICS_PER_REQUEST],
+                callback=self._handle_message
+            )
+
+    def _handle_message(self, message: Dict[str, Any]) -> None:
+        """Обработка сообщения стакана (поток WebSocket)"""
+        try:
+            topic = message.get("topic", "")
+            book = self._books.get(topic.rsplit(".", 1)[-1])
+            if book is None:
+                return
+            self._stats["messages"] += 1
+            if not book.apply(message):
+                self._resync(topic)
+        except Exception as e:
+            logger.error(f"Error handling order book message: {e}")
+
+    def _resync(self, topic: str) -> None:
+        """Запросить новый снимок стакана"""
+        self._stats["resyncs"] += 1
+        if self.ws is None:
+            return
+        try:
+            self.ws.resubscribe_topic(topic)
+        except Exception as e:
+            logger.warning(f"Order book resync failed for {topic}: {e}")
+
+    def get_book(self, symbol: str) -> Optional[LocalOrderBook]:
+        """
+        Синхронизированный стакан символа
+
+        Returns:
+            LocalOrderBook или None если подписки нет, книга не синхронизирована
+            или соединение потеряно
+        """
+        exchange_symbol = self._symbol_map.get(symbol)
+        if exchange_symbol is None:
+            return None
+        book = self._books.get(exchange_symbol)
+        if book is None or not book.synced:
+            return None
+        if self.ws is None or not self.ws.is_connected():
+            return None
+        self._stats["reads"] += 1
+        return book
+
+    def has_live_book(self, symbol: str) -> bool:
+        """Есть ли актуальный локальный стакан"""
+        return self.get_book(symbol) is not None
+
+    def stop(self) -> None:
+        """Закрыть WebSocket"""
+        if self.ws is not None:
+            try:
+                self.ws.exit()
+            except Exception as e:
+                logger.debug(f"Error closing order book stream: {e}")
+            self.ws = None
+            logger.info("Order book stream stopped")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика потока"""
+        return {
+            "enabled": self.enabled,
+            "connected": self.ws is not None,
+            "books": len(self._books),
+            "synced_books": sum(1 for book in self._books.values() if book.synced),
+            **self._stats
+        }
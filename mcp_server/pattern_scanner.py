@@ -0,0 +1,255 @@
+"""
+Pattern Scanner
+Векторная разметка свечных паттернов по всей истории и их статистика
+
+Каждый бар серии размечается всеми паттернами за один проход по массивам.
+Исход паттерна оценивается через horizon баров (бычий - цена выше,
+медвежий - ниже, доджи - смена направления), что даёт статистику
+срабатываний по символу. Надёжность паттерна - доля срабатываний,
+стянутая к априорной оценке при малом числе наблюдений.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+from loguru import logger
+
+
+# Паттерн: (тип, априорная надёжность, описание)
+PATTERNS = {
+    "Hammer": ("bullish", 0.65, "Potential reversal from downtrend"),
+    "Shooting Star": ("bearish", 0.65, "Potential reversal from uptrend"),
+    "Doji": ("neutral", 0.50, "Indecision, potential reversal"),
+    "Bullish Engulfing": ("bullish", 0.70, "Strong reversal signal"),
+    "Bearish Engulfing": ("bearish", 0.70, "Strong reversal signal"),
+    "Morning Star": ("bullish", 0.75, "Strong three-candle reversal pattern"),
+    "Evening Star": ("bearish", 0.75, "Strong three-candle reversal pattern"),
+}
+PATTERN_HORIZON = 5
+PRIOR_WEIGHT = 20
+
+
+def _shift(values: np.ndarray, periods: int) -> np.ndarray:
+    """Сдвиг ряда: periods > 0 - значение periods баров назад, < 0 - вперёд (NaN на краях)"""
+    shifted = np.full(len(values), np.nan)
+    if periods > 0:
+        shifted[periods:] = values[:-periods]
+    elif periods < 0:
+        shifted[:periods] = values[-periods:]
+    else:
+        shifted[:] = values
+    return shifted
+
+
+def label_patterns(candles: Any) -> Dict[str, np.ndarray]:
+    """
+    Паттерны на каждом баре
+
+    Args:
+        candles: Массив (N, 6) [timestamp, open, high, low, close, volume]
+
+    Returns:
+        {название: bool массив длины N}
+    """
+    candles = np.asarray(candles, dtype=np.float64).reshape(-1, 6)
+    o, h, l, c = candles[:, 1], candles[:, 2], candles[:, 3], candles[:, 4]
+
+    body = np.abs(c - o)
+    lower_shadow = np.minimum(o, c) - l
+    upper_shadow = h - np.maximum(o, c)
+    candle_range = h - l
+
+    prev_open, prev_close = _shift(o, 1), _shift(c, 1)
+    prev2_open, prev2_close = _shift(o, 2), _shift(c, 2)
+    prev_body = np.abs(prev_close - prev_open)
+    prev2_body = np.abs(prev2_close - prev2_open)
+    prev2_mid = (prev2_open + prev2_close) / 2
+
+    with np.errstate(invalid="ignore"):
+        return {
+            "Hammer": (candle_range > 0) & (lower_shadow > body * 2) & (upper_shadow < body * 0.5),
+            "Shooting Star": (candle_range > 0) & (upper_shadow > body * 2) & (lower_shadow < body * 0.5),
+            "Doji": (candle_range > 0) & (body < candle_range * 0.1),
+            "Bullish Engulfing": (prev_close < prev_open) & (c > o) & (c > prev_open) & (o < prev_close),
+            "Bearish Engulfing": (prev_close > prev_open) & (c < o) & (c < prev_open) & (o > prev_close),
+            # Вторая свеча маленькая относительно первой
+            "Morning Star": (prev2_close < prev2_open) & (prev_body < prev2_body * 0.3) & (c > o) & (c > prev2_mid),
+            "Evening Star": (prev2_close > prev2_open) & (prev_body < prev2_body * 0.3) & (c < o) & (c < prev2_mid),
+        }
+
+
+def pattern_outcomes(candles: Any, horizon: int = PATTERN_HORIZON) -> Dict[str, np.ndarray]:
+    """
+    Исход паттерна каждого типа на каждом баре
+
+    Returns:
+        {"bullish"|"bearish"|"neutral": bool массив "паттерн сработал"},
+        "evaluable": бары, для которых исход уже известен
+    """
+    candles = np.asarray(candles, dtype=np.float64).reshape(-1, 6)
+    close = candles[:, 4]
+    future = _shift(close, -horizon)
+    past = _shift(close, horizon)
+    with np.errstate(invalid="ignore"):
+        return {
+            "bullish": future > close,
+            "bearish": future < close,
+            "neutral": np.sign(future - close) * np.sign(close - past) < 0,
+            "evaluable": ~np.isnan(future),
+        }
+
+
+def hit_counts(
+    labels: Dict[str, np.ndarray],
+    outcomes: Dict[str, np.ndarray],
+    mask: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Массив (паттерны x [count, hits]) по барам mask с известным исходом"""
+    evaluable = outcomes["evaluable"] if mask is None else outcomes["evaluable"] & mask
+    counts = np.zeros((len(PATTERNS), 2))
+    for k, (name, (kind, _, _)) in enumerate(PATTERNS.items()):
+        seen = labels[name] & evaluable
+        counts[k] = seen.sum(), (seen & outcomes[kind]).sum()
+    return counts
+
+
+def reliability(name: str, count: float, hits: float) -> float:
+    """Доля срабатываний, стянутая к априорной надёжности PATTERNS"""
+    prior = PATTERNS[name][1]
+    return (hits + prior * PRIOR_WEIGHT) / (count + PRIOR_WEIGHT)
+
+
+def stats_dict(counts: np.ndarray) -> Dict[str, Dict[str, Any]]:
+    """Статистика паттернов {название: count, hits, hit_rate, reliability}"""
+    result = {}
+    for k, name in enumerate(PATTERNS):
+        count, hits = int(counts[k, 0]), int(counts[k, 1])
+        result[name] = {
+            "count": count,
+            "hits": hits,
+            "hit_rate": round(hits / count, 3) if count else None,
+            "reliability": round(reliability(name, count, hits), 3)
+        }
+    return result
+
+
+def detect_patterns(candles: Any, horizon: int = PATTERN_HORIZON) -> Dict[str, Any]:
+    """
+    Паттерны последнего бара с надёжностью по статистике окна
+
+    Returns:
+        {"candlestick": [...], "chart": [], "stats": статистика окна}
+    """
+    candles = np.asarray(candles, dtype=np.float64).reshape(-1, 6)
+    labels = label_patterns(candles)
+    stats = stats_dict(hit_counts(labels, pattern_outcomes(candles, horizon)))
+    return {
+        "candlestick": [
+            {
+                "name": name,
+                "type": kind,
+                "reliability": stats[name]["reliability"],
+                "description": description,
+                "samples": stats[name]["count"]
+            }
+            for name, (kind, _, description) in PATTERNS.items()
+            if len(candles) and labels[name][-1]
+        ],
+        "chart": [],
+        "stats": stats
+    }
+
+
+class PatternStats:
+    """
+    Накопленная статистика паттернов по символам (LRU)
+
+    Каждый закрытый бар таймфрейма учитывается один раз - после того,
+    как его исход стал известен. Thread-safe.
+    """
+
+    def __init__(self, horizon: int = PATTERN_HORIZON, max_symbols: int = 500):
+        self.horizon = horizon
+        self.max_symbols = max_symbols
+        self._counts: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._last_ts: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        logger.info(f"Pattern stats initialized (horizon={horizon}, max_symbols={max_symbols})")
+
+    def update(self, symbol: str, timeframe: str, candles: Any) -> int:
+        """
+        Учесть закрытые бары (N, 6) таймфрейма
+
+        Returns:
+            Число новых баров с известным исходом
+        """
+        candles = np.asarray(candles, dtype=np.float64).reshape(-1, 6)
+        if len(candles) <= self.horizon:
+            return 0
+        ts = candles[:, 0]
+        newest = float(ts[len(ts) - 1 - self.horizon])
+        with self._lock:
+            last = self._last_ts.get((symbol, timeframe))
+            if last is not None and newest <= last:
+                # Исход нового бара ещё не известен (повторный анализ окна) - разметку не считаем
+                if symbol in self._counts:
+                    self._counts.move_to_end(symbol)
+                return 0
+        labels = label_patterns(candles)
+        outcomes = pattern_outcomes(candles, self.horizon)
+        with self._lock:
+            last = self._last_ts.get((symbol, timeframe))
+            mask = ts > last if last is not None else np.ones(len(ts), dtype=bool)
+            # Первые бары окна без предыдущих свечей не размечены - пропускаем
+            mask[:2] = False
+            mask &= outcomes["evaluable"]
+            counts = self._counts.get(symbol)
+            if counts is None:
+                counts = np.zeros((len(PATTERNS), 2))
+                self._counts[symbol] = counts
+                while len(self._counts) > self.max_symbols:
+                    evicted, _ = self._counts.popitem(last=False)
+                    self._last_ts = {k: v for k, v in self._last_ts.items() if k[0] != evicted}
+            self._counts.move_to_end(symbol)
+            counts += hit_counts(labels, outcomes, mask)
+            self._last_ts[(symbol, timeframe)] = max(newest, last) if last is not None else newest
+            return int(mask.sum())
+
+    def get(self, symbol: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Статистика символа (None если ещё не накоплена)"""
+        with self._lock:
+            counts = self._counts.get(symbol)
+            return stats_dict(counts) if counts is not None else None
+
+    def apply(self, symbol: str, patterns: Dict[str, Any]) -> Dict[str, Any]:
+        """Копия результата detect_patterns с надёжностью по статистике символа"""
+        stats = self.get(symbol)
+        if stats is None:
+            return patterns
+        return {
+            **patterns,
+            "candlestick": [
+                {**p, "reliability": stats[p["name"]]["reliability"], "samples": stats[p["name"]]["count"]}
+                if p.get("name") in stats else p
+                for p in patterns.get("candlestick", [])
+            ],
+            "stats": stats
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"symbols": len(self._counts), "horizon": self.horizon}
+
+
+# Глобальный экземпляр
+_pattern_stats: Optional[PatternStats] = None
+
+
+def get_pattern_stats() -> PatternStats:
+    """Получить глобальную статистику паттернов"""
+    global _pattern_stats
+    if _pattern_stats is None:
+        _pattern_stats = PatternStats()
+    return _pattern_stats
@@ -0,0 +1,315 @@
+"""
+Rate Limiter
+Общий для процесса token-bucket лимитер запросов к Bybit API
+Учитывает лимиты v5 по группам эндпоинтов (market, order, position, account)
+и общий IP-лимит, собирает метрики очереди и времени ожидания
+"""
+
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from loguru import logger
+
+
+# Лимиты по умолчанию (запросов в секунду, ёмкость bucket)
+# Bybit v5: IP-лимит 600 запросов / 5 секунд, UID-лимиты на торговые и аккаунт эндпоинты 10-50 req/s
+DEFAULT_LIMITS: Dict[str, Dict[str, float]] = {
+    "ip": {"rate": 100.0, "capacity": 100.0},
+    "market": {"rate": 50.0, "capacity": 50.0},
+    "order": {"rate": 10.0, "capacity": 10.0},
+    "position": {"rate": 10.0, "capacity": 10.0},
+    "account": {"rate": 10.0, "capacity": 10.0},
+}
+
+# Группы методов pybit HTTP (по имени метода)
+PYBIT_METHOD_GROUPS: Dict[str, str] = {
+    "place_order": "order",
+    "amend_order": "order",
+    "cancel_order": "order",
+    "cancel_all_orders": "order",
+    "get_open_orders": "order",
+    "get_order_history": "order",
+    "get_executions": "order",
+    "place_batch_order": "order",
+    "get_positions": "position",
+    "set_leverage": "position",
+    "set_trading_stop": "position",
+    "switch_margin_mode": "position",
+    "switch_position_mode": "position",
+    "get_closed_pnl": "position",
+    "get_wallet_balance": "account",
+    "get_account_info": "account",
+    "get_fee_rates": "account",
+    "get_transaction_log": "account",
+    "create_internal_transfer": "account",
+    "get_coins_balance": "account",
+}
+
+# Пауза bucket после ответа "rate limit exceeded" (секунды)
+RATE_LIMITED_PENALTY = 1.0
+
+
+class TokenBucket:
+    """
+    Token bucket с резервированием
+
+    Вызывающий резервирует токены сразу (баланс может уйти в минус)
+    и ждёт ровно столько, сколько нужно для пополнения - без опроса,
+    порядок обслуживания совпадает с порядком вызовов.
+    """
+
+    def __init__(self, name: str, rate: float, capacity: float):
+        """
+        Args:
+            name: Имя группы
+            rate: Скорость пополнения (токенов в секунду)
+            capacity: Максимальный запас токенов (burst)
+        """
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+        # Метрики
+        self.waiting = 0
+        self.max_waiting = 0
+        self.acquired = 0
+        self.delayed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.rate_limited = 0
+
+    def _refill(self, now: float) -> None:
+        """Пополнить токены за прошедшее время"""
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, weight: float = 1.0) -> float:
+        """
+        Зарезервировать токены
+
+        Returns:
+            Сколько секунд нужно подождать перед запросом
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= weight
+            self.acquired += 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            if wait > 0:
+                self.delayed += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+            return wait
+
+    def penalize(self, seconds: float) -> None:
+        """Остановить выдачу токенов на seconds (биржа вернула rate limit)"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, -seconds * self.rate)
+            self.rate_limited += 1
+
+    def enter_wait(self) -> None:
+        with self._lock:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+
+    def exit_wait(self) -> None:
+        with self._lock:
+            self.waiting -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики bucket"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "rate_per_sec": self.rate,
+                "capacity": self.capacity,
+                "tokens": round(self._tokens, 2),
+                "queue_depth": self.waiting,
+                "max_queue_depth": self.max_waiting,
+                "acquired": self.acquired,
+                "delayed": self.delayed,
+                "avg_wait_ms": round(self.total_wait / self.delayed * 1000, 2) if self.delayed else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 2),
+                "total_wait_sec": round(self.total_wait, 3),
+                "rate_limited": self.rate_limited
+            }
+
+
+class RateLimiter:
+    """
+    Лимитер запросов для всех клиентов Bybit в процессе
+
+    Каждый запрос списывает токены из bucket своей группы и из общего IP bucket.
+    Асинхронный acquire() используется в BybitClient (ccxt, aiohttp),
+    синхронный acquire_sync() - только для синхронного кода вне event loop
+    (из async кода pybit вызывается через RateLimitedSession.call).
+    """
+
+    def __init__(self, limits: Optional[Dict[str, Dict[str, float]]] = None, enabled: Optional[bool] = None):
+        """
+        Args:
+            limits: Лимиты по группам (если None - DEFAULT_LIMITS с переопределением через
+                    BYBIT_RATE_LIMIT_<GROUP> env, значение в запросах в секунду)
+            enabled: Включить/выключить лимитер (если None - проверяет ENABLE_RATE_LIMITER env)
+        """
+        if limits is None:
+            limits = {}
+            for group, cfg in DEFAULT_LIMITS.items():
+                env_rate = os.getenv(f"BYBIT_RATE_LIMIT_{group.upper()}")
+                if env_rate:
+                    try:
+                        rate = float(env_rate)
+                        cfg = {"rate": rate, "capacity": rate}
+                    except ValueError:
+                        logger.warning(f"Invalid BYBIT_RATE_LIMIT_{group.upper()}={env_rate}, using default")
+                limits[group] = dict(cfg)
+
+        if enabled is None:
+            limiter_env = os.getenv("ENABLE_RATE_LIMITER", "true").lower()
+            self.enabled = limiter_env in ("true", "1", "yes")
+        else:
+            self.enabled = enabled
+
+        self._buckets: Dict[str, TokenBucket] = {
+            group: TokenBucket(group, cfg["rate"], cfg["capacity"])
+            for group, cfg in limits.items()
+        }
+
+        status = "ENABLED ✅" if self.enabled else "DISABLED ⚠️"
+        rates = ", ".join(f"{group}={cfg['rate']:g}/s" for group, cfg in limits.items())
+        logger.info(f"RateLimiter initialized: {status} ({rates})")
+
+    def _reserve(self, group: str, weight: float) -> tuple:
+        """Зарезервировать токены в группе и IP bucket, вернуть (wait, bucket)"""
+        bucket = self._buckets.get(group)
+        if bucket is None:
+            logger.warning(f"Unknown rate limit group '{group}', using 'market'")
+            bucket = self._buckets["market"]
+
+        wait = bucket.reserve(weight)
+        ip_bucket = self._buckets.get("ip")
+        if ip_bucket is not None and ip_bucket is not bucket:
+            wait = max(wait, ip_bucket.reserve(weight))
+        return wait, bucket
+
+    async def acquire(self, group: str = "market", weight: float = 1.0) -> float:
+        """
+        Дождаться разрешения на запрос (async)
+
+        Args:
+            group: Группа эндпоинта (market, order, position, account)
+            weight: Вес запроса в токенах
+
+        Returns:
+            Время ожидания в секундах
+        """
+        if not self.enabled:
+            return 0.0
+
+        wait, bucket = self._reserve(group, weight)
+        if wait > 0:
+            bucket.enter_wait()
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                bucket.exit_wait()
+        return wait
+
+    def acquire_sync(self, group: str = "market", weight: float = 1.0) -> float:
+        """Дождаться разрешения на запрос (блокирующая версия для синхронных клиентов)"""
+        if not self.enabled:
+            return 0.0
+
+        wait, bucket = self._reserve(group, weight)
+        if wait > 0:
+            bucket.enter_wait()
+            try:
+                time.sleep(wait)
+            finally:
+                bucket.exit_wait()
+        return wait
+
+    def report_rate_limited(self, group: str = "market", seconds: float = RATE_LIMITED_PENALTY) -> None:
+        """Биржа вернула rate limit - притормозить группу"""
+        bucket = self._buckets.get(group)
+        if bucket is not None:
+            bucket.penalize(seconds)
+            logger.warning(f"Rate limit hit for '{group}' group, pausing {seconds}s")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики по всем группам"""
+        return {
+            "enabled": self.enabled,
+            "groups": {group: bucket.get_stats() for group, bucket in self._buckets.items()}
+        }
+
+
+class RateLimitedSession:
+    """
+    Обёртка над pybit HTTP сессией
+
+    Перед каждым вызовом метода API ждёт токен в группе,
+    определённой по имени метода (по умолчанию - market).
+    Из async кода - только через call(): токен ждётся без блокировки
+    event loop, блокирующий запрос pybit выполняется в потоке.
+    Прямой вызов метода (acquire_sync) - для синхронного кода вне loop.
+    """
+
+    def __init__(self, session: Any, limiter: Optional[RateLimiter] = None):
+        self._session = session
+        self._limiter = limiter
+
+    async def call(self, name: str, *args, **kwargs) -> Any:
+        """Вызвать метод pybit из async кода (await limiter.acquire + asyncio.to_thread)"""
+        limiter = self._limiter or get_rate_limiter()
+        await limiter.acquire(PYBIT_METHOD_GROUPS.get(name, "market"))
+        return await asyncio.to_thread(getattr(self._session, name), *args, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._session, name)
+        if not callable(attr) or name.startswith("_"):
+            return attr
+
+        group = PYBIT_METHOD_GROUPS.get(name, "market")
+        limiter = self._limiter or get_rate_limiter()
+
+        def limited(*args, **kwargs):
+            limiter.acquire_sync(group)
+            return attr(*args, **kwargs)
+
+        return limited
+
+
+def get_scan_concurrency(default: int = 20) -> int:
+    """
+    Число параллельно анализируемых тикеров в сканере
+
+    Скорость запросов ограничивает RateLimiter, поэтому параллелизм
+    задаёт только количество одновременно выполняющихся анализов (BYBIT_SCAN_CONCURRENCY env).
+    """
+    try:
+        return max(1, int(os.getenv("BYBIT_SCAN_CONCURRENCY", str(default))))
+    except ValueError:
+        return default
+
+
+# Глобальный экземпляр лимитера (один на процесс - все клиенты делят лимиты)
+_rate_limiter: Optional[RateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Получить глобальный экземпляр лимитера"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                _rate_limiter = RateLimiter()
+    return _rate_limiter
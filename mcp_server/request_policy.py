@@ -0,0 +1,350 @@
+"""
+Request Policy
+Общая политика запросов к Bybit: повторы с jittered backoff,
+circuit breaker на каждый эндпоинт и hedged fallback на прямой HTTP
+"""
+
+import asyncio
+import os
+import random
+import socket
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+import aiohttp
+import ccxt.async_support as ccxt
+from loguru import logger
+
+T = TypeVar("T")
+
+# Признаки сетевых/DNS ошибок в тексте исключения (CCXT оборачивает их в строки)
+NETWORK_ERROR_KEYWORDS = ("dns", "could not contact dns", "name resolution", "gaierror", "cannot connect to host")
+
+
+def is_network_error(error: Exception) -> bool:
+    """DNS / сетевая ошибка (превышение лимита сетевой ошибкой не считается)"""
+    if isinstance(error, ccxt.RateLimitExceeded):
+        return False
+    if isinstance(error, (aiohttp.ClientError, socket.gaierror, OSError, asyncio.TimeoutError, ccxt.NetworkError)):
+        return True
+    error_msg = str(error).lower()
+    return any(keyword in error_msg for keyword in NETWORK_ERROR_KEYWORDS)
+
+
+# retCode превышения лимита запросов Bybit (по UID и по IP)
+RATE_LIMIT_RET_CODES = (10006, 10018)
+# HTTP статусы перегрузки эндпоинта (кроме 5xx): лимит по IP, таймаут, too many requests
+OVERLOAD_HTTP_STATUSES = (403, 408, 429)
+
+
+def is_transport_error(error: Exception) -> bool:
+    """
+    Сбой транспорта или перегрузка эндпоинта - только такие ошибки считает breaker
+
+    Сеть и таймауты, HTTP 5xx, превышение лимита. Ошибки данных и запроса
+    (пустой ответ, неизвестный символ, разбор ответа) эндпоинт не характеризуют.
+    """
+    if isinstance(error, aiohttp.ContentTypeError):
+        return False
+    if isinstance(error, ccxt.NetworkError) or is_network_error(error):
+        return True
+    if getattr(error, "ret_code", None) in RATE_LIMIT_RET_CODES:
+        return True
+    status = getattr(error, "status", None)
+    return isinstance(status, int) and (status >= 500 or status in OVERLOAD_HTTP_STATUSES)
+
+
+def is_query_info_error(error: Exception) -> bool:
+    """Ошибка CCXT с эндпоинтом asset/coin/query-info"""
+    return "query-info" in str(error).lower()
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Задержка перед повтором: full jitter (случайно от 0 до base * 2^attempt)"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+class CircuitOpenError(Exception):
+    """Эндпоинт временно отключён circuit breaker'ом"""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker одного эндпоинта
+
+    closed -> open после failure_threshold ошибок подряд; в состоянии open
+    запросы сразу отклоняются. Через recovery_timeout пропускается один
+    пробный запрос (half_open): успех закрывает breaker, ошибка снова открывает.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        """Можно ли выполнить запрос сейчас"""
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.recovery_timeout:
+            self.state = "half_open"
+            self._probe_in_flight = False
+        if self.state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def retry_in(self) -> float:
+        """Секунд до следующего пробного запроса"""
+        return max(0.0, self.recovery_timeout - (time.monotonic() - self.opened_at))
+
+    def release(self) -> None:
+        """Пробный запрос прерван без результата"""
+        self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        if self.state != "closed":
+            logger.info(f"Circuit closed for {self.name}")
+        self.state = "closed"
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+            logger.warning(f"Circuit opened for {self.name} after {self.failures} failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+
+class RequestPolicy:
+    """
+    Выполнение запросов по общей политике
+
+    Одна политика на процесс: breaker эндпоинта общий для всех
+    параллельных задач сканера, поэтому при сбое биржи задачи сразу
+    уходят на fallback (или получают ошибку), а не ждут backoff каждая.
+    """
+
+    def __init__(
+        self,
+        max_attempts: Optional[int] = None,
+        base_delay: float = 0.5,
+        max_delay: float = 4.0,
+        failure_threshold: Optional[int] = None,
+        recovery_timeout: Optional[float] = None,
+        hedge_after: Optional[float] = None
+    ):
+        """
+        Args:
+            max_attempts: Попыток основного запроса (если None - BYBIT_RETRY_ATTEMPTS env, 3)
+            base_delay: Базовая задержка backoff (секунды)
+            max_delay: Максимальная задержка backoff
+            failure_threshold: Ошибок подряд до открытия breaker (BYBIT_BREAKER_THRESHOLD env, 5)
+            recovery_timeout: Секунд до пробного запроса (BYBIT_BREAKER_COOLDOWN env, 30)
+            hedge_after: Через сколько секунд ожидания параллельно запускать fallback
+                (BYBIT_HEDGE_AFTER env, 3; 0 - не хеджировать)
+        """
+        self.max_attempts = max_attempts or int(os.getenv("BYBIT_RETRY_ATTEMPTS", "3"))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold or int(os.getenv("BYBIT_BREAKER_THRESHOLD", "5"))
+        self.recovery_timeout = recovery_timeout or float(os.getenv("BYBIT_BREAKER_COOLDOWN", "30"))
+        if hedge_after is None:
+            hedge_after = float(os.getenv("BYBIT_HEDGE_AFTER", "3"))
+        self.hedge_after = hedge_after if hedge_after > 0 else None
+
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        """Breaker эндпоинта (создаётся при первом обращении)"""
+        breaker = self._breakers.get(endpoint)
+        if breaker is None:
+            breaker = CircuitBreaker(endpoint, self.failure_threshold, self.recovery_timeout)
+            self._breakers[endpoint] = breaker
+        return breaker
+
+    def _count(self, endpoint: str, name: str) -> None:
+        stats = self._stats.setdefault(endpoint, {
+            "calls": 0, "successes": 0, "failures": 0, "retries": 0, "fast_failures": 0,
+            "fallbacks": 0, "fallback_failures": 0, "hedged": 0, "hedge_wins": 0, "request_errors": 0
+        })
+        stats[name] += 1
+
+    async def call(
+        self,
+        endpoint: str,
+        request: Callable[[], Awaitable[T]],
+        fallback: Optional[Callable[[], Awaitable[T]]] = None,
+        on_error: Optional[Callable[[Exception], None]] = None
+    ) -> T:
+        """
+        Выполнить запрос с повторами, breaker'ом и fallback
+
+        Args:
+            endpoint: Имя эндпоинта (ключ breaker'а и статистики)
+            request: Фабрика корутины основного запроса
+            fallback: Фабрика корутины запасного пути (прямой HTTP)
+            on_error: Вызывается на каждую ошибку; исключение из него
+                (например, неверный API ключ) пробрасывается без повторов
+
+        Повторяются и учитываются breaker'ом только сбои транспорта
+        (is_transport_error); остальные ошибки пробрасываются сразу.
+
+        Returns:
+            Результат основного запроса или fallback
+
+        Raises:
+            CircuitOpenError: breaker открыт и fallback не задан
+        """
+        self._count(endpoint, "calls")
+        breaker = self.breaker(endpoint)
+
+        if not breaker.allow():
+            self._count(endpoint, "fast_failures")
+            if fallback is not None:
+                return await self._run_fallback(endpoint, fallback, None)
+            raise CircuitOpenError(
+                f"Bybit endpoint {endpoint} is temporarily unavailable (circuit open, retry in {breaker.retry_in():.0f}s)"
+            )
+
+        last_error: Optional[Exception] = None
+        for attempt in range(self.max_attempts):
+            try:
+                result, primary_won = await self._attempt(endpoint, request, fallback)
+                if primary_won:
+                    breaker.record_success()
+                else:
+                    # Ответил fallback: основной запрос не уложился - для breaker это сбой (таймаут)
+                    breaker.record_failure()
+                self._count(endpoint, "successes")
+                return result
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            except Exception as e:
+                if on_error is not None:
+                    try:
+                        on_error(e)
+                    except Exception:
+                        # Фатальная ошибка API (ключ, права): эндпоинт отвечает, повторы бессмысленны
+                        breaker.record_success()
+                        raise
+                last_error = e
+                if not is_transport_error(e):
+                    # Ошибка данных или запроса: эндпоинт отвечает - состояние breaker
+                    # не меняется (освобождается только пробный слот), повтор не поможет
+                    breaker.release()
+                    self._count(endpoint, "request_errors")
+                    if fallback is not None and is_query_info_error(e):
+                        return await self._run_fallback(endpoint, fallback, e)
+                    raise
+                breaker.record_failure()
+                self._count(endpoint, "failures")
+                logger.warning(f"{endpoint} failed (attempt {attempt + 1}/{self.max_attempts}): {e}")
+
+            if not breaker.allow():
+                break
+            if attempt < self.max_attempts - 1:
+                self._count(endpoint, "retries")
+                await asyncio.sleep(backoff_delay(attempt, self.base_delay, self.max_delay))
+
+        if fallback is not None and (is_network_error(last_error) or is_query_info_error(last_error) or breaker.state == "open"):
+            return await self._run_fallback(endpoint, fallback, last_error)
+
+        if is_network_error(last_error):
+            raise Exception(
+                f"DNS/Network Error: Failed to connect to Bybit API ({endpoint}) "
+                f"after {self.max_attempts} attempts. Error: {last_error}"
+            )
+        raise last_error
+
+    async def _attempt(
+        self,
+        endpoint: str,
+        request: Callable[[], Awaitable[T]],
+        fallback: Optional[Callable[[], Awaitable[T]]]
+    ) -> Tuple[T, bool]:
+        """
+        Одна попытка; если она затягивается - параллельно запускается fallback
+
+        Returns:
+            (результат, ответил ли основной запрос)
+        """
+        if fallback is None or self.hedge_after is None:
+            return await request(), True
+
+        primary = asyncio.ensure_future(request())
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_after)
+        if done:
+            return primary.result(), True
+
+        self._count(endpoint, "hedged")
+        hedge = asyncio.ensure_future(fallback())
+        pending = {primary, hedge}
+        primary_error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._count(endpoint, "hedge_wins")
+                        return task.result(), task is primary
+                    if task is primary:
+                        primary_error = task.exception()
+            raise primary_error if primary_error is not None else hedge.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _run_fallback(
+        self,
+        endpoint: str,
+        fallback: Callable[[], Awaitable[T]],
+        error: Optional[Exception]
+    ) -> T:
+        """Запасной путь после исчерпания попыток или при открытом breaker"""
+        self._count(endpoint, "fallbacks")
+        logger.info(f"{endpoint}: trying direct HTTP fallback")
+        try:
+            return await fallback()
+        except Exception as http_error:
+            self._count(endpoint, "fallback_failures")
+            logger.error(f"Direct HTTP fallback also failed for {endpoint}: {http_error}")
+            raise Exception(
+                f"API Error: {endpoint} failed after {self.max_attempts} attempts and direct HTTP fallback. "
+                f"Error: {error}, HTTP error: {http_error}"
+            )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика по эндпоинтам"""
+        return {
+            "max_attempts": self.max_attempts,
+            "hedge_after": self.hedge_after,
+            "endpoints": {
+                endpoint: {
+                    "circuit": self.breaker(endpoint).state,
+                    **stats
+                }
+                for endpoint, stats in self._stats.items()
+            }
+        }
+
+
+# Глобальный экземпляр (breaker'ы общие для всех клиентов процесса)
+_request_policy: Optional[RequestPolicy] = None
+
+
+def get_request_policy() -> RequestPolicy:
+    """Получить глобальную политику запросов"""
+    global _request_policy
+    if _request_policy is None:
+        _request_policy = RequestPolicy()
+    return _request_policy
@@ -0,0 +1,207 @@
+"""
+Resampler
+Построение старших таймфреймов из свечей базового разрешения
+
+Границы баров совпадают с Bybit: интервалы до 1d выравниваются по UTC
+от начала эпохи, недельные бары начинаются в понедельник 00:00 UTC.
+"""
+
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Условный импорт для поддержки как пакета, так и прямого запуска
+try:
+    from .candle_store import timeframe_to_ms, OHLCV_COLUMNS
+except ImportError:
+    from candle_store import timeframe_to_ms, OHLCV_COLUMNS
+
+
+WEEK_MS = 7 * 24 * 60 * 60_000
+# 1970-01-01 - четверг, первый понедельник эпохи - 1970-01-05
+WEEK_OFFSET_MS = 4 * 24 * 60 * 60_000
+
+# Bybit отдаёт не больше 1000 свечей за один запрос /v5/market/kline
+MAX_KLINE_LIMIT = 1000
+
+
+def bucket_start(ts: np.ndarray, tf_ms: int) -> np.ndarray:
+    """Начало бара таймфрейма tf_ms, которому принадлежат timestamps"""
+    offset = WEEK_OFFSET_MS if tf_ms == WEEK_MS else 0
+    return (ts - offset) // tf_ms * tf_ms + offset
+
+
+def can_resample(base_tf: str, target_tf: str) -> bool:
+    """Можно ли собрать target_tf из баров base_tf"""
+    base_ms = timeframe_to_ms(base_tf)
+    target_ms = timeframe_to_ms(target_tf)
+    if base_ms is None or target_ms is None or target_ms <= base_ms:
+        return False
+    if target_ms % base_ms != 0:
+        return False
+    # Недельный бар собирается только из баров, не пересекающих границу суток
+    return target_ms != WEEK_MS or (24 * 60 * 60_000) % base_ms == 0
+
+
+def resample(candles: np.ndarray, base_tf: str, target_tf: str, drop_partial: bool = True) -> np.ndarray:
+    """
+    Агрегация свечей base_tf в target_tf
+
+    Args:
+        candles: Массив (N, 6) [timestamp, open, high, low, close, volume], по возрастанию времени
+        base_tf: Таймфрейм исходных свечей
+        target_tf: Целевой таймфрейм
+        drop_partial: Отбросить первый бар, если история начинается с середины бара
+
+    Returns:
+        Массив (M, 6) свечей target_tf (последний бар может быть формирующимся)
+    """
+    candles = np.asarray(candles, dtype=np.float64).reshape(-1, OHLCV_COLUMNS)
+    if len(candles) == 0:
+        return candles
+
+    target_ms = timeframe_to_ms(target_tf)
+    ts = candles[:, 0].astype(np.int64)
+    buckets = bucket_start(ts, target_ms)
+
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(candles)] - 1
+
+    result = np.empty((len(starts), OHLCV_COLUMNS), dtype=np.float64)
+    result[:, 0] = buckets[starts]
+    result[:, 1] = candles[starts, 1]
+    result[:, 2] = np.maximum.reduceat(candles[:, 2], starts)
+    result[:, 3] = np.minimum.reduceat(candles[:, 3], starts)
+    result[:, 4] = candles[ends, 4]
+    result[:, 5] = np.add.reduceat(candles[:, 5], starts)
+
+    if drop_partial and ts[0] != buckets[0]:
+        result = result[1:]
+    return result
+
+
+def bars_needed(base_tf: str, target_tf: str, limit: int, now_ms: Optional[int] = None) -> int:
+    """
+    Сколько последних баров base_tf нужно для limit баров target_tf
+
+    Формирующийся бар target_tf содержит только уже открытые базовые бары.
+    """
+    base_ms = timeframe_to_ms(base_tf)
+    target_ms = timeframe_to_ms(target_tf)
+    ratio = target_ms // base_ms
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    forming = int((now_ms - int(bucket_start(np.int64(now_ms), target_ms))) // base_ms) + 1
+    return (limit - 1) * ratio + forming
+
+
+def plan_fetches(
+    timeframes: List[str],
+    limit: int,
+    max_base_bars: Optional[int] = None,
+    now_ms: Optional[int] = None
+) -> Tuple[Dict[str, int], Dict[str, str]]:
+    """
+    План загрузки набора таймфреймов с минимумом запросов
+
+    Таймфреймы перебираются от младшего к старшему; каждый собирается
+    из уже загружаемого младшего таймфрейма, если для этого хватает
+    одного запроса (max_base_bars баров), иначе загружается сам.
+
+    Returns:
+        (fetch, derive): {таймфрейм: сколько баров загрузить},
+        {производный таймфрейм: базовый таймфрейм}
+    """
+    if max_base_bars is None:
+        max_base_bars = int(os.getenv("RESAMPLE_MAX_BASE_BARS", str(MAX_KLINE_LIMIT)))
+
+    fixed = sorted(
+        {tf for tf in timeframes if timeframe_to_ms(tf) is not None},
+        key=timeframe_to_ms
+    )
+    fetch: Dict[str, int] = {tf: limit for tf in timeframes if timeframe_to_ms(tf) is None}
+    derive: Dict[str, str] = {}
+
+    for tf in fixed:
+        best = None
+        # Предпочитаем самый крупный подходящий базовый таймфрейм - меньше баров
+        for base in sorted(fetch, key=lambda b: timeframe_to_ms(b) or 0, reverse=True):
+            if not can_resample(base, tf):
+                continue
+            needed = max(fetch[base], bars_needed(base, tf, limit, now_ms))
+            if needed <= max_base_bars:
+                best = (base, needed)
+                break
+        if best is None:
+            fetch[tf] = limit
+        else:
+            base, needed = best
+            fetch[base] = needed
+            derive[tf] = base
+
+    return fetch, derive
+
+
+class IncrementalResampler:
+    """
+    Инкрементальная сборка старшего таймфрейма из потока базовых баров
+
+    Хранит базовые бары текущего (формирующегося) бара target_tf, поэтому
+    повторные обновления формирующегося базового бара пересчитываются точно.
+    """
+
+    def __init__(self, base_tf: str, target_tf: str):
+        if not can_resample(base_tf, target_tf):
+            raise ValueError(f"Cannot resample {base_tf} into {target_tf}")
+        self.base_tf = base_tf
+        self.target_tf = target_tf
+        self.target_ms = timeframe_to_ms(target_tf)
+        self._bucket: Optional[int] = None
+        self._rows: Dict[int, np.ndarray] = {}
+
+    def reset(self, candles: np.ndarray) -> None:
+        """Восстановить состояние по истории базовых баров (нужен только последний бар target_tf)"""
+        self._bucket = None
+        self._rows = {}
+        candles = np.asarray(candles, dtype=np.float64).reshape(-1, OHLCV_COLUMNS)
+        if len(candles) == 0:
+            return
+        last_bucket = int(bucket_start(np.int64(candles[-1, 0]), self.target_ms))
+        tail = candles[candles[:, 0] >= last_bucket]
+        self._bucket = last_bucket
+        self._rows = {int(row[0]): row.copy() for row in tail}
+
+    @property
+    def complete(self) -> bool:
+        """Текущий бар target_tf содержит базовые бары с начала периода"""
+        return self._bucket is not None and min(self._rows) == self._bucket
+
+    def update(self, bar: List[float]) -> Optional[np.ndarray]:
+        """
+        Применить базовый бар (новый или обновление формирующегося)
+
+        Returns:
+            Актуальная версия бара target_tf, которому принадлежит bar,
+            или None для запоздавшего бара уже закрытого периода
+        """
+        row = np.asarray(bar, dtype=np.float64).reshape(OHLCV_COLUMNS)
+        ts = int(row[0])
+        bucket = int(bucket_start(np.int64(ts), self.target_ms))
+
+        if self._bucket is not None and bucket < self._bucket:
+            return None
+        if bucket != self._bucket:
+            self._bucket = bucket
+            self._rows = {}
+        self._rows[ts] = row
+
+        rows = np.array([self._rows[key] for key in sorted(self._rows)])
+        return np.array([
+            bucket,
+            rows[0, 1],
+            rows[:, 2].max(),
+            rows[:, 3].min(),
+            rows[-1, 4],
+            rows[:, 5].sum()
+        ])
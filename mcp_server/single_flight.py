@@ -0,0 +1,92 @@
+"""
+Single Flight
+Объединение одновременных одинаковых запросов (request coalescing)
+Конкурентные вызовы с одним ключом ждут один общий запрос вместо дублирования
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from loguru import logger
+
+
+class SingleFlight:
+    """
+    Группа single-flight вызовов
+
+    Первый вызов с ключом запускает задачу, остальные вызовы с тем же ключом,
+    пришедшие пока задача выполняется, ждут её результат. После завершения
+    ключ освобождается - следующий вызов снова идёт в сеть (или в кэш).
+    """
+
+    def __init__(self, name: str):
+        """
+        Args:
+            name: Имя группы (для логов и статистики)
+        """
+        self.name = name
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self._executed = 0
+        self._absorbed = 0
+        self._absorbed_by_kind: Dict[str, int] = {}
+
+    async def do(
+        self,
+        key: Hashable,
+        fn: Callable[[], Awaitable[Any]],
+        share: Optional[Callable[[Any], Any]] = None
+    ) -> Any:
+        """
+        Выполнить fn() или присоединиться к уже выполняющемуся вызову с тем же ключом
+
+        Args:
+            key: Ключ запроса (первый элемент кортежа используется как тип запроса в статистике)
+            fn: Фабрика корутины, выполняющей запрос
+            share: Функция копирования результата для каждого вызывающего
+                   (если результат может изменяться вызывающими)
+
+        Returns:
+            Результат fn() (или его копия через share)
+        """
+        task = self._in_flight.get(key)
+
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            self._executed += 1
+            task.add_done_callback(lambda t, k=key: self._on_done(k, t))
+        else:
+            self._absorbed += 1
+            kind = str(key[0]) if isinstance(key, tuple) and key else str(key)
+            self._absorbed_by_kind[kind] = self._absorbed_by_kind.get(kind, 0) + 1
+            logger.debug(f"SingleFlight[{self.name}]: joined in-flight call {key}")
+
+        # shield: отмена одного вызывающего не отменяет общий запрос для остальных
+        result = await asyncio.shield(task)
+        return share(result) if share is not None else result
+
+    def _on_done(self, key: Hashable, task: asyncio.Task) -> None:
+        """Освободить ключ после завершения задачи"""
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Помечаем исключение как полученное (если все вызывающие были отменены)
+        if not task.cancelled():
+            task.exception()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Статистика объединения запросов
+
+        Returns:
+            executed - реально выполненные вызовы,
+            absorbed - дубликаты, присоединившиеся к уже выполняющемуся вызову
+        """
+        total = self._executed + self._absorbed
+        return {
+            "name": self.name,
+            "executed": self._executed,
+            "absorbed": self._absorbed,
+            "absorbed_by_kind": dict(self._absorbed_by_kind),
+            "in_flight": len(self._in_flight),
+            "absorbed_pct": round(self._absorbed / total * 100, 2) if total > 0 else 0.0
+        }
@@ -0,0 +1,101 @@
+"""
+Staged Scan
+Поэтапная оценка кандидатов сканера с отсечением
+
+Кандидат проходит этапы от дешёвых к дорогим: индикаторы -> SMC секции
+(считаются лениво при чтении) -> order flow (CVD, корреляция с BTC) ->
+whale/volume profile. После каждого этапа считается частичный score
+(несчитанные компоненты = 0) и его верхняя граница - плюс максимум
+компонент оставшихся этапов. Если даже граница не дотягивает до
+адаптивного порога направления, следующие этапы не выполняются.
+"""
+
+import os
+from typing import Any, Dict, Iterable
+
+from loguru import logger
+
+
+STAGES = ("indicators", "smc", "order_flow", "extended")
+
+# Максимальный вклад в 20-point score компонент, которые дают этапы после индикаторов
+STAGE_COMPONENTS = {
+    "smc": {"order_blocks": 1.0, "fvg": 1.0, "structure": 1.0, "liquidity_grab": 1.0},
+    "order_flow": {"cvd": 2.0},
+    "extended": {"whale": 1.0, "volume_profile": 1.0},
+}
+
+# Секции таймфрейма, которые считает этап smc
+SMC_SECTIONS = ("order_blocks", "fair_value_gaps", "structure", "liquidity_grabs")
+
+# Кандидат в пределах 0.5 от порога SmartDisplay ещё показывает как ACCEPTABLE
+PROMOTION_MARGIN = 0.5
+
+
+def staged_scan_enabled() -> bool:
+    """Поэтапная оценка кандидатов (ENABLE_STAGED_SCAN env, по умолчанию включена)"""
+    return os.getenv("ENABLE_STAGED_SCAN", "true").lower() in ("true", "1", "yes")
+
+
+def remaining_max(stage: str, extended: bool = True) -> float:
+    """
+    Максимум 20-point score, который могут добавить этапы после stage
+
+    Args:
+        stage: Пройденный этап
+        extended: Будет ли выполняться этап extended (whale/volume profile)
+    """
+    later = STAGES[STAGES.index(stage) + 1:]
+    return sum(
+        sum(STAGE_COMPONENTS[name].values())
+        for name in later
+        if name != "extended" or extended
+    )
+
+
+def upper_bound(partial_score: float, stage: str, extended: bool = True) -> float:
+    """Верхняя граница итогового score по 10-point шкале (как у adaptive thresholds)"""
+    return min(20.0, partial_score + remaining_max(stage, extended)) / 20.0 * 10.0
+
+
+def without_sections(analysis: Dict[str, Any], sections: Iterable[str] = SMC_SECTIONS, timeframe: str = "4h") -> Dict[str, Any]:
+    """
+    Поверхностная копия анализа без секций таймфрейма
+
+    Ленивые секции при этом не вычисляются, оригинал не меняется.
+    """
+    timeframes = analysis.get("timeframes", {})
+    if timeframe not in timeframes:
+        return analysis
+    view = timeframes[timeframe].copy()
+    for name in sections:
+        if name in view:
+            del view[name]
+    return {**analysis, "timeframes": {**timeframes, timeframe: view}}
+
+
+class StageStats:
+    """Счётчики этапов: сколько кандидатов дошло до этапа и сколько на нём отсечено"""
+
+    def __init__(self):
+        self._stats = {stage: {"evaluated": 0, "pruned": 0} for stage in STAGES}
+
+    def record(self, stage: str, pruned: bool = False) -> None:
+        self._stats[stage]["evaluated"] += 1
+        if pruned:
+            self._stats[stage]["pruned"] += 1
+
+    def merge(self, other: "StageStats") -> None:
+        for stage, counts in other._stats.items():
+            for key, value in counts.items():
+                self._stats[stage][key] += value
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        return {stage: dict(counts) for stage, counts in self._stats.items()}
+
+    def log_summary(self) -> None:
+        logger.info(
+            "Staged scan: " + ", ".join(
+                f"{stage} {c['pruned']}/{c['evaluated']} pruned" for stage, c in self._stats.items()
+            )
+        )
@@ -3,15 +3,36 @@ Structure Analyzer - Market Structure Detection
 Анализ BOS (Break of Structure) и ChoCh (Change of Character)
 """
 
+import numpy as np
 import pandas as pd
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 from loguru import logger
 
+# Условный импорт для поддержки как пакета, так и прямого запуска
+try:
+    from .indicator_engine import rolling_max, rolling_min
+except ImportError:
+    from indicator_engine import rolling_max, rolling_min
+
 
 class StructureAnalyzer:
     """Анализ рыночной структуры - BOS & ChoCh"""
+
+    def __init__(self, left: int = 5, right: int = 5):
+        """
+        Args:
+            left: Баров слева, которые swing должен превосходить
+            right: Баров справа (задержка подтверждения swing)
+        """
+        self.left = left
+        self.right = right
     
-    def detect_structure_breaks(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def detect_structure_breaks(
+        self,
+        df: pd.DataFrame,
+        left: Optional[int] = None,
+        right: Optional[int] = None
+    ) -> Dict[str, Any]:
         """
         Break of Structure (BOS) vs Change of Character (ChoCh)
         
@@ -20,16 +41,17 @@ class StructureAnalyzer:
         
         Args:
             df: DataFrame с OHLCV данными
+            left, right: Сила swing слева/справа (по умолчанию из конструктора)
         
         Returns:
-            Dict с BOS/ChoCh событиями и текущей структурой
+            Dict с BOS/ChoCh событиями, текущей структурой и историей events
         """
         if len(df) < 10:
-            return {"bos": [], "choch": [], "current_structure": "neutral"}
+            return {"bos": [], "choch": [], "current_structure": "neutral", "events": [], "last_event": None, "structure_trend": "neutral"}
         
         # Находим swing highs/lows
-        swing_highs = self._find_swing_highs(df)
-        swing_lows = self._find_swing_lows(df)
+        swing_highs = self._find_swing_highs(df, left, right)
+        swing_lows = self._find_swing_lows(df, left, right)
         
         # Определяем текущий тренд
         if len(swing_highs) >= 2 and len(swing_lows) >= 2:
@@ -98,55 +120,115 @@ class StructureAnalyzer:
                     "description": "Change of Character - potential reversal"
                 })
         
+        events = self.find_structure_events(df, left, right)
+        
         return {
             "bos": bos_events,
             "choch": choch_events,
             "current_structure": current_structure,
             "swing_highs_count": len(swing_highs),
-            "swing_lows_count": len(swing_lows)
+            "swing_lows_count": len(swing_lows),
+            "events": events,
+            "last_event": events[-1] if events else None,
+            "structure_trend": events[-1]["type"].split("_")[0] if events else "neutral"
         }
     
-    def _find_swing_highs(self, df: pd.DataFrame, window: int = 5) -> List[Dict]:
+    def find_structure_events(
+        self,
+        df: pd.DataFrame,
+        left: Optional[int] = None,
+        right: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Полная история BOS/ChoCh по окну
+
+        Swing становится известен через right баров после экстремума и
+        остаётся активным уровнем до подтверждения следующего swing того же
+        типа. Первое закрытие за активным уровнем - пробой: в сторону текущего
+        тренда это BOS, против него - ChoCh (тренд меняется).
+
+        Returns:
+            События в хронологическом порядке: type, level, index (бар пробоя),
+            swing_index (бар swing)
+        """
+        left = self.left if left is None else left
+        right = self.right if right is None else right
+        close = df['close'].to_numpy(dtype=np.float64)
+
+        breaks = []
+        for direction, points in (
+            ("bullish", self._swing_points(df['high'].to_numpy(dtype=np.float64), left, right, highs=True)),
+            ("bearish", self._swing_points(df['low'].to_numpy(dtype=np.float64), left, right, highs=False))
+        ):
+            if len(points) == 0:
+                continue
+            levels = df['high' if direction == "bullish" else 'low'].to_numpy(dtype=np.float64)[points]
+            # Активный swing бара j - последний подтверждённый до j
+            active = np.searchsorted(points + right, np.arange(len(close)), side="left") - 1
+            level = np.where(active >= 0, levels[np.maximum(active, 0)], np.nan)
+            crossed = close > level if direction == "bullish" else close < level
+            bars = np.flatnonzero(crossed & (active >= 0))
+            # Каждый swing пробивается один раз - первым закрытием за уровнем
+            swings, first = np.unique(active[bars], return_index=True)
+            for swing, bar in zip(swings, bars[first]):
+                breaks.append((int(bar), direction, int(points[swing]), float(levels[swing])))
+
+        events = []
+        trend = None
+        for bar, direction, swing_index, level in sorted(breaks):
+            kind = "choch" if trend is not None and trend != direction else "bos"
+            trend = direction
+            events.append({
+                "type": f"{direction}_{kind}",
+                "level": level,
+                "index": bar,
+                "swing_index": swing_index
+            })
+        return events
+
+    @staticmethod
+    def _swing_points(values: np.ndarray, left: int, right: int, highs: bool = True) -> np.ndarray:
+        """
+        Индексы swing точек: значение строго больше (меньше для lows)
+        left баров слева и right баров справа
+        """
+        if left < 1 or right < 1:
+            raise ValueError("Swing strengths must be positive")
+        n = len(values)
+        if n < left + right + 1:
+            return np.empty(0, dtype=np.int64)
+        extreme = rolling_max if highs else rolling_min
+        left_extreme = extreme(values, left)
+        right_extreme = extreme(values, right)
+        index = np.arange(left, n - right)
+        center = values[index]
+        if highs:
+            is_swing = (center > left_extreme[index - left]) & (center > right_extreme[index + 1])
+        else:
+            is_swing = (center < left_extreme[index - left]) & (center < right_extreme[index + 1])
+        return index[is_swing]
+
+    def _find_swing_highs(self, df: pd.DataFrame, left: Optional[int] = None, right: Optional[int] = None) -> List[Dict]:
         """Найти swing highs (локальные максимумы)"""
-        swing_highs = []
-        
-        for i in range(window, len(df) - window):
-            high = df['high'].iloc[i]
-            is_swing_high = True
-            
-            # Проверяем что это локальный максимум
-            for j in range(i - window, i + window + 1):
-                if j != i and df['high'].iloc[j] >= high:
-                    is_swing_high = False
-                    break
-            
-            if is_swing_high:
-                swing_highs.append({
-                    "index": i,
-                    "price": high,
-                    "timestamp": df.index[i]
-                })
-        
-        return swing_highs
-    
-    def _find_swing_lows(self, df: pd.DataFrame, window: int = 5) -> List[Dict]:
+        return self._swing_dicts(df, 'high', left, right, highs=True)
+
+    def _find_swing_lows(self, df: pd.DataFrame, left: Optional[int] = None, right: Optional[int] = None) -> List[Dict]:
         """Найти swing lows (локальные минимумы)"""
-        swing_lows = []
-        
-        for i in range(window, len(df) - window):
-            low = df['low'].iloc[i]
-            is_swing_low = True
-            
-            for j in range(i - window, i + window + 1):
-                if j != i and df['low'].iloc[j] <= low:
-                    is_swing_low = False
-                    break
-            
-            if is_swing_low:
-                swing_lows.append({
-                    "index": i,
-                    "price": low,
-                    "timestamp": df.index[i]
-                })
-        
-        return swing_lows
\ No newline at end of file
+        return self._swing_dicts(df, 'low', left, right, highs=False)
+
+    def _swing_dicts(
+        self,
+        df: pd.DataFrame,
+        column: str,
+        left: Optional[int],
+        right: Optional[int],
+        highs: bool
+    ) -> List[Dict]:
+        values = df[column].to_numpy(dtype=np.float64)
+        points = self._swing_points(
+            values,
+            self.left if left is None else left,
+            self.right if right is None else right,
+            highs
+        )
+        return [{"index": int(i), "price": values[i], "timestamp": df.index[i]} for i in points]
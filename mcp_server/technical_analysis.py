@@ -3,18 +3,37 @@ Technical Analysis Engine
 Полный расчёт всех технических индикаторов для криптовалют
 """
 
+import asyncio
+import os
 import numpy as np
 import pandas as pd
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterable, List, Any, Optional
 from datetime import datetime
-import ta
 from loguru import logger
 
 # Импорт StructureAnalyzer с поддержкой относительных и абсолютных импортов
 try:
     from .structure_analyzer import StructureAnalyzer
+    from .single_flight import SingleFlight
+    from .analysis_cache import get_analysis_cache
+    from .compute_pool import get_compute_pool
+    from .correlation_matrix import CorrelationMatrix
+    from .level_engine import LevelMap, get_level_engine
+    from .pattern_scanner import detect_patterns, get_pattern_stats
+    from .cvd_accumulator import CvdAccumulator, cvd_signal
+    from .lazy_analysis import LazySections, lazy_sections_enabled
+    from .indicator_engine import compute_indicators, rolling_max, rolling_min, trailing_mean
 except ImportError:
     from structure_analyzer import StructureAnalyzer
+    from single_flight import SingleFlight
+    from analysis_cache import get_analysis_cache
+    from compute_pool import get_compute_pool
+    from correlation_matrix import CorrelationMatrix
+    from level_engine import LevelMap, get_level_engine
+    from pattern_scanner import detect_patterns, get_pattern_stats
+    from cvd_accumulator import CvdAccumulator, cvd_signal
+    from lazy_analysis import LazySections, lazy_sections_enabled
+    from indicator_engine import compute_indicators, rolling_max, rolling_min, trailing_mean
 
 
 def validate_dataframe(df: pd.DataFrame, min_required: int = 20, symbol: str = "") -> Dict[str, Any]:
@@ -161,20 +180,87 @@ def safe_rolling_mean(series, window, default=0.0):
         return default
 
 
+def get_analysis_deadline() -> float:
+    """Дедлайн analyze_asset в секундах (ANALYSIS_DEADLINE env, 30)"""
+    return float(os.getenv("ANALYSIS_DEADLINE", "30"))
+
+
+def _copy_analysis(analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Копия результата analyze_asset для отдельного вызывающего
+    
+    Копируются верхний уровень и секции таймфреймов - именно туда
+    вызывающие дописывают свои поля (whale_analysis, volume_profile).
+    Ленивые секции при копировании не досчитываются.
+    """
+    result = dict(analysis)
+    if isinstance(analysis.get("timeframes"), dict):
+        result["timeframes"] = {
+            tf: data.copy() if isinstance(data, dict) else data
+            for tf, data in analysis["timeframes"].items()
+        }
+    return result
+
+
+# Анализатор процесса-исполнителя compute_pool (без клиента биржи)
+_window_analyzer: Optional["TechnicalAnalysis"] = None
+
+
+def analyze_window(symbol: str, timeframe: str, include_patterns: bool, candles: np.ndarray) -> Dict[str, Any]:
+    """
+    Анализ таймфрейма по окну свечей в процессе-исполнителе пула
+
+    Функция уровня модуля, чтобы передаваться в ProcessPoolExecutor.
+    """
+    global _window_analyzer
+    if _window_analyzer is None:
+        _window_analyzer = TechnicalAnalysis(None)
+    return _window_analyzer._compute_timeframe_analysis(symbol, timeframe, include_patterns, candles)
+
+
 class TechnicalAnalysis:
     """Движок технического анализа"""
     
     def __init__(self, bybit_client):
         self.client = bybit_client
-        self._btc_cache = {"data": None, "timestamp": 0}
         self.structure_analyzer = StructureAnalyzer()
+        # Объединение одновременных анализов одного актива (сканеры запускаются параллельно)
+        self.single_flight = SingleFlight("technical_analysis")
+        # Анализ таймфрейма по окну свечей общий для всех вызывающих (сканер, валидация, MCP)
+        self.analysis_cache = get_analysis_cache()
+        # CPU-bound расчёт таймфрейма выполняется вне event loop
+        self.compute_pool = get_compute_pool()
+        # SMC секции таймфрейма считаются при первом чтении (кроме пула процессов)
+        self.lazy_sections = lazy_sections_enabled()
+        # Матрицы корреляций universe по (timeframe, period), пересчёт раз за бар
+        self._correlation_matrices: Dict[tuple, CorrelationMatrix] = {}
+        # Карты уровней символов по закрытым барам всех анализируемых таймфреймов
+        self.level_engine = get_level_engine()
+        # Статистика срабатываний свечных паттернов по символам
+        self.pattern_stats = get_pattern_stats()
+        # CVD дочитывается от курсора последней сделки, а не пересчитывается по 1000 сделок
+        self.cvd_accumulator = CvdAccumulator(self._fetch_trade_arrays)
         logger.info("Technical Analysis engine initialized")
+
+    def correlation_matrix(self, timeframe: str = "1h", period: int = 24) -> CorrelationMatrix:
+        """Общая матрица корреляций для таймфрейма и периода"""
+        key = (timeframe, period)
+        matrix = self._correlation_matrices.get(key)
+        if matrix is None:
+            async def fetch(symbol: str, tf: str, limit: int):
+                return await self.client.get_ohlcv(symbol, tf, limit=limit)
+
+            matrix = CorrelationMatrix(fetch, timeframe, period)
+            self._correlation_matrices[key] = matrix
+        return matrix
     
     async def analyze_asset(
         self,
         symbol: str,
         timeframes: List[str] = ["5m", "15m", "1h", "4h", "1d"],
-        include_patterns: bool = True
+        include_patterns: bool = True,
+        deadline: Optional[float] = None,
+        include_order_flow: bool = True
     ) -> Dict[str, Any]:
         """
         ПОЛНЫЙ анализ актива на всех таймфреймах
@@ -183,9 +269,37 @@ class TechnicalAnalysis:
             symbol: Торговая пара (например "BTC/USDT")
             timeframes: Список таймфреймов для анализа
             include_patterns: Включить распознавание паттернов
+            deadline: Максимальное время анализа в секундах (если None - ANALYSIS_DEADLINE env, 30)
+            include_order_flow: Считать CVD и корреляцию с BTC (иначе см. analyze_order_flow)
             
         Returns:
-            Детальный анализ по каждому таймфрейму + composite signal
+            Детальный анализ по каждому таймфрейму + composite signal,
+            latency_ms по шагам и partial/timed_out, если дедлайн истёк
+        """
+        if deadline is None:
+            deadline = get_analysis_deadline()
+        # Каждый вызывающий получает свою копию - сканер дописывает поля в результат.
+        # Дедлайн входит в ключ: вызов с коротким дедлайном не ждёт анализ с длинным
+        return await self.single_flight.do(
+            ("analyze_asset", symbol, tuple(timeframes), include_patterns, include_order_flow, deadline),
+            lambda: self._analyze_asset(symbol, list(timeframes), include_patterns, deadline, include_order_flow),
+            share=_copy_analysis
+        )
+    
+    async def _analyze_asset(
+        self,
+        symbol: str,
+        timeframes: List[str],
+        include_patterns: bool,
+        deadline: float,
+        include_order_flow: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Полный анализ актива (без объединения запросов, см. analyze_asset)
+
+        CVD и корреляция с BTC запускаются сразу, таймфреймы - параллельно
+        после общей загрузки свечей. Шаги, не успевшие к дедлайну,
+        отменяются и помечаются ошибкой timeout, остальные возвращаются.
         """
         logger.info(f"Analyzing {symbol} on timeframes: {timeframes}")
         
@@ -195,44 +309,207 @@ class TechnicalAnalysis:
             "timeframes": {}
         }
         
-        # Анализ на каждом таймфрейме
-        for tf in timeframes:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline_at = started + deadline
+        latency: Dict[str, float] = {}
+        timed_out: List[str] = []
+        
+        async def timed(step: str, coro):
+            step_started = loop.time()
             try:
-                tf_analysis = await self._analyze_timeframe(symbol, tf, include_patterns)
-                results["timeframes"][tf] = tf_analysis
-            except Exception as e:
-                logger.error(f"Error analyzing {symbol} on {tf}: {e}")
-                results["timeframes"][tf] = {"error": str(e)}
+                return await coro
+            finally:
+                latency[step] = round((loop.time() - step_started) * 1000, 1)
+        
+        # Order Flow (CVD) и BTC Correlation (если это не BTC) не зависят от свечей анализа
+        side_tasks = {}
+        if include_order_flow:
+            side_tasks["cvd_analysis"] = asyncio.ensure_future(timed("cvd_analysis", self.get_cvd_divergence(symbol)))
+        if include_order_flow and "BTC" not in symbol and "btc" not in symbol.lower():
+            side_tasks["btc_correlation"] = asyncio.ensure_future(
+                timed("btc_correlation", self.get_btc_correlation(symbol))
+            )
+        
+        # Свечи всех таймфреймов одним планом загрузки (старшие собираются из младших)
+        try:
+            prefetched = await asyncio.wait_for(
+                timed("prefetch", self._prefetch_ohlcv(symbol, timeframes)),
+                timeout=max(0.0, deadline_at - loop.time())
+            )
+        except asyncio.TimeoutError:
+            timed_out.append("prefetch")
+            prefetched = {}
+        
+        # Анализ на каждом таймфрейме
+        tf_tasks = {
+            tf: asyncio.ensure_future(timed(
+                f"timeframe_{tf}",
+                self._analyze_timeframe(symbol, tf, include_patterns, ohlcv=prefetched.get(tf))
+            ))
+            for tf in timeframes
+        }
+        
+        pending_tasks = list(tf_tasks.values()) + list(side_tasks.values())
+        _, pending = await asyncio.wait(pending_tasks, timeout=max(0.0, deadline_at - loop.time()))
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        
+        for tf, task in tf_tasks.items():
+            if task in pending:
+                timed_out.append(f"timeframe_{tf}")
+                results["timeframes"][tf] = {
+                    "error": "timeout",
+                    "message": f"Analysis of {tf} did not finish within {deadline:.0f}s"
+                }
+            elif task.exception() is not None:
+                logger.error(f"Error analyzing {symbol} on {tf}: {task.exception()}")
+                results["timeframes"][tf] = {"error": str(task.exception())}
+            else:
+                results["timeframes"][tf] = task.result()
         
         # Composite signal (объединённый сигнал)
         results["composite_signal"] = self._generate_composite_signal(results["timeframes"])
         
-        # Order Flow Analysis (CVD)
-        try:
-            results["cvd_analysis"] = await self.get_cvd_divergence(symbol)
-        except Exception as e:
-            logger.warning(f"Could not calculate CVD for {symbol}: {e}")
-            results["cvd_analysis"] = {"signal": "NONE", "error": str(e)}
+        key_levels = self._key_levels(symbol, results["timeframes"])
+        if key_levels:
+            results["key_levels"] = key_levels
+        
+        for name, task in side_tasks.items():
+            if task in pending:
+                timed_out.append(name)
+                logger.warning(f"{name} for {symbol} did not finish within {deadline:.0f}s")
+                if name == "cvd_analysis":
+                    results[name] = {"signal": "NONE", "error": "timeout"}
+            elif task.exception() is not None:
+                logger.warning(f"Could not calculate {name} for {symbol}: {task.exception()}")
+                if name == "cvd_analysis":
+                    results[name] = {"signal": "NONE", "error": str(task.exception())}
+            else:
+                results[name] = task.result()
         
-        # BTC Correlation (если это не BTC)
-        if "BTC" not in symbol and "btc" not in symbol.lower():
-            try:
-                results["btc_correlation"] = await self.get_btc_correlation(symbol)
-            except Exception as e:
-                logger.warning(f"Could not calculate BTC correlation for {symbol}: {e}")
+        latency["total"] = round((loop.time() - started) * 1000, 1)
+        results["latency_ms"] = latency
+        results["partial"] = bool(timed_out)
+        if timed_out:
+            results["timed_out"] = timed_out
         
         return results
     
+    async def resolve_sections(
+        self,
+        analysis: Dict[str, Any],
+        sections: Optional[Iterable[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Досчитать ленивые секции анализа в пуле вычислений, а не в event loop
+
+        Args:
+            analysis: Результат analyze_asset или _analyze_timeframe
+            sections: Какие секции досчитать (все, если None)
+
+        Returns:
+            Тот же analysis (секции посчитаны на месте)
+        """
+        sections = None if sections is None else tuple(sections)
+        parts = [analysis, *analysis.get("timeframes", {}).values()]
+        for part in parts:
+            if not isinstance(part, LazySections):
+                continue
+            pending = [key for key in part.pending if sections is None or key in sections]
+            if pending:
+                await self.compute_pool.run(part.resolve, pending)
+        return analysis
+    
+    async def analyze_order_flow(self, symbol: str) -> Dict[str, Any]:
+        """
+        CVD и корреляция с BTC отдельно от analyze_asset(include_order_flow=False)
+
+        Returns:
+            {"cvd_analysis": ..., "btc_correlation": ...} - поля в формате analyze_asset
+        """
+        steps = {"cvd_analysis": self.get_cvd_divergence(symbol)}
+        if "BTC" not in symbol and "btc" not in symbol.lower():
+            steps["btc_correlation"] = self.get_btc_correlation(symbol)
+        values = await asyncio.gather(*steps.values(), return_exceptions=True)
+        
+        results = {}
+        for name, value in zip(steps, values):
+            if isinstance(value, Exception):
+                logger.warning(f"Could not calculate {name} for {symbol}: {value}")
+                if name == "cvd_analysis":
+                    results[name] = {"signal": "NONE", "error": str(value)}
+            else:
+                results[name] = value
+        return results
+    
+    async def _prefetch_ohlcv(self, symbol: str, timeframes: List[str]) -> Dict[str, List[List]]:
+        """Свечи для набора таймфреймов (пустой словарь при ошибке - таймфреймы загрузятся по одному)"""
+        try:
+            return await self.client.get_ohlcv_multi(symbol, timeframes, limit=200)
+        except Exception as e:
+            logger.warning(f"Could not prefetch OHLCV for {symbol}: {e}")
+            return {}
+    
     async def _analyze_timeframe(
         self,
         symbol: str,
         timeframe: str,
-        include_patterns: bool
+        include_patterns: bool,
+        ohlcv: Optional[List[List]] = None
     ) -> Dict[str, Any]:
-        """Анализ на одном таймфрейме с валидацией данных"""
+        """
+        Анализ на одном таймфрейме с валидацией данных
+
+        Результат кешируется по окну свечей: повторный вызов до прихода
+        нового бара возвращает копию уже посчитанного анализа.
+        """
+        
+        # Получаем OHLCV данные (если не загружены заранее)
+        if ohlcv is None:
+            ohlcv = await self.client.get_ohlcv(symbol, timeframe, limit=200)
         
-        # Получаем OHLCV данные
-        ohlcv = await self.client.get_ohlcv(symbol, timeframe, limit=200)
+        # Один массив (N, 6) на кеш и расчёт; в пул потоков передаётся без копирования
+        candles = np.asarray(ohlcv, dtype=np.float64).reshape(-1, 6)
+        # Последний бар формируется - в карту уровней идут только закрытые
+        self.level_engine.update(symbol, timeframe, candles[:-1])
+        if include_patterns:
+            self.pattern_stats.update(symbol, timeframe, candles[:-1])
+        params = {"include_patterns": include_patterns}
+        analysis = self.analysis_cache.get(symbol, timeframe, candles, params)
+        if analysis is None:
+            if self.compute_pool.mode == "process":
+                analysis = await self.compute_pool.run(analyze_window, symbol, timeframe, include_patterns, candles)
+            else:
+                analysis = await self.compute_pool.run(
+                    self._compute_timeframe_analysis, symbol, timeframe, include_patterns, candles, self.lazy_sections
+                )
+            self.analysis_cache.put(symbol, timeframe, candles, params, analysis)
+        # Вызывающие дописывают поля в секцию таймфрейма (volume_profile) - отдаём копию;
+        # копия ленивого анализа досчитывает секции через закешированный оригинал
+        analysis = analysis.copy()
+        if analysis.get("patterns"):
+            # Надёжность паттернов - по всей накопленной истории символа, а не по одному окну
+            analysis["patterns"] = self.pattern_stats.apply(symbol, analysis["patterns"])
+        return analysis
+
+    def _compute_timeframe_analysis(
+        self,
+        symbol: str,
+        timeframe: str,
+        include_patterns: bool,
+        ohlcv: Any,
+        lazy: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Расчёт анализа таймфрейма по окну свечей (без кеша, см. _analyze_timeframe)
+
+        Не обращается к клиенту и не меняет состояние - выполняется в пуле compute_pool.
+        При lazy=True order blocks, FVG, структура и liquidity grabs не влияют
+        на сигнал и считаются при первом чтении (LazySections).
+        """
         
         # Конвертируем в DataFrame
         df = pd.DataFrame(
@@ -276,17 +553,13 @@ class TechnicalAnalysis:
         if include_patterns:
             patterns = self._detect_patterns(df)
             
-        # Order Blocks
-        order_blocks = self.find_order_blocks(df)
-        
-        # Fair Value Gaps
-        fvgs = self.find_fair_value_gaps(df)
-        
-        # Structure Analysis (BOS/ChoCh)
-        structure = self.structure_analyzer.detect_structure_breaks(df)
-        
-        # Liquidity Grabs (Stop Hunts)
-        liquidity_grabs = self.detect_liquidity_grabs(df)
+        # SMC секции: Order Blocks, Fair Value Gaps, Structure (BOS/ChoCh), Liquidity Grabs (Stop Hunts)
+        smc_sections = {
+            "order_blocks": lambda: self.find_order_blocks(df),
+            "fair_value_gaps": lambda: self.find_fair_value_gaps(df),
+            "structure": lambda: self.structure_analyzer.detect_structure_breaks(df),
+            "liquidity_grabs": lambda: self.detect_liquidity_grabs(df)
+        }
         
         # Генерация сигнала
         signal = self._generate_signal(indicators, trend, levels, patterns)
@@ -295,7 +568,7 @@ class TechnicalAnalysis:
         available_points = len(df)
         h24_window = min(24 if timeframe == "1h" else 10, available_points)
         
-        return {
+        analysis = {
             "timeframe": timeframe,
             "current_price": float(df['close'].iloc[-1]),
             "ohlcv_summary": {
@@ -308,114 +581,30 @@ class TechnicalAnalysis:
             "trend": trend,
             "levels": levels,
             "patterns": patterns,
-            "order_blocks": order_blocks,
-            "fair_value_gaps": fvgs,
-            "structure": structure,
-            "liquidity_grabs": liquidity_grabs,
             "signal": signal
         }
+        if lazy:
+            return LazySections(analysis, smc_sections)
+        analysis.update({name: compute() for name, compute in smc_sections.items()})
+        return analysis
     
     def _calculate_all_indicators(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """Расчёт всех технических индикаторов"""
-        
-        indicators = {}
-        
-        # RSI (несколько периодов)
-        indicators['rsi'] = {
-            'rsi_7': float(ta.momentum.rsi(df['close'], window=7).iloc[-1]),
-            'rsi_14': float(ta.momentum.rsi(df['close'], window=14).iloc[-1]),
-            'rsi_21': float(ta.momentum.rsi(df['close'], window=21).iloc[-1])
-        }
-        
-        # MACD
-        macd = ta.trend.MACD(df['close'])
-        indicators['macd'] = {
-            'macd_line': float(macd.macd().iloc[-1]),
-            'signal_line': float(macd.macd_signal().iloc[-1]),
-            'histogram': float(macd.macd_diff().iloc[-1]),
-            'crossover': 'bullish' if macd.macd().iloc[-1] > macd.macd_signal().iloc[-1] else 'bearish'
-        }
-        
-        # Bollinger Bands
-        bb = ta.volatility.BollingerBands(df['close'])
-        bb_width = (bb.bollinger_hband().iloc[-1] - bb.bollinger_lband().iloc[-1]) / bb.bollinger_mavg().iloc[-1] * 100
-        
-        indicators['bollinger_bands'] = {
-            'upper': float(bb.bollinger_hband().iloc[-1]),
-            'middle': float(bb.bollinger_mavg().iloc[-1]),
-            'lower': float(bb.bollinger_lband().iloc[-1]),
-            'width': float(bb_width),
-            'squeeze': bool(bb_width < 2.0)  # Squeeze если ширина < 2% - конвертируем в bool для JSON
-        }
-        
-        # EMA (множественные периоды)
-        indicators['ema'] = {
-            'ema_9': float(ta.trend.ema_indicator(df['close'], window=9).iloc[-1]),
-            'ema_20': float(ta.trend.ema_indicator(df['close'], window=20).iloc[-1]),
-            'ema_50': float(ta.trend.ema_indicator(df['close'], window=50).iloc[-1]),
-            'ema_100': float(ta.trend.ema_indicator(df['close'], window=100).iloc[-1]),
-            'ema_200': float(ta.trend.ema_indicator(df['close'], window=200).iloc[-1])
-        }
-        
-        # EMA alignment
-        current_price = df['close'].iloc[-1]
-        ema_values = [
-            current_price,
-            indicators['ema']['ema_9'],
-            indicators['ema']['ema_20'],
-            indicators['ema']['ema_50'],
-            indicators['ema']['ema_200']
-        ]
-        
-        is_bullish_alignment = all(ema_values[i] > ema_values[i+1] for i in range(len(ema_values)-1))
-        is_bearish_alignment = all(ema_values[i] < ema_values[i+1] for i in range(len(ema_values)-1))
-        
-        indicators['ema']['alignment'] = 'bullish' if is_bullish_alignment else 'bearish' if is_bearish_alignment else 'mixed'
-        
-        # ATR
-        atr = ta.volatility.average_true_range(df['high'], df['low'], df['close'], window=14)
-        indicators['atr'] = {
-            'atr_14': float(atr.iloc[-1]),
-            'atr_7': float(ta.volatility.average_true_range(df['high'], df['low'], df['close'], window=7).iloc[-1])
-        }
-        
-        # ADX
-        adx = ta.trend.ADXIndicator(df['high'], df['low'], df['close'])
-        indicators['adx'] = {
-            'adx': float(adx.adx().iloc[-1]),
-            'adx_pos': float(adx.adx_pos().iloc[-1]),
-            'adx_neg': float(adx.adx_neg().iloc[-1]),
-            'trend_strength': 'strong' if adx.adx().iloc[-1] > 25 else 'weak'
-        }
-        
-        # Stochastic
-        stoch = ta.momentum.StochasticOscillator(df['high'], df['low'], df['close'])
-        indicators['stochastic'] = {
-            'stoch_k': float(stoch.stoch().iloc[-1]),
-            'stoch_d': float(stoch.stoch_signal().iloc[-1]),
-            'crossover': 'bullish' if stoch.stoch().iloc[-1] > stoch.stoch_signal().iloc[-1] else 'bearish'
-        }
+        """
+        Расчёт всех технических индикаторов
         
-        # Volume indicators (строки 230-236)
+        Один векторизованный проход indicator_engine по numpy массивам
+        (значения совпадают с библиотекой ta).
+        """
         # ✅ ADAPTIVE WINDOW для volume calculations
         volume_window = adaptive_window(df, 20)
-        obv_series = ta.volume.on_balance_volume(df['close'], df['volume'])
-        volume_sma = df['volume'].rolling(volume_window, min_periods=1).mean()
-        
-        indicators['volume'] = {
-            'obv': float(obv_series.iloc[-1]) if len(obv_series) > 0 else 0.0,
-            'volume_sma': float(volume_sma.iloc[-1]) if len(volume_sma) > 0 else 0.0,
-            'current_volume': float(df['volume'].iloc[-1]) if len(df) > 0 else 0.0,
-            'volume_ratio': float(df['volume'].iloc[-1] / volume_sma.iloc[-1]) if len(volume_sma) > 0 and volume_sma.iloc[-1] > 0 else 1.0,
-            'window_used': volume_window  # Для отладки
-        }
-        
-        # VWAP (для интрадей)
-        if len(df) >= 20:
-            typical_price = (df['high'] + df['low'] + df['close']) / 3
-            indicators['vwap'] = float((typical_price * df['volume']).sum() / df['volume'].sum())
         
-        return indicators
+        return compute_indicators(
+            df['high'].to_numpy(dtype=np.float64),
+            df['low'].to_numpy(dtype=np.float64),
+            df['close'].to_numpy(dtype=np.float64),
+            df['volume'].to_numpy(dtype=np.float64),
+            volume_window=volume_window
+        )
     
     def _analyze_trend(self, df: pd.DataFrame, indicators: Dict) -> Dict[str, Any]:
         """Анализ тренда"""
@@ -459,153 +648,51 @@ class TechnicalAnalysis:
             "ema_alignment": indicators['ema']['alignment']
         }
     
-    def _find_support_resistance(self, df: pd.DataFrame, lookback: int = 50) -> Dict[str, List[float]]:
-        """Поиск уровней поддержки и сопротивления"""
-        
-        # Используем локальные минимумы и максимумы
-        recent_df = df.tail(lookback)
-        
-        # Простой метод: найти локальные экстремумы
-        highs = recent_df['high'].nlargest(5).values
-        lows = recent_df['low'].nsmallest(5).values
-        
-        # Кластеризация близких уровней
-        resistance_levels = self._cluster_levels(highs, tolerance=0.02)
-        support_levels = self._cluster_levels(lows, tolerance=0.02)
-        
+    def _find_support_resistance(self, df: pd.DataFrame, count: int = 5) -> Dict[str, List[float]]:
+        """
+        Поиск уровней поддержки и сопротивления
+
+        Уровни - пики плотности swing точек всего окна (см. level_engine),
+        count ближайших к текущей цене с каждой стороны.
+        """
+        if df.empty:
+            return {"support": [], "resistance": []}
+        level_map = LevelMap()
+        candles = np.column_stack([
+            np.arange(len(df), dtype=np.float64),
+            df[['open', 'high', 'low', 'close', 'volume']].to_numpy(dtype=np.float64)
+        ])
+        level_map.add_candles(candles)
+        return level_map.support_resistance(float(df['close'].iloc[-1]), count)
+    
+    def _key_levels(self, symbol: str, timeframes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Ближайшие уровни карты символа (все таймфреймы) к текущей цене"""
+        level_map = self.level_engine.get(symbol)
+        price = next((tf["current_price"] for tf in timeframes.values() if "current_price" in tf), None)
+        if level_map is None or price is None:
+            return None
         return {
-            "support": [float(x) for x in support_levels],
-            "resistance": [float(x) for x in resistance_levels]
+            "nearest_support": level_map.nearest_below(price),
+            "nearest_resistance": level_map.nearest_above(price),
+            **level_map.support_resistance(price)
         }
     
-    def _cluster_levels(self, levels: np.ndarray, tolerance: float = 0.02) -> List[float]:
-        """Кластеризация близких уровней"""
-        if len(levels) == 0:
-            return []
-        
-        clustered = []
-        sorted_levels = np.sort(levels)
-        
-        current_cluster = [sorted_levels[0]]
-        
-        for level in sorted_levels[1:]:
-            if abs(level - current_cluster[0]) / current_cluster[0] < tolerance:
-                current_cluster.append(level)
-            else:
-                clustered.append(np.mean(current_cluster))
-                current_cluster = [level]
-        
-        clustered.append(np.mean(current_cluster))
-        
-        return clustered
-    
     def _detect_patterns(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """Детектор свечных паттернов - РАСШИРЕННЫЙ"""
-        
-        patterns = {
-            "candlestick": [],
-            "chart": []
-        }
+        """
+        Детектор свечных паттернов - РАСШИРЕННЫЙ
+
+        Все бары окна размечаются одним векторным проходом (pattern_scanner);
+        возвращаются паттерны последнего бара с надёжностью по статистике окна.
+        """
         
         if len(df) < 3:
-            return patterns
-        
-        # Последние свечи для анализа
-        recent = df.tail(5)
-        last = recent.iloc[-1]
-        prev = recent.iloc[-2] if len(recent) > 1 else None
-        prev2 = recent.iloc[-3] if len(recent) > 2 else None
-        
-        # Расчет компонентов свечи
-        body = abs(last['close'] - last['open'])
-        lower_shadow = min(last['open'], last['close']) - last['low']
-        upper_shadow = last['high'] - max(last['open'], last['close'])
-        candle_range = last['high'] - last['low']
-        
-        # === СУЩЕСТВУЮЩИЕ ПАТТЕРНЫ ===
-        
-        # Hammer
-        if candle_range > 0 and lower_shadow > body * 2 and upper_shadow < body * 0.5:
-            patterns['candlestick'].append({
-                "name": "Hammer",
-                "type": "bullish",
-                "reliability": 0.65,
-                "description": "Potential reversal from downtrend"
-            })
-        
-        # Shooting Star
-        if candle_range > 0 and upper_shadow > body * 2 and lower_shadow < body * 0.5:
-            patterns['candlestick'].append({
-                "name": "Shooting Star",
-                "type": "bearish",
-                "reliability": 0.65,
-                "description": "Potential reversal from uptrend"
-            })
+            return {"candlestick": [], "chart": []}
         
-        # Doji
-        if candle_range > 0 and body < candle_range * 0.1:
-            patterns['candlestick'].append({
-                "name": "Doji",
-                "type": "neutral",
-                "reliability": 0.50,
-                "description": "Indecision, potential reversal"
-            })
-        
-        # === НОВЫЕ ПАТТЕРНЫ ===
-        
-        if prev is not None:
-            prev_body = abs(prev['close'] - prev['open'])
-            
-            # Bullish Engulfing
-            if (prev['close'] < prev['open'] and
-                last['close'] > last['open'] and
-                last['close'] > prev['open'] and
-                last['open'] < prev['close']):
-                patterns['candlestick'].append({
-                    "name": "Bullish Engulfing",
-                    "type": "bullish",
-                    "reliability": 0.70,
-                    "description": "Strong reversal signal"
-                })
-            
-            # Bearish Engulfing
-            if (prev['close'] > prev['open'] and
-                last['close'] < last['open'] and
-                last['close'] < prev['open'] and
-                last['open'] > prev['close']):
-                patterns['candlestick'].append({
-                    "name": "Bearish Engulfing",
-                    "type": "bearish",
-                    "reliability": 0.70,
-                    "description": "Strong reversal signal"
-                })
-            
-            # Morning Star (требует 3 свечи)
-            if prev2 is not None:
-                if (prev2['close'] < prev2['open'] and  # Первая медвежья
-                    abs(prev['close'] - prev['open']) < prev_body * 0.3 and  # Вторая маленькая
-                    last['close'] > last['open'] and  # Третья бычья
-                    last['close'] > (prev2['open'] + prev2['close']) / 2):  # Закрылась выше середины первой
-                    patterns['candlestick'].append({
-                        "name": "Morning Star",
-                        "type": "bullish",
-                        "reliability": 0.75,
-                        "description": "Strong three-candle reversal pattern"
-                    })
-                
-                # Evening Star
-                if (prev2['close'] > prev2['open'] and  # Первая бычья
-                    abs(prev['close'] - prev['open']) < prev_body * 0.3 and  # Вторая маленькая
-                    last['close'] < last['open'] and  # Третья медвежья
-                    last['close'] < (prev2['open'] + prev2['close']) / 2):  # Закрылась ниже середины первой
-                    patterns['candlestick'].append({
-                        "name": "Evening Star",
-                        "type": "bearish",
-                        "reliability": 0.75,
-                        "description": "Strong three-candle reversal pattern"
-                    })
-        
-        return patterns
+        candles = np.column_stack([
+            np.arange(len(df), dtype=np.float64),
+            df[['open', 'high', 'low', 'close', 'volume']].to_numpy(dtype=np.float64)
+        ])
+        return detect_patterns(candles)
     
     def _generate_signal(
         self,
@@ -807,167 +894,92 @@ class TechnicalAnalysis:
         else:
             return "Нет чёткого сигнала. Лучше подождать более ясной картины."
     
-    async def get_cvd_divergence(self, symbol: str, limit: int = 1000) -> Dict[str, Any]:
+    async def get_cvd_divergence(
+        self,
+        symbol: str,
+        limit: int = 1000,
+        window_seconds: Optional[int] = None
+    ) -> Dict[str, Any]:
         """
         Анализ Order Flow: Cumulative Volume Delta (CVD) + Aggressive Ratio
         Определяет поглощение лимитными ордерами и агрессивность покупателей/продавцов.
+        
+        Args:
+            symbol: Торговая пара
+            limit: Количество последних сделок
+            window_seconds: Окно по времени вместо количества сделок (из ленты сделок)
         """
         logger.info(f"Calculating CVD + Aggressive Ratio for {symbol}")
         try:
-            trades = await self.client.get_public_trade_history(symbol, limit=limit)
-            if not trades:
+            covered = None
+            if window_seconds:
+                flow, covered = await self.cvd_accumulator.window(symbol, window_seconds)
+            else:
+                series = await self.cvd_accumulator.update(symbol)
+                flow = series.last(limit)
+            if flow["trades_count"] == 0:
                 return {"signal": "NONE", "details": "No trades data"}
 
-            trades.sort(key=lambda x: x['timestamp'])
-            
-            cumulative_delta = 0
-            cvd_series = []
-            price_series = []
-            
-            # НОВОЕ: Aggressive tracking
-            aggressive_buys = 0
-            aggressive_sells = 0
-            total_buy_volume = 0
-            total_sell_volume = 0
-            
-            for trade in trades:
-                size = float(trade['amount'])
-                price = float(trade['price'])
-                side = trade['side']  # 'buy' или 'sell'
-                
-                if side == 'buy':
-                    cumulative_delta += size
-                    aggressive_buys += 1
-                    total_buy_volume += size
-                else:
-                    cumulative_delta -= size
-                    aggressive_sells += 1
-                    total_sell_volume += size
-                
-                cvd_series.append(cumulative_delta)
-                price_series.append(price)
-            
-            if not price_series:
-                return {"signal": "NONE"}
-
-            # Анализ дивергенции
-            idx_start = 0
-            idx_end = len(price_series) - 1
-            
-            price_change = (price_series[idx_end] - price_series[idx_start]) / price_series[idx_start]
-            cvd_change = cvd_series[idx_end] - cvd_series[idx_start]
-            
-            # НОВОЕ: Aggressive Ratio
-            aggressive_ratio = aggressive_buys / aggressive_sells if aggressive_sells > 0 else 0
-            volume_ratio = total_buy_volume / total_sell_volume if total_sell_volume > 0 else 0
-            
-            signal = "NONE"
-            details = "No divergence"
-            
-            # Цена падает, CVD растет (Bullish Absorption)
-            if price_change < -0.005 and cvd_change > 0:
-                signal = "BULLISH_ABSORPTION"
-                details = "Price dropping, but aggressive buying detected (Limit Buy Absorption)"
-            
-            # Цена растет, CVD падает (Bearish Absorption)
-            elif price_change > 0.005 and cvd_change < 0:
-                signal = "BEARISH_ABSORPTION"
-                details = "Price rising, but aggressive selling detected (Limit Sell Absorption)"
-            
-            # НОВОЕ: Aggressive Dominance (без дивергенции, но сильный перекос)
-            elif aggressive_ratio > 2.5:
-                signal = "AGGRESSIVE_BUYING"
-                details = f"Strong buying pressure (ratio: {aggressive_ratio:.2f})"
-            elif aggressive_ratio < 0.4:
-                signal = "AGGRESSIVE_SELLING"
-                details = f"Strong selling pressure (ratio: {aggressive_ratio:.2f})"
-                
-            return {
-                "signal": signal,
-                "price_change_pct": round(price_change * 100, 2),
-                "cvd_delta": round(cvd_change, 2),
-                "aggressive_ratio": round(aggressive_ratio, 2),
-                "volume_ratio": round(volume_ratio, 2),
-                "aggressive_buys": aggressive_buys,
-                "aggressive_sells": aggressive_sells,
-                "details": details,
-                "trades_count": len(trades)
-            }
+            result = cvd_signal(flow)
+            # CVD по стандартным окнам из уже накопленных сделок (без запросов)
+            result["windows"] = self.cvd_accumulator.windows(symbol)
+            if covered is not None:
+                result["covered"] = covered
+            return result
             
         except Exception as e:
             logger.error(f"Error calculating CVD: {e}")
             return {"signal": "ERROR", "error": str(e)}
 
+    async def _fetch_trade_arrays(self, symbol: str, limit: int, since_ms: Optional[int]):
+        """Источник сделок для cvd_accumulator (лента сделок или REST)"""
+        return await self.client.get_trade_arrays(symbol, limit=limit, since_ms=since_ms)
+
     def find_order_blocks(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
         """
         Поиск Order Blocks (институциональных зон спроса/предложения)
         Bullish OB: Последняя медвежья свеча перед сильным импульсом вверх (BOS)
         """
-        order_blocks = []
         if len(df) < 20:
             return []
-            
-        # Конвертируем в список словарей для скорости
-        candles = df.to_dict('records')
-        
-        # Итерация (исключая самые последние свечи чтобы подтвердить BOS)
-        for i in range(2, len(candles) - 3):
-            candle = candles[i]
-            prev_candle = candles[i-1]
-            
-            # 1. Bullish OB
-            # Условие: Сильный импульс вверх (тело > 2x среднего)
-            body = abs(candle['close'] - candle['open'])
-            candle_slice = candles[max(0, i-5):i]
-            if len(candle_slice) > 0:
-                avg_body = safe_mean([abs(c['close'] - c['open']) for c in candle_slice])
-            else:
-                avg_body = 0.0
-            
-            if (candle['close'] > candle['open'] and  # Зеленая
-                body > avg_body * 1.5 and             # Импульсная
-                prev_candle['close'] < prev_candle['open']): # Предыдущая красная
-                
-                # Проверяем слом структуры (цена ушла выше хая предыдущей свечи)
-                if candle['close'] > prev_candle['high']:
-                    ob = {
-                        "type": "bullish_ob",
-                        "top": prev_candle['high'],
-                        "bottom": prev_candle['low'],
-                        "price": (prev_candle['high'] + prev_candle['low']) / 2,
-                        "index": i-1,
-                        "strength": "strong" if body > avg_body * 2.5 else "moderate"
-                    }
-                    order_blocks.append(ob)
-            
-            # 2. Bearish OB
-            elif (candle['close'] < candle['open'] and  # Красная
-                  body > avg_body * 1.5 and             # Импульсная
-                  prev_candle['close'] > prev_candle['open']): # Предыдущая зеленая
-                  
-                if candle['close'] < prev_candle['low']:
-                    ob = {
-                        "type": "bearish_ob",
-                        "top": prev_candle['high'],
-                        "bottom": prev_candle['low'],
-                        "price": (prev_candle['high'] + prev_candle['low']) / 2,
-                        "index": i-1,
-                        "strength": "strong" if body > avg_body * 2.5 else "moderate"
-                    }
-                    order_blocks.append(ob)
-        
-        # Возвращаем только актуальные (цена еще не пробила их полностью)
-        current_price = candles[-1]['close']
+
+        open_ = df['open'].to_numpy(dtype=np.float64)
+        high = df['high'].to_numpy(dtype=np.float64)
+        low = df['low'].to_numpy(dtype=np.float64)
+        close = df['close'].to_numpy(dtype=np.float64)
+
+        # Тело свечи и среднее тело 5 предыдущих свечей (NaN -> 0 как safe_mean)
+        body = np.abs(close - open_)
+        avg_body = np.nan_to_num(trailing_mean(body, 5), nan=0.0)
+
+        # Кандидаты (исключая самые последние свечи чтобы подтвердить BOS)
+        idx = np.arange(2, len(df) - 3)
+        prev = idx - 1
+        impulse = body[idx] > avg_body[idx] * 1.5
+
+        # 1. Bullish OB: импульсная зеленая после красной со сломом хая предыдущей свечи
+        bullish = (close[idx] > open_[idx]) & impulse & (close[prev] < open_[prev]) & (close[idx] > high[prev])
+        # 2. Bearish OB: импульсная красная после зеленой со сломом лоя предыдущей свечи
+        bearish = (close[idx] < open_[idx]) & impulse & (close[prev] > open_[prev]) & (close[idx] < low[prev])
+
+        # Только актуальные (цена еще не пробила их полностью)
+        current_price = close[-1]
+        bullish &= current_price > low[prev]
+        bearish &= current_price < high[prev]
+
         active_obs = []
-        for ob in order_blocks:
-            if ob['type'] == 'bullish_ob' and current_price > ob['bottom']:
-                active_obs.append(ob)
-            elif ob['type'] == 'bearish_ob' and current_price < ob['top']:
-                active_obs.append(ob)
-                
         # Возвращаем последние 3 OB
-        return active_obs[-3:]
-    
+        for i in idx[bullish | bearish][-3:]:
+            active_obs.append({
+                "type": "bullish_ob" if bullish[i - 2] else "bearish_ob",
+                "top": float(high[i - 1]),
+                "bottom": float(low[i - 1]),
+                "price": float((high[i - 1] + low[i - 1]) / 2),
+                "index": int(i - 1),
+                "strength": "strong" if body[i] > avg_body[i] * 2.5 else "moderate"
+            })
+        return active_obs
+
     def find_fair_value_gaps(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
         """
         Поиск FVG (Fair Value Gaps) - институциональные зоны дисбаланса
@@ -981,121 +993,107 @@ class TechnicalAnalysis:
         Returns:
             Список FVG с координатами и силой
         """
-        fvgs = []
         if len(df) < 3:
             return []
-        
-        candles = df.to_dict('records')
-        current_price = candles[-1]['close']
-        
-        # Итерация (исключая последние 2 свечи для подтверждения)
-        for i in range(len(candles) - 2):
-            candle_1 = candles[i]
-            candle_2 = candles[i+1]
-            candle_3 = candles[i+2]
-            
-            # Bullish FVG: Импульс вверх оставил gap
-            # candle_3.low > candle_1.high (gap между ними)
-            if candle_3['low'] > candle_1['high']:
-                gap_size = candle_3['low'] - candle_1['high']
-                gap_pct = (gap_size / candle_1['high']) * 100
-                
-                # Фильтруем мелкие gaps (< 0.1%)
-                if gap_pct >= 0.1:
-                    fvg = {
-                        "type": "bullish_fvg",
-                        "top": candle_3['low'],
-                        "bottom": candle_1['high'],
-                        "mid": (candle_3['low'] + candle_1['high']) / 2,
-                        "size_pct": round(gap_pct, 3),
-                        "index": i,
-                        "strength": "strong" if gap_pct >= 0.5 else "moderate",
-                        "filled": current_price < candle_1['high']  # Gap заполнен?
-                    }
-                    fvgs.append(fvg)
-            
-            # Bearish FVG: Импульс вниз оставил gap
-            # candle_3.high < candle_1.low (gap между ними)
-            elif candle_3['high'] < candle_1['low']:
-                gap_size = candle_1['low'] - candle_3['high']
-                gap_pct = (gap_size / candle_1['low']) * 100
-                
-                if gap_pct >= 0.1:
-                    fvg = {
-                        "type": "bearish_fvg",
-                        "top": candle_1['low'],
-                        "bottom": candle_3['high'],
-                        "mid": (candle_1['low'] + candle_3['high']) / 2,
-                        "size_pct": round(gap_pct, 3),
-                        "index": i,
-                        "strength": "strong" if gap_pct >= 0.5 else "moderate",
-                        "filled": current_price > candle_1['low']
-                    }
-                    fvgs.append(fvg)
-        
-        # Возвращаем только незаполненные FVG (актуальные для торговли)
-        active_fvgs = [fvg for fvg in fvgs if not fvg['filled']]
-        
+
+        high = df['high'].to_numpy(dtype=np.float64)
+        low = df['low'].to_numpy(dtype=np.float64)
+        current_price = float(df['close'].iloc[-1])
+
+        # candle_1 = i, candle_3 = i + 2 (исключая последние 2 свечи для подтверждения)
+        high_1, low_1 = high[:-2], low[:-2]
+        high_3, low_3 = high[2:], low[2:]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # Bullish FVG: Импульс вверх оставил gap (candle_3.low > candle_1.high)
+            bullish = low_3 > high_1
+            bull_pct = (low_3 - high_1) / high_1 * 100
+            # Bearish FVG: Импульс вниз оставил gap (candle_3.high < candle_1.low)
+            bearish = ~bullish & (high_3 < low_1)
+            bear_pct = (low_1 - high_3) / low_1 * 100
+
+        # Фильтруем мелкие gaps (< 0.1%) и заполненные (неактуальные для торговли)
+        bullish &= (bull_pct >= 0.1) & ~(current_price < high_1)
+        bearish &= (bear_pct >= 0.1) & ~(current_price > low_1)
+
+        active_fvgs = []
+        for i in np.flatnonzero(bullish | bearish):
+            if bullish[i]:
+                gap_pct, top, bottom, fvg_type = bull_pct[i], low_3[i], high_1[i], "bullish_fvg"
+            else:
+                gap_pct, top, bottom, fvg_type = bear_pct[i], low_1[i], high_3[i], "bearish_fvg"
+            active_fvgs.append({
+                "type": fvg_type,
+                "top": float(top),
+                "bottom": float(bottom),
+                "mid": float((top + bottom) / 2),
+                "size_pct": round(float(gap_pct), 3),
+                "index": int(i),
+                "strength": "strong" if gap_pct >= 0.5 else "moderate",
+                "filled": False
+            })
+
         # Сортируем по расстоянию от текущей цены (ближайшие важнее)
         active_fvgs.sort(key=lambda x: abs(current_price - x['mid']))
-        
+
         # Возвращаем последние 3 актуальных FVG
         return active_fvgs[:3]
-    
+
     def detect_liquidity_grabs(self, df: pd.DataFrame, lookback: int = 50) -> List[Dict[str, Any]]:
         """Детекция Stop Hunts (Liquidity Grabs)"""
-        grabs = []
         if len(df) < lookback + 5:
             return []
-        
-        candles = df.to_dict('records')
-        current_price = candles[-1]['close']
-        
-        for i in range(lookback, len(candles) - 2):
-            candle = candles[i]
-            prev_candles = candles[i-lookback:i]
-            prev_high = max(c['high'] for c in prev_candles)
-            prev_low = min(c['low'] for c in prev_candles)
-            
-            body = abs(candle['close'] - candle['open'])
-            lower_wick = min(candle['open'], candle['close']) - candle['low']
-            upper_wick = candle['high'] - max(candle['open'], candle['close'])
-            
-            avg_vol = safe_mean([c['volume'] for c in prev_candles]) if prev_candles else 1.0
-            vol_ratio = candle['volume'] / avg_vol if avg_vol > 0 else 1.0
-            
-            # Bullish grab
-            if (candle['low'] < prev_low * 0.998 and
-                candle['close'] > candle['open'] and
-                lower_wick > body * 1.5 and
-                vol_ratio > 1.2):
-                
-                next_1 = candles[i+1]
-                if next_1['close'] > next_1['open'] and next_1['close'] > candle['close']:
-                    grabs.append({
-                        "type": "bullish_grab",
-                        "spike_low": candle['low'],
-                        "strength": "strong" if vol_ratio > 1.8 else "moderate",
-                        "active": current_price > candle['close']
-                    })
-            
-            # Bearish grab
-            elif (candle['high'] > prev_high * 1.002 and
-                  candle['close'] < candle['open'] and
-                  upper_wick > body * 1.5 and
-                  vol_ratio > 1.2):
-                
-                next_1 = candles[i+1]
-                if next_1['close'] < next_1['open'] and next_1['close'] < candle['close']:
-                    grabs.append({
-                        "type": "bearish_grab",
-                        "spike_high": candle['high'],
-                        "strength": "strong" if vol_ratio > 1.8 else "moderate",
-                        "active": current_price < candle['close']
-                    })
-        
-        return [g for g in grabs if g['active']][:3]
-    
+
+        open_ = df['open'].to_numpy(dtype=np.float64)
+        high = df['high'].to_numpy(dtype=np.float64)
+        low = df['low'].to_numpy(dtype=np.float64)
+        close = df['close'].to_numpy(dtype=np.float64)
+        volume = df['volume'].to_numpy(dtype=np.float64)
+        current_price = close[-1]
+
+        # Экстремумы и средний объём предыдущих lookback свечей для каждого индекса
+        idx = np.arange(lookback, len(df) - 2)
+        prev_high = rolling_max(high, lookback)[idx - lookback]
+        prev_low = rolling_min(low, lookback)[idx - lookback]
+        avg_vol = np.nan_to_num(trailing_mean(volume, lookback)[idx], nan=0.0)
+
+        body = np.abs(close[idx] - open_[idx])
+        lower_wick = np.minimum(open_[idx], close[idx]) - low[idx]
+        upper_wick = high[idx] - np.maximum(open_[idx], close[idx])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            vol_ratio = np.where(avg_vol > 0, volume[idx] / avg_vol, 1.0)
+
+        next_open, next_close = open_[idx + 1], close[idx + 1]
+
+        # Bullish grab: пробой минимума с выкупом и подтверждением следующей свечой
+        bullish = ((low[idx] < prev_low * 0.998) & (close[idx] > open_[idx]) &
+                   (lower_wick > body * 1.5) & (vol_ratio > 1.2))
+        # Bearish grab
+        bearish = (~bullish & (high[idx] > prev_high * 1.002) & (close[idx] < open_[idx]) &
+                   (upper_wick > body * 1.5) & (vol_ratio > 1.2))
+
+        bullish &= (next_close > next_open) & (next_close > close[idx]) & (current_price > close[idx])
+        bearish &= (next_close < next_open) & (next_close < close[idx]) & (current_price < close[idx])
+
+        grabs = []
+        for j in np.flatnonzero(bullish | bearish)[:3]:
+            i = idx[j]
+            if bullish[j]:
+                grabs.append({
+                    "type": "bullish_grab",
+                    "spike_low": float(low[i]),
+                    "strength": "strong" if vol_ratio[j] > 1.8 else "moderate",
+                    "active": True
+                })
+            else:
+                grabs.append({
+                    "type": "bearish_grab",
+                    "spike_high": float(high[i]),
+                    "strength": "strong" if vol_ratio[j] > 1.8 else "moderate",
+                    "active": True
+                })
+        return grabs
+
     def _check_hard_stops_for_validation(self, analysis: Dict, is_long: bool, entry_timeframe: str = "5m") -> Dict:
         """
         Обязательные проверки которые БЛОКИРУЮТ вход (для validate_entry)
@@ -1430,27 +1428,15 @@ class TechnicalAnalysis:
     ) -> float:
         """
         Рассчитать корреляцию между двумя активами
+
+        Берётся из матрицы корреляций universe: свечи догружаются только
+        для новых символов или после закрытия бара.
         """
         try:
-            # Получаем данные для A
-            a_data = await self.client.get_ohlcv(symbol_a, timeframe, limit=period)
-            a_df = pd.DataFrame(a_data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-            a_returns = a_df['close'].pct_change().dropna()
-            
-            # Получаем данные для B
-            b_data = await self.client.get_ohlcv(symbol_b, timeframe, limit=period)
-            b_df = pd.DataFrame(b_data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-            b_returns = b_df['close'].pct_change().dropna()
-            
-            # Выравниваем по длине
-            min_len = min(len(a_returns), len(b_returns))
-            if min_len < 2:
-                return 0.0
-                
-            a_returns = a_returns[-min_len:]
-            b_returns = b_returns[-min_len:]
-            
-            return float(a_returns.corr(b_returns))
+            matrix = self.correlation_matrix(timeframe, period)
+            await matrix.ensure([symbol_a, symbol_b])
+            correlation = matrix.correlation(symbol_a, symbol_b)
+            return correlation if correlation is not None else 0.0
         except Exception as e:
             logger.warning(f"Error calculating correlation {symbol_a}-{symbol_b}: {e}")
             return 0.0
@@ -1462,7 +1448,7 @@ class TechnicalAnalysis:
         timeframe: str = "1h"
     ) -> Dict[str, Any]:
         """
-        Рассчитать корреляцию актива с BTC (с кэшированием BTC данных)
+        Рассчитать корреляцию актива с BTC (из матрицы корреляций universe)
         
         Args:
             symbol: Торговая пара (например "ETH/USDT")
@@ -1475,34 +1461,14 @@ class TechnicalAnalysis:
         # logger.info(f"Calculating BTC correlation for {symbol}")
         
         try:
-            # Получаем данные для актива
-            alt_data = await self.client.get_ohlcv(symbol, timeframe, limit=period)
-            alt_df = pd.DataFrame(alt_data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-            alt_returns = alt_df['close'].pct_change().dropna()
-            
-            # Получаем данные для BTC (с кэшированием на 5 минут)
-            import time
-            now_ts = time.time()
-            
-            # Проверяем кэш: данные должны быть, timestamp свежий, и длина достаточная
-            if (self._btc_cache.get("data") is not None and 
-                (now_ts - self._btc_cache.get("timestamp", 0) < 300) and
-                len(self._btc_cache["data"]) >= period):
-                btc_data = self._btc_cache["data"]
-            else:
-                btc_data = await self.client.get_ohlcv("BTC/USDT", timeframe, limit=period)
-                self._btc_cache = {"data": btc_data, "timestamp": now_ts}
-            
-            btc_df = pd.DataFrame(btc_data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-            btc_returns = btc_df['close'].pct_change().dropna()
-            
-            # Выравниваем по длине
-            min_len = min(len(alt_returns), len(btc_returns))
-            alt_returns = alt_returns[-min_len:]
-            btc_returns = btc_returns[-min_len:]
-            
-            # Рассчитываем корреляцию
-            correlation = alt_returns.corr(btc_returns) if len(alt_returns) > 1 else 0.0
+            # BTC загружается один раз за бар для всех альтов
+            matrix = self.correlation_matrix(timeframe, period)
+            await matrix.ensure([symbol, "BTC/USDT"])
+            correlation = matrix.correlation(symbol, "BTC/USDT")
+            correlation = correlation if correlation is not None else 0.0
+            beta = matrix.beta(symbol, "BTC/USDT")
+            alt_avg_return = matrix.mean_return(symbol)
+            btc_avg_return = matrix.mean_return("BTC/USDT")
             
             # Интерпретация
             if correlation > 0.8:
@@ -1535,8 +1501,9 @@ class TechnicalAnalysis:
                 "timeframe": timeframe,
                 "interpretation": interpretation,
                 "recommendation": recommendation,
-                "alt_avg_return": round(alt_returns.mean() * 100, 2) if len(alt_returns) > 0 else 0,
-                "btc_avg_return": round(btc_returns.mean() * 100, 2) if len(btc_returns) > 0 else 0,
+                "beta": round(beta, 3) if beta is not None else None,
+                "alt_avg_return": round(alt_avg_return * 100, 2) if alt_avg_return is not None else 0,
+                "btc_avg_return": round(btc_avg_return * 100, 2) if btc_avg_return is not None else 0,
                 "timestamp": datetime.now().isoformat()
             }
         except Exception as e:
@@ -1569,8 +1536,9 @@ class TechnicalAnalysis:
             signals = {}
             trends = {}
             
+            prefetched = await self._prefetch_ohlcv(symbol, timeframes)
             for tf in timeframes:
-                analysis = await self._analyze_timeframe(symbol, tf, include_patterns=False)
+                analysis = await self._analyze_timeframe(symbol, tf, include_patterns=False, ohlcv=prefetched.get(tf))
                 signal = analysis.get('signal', {})
                 trend = analysis.get('trend', {})
                 
@@ -1653,10 +1621,10 @@ class TechnicalAnalysis:
         logger.info(f"Checking liquidity for {symbol}")
         
         try:
-            # Получаем orderbook через bybit_client
-            orderbook = await self.client.get_orderbook(symbol)
+            # Верхние уровни стакана (локальный стакан WebSocket или REST)
+            bids, asks = await self.client.get_orderbook_levels(symbol, limit=25)
             
-            if not orderbook or 'bids' not in orderbook or 'asks' not in orderbook:
+            if len(bids) == 0 and len(asks) == 0:
                 return {
                     "symbol": symbol,
                     "success": False,
@@ -1664,19 +1632,16 @@ class TechnicalAnalysis:
                     "timestamp": datetime.now().isoformat()
                 }
             
-            bids = orderbook.get('bids', [])
-            asks = orderbook.get('asks', [])
-            
-            # Рассчитываем ликвидность
-            bid_volume = sum(float(bid[1]) for bid in bids[:10]) if len(bids) >= 10 else sum(float(bid[1]) for bid in bids)
-            ask_volume = sum(float(ask[1]) for ask in asks[:10]) if len(asks) >= 10 else sum(float(ask[1]) for ask in asks)
+            # Рассчитываем ликвидность (топ-10 уровней)
+            bid_volume = float(bids[:10, 1].sum())
+            ask_volume = float(asks[:10, 1].sum())
             
             total_liquidity = bid_volume + ask_volume
             
             # Рассчитываем spread
-            if bids and asks:
-                best_bid = float(bids[0][0])
-                best_ask = float(asks[0][0])
+            if len(bids) and len(asks):
+                best_bid = float(bids[0, 0])
+                best_ask = float(asks[0, 0])
                 spread = best_ask - best_bid
                 spread_pct = (spread / best_bid * 100) if best_bid > 0 else 0
             else:
@@ -0,0 +1,308 @@
+"""
+Ticker Table
+Таблица тикеров всей биржи, поддерживаемая в актуальном состоянии
+публичным WebSocket потоком tickers.{symbol} (начальное заполнение - REST)
+
+Читатели получают согласованный, уже отсортированный снимок с номером версии.
+Одна таблица на категорию разделяется BybitClient и TradingOperations.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from pybit.unified_trading import WebSocket
+from loguru import logger
+
+
+# Котируемые валюты спота Bybit (для восстановления CCXT символа из "BTCUSDT")
+QUOTE_CURRENCIES = ("USDT", "USDC", "USDE", "BTC", "ETH", "EUR", "DAI", "BRL", "BRZ", "TRY", "PLN", "MNT")
+
+# Bybit принимает не больше 10 топиков в одном запросе subscribe (spot)
+MAX_TOPICS_PER_REQUEST = 10
+
+
+def to_ccxt_symbol(exchange_symbol: str, category: str = "spot") -> Optional[str]:
+    """
+    Символ Bybit -> символ CCXT
+
+    "BTCUSDT" (spot) -> "BTC/USDT", "BTCUSDT" (linear) -> "BTC/USDT:USDT",
+    "BTCPERP" (linear) -> "BTC/USDC:USDC". Срочные контракты ("BTC-26DEC25") -> None.
+    """
+    if "-" in exchange_symbol:
+        return None
+
+    if category == "linear" and exchange_symbol.endswith("PERP"):
+        return f"{exchange_symbol[:-4]}/USDC:USDC"
+
+    for quote in QUOTE_CURRENCIES:
+        if exchange_symbol.endswith(quote) and len(exchange_symbol) > len(quote):
+            base = exchange_symbol[:-len(quote)]
+            if category == "linear":
+                return f"{base}/{quote}:{quote}"
+            return f"{base}/{quote}"
+    return None
+
+
+def _to_float(value: Any) -> float:
+    """Безопасное преобразование строкового поля Bybit в float"""
+    try:
+        return float(value) if value not in (None, "") else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class TickerSnapshot:
+    """
+    Неизменяемый снимок таблицы тикеров
+
+    Attributes:
+        version: Версия данных таблицы на момент построения
+        tickers: Тикеры по CCXT символу (формат get_all_tickers)
+        raw: Исходные строки Bybit v5 (формат /v5/market/tickers)
+        by_volume / by_change / by_name: Отсортированные списки тикеров
+    """
+
+    __slots__ = ("category", "version", "built_at", "tickers", "raw", "by_volume", "by_change", "by_name")
+
+    def __init__(self, category: str, version: int, rows: Dict[str, Dict[str, Any]]):
+        self.category = category
+        self.version = version
+        self.built_at = time.time()
+        self.raw: List[Dict[str, Any]] = [dict(row) for row in rows.values()]
+
+        tickers: Dict[str, Dict[str, Any]] = {}
+        for row in self.raw:
+            symbol = to_ccxt_symbol(row.get("symbol", ""), category)
+            if symbol is None:
+                continue
+            tickers[symbol] = {
+                "symbol": symbol,
+                "price": _to_float(row.get("lastPrice")),
+                "change_24h": _to_float(row.get("price24hPcnt")) * 100,
+                "volume_24h": _to_float(row.get("turnover24h")),
+                "high_24h": _to_float(row.get("highPrice24h")),
+                "low_24h": _to_float(row.get("lowPrice24h")),
+                "bid": _to_float(row.get("bid1Price")),
+                "ask": _to_float(row.get("ask1Price"))
+            }
+        self.tickers = tickers
+
+        values = list(tickers.values())
+        self.by_volume = sorted(values, key=lambda t: t["volume_24h"], reverse=True)
+        self.by_change = sorted(values, key=lambda t: t["change_24h"], reverse=True)
+        self.by_name = sorted(values, key=lambda t: t["symbol"])
+
+    def sorted_by(self, sort_by: str = "volume") -> List[Dict[str, Any]]:
+        """Отсортированный список тикеров ("volume", "change" или "name")"""
+        if sort_by == "volume":
+            return self.by_volume
+        if sort_by == "change":
+            return self.by_change
+        return self.by_name
+
+    def __len__(self) -> int:
+        return len(self.tickers)
+
+
+class TickerTable:
+    """
+    Таблица тикеров одной категории (spot / linear)
+
+    Строки хранятся в исходном формате Bybit и обновляются сообщениями
+    snapshot/delta потока. Снимок перестраивается не чаще rebuild_interval,
+    между перестроениями чтение возвращает готовый объект.
+    """
+
+    def __init__(
+        self,
+        category: str = "spot",
+        testnet: bool = False,
+        rest_ttl: float = 30.0,
+        stale_after: float = 15.0,
+        reseed_interval: float = 600.0,
+        rebuild_interval: float = 1.0,
+        stream_enabled: Optional[bool] = None
+    ):
+        """
+        Args:
+            category: Категория Bybit ("spot" или "linear")
+            testnet: Использовать testnet
+            rest_ttl: Сколько секунд REST данные считаются актуальными без потока
+            stale_after: Через сколько секунд без сообщений поток считается мёртвым
+            reseed_interval: Период полной перезагрузки через REST (новые листинги)
+            rebuild_interval: Минимальный интервал между перестроениями снимка
+            stream_enabled: Включить поток (если None - проверяет ENABLE_TICKER_STREAM env)
+        """
+        self.category = category
+        self.testnet = testnet
+        self.rest_ttl = rest_ttl
+        self.stale_after = stale_after
+        self.reseed_interval = reseed_interval
+        self.rebuild_interval = rebuild_interval
+
+        if stream_enabled is None:
+            stream_env = os.getenv("ENABLE_TICKER_STREAM", "true").lower()
+            self.stream_enabled = stream_env in ("true", "1", "yes")
+        else:
+            self.stream_enabled = stream_enabled
+
+        self.ws = None
+        self._lock = threading.RLock()
+        self._rows: Dict[str, Dict[str, Any]] = {}
+        self._version = 0
+        self._seeded_at = 0.0
+        self._last_message = 0.0
+        self._subscribed: set = set()
+        self._snapshot: Optional[TickerSnapshot] = None
+        self._stats = {"seeds": 0, "messages": 0, "rebuilds": 0, "reads": 0}
+
+    @property
+    def version(self) -> int:
+        """Текущая версия данных"""
+        return self._version
+
+    def seed(self, rows: List[Dict[str, Any]]) -> None:
+        """Заполнить таблицу полным списком тикеров из REST /v5/market/tickers"""
+        with self._lock:
+            for row in rows:
+                symbol = row.get("symbol")
+                if symbol:
+                    self._rows[symbol] = dict(row)
+            self._version += 1
+            self._seeded_at = time.monotonic()
+            self._stats["seeds"] += 1
+
+    def apply_message(self, message: Dict[str, Any]) -> None:
+        """Применить сообщение потока tickers (snapshot или delta)"""
+        data = message.get("data")
+        if not isinstance(data, dict):
+            return
+        symbol = data.get("symbol")
+        if not symbol:
+            return
+
+        with self._lock:
+            if message.get("type") == "snapshot" or symbol not in self._rows:
+                self._rows[symbol] = dict(data)
+            else:
+                # delta содержит только изменившиеся поля
+                self._rows[symbol].update(data)
+            self._version += 1
+            self._last_message = time.monotonic()
+            self._stats["messages"] += 1
+
+    def is_live(self) -> bool:
+        """Поток недавно присылал обновления"""
+        return self.ws is not None and time.monotonic() - self._last_message <= self.stale_after
+
+    def is_fresh(self) -> bool:
+        """Можно ли отдавать данные без обращения к REST"""
+        if not self._rows:
+            return False
+        age = time.monotonic() - self._seeded_at
+        if self.is_live():
+            return age <= self.reseed_interval
+        return age <= self.rest_ttl
+
+    def snapshot(self) -> TickerSnapshot:
+        """
+        Согласованный отсортированный снимок таблицы
+
+        Returns:
+            Готовый снимок, если данные не менялись или он построен недавно
+        """
+        with self._lock:
+            self._stats["reads"] += 1
+            current = self._snapshot
+            if current is not None and (
+                current.version == self._version
+                or time.time() - current.built_at < self.rebuild_interval
+            ):
+                return current
+
+            self._snapshot = TickerSnapshot(self.category, self._version, self._rows)
+            self._stats["rebuilds"] += 1
+            return self._snapshot
+
+    async def start_stream(self) -> int:
+        """
+        Подписаться на tickers.{symbol} для всех символов таблицы
+
+        Returns:
+            Количество новых подписок
+        """
+        if not self.stream_enabled:
+            return 0
+
+        with self._lock:
+            symbols = [s for s in self._rows if s not in self._subscribed and "-" not in s]
+            self._subscribed.update(symbols)
+        if not symbols:
+            return 0
+
+        try:
+            await asyncio.to_thread(self._subscribe_blocking, symbols)
+        except Exception as e:
+            logger.error(f"Ticker stream subscription failed for {self.category}: {e}")
+            with self._lock:
+                self._subscribed.difference_update(symbols)
+            return 0
+
+        logger.info(f"Ticker stream ({self.category}) subscribed to {len(symbols)} symbols")
+        return len(symbols)
+
+    def _subscribe_blocking(self, symbols: List[str]) -> None:
+        """Создать WebSocket (если нужно) и подписаться пачками"""
+        if self.ws is None:
+            self.ws = WebSocket(testnet=self.testnet, channel_type=self.category)
+        for i in range(0, len(symbols), MAX_TOPICS_PER_REQUEST):
+            self.ws.ticker_stream(symbol=symbols[i:i + MAX_TOPICS_PER_REQUEST], callback=self._handle_message)
+
+    def _handle_message(self, message: Dict[str, Any]) -> None:
+        """Callback WebSocket (поток pybit)"""
+        try:
+            self.apply_message(message)
+        except Exception as e:
+            logger.error(f"Error handling ticker message: {e}")
+
+    def stop(self) -> None:
+        """Закрыть WebSocket"""
+        if self.ws is not None:
+            try:
+                self.ws.exit()
+            except Exception as e:
+                logger.debug(f"Error closing ticker stream: {e}")
+            self.ws = None
+            with self._lock:
+                self._subscribed.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика таблицы"""
+        with self._lock:
+            return {
+                "category": self.category,
+                "symbols": len(self._rows),
+                "version": self._version,
+                "live": self.is_live(),
+                "fresh": self.is_fresh(),
+                "subscriptions": len(self._subscribed),
+                **self._stats
+            }
+
+
+# Глобальные таблицы по категориям (одни данные для всех клиентов процесса)
+_ticker_tables: Dict[str, TickerTable] = {}
+_ticker_tables_lock = threading.Lock()
+
+
+def get_ticker_table(category: str, testnet: bool = False) -> TickerTable:
+    """Получить глобальную таблицу тикеров категории ("spot" или "linear")"""
+    with _ticker_tables_lock:
+        table = _ticker_tables.get(category)
+        if table is None:
+            table = TickerTable(category=category, testnet=testnet)
+            _ticker_tables[category] = table
+        return table
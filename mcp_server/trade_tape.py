@@ -0,0 +1,436 @@
+"""
+Trade Tape
+Лента публичных сделок из потока publicTrade.{symbol}
+
+Сделки каждого символа хранятся в кольцевом буфере фиксированного размера
+(время, цена, объём и сторона - отдельные непрерывные массивы). CVD,
+aggressive ratio и статистика крупных сделок считаются по буферу
+за любое окно без загрузки сделок через REST.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from pybit.unified_trading import WebSocket
+from loguru import logger
+
+# Условный импорт для поддержки как пакета, так и прямого запуска
+try:
+    from .kline_stream import to_exchange_symbol, category_of, MAX_TOPICS_PER_REQUEST
+except ImportError:
+    from kline_stream import to_exchange_symbol, category_of, MAX_TOPICS_PER_REQUEST
+
+
+# (timestamp ms, price, size, side: +1 покупка агрессором, -1 продажа)
+TradeArrays = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+SIDE_BUY = 1
+SIDE_SELL = -1
+
+
+def trades_to_arrays(trades: List[Dict[str, Any]]) -> TradeArrays:
+    """
+    Сделки CCXT (fetch_trades) -> массивы, упорядоченные по времени
+
+    Объём берётся из amount/size/quantity, сторона 'buy' -> +1, 'sell' -> -1,
+    неизвестная сторона -> 0.
+    """
+    count = len(trades)
+    ts = np.empty(count, dtype=np.int64)
+    price = np.empty(count, dtype=np.float64)
+    size = np.empty(count, dtype=np.float64)
+    side = np.zeros(count, dtype=np.int8)
+
+    for i, t in enumerate(trades):
+        ts[i] = t.get('timestamp') or 0
+        price[i] = float(t.get('price') or 0)
+        size[i] = float(t.get('amount') or t.get('size') or t.get('quantity') or 0)
+        trade_side = (t.get('side') or '').lower()
+        if trade_side == 'buy':
+            side[i] = SIDE_BUY
+        elif trade_side == 'sell':
+            side[i] = SIDE_SELL
+
+    order = np.argsort(ts, kind="stable")
+    return ts[order], price[order], size[order], side[order]
+
+
+def order_flow(price: np.ndarray, size: np.ndarray, side: np.ndarray) -> Dict[str, Any]:
+    """
+    Order flow по окну сделок
+
+    cvd_delta - изменение CVD от первой до последней сделки окна
+    (как в TechnicalAnalysis.get_cvd_divergence). Сделки без стороны
+    считаются продажами, как и раньше.
+    """
+    if len(price) == 0:
+        return {
+            "trades_count": 0, "price_change": 0.0, "cvd_delta": 0.0,
+            "aggressive_buys": 0, "aggressive_sells": 0,
+            "buy_volume": 0.0, "sell_volume": 0.0
+        }
+
+    is_buy = side > 0
+    buy_volume = float(size[is_buy].sum())
+    sell_volume = float(size[~is_buy].sum())
+    delta = np.where(is_buy, size, -size)
+    aggressive_buys = int(is_buy.sum())
+
+    return {
+        "trades_count": len(price),
+        "price_change": float((price[-1] - price[0]) / price[0]) if price[0] else 0.0,
+        "cvd_delta": float(delta[1:].sum()),
+        "aggressive_buys": aggressive_buys,
+        "aggressive_sells": len(price) - aggressive_buys,
+        "buy_volume": buy_volume,
+        "sell_volume": sell_volume
+    }
+
+
+def whale_stats(size: np.ndarray, side: np.ndarray, multiplier: float = 10.0) -> Dict[str, Any]:
+    """
+    Крупные сделки окна (объём больше среднего в multiplier раз)
+
+    Формат совпадает с WhaleDetector._detect_large_orders.
+    """
+    traded = size[size > 0]
+    if len(traded) == 0:
+        return {
+            "count_large_buys": 0,
+            "count_large_sells": 0,
+            "whale_buy_percentage": 0,
+            "whale_sell_percentage": 0,
+            "net_direction": "neutral"
+        }
+
+    whale_threshold = traded.mean() * multiplier
+    large = size > whale_threshold
+    large_buys = large & (side == SIDE_BUY)
+    large_sells = large & (side == SIDE_SELL)
+
+    count_buys = int(large_buys.sum())
+    count_sells = int(large_sells.sum())
+    total_volume = float(traded.sum())
+    whale_buy_vol = float(size[large_buys].sum())
+    whale_sell_vol = float(size[large_sells].sum())
+
+    net_direction = "bullish" if count_buys > count_sells * 1.5 else "bearish" if count_sells > count_buys * 1.5 else "neutral"
+
+    return {
+        "count_large_buys": count_buys,
+        "count_large_sells": count_sells,
+        "whale_buy_percentage": round(whale_buy_vol / total_volume * 100, 2) if total_volume > 0 else 0,
+        "whale_sell_percentage": round(whale_sell_vol / total_volume * 100, 2) if total_volume > 0 else 0,
+        "net_direction": net_direction
+    }
+
+
+class TradeRingBuffer:
+    """
+    Кольцевой буфер сделок одного символа
+
+    Запись идёт по кругу в заранее выделенные массивы, старые сделки
+    перезаписываются. Чтение возвращает копии в хронологическом порядке.
+    Синхронизация - на стороне владельца (TradeTape).
+    """
+
+    def __init__(self, capacity: int = 5000):
+        self.capacity = capacity
+        self.ts = np.zeros(capacity, dtype=np.int64)
+        self.price = np.zeros(capacity, dtype=np.float64)
+        self.size = np.zeros(capacity, dtype=np.float64)
+        self.side = np.zeros(capacity, dtype=np.int8)
+        self._written = 0  # Всего записано сделок
+        # Время, начиная с которого лента не имеет пропусков
+        self.covered_from: Optional[int] = None
+
+    def __len__(self) -> int:
+        return min(self._written, self.capacity)
+
+    def append(self, ts: np.ndarray, price: np.ndarray, size: np.ndarray, side: np.ndarray) -> None:
+        """Добавить сделки (в хронологическом порядке)"""
+        count = len(ts)
+        if count == 0:
+            return
+        if count > self.capacity:
+            ts, price, size, side = ts[-self.capacity:], price[-self.capacity:], size[-self.capacity:], side[-self.capacity:]
+            self._written += count - self.capacity
+            count = self.capacity
+
+        start = self._written % self.capacity
+        first = min(count, self.capacity - start)
+        for buffer, values in ((self.ts, ts), (self.price, price), (self.size, size), (self.side, side)):
+            buffer[start:start + first] = values[:first]
+            buffer[:count - first] = values[first:]
+        self._written += count
+
+        # После переполнения история начинается с самой старой сохранённой сделки
+        if self._written > self.capacity:
+            oldest = self.oldest_ts
+            if self.covered_from is None or oldest > self.covered_from:
+                self.covered_from = oldest
+
+    @property
+    def oldest_ts(self) -> Optional[int]:
+        """Время самой старой сохранённой сделки"""
+        if self._written == 0:
+            return None
+        return int(self.ts[(self._written - len(self)) % self.capacity])
+
+    def load(self, ts: np.ndarray, price: np.ndarray, size: np.ndarray, side: np.ndarray) -> None:
+        """Заменить содержимое буфера"""
+        self._written = 0
+        self.covered_from = None
+        self.append(ts, price, size, side)
+
+    def last(self, n: Optional[int] = None) -> TradeArrays:
+        """Последние n сделок (все, если n не указан)"""
+        available = len(self)
+        n = available if n is None else min(n, available)
+        end = self._written % self.capacity
+        start = (self._written - n) % self.capacity
+
+        if n == 0:
+            return self.ts[:0].copy(), self.price[:0].copy(), self.size[:0].copy(), self.side[:0].copy()
+        if start < end:
+            return self.ts[start:end].copy(), self.price[start:end].copy(), self.size[start:end].copy(), self.side[start:end].copy()
+        return tuple(
+            np.concatenate((buffer[start:], buffer[:end]))
+            for buffer in (self.ts, self.price, self.size, self.side)
+        )
+
+    def since(self, since_ms: int) -> TradeArrays:
+        """Сделки начиная с since_ms"""
+        ts, price, size, side = self.last()
+        start = int(np.searchsorted(ts, since_ms, side="left"))
+        return ts[start:], price[start:], size[start:], side[start:]
+
+
+class TradeTape:
+    """
+    Лента публичных сделок для набора символов
+
+    До подписки и дозаполнения историей через REST (seed) окно может
+    быть неполным - тогда get_window возвращает None и BybitClient
+    загружает сделки через REST.
+    """
+
+    def __init__(
+        self,
+        testnet: bool = False,
+        category: str = "spot",
+        capacity: int = 5000,
+        enabled: Optional[bool] = None
+    ):
+        """
+        Args:
+            testnet: Использовать testnet
+            category: Категория публичного потока ("spot", "linear")
+            capacity: Размер кольцевого буфера на символ (сделок)
+            enabled: Включить поток (если None - проверяет ENABLE_TRADE_TAPE env)
+        """
+        self.testnet = testnet
+        self.category = category
+        self.capacity = capacity
+
+        if enabled is None:
+            tape_env = os.getenv("ENABLE_TRADE_TAPE", "true").lower()
+            self.enabled = tape_env in ("true", "1", "yes")
+        else:
+            self.enabled = enabled
+
+        self.ws = None
+        self._lock = threading.Lock()
+        self._buffers: Dict[str, TradeRingBuffer] = {}  # BTCUSDT -> буфер
+        self._symbol_map: Dict[str, str] = {}  # BTC/USDT -> BTCUSDT
+        self._stats = {"messages": 0, "trades": 0, "seeds": 0, "reads": 0, "misses": 0}
+
+    async def subscribe(self, symbols: List[str]) -> int:
+        """
+        Подписаться на сделки символов
+
+        Returns:
+            Количество новых подписок
+        """
+        if not self.enabled:
+            return 0
+
+        new_symbols = []
+        with self._lock:
+            for symbol in symbols:
+                # Сделки BTCUSDT spot не являются сделками BTC/USDT:USDT
+                if symbol in self._symbol_map or category_of(symbol) != self.category:
+                    continue
+                exchange_symbol = to_exchange_symbol(symbol)
+                self._symbol_map[symbol] = exchange_symbol
+                if exchange_symbol not in self._buffers:
+                    buffer = TradeRingBuffer(self.capacity)
+                    # Без REST истории лента полна только с момента подписки
+                    buffer.covered_from = int(time.time() * 1000)
+                    self._buffers[exchange_symbol] = buffer
+                    new_symbols.append(exchange_symbol)
+
+        if not new_symbols:
+            return 0
+
+        try:
+            await asyncio.to_thread(self._subscribe_blocking, new_symbols)
+        except Exception as e:
+            logger.error(f"Trade tape subscription failed: {e}")
+            with self._lock:
+                for symbol in [s for s, ex in self._symbol_map.items() if ex in new_symbols]:
+                    del self._symbol_map[symbol]
+                for exchange_symbol in new_symbols:
+                    self._buffers.pop(exchange_symbol, None)
+            return 0
+
+        logger.info(f"Trade tape subscribed to {len(new_symbols)} symbols")
+        return len(new_symbols)
+
+    def _subscribe_blocking(self, exchange_symbols: List[str]) -> None:
+        """Создать WebSocket (если нужно) и подписаться пачками"""
+        if self.ws is None:
+            self.ws = WebSocket(testnet=self.testnet, channel_type=self.category)
+        for i in range(0, len(exchange_symbols), MAX_TOPICS_PER_REQUEST):
+            self.ws.trade_stream(
+                symbol=exchange_symbols[i:i + MAX_TOPICS_PER_REQUEST],
+                callback=self._handle_message
+            )
+
+    def _handle_message(self, message: Dict[str, Any]) -> None:
+        """Обработка сообщения publicTrade (поток WebSocket)"""
+        try:
+            trades = message.get("data") or []
+            if not trades:
+                return
+            buffer = self._buffers.get(message.get("topic", "").rsplit(".", 1)[-1])
+            if buffer is None:
+                return
+
+            ts = np.array([int(t["T"]) for t in trades], dtype=np.int64)
+            price = np.array([t["p"] for t in trades], dtype=np.float64)
+            size = np.array([t["v"] for t in trades], dtype=np.float64)
+            side = np.array([SIDE_BUY if t["S"] == "Buy" else SIDE_SELL for t in trades], dtype=np.int8)
+
+            with self._lock:
+                buffer.append(ts, price, size, side)
+                self._stats["messages"] += 1
+                self._stats["trades"] += len(trades)
+        except Exception as e:
+            logger.error(f"Error handling trade message: {e}")
+
+    def seed(self, symbol: str, ts: np.ndarray, price: np.ndarray, size: np.ndarray, side: np.ndarray) -> None:
+        """
+        Дозаполнить ленту историей из REST
+
+        Берутся только сделки старше первой сделки потока, после чего
+        лента считается полной с самой старой загруженной сделки.
+        """
+        exchange_symbol = self._symbol_map.get(symbol)
+        if exchange_symbol is None or len(ts) == 0:
+            return
+
+        with self._lock:
+            buffer = self._buffers.get(exchange_symbol)
+            if buffer is None:
+                return
+            live = buffer.last()
+            if len(live[0]):
+                older = ts < live[0][0]
+                ts, price, size, side = (
+                    np.concatenate((history[older], current))
+                    for history, current in zip((ts, price, size, side), live)
+                )
+            buffer.load(ts, price, size, side)
+            buffer.covered_from = buffer.oldest_ts
+            self._stats["seeds"] += 1
+
+    def get_window(
+        self,
+        symbol: str,
+        limit: Optional[int] = None,
+        since_ms: Optional[int] = None
+    ) -> Optional[TradeArrays]:
+        """
+        Окно сделок символа из ленты
+
+        Args:
+            symbol: Торговая пара (CCXT)
+            limit: Последние limit сделок
+            since_ms: Сделки начиная с этого времени (ms)
+
+        Returns:
+            (ts, price, size, side) или None если лента не покрывает окно
+            целиком или соединение потеряно
+        """
+        exchange_symbol = self._symbol_map.get(symbol)
+        buffer = self._buffers.get(exchange_symbol) if exchange_symbol else None
+        if buffer is None or self.ws is None or not self.ws.is_connected():
+            return None
+
+        with self._lock:
+            if since_ms is not None:
+                if buffer.covered_from is None or buffer.covered_from > since_ms:
+                    window = None
+                else:
+                    window = buffer.since(since_ms)
+                    if limit is not None:
+                        window = tuple(values[-limit:] for values in window)
+            elif limit is not None and len(buffer) >= limit:
+                window = buffer.last(limit)
+            else:
+                window = None
+
+            self._stats["reads" if window is not None else "misses"] += 1
+        return window
+
+    def order_flow(self, symbol: str, limit: Optional[int] = None, since_ms: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """CVD и aggressive ratio по окну ленты (None если окно не покрыто)"""
+        window = self.get_window(symbol, limit=limit, since_ms=since_ms)
+        if window is None:
+            return None
+        _, price, size, side = window
+        return order_flow(price, size, side)
+
+    def whale_stats(
+        self,
+        symbol: str,
+        limit: Optional[int] = None,
+        since_ms: Optional[int] = None,
+        multiplier: float = 10.0
+    ) -> Optional[Dict[str, Any]]:
+        """Крупные сделки по окну ленты (None если окно не покрыто)"""
+        window = self.get_window(symbol, limit=limit, since_ms=since_ms)
+        if window is None:
+            return None
+        _, _, size, side = window
+        return whale_stats(size, side, multiplier)
+
+    def is_subscribed(self, symbol: str) -> bool:
+        """Подписан ли символ на ленту"""
+        return symbol in self._symbol_map
+
+    def stop(self) -> None:
+        """Закрыть WebSocket"""
+        if self.ws is not None:
+            try:
+                self.ws.exit()
+            except Exception as e:
+                logger.debug(f"Error closing trade tape: {e}")
+            self.ws = None
+            logger.info("Trade tape stopped")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика ленты"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "connected": self.ws is not None,
+                "symbols": len(self._buffers),
+                "buffered_trades": sum(len(buffer) for buffer in self._buffers.values()),
+                **self._stats
+            }
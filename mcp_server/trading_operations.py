@@ -3,6 +3,7 @@ Trading Operations Module
 Полная реализация торговых операций для Bybit
 """
 
+import asyncio
 from typing import Dict, Any, Optional, List
 from datetime import datetime, timedelta
 from pybit.unified_trading import HTTP
@@ -17,6 +18,14 @@ import json
 import uuid
 import aiohttp
 
+# Условный импорт для поддержки как пакета, так и прямого запуска
+try:
+    from .rate_limiter import get_rate_limiter, RateLimitedSession
+    from .ticker_table import get_ticker_table
+except ImportError:
+    from rate_limiter import get_rate_limiter, RateLimitedSession
+    from ticker_table import get_ticker_table
+
 
 def handle_bybit_error(response: Dict[str, Any], operation: str = "API call") -> None:
     """
@@ -363,10 +372,15 @@ class TradingOperations:
         self.testnet = testnet
         
         # Инициализация Bybit HTTP client
-        self.session = HTTP(
-            testnet=testnet,
-            api_key=api_key,
-            api_secret=api_secret
+        # Все вызовы pybit проходят через общий лимитер запросов (группа по имени метода)
+        self.rate_limiter = get_rate_limiter()
+        self.session = RateLimitedSession(
+            HTTP(
+                testnet=testnet,
+                api_key=api_key,
+                api_secret=api_secret
+            ),
+            self.rate_limiter
         )
         
         logger.info(f"Trading Operations initialized ({'testnet' if testnet else 'mainnet'})")
@@ -374,6 +388,17 @@ class TradingOperations:
         # Базовый URL для API
         self.base_url = "https://api-testnet.bybit.com" if testnet else "https://api.bybit.com"
     
+    async def session_call(self, method: str, *args, **kwargs) -> Any:
+        """
+        Вызов метода pybit из async кода
+
+        Токен лимитера ждётся через await, блокирующий HTTP запрос pybit
+        выполняется в потоке - event loop (WebSocket потоки, сканер) не стоит.
+        """
+        if isinstance(self.session, RateLimitedSession):
+            return await self.session.call(method, *args, **kwargs)
+        return await asyncio.to_thread(getattr(self.session, method), *args, **kwargs)
+    
     def _generate_signature(self, params: Dict[str, Any], timestamp: int, recv_window: int = 5000, use_json_body: bool = True) -> str:
         """Генерация подписи для Bybit API v5
         
@@ -405,7 +430,7 @@ class TradingOperations:
         
         return signature
     
-    def _place_order_direct_http(self, order_params: Dict[str, Any]) -> Dict[str, Any]:
+    async def _place_order_direct_http(self, order_params: Dict[str, Any]) -> Dict[str, Any]:
         """Размещение ордера через прямой HTTP запрос к Bybit API v5"""
         endpoint = "/v5/order/create"
         url = f"{self.base_url}{endpoint}"
@@ -475,7 +500,9 @@ class TradingOperations:
                 # КРИТИЧНО: Используем data= вместо json= чтобы отправить точно такой же JSON body,
                 # который использовался для подписи (с сортировкой ключей)
                 # Это гарантирует, что подпись будет валидной
-                response = session.post(
+                await self.rate_limiter.acquire("order")
+                response = await asyncio.to_thread(
+                    session.post,
                     url, 
                     data=json_body,  # Используем предварительно созданную JSON строку
                     headers=headers, 
@@ -491,7 +518,7 @@ class TradingOperations:
                 if attempt < max_retries - 1:
                     wait_time = (attempt + 1) * 3
                     logger.warning(f"Retrying SSL connection in {wait_time}s...")
-                    time.sleep(wait_time)
+                    await asyncio.sleep(wait_time)
                     # Обновляем timestamp и подпись (используем тот же json_body)
                     timestamp = int(time.time() * 1000)
                     headers["X-BAPI-TIMESTAMP"] = str(timestamp)
@@ -509,7 +536,7 @@ class TradingOperations:
                 if attempt < max_retries - 1:
                     wait_time = (attempt + 1) * 2  # Экспоненциальная задержка: 2, 4, 6 секунд
                     logger.warning(f"Request failed (attempt {attempt + 1}/{max_retries}): {e}. Retrying in {wait_time}s...")
-                    time.sleep(wait_time)
+                    await asyncio.sleep(wait_time)
                     # Обновляем timestamp и подпись для нового запроса (используем тот же json_body)
                     timestamp = int(time.time() * 1000)
                     headers["X-BAPI-TIMESTAMP"] = str(timestamp)
@@ -592,7 +619,7 @@ class TradingOperations:
             logger.error(f"Traceback: {traceback.format_exc()}")
             raise Exception(f"KeyError processing API response: {error_key}. Response structure may be unexpected.")
     
-    def _set_leverage_direct_http(self, leverage_params: Dict[str, Any]) -> Dict[str, Any]:
+    async def _set_leverage_direct_http(self, leverage_params: Dict[str, Any]) -> Dict[str, Any]:
         """Установка leverage через прямой HTTP запрос к Bybit API v5"""
         endpoint = "/v5/position/set-leverage"
         url = f"{self.base_url}{endpoint}"
@@ -638,7 +665,9 @@ class TradingOperations:
         try:
             # КРИТИЧНО: Используем data= вместо json= чтобы отправить точно такой же JSON body,
             # который использовался для подписи (с сортировкой ключей)
-            response = session.post(
+            await self.rate_limiter.acquire("position")
+            response = await asyncio.to_thread(
+                session.post,
                 url, 
                 data=json_body,  # Используем предварительно созданную JSON строку
                 headers=headers, 
@@ -786,7 +815,7 @@ class TradingOperations:
             # Получаем информацию об инструменте для правильного округления количества
             # Это критично для избежания ошибок "Order quantity has too many decimals"
             try:
-                instrument_info = self.session.get_instruments_info(
+                instrument_info = await self.session_call("get_instruments_info",
                     category=category,
                     symbol=symbol
                 )
@@ -848,7 +877,7 @@ class TradingOperations:
                         required_position_value = min_order_qty * price
                     else:
                         # Для market ордеров используем текущую цену
-                        ticker = self.session.get_tickers(category=category, symbol=symbol)
+                        ticker = await self.session_call("get_tickers", category=category, symbol=symbol)
                         if ticker.get("retCode") == 0:
                             ticker_data = ticker.get("result", {}).get("list", [{}])[0]
                             current_price = float(ticker_data.get("lastPrice", 0))
@@ -870,7 +899,7 @@ class TradingOperations:
                     position_value = quantity_rounded * price
                 else:
                     # Для market ордеров используем текущую цену
-                    ticker = self.session.get_tickers(category=category, symbol=symbol)
+                    ticker = await self.session_call("get_tickers", category=category, symbol=symbol)
                     if ticker.get("retCode") == 0:
                         ticker_data = ticker.get("result", {}).get("list", [{}])[0]
                         current_price = float(ticker_data.get("lastPrice", 0))
@@ -908,7 +937,7 @@ class TradingOperations:
             if order_type == "Limit" and price:
                 # Округляем цену до tickSize
                 try:
-                    instrument_info = self.session.get_instruments_info(category=category, symbol=symbol)
+                    instrument_info = await self.session_call("get_instruments_info", category=category, symbol=symbol)
                     if instrument_info.get("retCode") == 0:
                         instrument_list = instrument_info.get("result", {}).get("list", [])
                         if instrument_list:
@@ -979,7 +1008,7 @@ class TradingOperations:
                         "sellLeverage": str(leverage)
                     }
                     logger.debug(f"Leverage params: {leverage_params}")
-                    leverage_response = self._set_leverage_direct_http(leverage_params)
+                    leverage_response = await self._set_leverage_direct_http(leverage_params)
                     logger.debug(f"Leverage response: {leverage_response}")
                     
                     # Безопасная проверка ответа с детальным логированием
@@ -1036,7 +1065,7 @@ class TradingOperations:
             # Это более надежный метод, который работает для всех категорий
             logger.info(f"Using direct HTTP request for {category} order (more reliable than Pybit)")
             try:
-                response = self._place_order_direct_http(order_params)
+                response = await self._place_order_direct_http(order_params)
                 
                 # КРИТИЧНО: Проверяем что response не None
                 if response is None:
@@ -1064,7 +1093,7 @@ class TradingOperations:
                         if order_params.get("price"):
                             pybit_params["price"] = order_params.get("price")
                         logger.info(f"Pybit params: {pybit_params}")
-                        response = self.session.place_order(**pybit_params)
+                        response = await self.session_call("place_order", **pybit_params)
                         
                         # Проверяем что response не None
                         if response is None:
@@ -1087,7 +1116,7 @@ class TradingOperations:
                             # Добавляем цену если это Limit ордер
                             if order_params.get("price"):
                                 order_params_no_cat["price"] = order_params.get("price")
-                            response = self.session.place_order(**order_params_no_cat)
+                            response = await self.session_call("place_order", **order_params_no_cat)
                             
                             # Проверяем что response не None
                             if response is None:
@@ -1264,7 +1293,7 @@ class TradingOperations:
                 try:
                     if 'order_params' in locals():
                         logger.info("Attempting direct HTTP fallback with order_params")
-                        response = self._place_order_direct_http(order_params)
+                        response = await self._place_order_direct_http(order_params)
                         logger.info("Direct HTTP fallback successful")
                         # Продолжаем обработку ответа
                         ret_code = response.get("retCode")
@@ -1339,7 +1368,7 @@ class TradingOperations:
                     "triggerPrice": str(stop_loss),
                     "triggerBy": "LastPrice"
                 }
-                sl_response = self.session.place_order(**sl_params)
+                sl_response = await self.session_call("place_order", **sl_params)
                 if isinstance(sl_response, dict) and sl_response.get("retCode") == 0:
                     logger.info(f"Stop-Loss placed: {sl_response.get('result', {}).get('orderId')}")
             
@@ -1353,7 +1382,7 @@ class TradingOperations:
                     "qty": str(quantity),
                     "price": str(take_profit)
                 }
-                tp_response = self.session.place_order(**tp_params)
+                tp_response = await self.session_call("place_order", **tp_params)
                 if isinstance(tp_response, dict) and tp_response.get("retCode") == 0:
                     logger.info(f"Take-Profit placed: {tp_response.get('result', {}).get('orderId')}")
                     
@@ -1399,7 +1428,7 @@ class TradingOperations:
                 wallet_response = None
                 for account_type in account_types_to_try:
                     try:
-                        wallet_response = self.session.get_wallet_balance(accountType=account_type, coin=base_coin)
+                        wallet_response = await self.session_call("get_wallet_balance", accountType=account_type, coin=base_coin)
                         if wallet_response.get("retCode") == 0:
                             logger.info(f"Successfully retrieved balance from {account_type} account")
                             break
@@ -1410,7 +1439,7 @@ class TradingOperations:
                 # Если все попытки не удались, пробуем CONTRACT (на случай если это futures spot)
                 if not wallet_response or wallet_response.get("retCode") != 0:
                     try:
-                        wallet_response = self.session.get_wallet_balance(accountType="CONTRACT", coin=base_coin)
+                        wallet_response = await self.session_call("get_wallet_balance", accountType="CONTRACT", coin=base_coin)
                         if wallet_response.get("retCode") == 0:
                             logger.info("Successfully retrieved balance from CONTRACT account")
                     except Exception as e:
@@ -1486,7 +1515,7 @@ class TradingOperations:
                     "timeInForce": "IOC"  # Immediate or Cancel для Market ордеров
                 }
                 
-                response = self.session.place_order(**close_order)
+                response = await self.session_call("place_order", **close_order)
                 
                 if response.get("retCode") == 0:
                     order_data = response.get("result", {})
@@ -1512,7 +1541,7 @@ class TradingOperations:
             # Для futures - используем стандартную логику
             else:
                 # Получаем текущую позицию
-                positions = self.session.get_positions(
+                positions = await self.session_call("get_positions",
                     category=category,
                     symbol=symbol
                 )
@@ -1567,7 +1596,7 @@ class TradingOperations:
                     "reduceOnly": True  # Важно для futures
                 }
                 
-                response = self.session.place_order(**close_order)
+                response = await self.session_call("place_order", **close_order)
                 
                 if response.get("retCode") == 0:
                     logger.info(f"Position closed successfully: {symbol}")
@@ -1619,7 +1648,7 @@ class TradingOperations:
             # Для futures нужно получить positionIdx
             position_idx = 0
             if category in ["linear", "inverse"]:
-                positions = self.session.get_positions(
+                positions = await self.session_call("get_positions",
                     category=category,
                     symbol=symbol
                 )
@@ -1663,7 +1692,7 @@ class TradingOperations:
             # Пробуем разные способы передачи category
             try:
                 # Способ 1: category как именованный параметр
-                response = self.session.set_trading_stop(
+                response = await self.session_call("set_trading_stop",
                     category=category,
                     **params
                 )
@@ -1671,7 +1700,7 @@ class TradingOperations:
                 # Способ 2: category внутри словаря params
                 logger.debug(f"Method 1 failed, trying method 2: {e}")
                 params_with_category = {**params, "category": category}
-                response = self.session.set_trading_stop(**params_with_category)
+                response = await self.session_call("set_trading_stop", **params_with_category)
             
             # Безопасная проверка ответа
             if not isinstance(response, dict):
@@ -1733,7 +1762,7 @@ class TradingOperations:
             # Пробуем разные способы передачи параметров
             try:
                 # Способ 1: все параметры как именованные
-                response = self.session.cancel_order(
+                response = await self.session_call("cancel_order",
                     category=category,
                     symbol=symbol,
                     orderId=order_id
@@ -1746,7 +1775,7 @@ class TradingOperations:
                     "symbol": symbol,
                     "orderId": order_id
                 }
-                response = self.session.cancel_order(**params)
+                response = await self.session_call("cancel_order", **params)
             
             # Безопасная проверка ответа
             if not isinstance(response, dict):
@@ -1821,10 +1850,17 @@ class TradingOperations:
             
             for cat in categories:
                 try:
-                    response = self.session.get_tickers(category=cat)
+                    # Общая таблица тикеров (поток WebSocket) - без запроса к бирже
+                    table = get_ticker_table(cat, self.testnet)
+                    if table.is_fresh():
+                        all_tickers.extend(table.snapshot().raw)
+                        continue
+                    
+                    response = await self.session_call("get_tickers", category=cat)
                     # Безопасная проверка ответа
                     if isinstance(response, dict) and response.get("retCode") == 0:
                         tickers = response.get("result", {}).get("list", [])
+                        table.seed(tickers)
                         all_tickers.extend(tickers)
                 except Exception as e:
                     logger.warning(f"Failed to get {cat} tickers: {e}")
@@ -1959,7 +1995,7 @@ class TradingOperations:
                 raise ValueError(f"Category must be 'spot', 'linear', or 'inverse'. Got: {category}")
             
             # Получаем информацию о позиции для определения стороны
-            positions_resp = self.session.get_positions(category=category, symbol=symbol)
+            positions_resp = await self.session_call("get_positions", category=category, symbol=symbol)
             if positions_resp.get("retCode") == 0:
                 positions_list = positions_resp.get("result", {}).get("list", [])
                 open_positions = [p for p in positions_list if float(p.get("size", 0)) != 0]
@@ -1969,7 +2005,7 @@ class TradingOperations:
                     position_size = float(position.get("size", 0))
                     
                     # Получаем tick_size для правильного округления
-                    instrument_info = self.session.get_instruments_info(category=category, symbol=symbol)
+                    instrument_info = await self.session_call("get_instruments_info", category=category, symbol=symbol)
                     tick_size = 0.01  # Default
                     if instrument_info.get("retCode") == 0:
                         instrument_list = instrument_info.get("result", {}).get("list", [])
@@ -1989,7 +2025,7 @@ class TradingOperations:
                 else:
                     # Если позиция не найдена, используем консервативный подход
                     # Для LONG: ниже цены входа
-                    instrument_info = self.session.get_instruments_info(category=category, symbol=symbol)
+                    instrument_info = await self.session_call("get_instruments_info", category=category, symbol=symbol)
                     tick_size = 0.01
                     if instrument_info.get("retCode") == 0:
                         instrument_list = instrument_info.get("result", {}).get("list", [])
@@ -2047,7 +2083,7 @@ class TradingOperations:
                 raise Exception("Trailing stop is not supported for spot trading. Use futures (linear/inverse).")
             
             # Получаем текущую позицию
-            positions = self.session.get_positions(
+            positions = await self.session_call("get_positions",
                 category=category,
                 symbol=symbol
             )
@@ -2112,7 +2148,7 @@ class TradingOperations:
             # Пробуем разные способы передачи category
             try:
                 # Способ 1: category как именованный параметр
-                response = self.session.set_trading_stop(
+                response = await self.session_call("set_trading_stop",
                     category=category,
                     **params
                 )
@@ -2120,7 +2156,7 @@ class TradingOperations:
                 # Способ 2: category внутри словаря params
                 logger.debug(f"Method 1 failed, trying method 2: {e}")
                 params_with_category = {**params, "category": category}
-                response = self.session.set_trading_stop(**params_with_category)
+                response = await self.session_call("set_trading_stop", **params_with_category)
             
             if response.get("retCode") == 0:
                 logger.info(f"Trailing stop activated successfully for {symbol}")
@@ -2216,6 +2252,7 @@ class TradingOperations:
             # Выполняем запрос
             # КРИТИЧНО: Используем data= вместо json= чтобы отправить точно такой же JSON body
             async with aiohttp.ClientSession() as session:
+                await self.rate_limiter.acquire("account")
                 async with session.post(url, data=json_body.encode('utf-8'), headers=headers) as response:
                     response_data = await response.json()
                     
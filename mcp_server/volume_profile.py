@@ -1,74 +1,223 @@
-"""Volume Profile Analysis"""
-from typing import Dict, List, Any
-import pandas as pd
+"""
+Volume Profile Analysis
+
+Объём каждого бара распределяется по ценовым корзинам пропорционально
+перекрытию диапазона [low, high] с корзиной (одно матричное умножение
+вместо циклов по строкам и корзинам). Профиль строится по всему окну
+(composite) или от начала текущей сессии (session); VolumeProfile
+обновляется инкрементально при добавлении бара.
+"""
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
 import numpy as np
 from loguru import logger
 from datetime import datetime
 
+# Условный импорт для поддержки как пакета, так и прямого запуска
+try:
+    from .resampler import bucket_start
+except ImportError:
+    from resampler import bucket_start
+
+
+VALUE_AREA_SHARE = 0.70
+ANCHORS = ("composite", "session")
+DAY_MS = 24 * 60 * 60_000
+
+
+def get_profile_bins() -> int:
+    """Число ценовых корзин по умолчанию (VOLUME_PROFILE_BINS env, 50)"""
+    return max(1, int(os.getenv("VOLUME_PROFILE_BINS", "50")))
+
+
+def distribute_volume(
+    high: np.ndarray,
+    low: np.ndarray,
+    volume: np.ndarray,
+    edges: np.ndarray
+) -> np.ndarray:
+    """
+    Объём по корзинам с границами edges
+
+    Доля объёма бара в корзине равна доле его диапазона [low, high],
+    попавшей в корзину; бар с нулевым диапазоном целиком попадает
+    в корзину своей цены. Объём вне edges отбрасывается.
+
+    Returns:
+        Массив длины len(edges) - 1
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    volume = np.asarray(volume, dtype=np.float64)
+    bins = len(edges) - 1
+    span = high - low
+    ranged = span > 0
+
+    # Кумулятивная доля объёма бара ниже каждой границы -> объём между границами
+    with np.errstate(divide="ignore", invalid="ignore"):
+        share_below = np.clip((edges[None, :] - low[ranged, None]) / span[ranged, None], 0.0, 1.0)
+    profile = np.diff(volume[ranged] @ share_below)
+
+    if not ranged.all():
+        price = low[~ranged]
+        inside = (price >= edges[0]) & (price <= edges[-1])
+        index = np.clip(np.searchsorted(edges, price[inside], side="right") - 1, 0, bins - 1)
+        profile += np.bincount(index, weights=volume[~ranged][inside], minlength=bins)
+    return profile
+
+
+def value_area(mids: np.ndarray, volumes: np.ndarray, share: float = VALUE_AREA_SHARE) -> Tuple[float, float, float]:
+    """
+    (POC, VA high, VA low)
+
+    Корзины перебираются по убыванию объёма, пока набранный объём
+    не достигнет share от общего; VA - границы выбранных корзин.
+    """
+    order = np.argsort(-volumes, kind="stable")
+    filled = np.cumsum(volumes[order])
+    count = int(np.searchsorted(filled, filled[-1] * share, side="left")) + 1
+    chosen = mids[order[:count]]
+    return float(mids[order[0]]), float(chosen.max()), float(chosen.min())
+
+
+class VolumeProfile:
+    """
+    Инкрементальный профиль объёма на сетке с фиксированным шагом
+
+    Бар за пределами сетки расширяет её корзинами того же шага,
+    поэтому добавление бара стоит O(число корзин) и не требует пересчёта.
+    """
+
+    def __init__(self, low: float, high: float, num_bins: int = 50):
+        """
+        Args:
+            low, high: Начальный диапазон цен
+            num_bins: Число корзин на начальном диапазоне
+        """
+        if not high > low:
+            raise ValueError("Volume profile needs a non-zero price range")
+        self.origin = float(low)
+        self.bin_size = (float(high) - float(low)) / num_bins
+        self.volumes = np.zeros(num_bins)
+        self.bars = 0
+
+    @classmethod
+    def from_candles(cls, candles: Any, num_bins: int = 50) -> "VolumeProfile":
+        """Профиль по массиву свечей (N, 6) [timestamp, open, high, low, close, volume]"""
+        candles = np.asarray(candles, dtype=np.float64).reshape(-1, 6)
+        profile = cls(candles[:, 3].min(), candles[:, 2].max(), num_bins)
+        profile.add_bars(candles)
+        return profile
+
+    @property
+    def edges(self) -> np.ndarray:
+        return self.origin + self.bin_size * np.arange(len(self.volumes) + 1)
+
+    @property
+    def mids(self) -> np.ndarray:
+        return self.origin + self.bin_size * (np.arange(len(self.volumes)) + 0.5)
+
+    def _extend(self, low: float, high: float) -> None:
+        """Расширить сетку корзинами того же шага до [low, high]"""
+        below = max(0, int(np.ceil((self.origin - low) / self.bin_size - 1e-9)))
+        top = self.origin + self.bin_size * len(self.volumes)
+        above = max(0, int(np.ceil((high - top) / self.bin_size - 1e-9)))
+        if below or above:
+            self.volumes = np.concatenate([np.zeros(below), self.volumes, np.zeros(above)])
+            self.origin -= below * self.bin_size
+
+    def add_bars(self, candles: Any) -> None:
+        """Добавить бары (N, 6) в профиль"""
+        candles = np.asarray(candles, dtype=np.float64).reshape(-1, 6)
+        if len(candles) == 0:
+            return
+        self._extend(candles[:, 3].min(), candles[:, 2].max())
+        self.volumes += distribute_volume(candles[:, 2], candles[:, 3], candles[:, 5], self.edges)
+        self.bars += len(candles)
+
+    def add_bar(self, bar: List[float]) -> None:
+        """Добавить один бар [timestamp, open, high, low, close, volume]"""
+        self.add_bars([bar])
+
+    def levels(self, share: float = VALUE_AREA_SHARE) -> Tuple[float, float, float]:
+        """(POC, VA high, VA low)"""
+        if self.volumes.sum() <= 0:
+            raise ValueError("Volume profile is empty")
+        return value_area(self.mids, self.volumes, share)
+
+
+def session_start(candles: np.ndarray, session_ms: int = DAY_MS) -> int:
+    """Индекс первого бара текущей сессии (сессии выровнены по UTC, как бары Bybit)"""
+    ts = candles[:, 0].astype(np.int64)
+    start = int(bucket_start(np.int64(ts[-1]), session_ms))
+    return int(np.searchsorted(ts, start, side="left"))
+
 
 class VolumeProfileAnalyzer:
     def __init__(self, bybit_client):
         self.client = bybit_client
         logger.info("Volume Profile Analyzer initialized")
-    
-    async def calculate_volume_profile(self, symbol: str, timeframe: str = "1h", lookback: int = 100) -> Dict[str, Any]:
+
+    async def calculate_volume_profile(
+        self,
+        symbol: str,
+        timeframe: str = "1h",
+        lookback: int = 100,
+        num_bins: Optional[int] = None,
+        anchor: str = "composite",
+        session_hours: float = 24
+    ) -> Dict[str, Any]:
+        """
+        Volume Profile с POC и Value Area (70% объёма)
+
+        Args:
+            symbol: Торговая пара
+            timeframe: Таймфрейм свечей
+            lookback: Количество свечей
+            num_bins: Число ценовых корзин (если None - VOLUME_PROFILE_BINS env, 50)
+            anchor: "composite" - всё окно, "session" - от начала текущей сессии
+            session_hours: Длина сессии для anchor="session" (по умолчанию сутки UTC)
+        """
         try:
+            if anchor not in ANCHORS:
+                return {"error": f"Unknown anchor '{anchor}', expected one of {ANCHORS}"}
+            num_bins = num_bins or get_profile_bins()
+
             ohlcv = await self.client.get_ohlcv(symbol, timeframe, limit=lookback)
             if not ohlcv or len(ohlcv) < 10:
                 return {"error": "Insufficient data"}
-            
-            # Конвертируем в DataFrame
-            df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-            
-            price_range = df['high'].max() - df['low'].min()
+
+            candles = np.asarray(ohlcv, dtype=np.float64).reshape(-1, 6)
+            current = float(candles[-1, 4])
+            if anchor == "session":
+                candles = candles[session_start(candles, int(session_hours * 60 * 60_000)):]
+
+            price_range = candles[:, 2].max() - candles[:, 3].min()
             if price_range == 0:
                 return {"error": "Zero price range"}
-            
-            num_bins = 50
-            bin_size = price_range / num_bins
-            min_price = df['low'].min()
-            
-            volume_by_level = {}
-            for idx, row in df.iterrows():
-                for i in range(num_bins):
-                    bin_mid = min_price + (i + 0.5) * bin_size
-                    if row['low'] <= bin_mid <= row['high']:
-                        if bin_mid not in volume_by_level:
-                            volume_by_level[bin_mid] = 0
-                        volume_by_level[bin_mid] += row['volume']
-            
-            if not volume_by_level:
+
+            profile = VolumeProfile.from_candles(candles, num_bins)
+            if profile.volumes.sum() <= 0:
                 return {"error": "Could not calculate volume profile"}
-            
-            # POC (Point of Control) - уровень с максимальным объемом
-            poc = max(volume_by_level.items(), key=lambda x: x[1])[0]
-            
-            # Value Area (70% объема)
-            sorted_levels = sorted(volume_by_level.items(), key=lambda x: x[1], reverse=True)
-            total_vol = sum(v for p, v in sorted_levels)
-            va_vol = 0
-            va_levels = []
-            for price, vol in sorted_levels:
-                va_vol += vol
-                va_levels.append(price)
-                if va_vol >= total_vol * 0.70:
-                    break
-            
-            va_high = max(va_levels)
-            va_low = min(va_levels)
-            current = float(df['close'].iloc[-1])
-            
+
+            # POC (Point of Control) - уровень с максимальным объемом, Value Area (70% объема)
+            poc, va_high, va_low = profile.levels()
+
             position = "above_va" if current > va_high else "below_va" if current < va_low else "in_va"
-            
+
             # ✅ FIX: Явно конвертируем в JSON-совместимый bool
             confluence_with_poc = bool(abs(current - poc) / current < 0.02) if current > 0 else False
-            
+
             return {
                 "poc": round(float(poc), 4),
                 "value_area_high": round(float(va_high), 4),
                 "value_area_low": round(float(va_low), 4),
                 "current_position": position,
                 "confluence_with_poc": bool(confluence_with_poc),  # Явно конвертируем в bool
+                "anchor": anchor,
+                "bins": num_bins,
+                "bars": int(len(candles)),
                 "timestamp": datetime.now().isoformat()
             }
         except Exception as e:
@@ -4,6 +4,12 @@ import numpy as np
 from loguru import logger
 from datetime import datetime
 
+# Условный импорт для поддержки как пакета, так и прямого запуска
+try:
+    from .trade_tape import trades_to_arrays, whale_stats
+except ImportError:
+    from trade_tape import trades_to_arrays, whale_stats
+
 
 class WhaleDetector:
     def __init__(self, bybit_client):
@@ -13,15 +19,16 @@ class WhaleDetector:
     
     async def detect_whale_activity(self, symbol: str, lookback_trades: int = 1000) -> Dict[str, Any]:
         try:
-            trades = await self.client.get_public_trade_history(symbol, limit=lookback_trades)
-            if not trades:
+            # Лента сделок (или REST, если лента не покрывает окно)
+            _, _, size, side = await self.client.get_trade_arrays(symbol, limit=lookback_trades)
+            if len(size) == 0:
                 return {"whale_activity": "unknown", "error": "No data"}
             
-            large_orders = self._detect_large_orders(trades)
-            orderbook = await self.client.get_orderbook(symbol, limit=50)
-            walls = self._detect_orderbook_walls(orderbook)
+            large_orders = whale_stats(size, side, self.whale_threshold_multiplier)
+            bids, asks = await self.client.get_orderbook_levels(symbol, limit=50)
+            walls = self._detect_orderbook_walls({"bids": bids, "asks": asks})
             flow = self._analyze_whale_flow(large_orders, walls)
-            activity_pattern = self._detect_activity_pattern(large_orders, trades)
+            activity_pattern = self._detect_activity_pattern(large_orders)
             signals = self._generate_whale_signals(activity_pattern, flow, walls)
             
             return {
@@ -38,81 +45,33 @@ class WhaleDetector:
             return {"whale_activity": "error", "error": str(e)}
     
     def _detect_large_orders(self, trades: List[Dict]) -> Dict[str, Any]:
-        if not trades:
-            return {
-                "count_large_buys": 0,
-                "count_large_sells": 0,
-                "whale_buy_percentage": 0,
-                "whale_sell_percentage": 0,
-                "net_direction": "neutral"
-            }
-        
-        # Получаем amount из разных возможных полей
-        amounts = []
-        for t in trades:
-            amount = t.get('amount') or t.get('size') or t.get('quantity') or 0
-            if amount:
-                amounts.append(float(amount))
-        
-        if not amounts:
-            return {
-                "count_large_buys": 0,
-                "count_large_sells": 0,
-                "whale_buy_percentage": 0,
-                "whale_sell_percentage": 0,
-                "net_direction": "neutral"
-            }
-        
-        avg_size = np.mean(amounts)
-        whale_threshold = avg_size * self.whale_threshold_multiplier
-        
-        large_buys = []
-        large_sells = []
-        
-        for t in trades:
-            amount = float(t.get('amount') or t.get('size') or t.get('quantity') or 0)
-            if amount > whale_threshold:
-                side = t.get('side', '').lower()
-                if side == 'buy':
-                    large_buys.append(t)
-                elif side == 'sell':
-                    large_sells.append(t)
-        
-        total_volume = sum(amounts)
-        whale_buy_vol = sum(float(t.get('amount') or t.get('size') or t.get('quantity') or 0) for t in large_buys)
-        whale_sell_vol = sum(float(t.get('amount') or t.get('size') or t.get('quantity') or 0) for t in large_sells)
-        
-        net_direction = "bullish" if len(large_buys) > len(large_sells) * 1.5 else "bearish" if len(large_sells) > len(large_buys) * 1.5 else "neutral"
-        
-        return {
-            "count_large_buys": len(large_buys),
-            "count_large_sells": len(large_sells),
-            "whale_buy_percentage": round(whale_buy_vol / total_volume * 100, 2) if total_volume > 0 else 0,
-            "whale_sell_percentage": round(whale_sell_vol / total_volume * 100, 2) if total_volume > 0 else 0,
-            "net_direction": net_direction
-        }
+        """Крупные сделки из списка сделок CCXT"""
+        _, _, size, side = trades_to_arrays(trades or [])
+        return whale_stats(size, side, self.whale_threshold_multiplier)
     
     def _detect_orderbook_walls(self, orderbook: Dict) -> Dict[str, Any]:
-        if not orderbook or not orderbook.get('bids') or not orderbook.get('asks'):
-            return {"bid_walls": [], "ask_walls": [], "imbalance_direction": "neutral", "imbalance": 0.0}
+        empty = {"bid_walls": [], "ask_walls": [], "imbalance_direction": "neutral", "imbalance": 0.0}
+        if not orderbook:
+            return empty
         
-        bids = orderbook['bids'][:20]
-        asks = orderbook['asks'][:20]
+        # Уровни могут быть списками (REST) или массивами (локальный стакан)
+        bids = np.asarray(orderbook.get('bids', [])[:20], dtype=np.float64).reshape(-1, 2)
+        asks = np.asarray(orderbook.get('asks', [])[:20], dtype=np.float64).reshape(-1, 2)
         
-        if not bids or not asks:
-            return {"bid_walls": [], "ask_walls": [], "imbalance_direction": "neutral", "imbalance": 0.0}
+        if len(bids) == 0 or len(asks) == 0:
+            return empty
         
-        bid_sizes = [float(b[1]) for b in bids]
-        ask_sizes = [float(a[1]) for a in asks]
+        bid_sizes = bids[:, 1]
+        ask_sizes = asks[:, 1]
         
-        avg_bid = np.mean(bid_sizes) if bid_sizes else 0
-        avg_ask = np.mean(ask_sizes) if ask_sizes else 0
+        avg_bid = bid_sizes.mean()
+        avg_ask = ask_sizes.mean()
         
-        bid_walls = [{"price": float(b[0]), "size": float(b[1])} for b in bids if float(b[1]) > avg_bid * 3]
-        ask_walls = [{"price": float(a[0]), "size": float(a[1])} for a in asks if float(a[1]) > avg_ask * 3]
+        bid_walls = [{"price": float(p), "size": float(q)} for p, q in bids[bid_sizes > avg_bid * 3]]
+        ask_walls = [{"price": float(p), "size": float(q)} for p, q in asks[ask_sizes > avg_ask * 3]]
         
-        total_bid = sum(bid_sizes)
-        total_ask = sum(ask_sizes)
+        total_bid = float(bid_sizes.sum())
+        total_ask = float(ask_sizes.sum())
         total_volume = total_bid + total_ask
         
         imbalance = (total_bid - total_ask) / total_volume if total_volume > 0 else 0.0
@@ -138,7 +97,7 @@ class WhaleDetector:
             return "bearish"
         return "neutral"
     
-    def _detect_activity_pattern(self, large_orders: Dict, trades: List) -> str:
+    def _detect_activity_pattern(self, large_orders: Dict) -> str:
         buy_pct = large_orders.get('whale_buy_percentage', 0)
         sell_pct = large_orders.get('whale_sell_percentage', 0)
         
@@ -0,0 +1,69 @@
+"""
+Shared test helpers
+Synthetic random-walk candles and a fake exchange client serving them
+"""
+
+import asyncio
+from typing import Any, Iterable
+
+import numpy as np
+
+HOUR_MS = 60 * 60 * 1000
+MIN_MS = 60 * 1000
+START_TS = 1_700_000_000_000
+
+
+def make_candles(
+    count: int = 200,
+    seed: int = 0,
+    start_ts: int = START_TS,
+    step_ms: int = HOUR_MS,
+    open_noise: float = 0.0
+) -> np.ndarray:
+    """
+    Random-walk OHLCV candles (N, 6)
+
+    Open is the previous close (or a random offset from the close when
+    open_noise > 0, which gives varied bodies for candlestick patterns);
+    wicks and volume are random.
+    """
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, count)))
+    if open_noise > 0:
+        open_ = close * np.exp(rng.normal(0, open_noise, count))
+    else:
+        open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.01, count))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.01, count))
+    volume = rng.uniform(10, 1000, count)
+    ts = start_ts + np.arange(count) * step_ms
+    return np.column_stack([ts, open_, high, low, close, volume])
+
+
+class FakeClient:
+    """Exchange client serving the last limit bars of a fixed candle series"""
+
+    def __init__(self, candles: Any, delay: float = 0.0, broken: Iterable[str] = ()):
+        """
+        Args:
+            candles: Series (N, 6) returned for every symbol and timeframe
+            delay: Seconds each request takes
+            broken: Timeframes without data (get_ohlcv raises, get_ohlcv_multi omits them)
+        """
+        self.candles = candles
+        self.delay = delay
+        self.broken = set(broken)
+        self.calls = 0
+
+    async def get_ohlcv(self, symbol, timeframe, limit=200):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if timeframe in self.broken:
+            raise ConnectionError(f"no data for {timeframe}")
+        return np.asarray(self.candles, dtype=np.float64)[-limit:].tolist()
+
+    async def get_ohlcv_multi(self, symbol, timeframes, limit=200):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        candles = np.asarray(self.candles, dtype=np.float64)[-limit:].tolist()
+        return {tf: candles for tf in timeframes if tf not in self.broken}
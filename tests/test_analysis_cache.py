@@ -0,0 +1,121 @@
+"""
+Unit tests for AnalysisCache
+Tests bar-keyed memoization of per-timeframe analysis
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from mcp_server.analysis_cache import AnalysisCache
+from mcp_server.technical_analysis import TechnicalAnalysis
+from tests.helpers import HOUR_MS, FakeClient, make_candles
+
+
+class TestAnalysisCache:
+    """Test suite for AnalysisCache"""
+
+    def test_hit_for_same_window(self):
+        cache = AnalysisCache(enabled=True)
+        candles = make_candles(50)
+        params = {"include_patterns": True}
+        assert cache.get("BTC/USDT", "1h", candles, params) is None
+
+        result = {"signal": "BUY"}
+        cache.put("BTC/USDT", "1h", candles, params, result)
+        assert cache.get("BTC/USDT", "1h", [list(c) for c in candles], params) is result
+        assert cache.get("ETH/USDT", "1h", candles, params) is None
+        assert cache.get("BTC/USDT", "1h", candles, {"include_patterns": False}) is None
+
+        stats = cache.get_stats()
+        assert stats["hits"] == 1 and stats["misses"] == 3
+
+    def test_forming_bar_change_misses(self):
+        cache = AnalysisCache(enabled=True)
+        candles = make_candles(50)
+        cache.put("BTC/USDT", "1h", candles, {}, {"v": 1})
+
+        updated = [list(c) for c in candles]
+        updated[-1][4] *= 1.001
+        assert cache.get("BTC/USDT", "1h", updated, {}) is None
+        assert cache.get_stats()["window_changes"] == 1
+
+    def test_new_bar_invalidates_previous_entry(self):
+        cache = AnalysisCache(enabled=True)
+        candles = make_candles(51)
+        cache.put("BTC/USDT", "1h", candles[:50], {}, {"v": 1})
+
+        assert cache.get("BTC/USDT", "1h", candles[1:], {}) is None
+        stats = cache.get_stats()
+        assert stats["new_bar_invalidations"] == 1
+        assert stats["entries"] == 0
+
+        # Запоздавший расчёт по старому окну не вытесняет свежий
+        cache.put("BTC/USDT", "1h", candles[1:], {}, {"v": 2})
+        cache.put("BTC/USDT", "1h", candles[:50], {}, {"v": 1})
+        assert cache.get("BTC/USDT", "1h", candles[1:], {}) == {"v": 2}
+
+    def test_lru_eviction_and_invalidate(self):
+        cache = AnalysisCache(max_entries=2, enabled=True)
+        candles = make_candles(30)
+        for symbol in ("A/USDT", "B/USDT"):
+            cache.put(symbol, "1h", candles, {}, symbol)
+        assert cache.get("A/USDT", "1h", candles, {}) == "A/USDT"  # A становится свежей
+        cache.put("C/USDT", "1h", candles, {}, "C/USDT")
+
+        assert cache.get("B/USDT", "1h", candles, {}) is None
+        assert cache.get("A/USDT", "1h", candles, {}) == "A/USDT"
+        assert cache.get_stats()["evictions"] == 1
+
+        cache.invalidate("A/USDT")
+        assert cache.get("A/USDT", "1h", candles, {}) is None
+        cache.invalidate()
+        assert cache.get_stats()["entries"] == 0
+
+    def test_disabled_and_invalid_windows(self):
+        candles = make_candles(30)
+        disabled = AnalysisCache(enabled=False)
+        disabled.put("BTC/USDT", "1h", candles, {}, "x")
+        assert disabled.get("BTC/USDT", "1h", candles, {}) is None
+
+        cache = AnalysisCache(enabled=True)
+        for window in ([], None, [[1, 2], [3]]):
+            cache.put("BTC/USDT", "1h", window, {}, "x")
+            assert cache.get("BTC/USDT", "1h", window, {}) is None
+        assert cache.get_stats()["entries"] == 0
+
+    def test_technical_analysis_shares_cache(self, monkeypatch):
+        """Repeated _analyze_timeframe on the same window computes once and returns copies"""
+        candles = make_candles(200)
+        client = FakeClient(candles)
+        ta = TechnicalAnalysis(client)
+        ta.analysis_cache = AnalysisCache(enabled=True)
+
+        computed = []
+        original = ta._compute_timeframe_analysis
+
+        def counting(*args, **kwargs):
+            computed.append(args[:2])
+            return original(*args, **kwargs)
+
+        monkeypatch.setattr(ta, "_compute_timeframe_analysis", counting)
+
+        async def run():
+            first = await ta._analyze_timeframe("BTC/USDT", "1h", include_patterns=True)
+            first["volume_profile"] = {"poc": 1.0}
+            second = await ta._analyze_timeframe("BTC/USDT", "1h", include_patterns=True, ohlcv=candles)
+            client.candles = np.vstack([candles, make_candles(1, start_ts=int(candles[-1, 0]) + HOUR_MS)])
+            third = await ta._analyze_timeframe("BTC/USDT", "1h", include_patterns=True)
+            return first, second, third
+
+        first, second, third = asyncio.run(run())
+        assert len(computed) == 2
+        assert "volume_profile" not in second
+        assert second["indicators"] == first["indicators"]
+        assert third["current_price"] == pytest.approx(client.candles[-1][4])
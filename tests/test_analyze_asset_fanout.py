@@ -0,0 +1,112 @@
+"""
+Unit tests for concurrent analyze_asset
+Tests parallel timeframe/side-analysis fan-out, deadlines and latency reporting
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from mcp_server.analysis_cache import AnalysisCache
+from mcp_server.technical_analysis import TechnicalAnalysis, get_analysis_deadline
+from tests.helpers import FakeClient, make_candles
+
+
+def make_analyzer(client, cvd_delay=0.0, btc_delay=0.0) -> TechnicalAnalysis:
+    ta = TechnicalAnalysis(client)
+    ta.analysis_cache = AnalysisCache(enabled=False)
+
+    async def cvd(symbol, *args, **kwargs):
+        await asyncio.sleep(cvd_delay)
+        return {"signal": "BULLISH_ABSORPTION"}
+
+    async def btc(symbol, *args, **kwargs):
+        await asyncio.sleep(btc_delay)
+        return {"correlation": 0.8}
+
+    ta.get_cvd_divergence = cvd
+    ta.get_btc_correlation = btc
+    return ta
+
+
+class TestAnalyzeAssetFanout:
+    """Test suite for concurrent analyze_asset"""
+
+    def test_side_analyses_run_concurrently(self):
+        ta = make_analyzer(FakeClient(make_candles(), delay=0.2), cvd_delay=0.3, btc_delay=0.3)
+
+        started = time.perf_counter()
+        result = asyncio.run(ta.analyze_asset("ETH/USDT", timeframes=["1h", "4h"], deadline=5))
+        elapsed = time.perf_counter() - started
+
+        assert elapsed < 0.7  # последовательно было бы >= 0.8 с
+        assert result["partial"] is False
+        assert result["cvd_analysis"]["signal"] == "BULLISH_ABSORPTION"
+        assert result["btc_correlation"] == {"correlation": 0.8}
+        assert set(result["timeframes"]) == {"1h", "4h"}
+        assert "current_price" in result["timeframes"]["4h"]
+        assert set(result["latency_ms"]) >= {"prefetch", "timeframe_1h", "timeframe_4h", "cvd_analysis", "btc_correlation", "total"}
+        assert result["latency_ms"]["cvd_analysis"] >= 250
+
+    def test_slow_cvd_returns_partial_result(self):
+        ta = make_analyzer(FakeClient(make_candles()), cvd_delay=5.0)
+
+        started = time.perf_counter()
+        result = asyncio.run(ta.analyze_asset("ETH/USDT", timeframes=["1h"], deadline=0.5))
+        assert time.perf_counter() - started < 2.0
+
+        assert result["partial"] is True
+        assert result["timed_out"] == ["cvd_analysis"]
+        assert result["cvd_analysis"] == {"signal": "NONE", "error": "timeout"}
+        assert "indicators" in result["timeframes"]["1h"]
+        assert result["btc_correlation"] == {"correlation": 0.8}
+
+    def test_shared_call_respects_caller_deadline(self):
+        ta = make_analyzer(FakeClient(make_candles()), cvd_delay=1.0)
+
+        async def scenario():
+            slow = asyncio.ensure_future(ta.analyze_asset("ETH/USDT", timeframes=["1h"], deadline=5))
+            await asyncio.sleep(0)
+            started = time.perf_counter()
+            fast = await ta.analyze_asset("ETH/USDT", timeframes=["1h"], deadline=0.3)
+            elapsed = time.perf_counter() - started
+            return fast, elapsed, await slow
+
+        fast, elapsed, slow = asyncio.run(scenario())
+        # Короткий дедлайн не присоединяется к анализу с длинным
+        assert elapsed < 0.8
+        assert fast["timed_out"] == ["cvd_analysis"]
+        assert slow["partial"] is False
+
+    def test_slow_prefetch_times_out_timeframes(self):
+        ta = make_analyzer(FakeClient(make_candles(), delay=5.0))
+        result = asyncio.run(ta.analyze_asset("ETH/USDT", timeframes=["1h"], deadline=0.3))
+
+        assert result["partial"] is True
+        assert result["timed_out"][0] == "prefetch"
+        assert result["timeframes"]["1h"]["error"] in ("timeout", "no data for 1h")
+        assert "composite_signal" in result
+
+    def test_timeframe_error_is_isolated(self):
+        ta = make_analyzer(FakeClient(make_candles(), broken={"15m"}))
+        result = asyncio.run(ta.analyze_asset("ETH/USDT", timeframes=["15m", "1h"], deadline=5))
+
+        assert result["timeframes"]["15m"] == {"error": "no data for 15m"}
+        assert "indicators" in result["timeframes"]["1h"]
+        assert result["partial"] is False
+
+    def test_btc_skips_correlation(self):
+        ta = make_analyzer(FakeClient(make_candles()))
+        result = asyncio.run(ta.analyze_asset("BTC/USDT", timeframes=["1h"], deadline=5))
+        assert "btc_correlation" not in result
+        assert "btc_correlation" not in result["latency_ms"]
+
+    def test_deadline_from_env(self, monkeypatch):
+        monkeypatch.setenv("ANALYSIS_DEADLINE", "12.5")
+        assert get_analysis_deadline() == pytest.approx(12.5)
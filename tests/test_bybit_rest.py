@@ -0,0 +1,140 @@
+"""
+Unit tests for BybitRestClient
+Tests parsing of v5 market data responses into numpy arrays
+"""
+
+import asyncio
+import numpy as np
+import pytest
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from mcp_server.bybit_rest import BybitRestClient, BybitAPIError, category_of
+from mcp_server.rate_limiter import RateLimiter
+
+
+class FakeResponse:
+    def __init__(self, payload, status=200):
+        self.payload = payload
+        self.status = status
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def json(self, content_type=None):
+        return self.payload
+
+    async def text(self):
+        return str(self.payload)
+
+
+class FakeSession:
+    """Записывает запросы и отдаёт заготовленный ответ"""
+
+    def __init__(self, payload, status=200):
+        self.payload = payload
+        self.status = status
+        self.closed = False
+        self.requests = []
+
+    def get(self, url, params=None):
+        self.requests.append((url, params))
+        return FakeResponse(self.payload, self.status)
+
+
+def make_client(result, ret_code=0, status=200):
+    limiter = RateLimiter(enabled=False)
+    client = BybitRestClient(testnet=False, rate_limiter=limiter)
+    client._session = FakeSession({"retCode": ret_code, "retMsg": "OK" if ret_code == 0 else "error", "result": result}, status)
+    return client
+
+
+class TestBybitRestClient:
+    """Test suite for BybitRestClient"""
+
+    def test_klines_are_ascending_arrays(self):
+        """Свечи разворачиваются в порядок по возрастанию, turnover отбрасывается"""
+        client = make_client({"list": [
+            ["1700000120000", "3", "4", "2", "3.5", "30", "100"],
+            ["1700000060000", "2", "3", "1", "2.5", "20", "50"],
+            ["1700000000000", "1", "2", "0.5", "1.5", "10", "15"],
+        ]})
+
+        candles = asyncio.run(client.klines("BTC/USDT", "1m", limit=3))
+
+        assert candles.shape == (3, 6)
+        assert candles.dtype == np.float64
+        assert candles[:, 0].tolist() == [1700000000000, 1700000060000, 1700000120000]
+        assert candles[-1, 4] == 3.5
+        url, params = client._session.requests[0]
+        assert url.endswith("/v5/market/kline")
+        assert params == {"category": "spot", "symbol": "BTCUSDT", "interval": "1", "limit": "3"}
+
+    def test_recent_trades_sides_and_spot_limit(self):
+        """Сделки по возрастанию времени, side +1/-1, лимит spot ограничен 60"""
+        client = make_client({"list": [
+            {"time": "1700000000300", "price": "101", "size": "2", "side": "Sell"},
+            {"time": "1700000000200", "price": "100", "size": "1", "side": "Buy"},
+        ]})
+
+        ts, price, size, side = asyncio.run(client.recent_trades("ETH/USDT", limit=1000))
+
+        assert ts.tolist() == [1700000000200, 1700000000300]
+        assert price.tolist() == [100.0, 101.0]
+        assert size.tolist() == [1.0, 2.0]
+        assert side.tolist() == [1, -1]
+        assert client._session.requests[0][1]["limit"] == "60"
+
+    def test_orderbook_levels(self):
+        """Стакан разбирается в массивы (N, 2)"""
+        client = make_client({"s": "BTCUSDT", "b": [["100", "1.5"], ["99", "2"]], "a": [["101", "0.5"]]})
+
+        bids, asks = asyncio.run(client.orderbook("BTC/USDT:USDT", limit=1000))
+
+        assert bids.tolist() == [[100.0, 1.5], [99.0, 2.0]]
+        assert asks.shape == (1, 2)
+        params = client._session.requests[0][1]
+        assert params["category"] == "linear"
+        assert params["limit"] == "500"
+
+    def test_open_interest_and_funding_history(self):
+        """История OI и funding по возрастанию времени"""
+        client = make_client({"list": [
+            {"timestamp": "2000", "openInterest": "120", "fundingRateTimestamp": "2000", "fundingRate": "0.0002"},
+            {"timestamp": "1000", "openInterest": "100", "fundingRateTimestamp": "1000", "fundingRate": "0.0001"},
+        ]})
+
+        ts, oi = asyncio.run(client.open_interest("BTCUSDT"))
+        assert ts.tolist() == [1000, 2000]
+        assert oi.tolist() == [100.0, 120.0]
+
+        ts, rate = asyncio.run(client.funding_history("BTC/USDT:USDT"))
+        assert rate.tolist() == [0.0001, 0.0002]
+
+    def test_ret_code_error(self):
+        """retCode != 0 превращается в BybitAPIError, лимит сообщается лимитеру"""
+        client = make_client({}, ret_code=10006)
+        reported = []
+        client.rate_limiter.report_rate_limited = lambda group, *args: reported.append(group)
+
+        with pytest.raises(BybitAPIError) as exc_info:
+            asyncio.run(client.tickers("spot"))
+
+        assert exc_info.value.ret_code == 10006
+        assert reported == ["market"]
+        assert client.get_stats()["rate_limited"] == 1
+
+    def test_category_of(self):
+        """Категория определяется по CCXT символу"""
+        assert category_of("BTC/USDT") == "spot"
+        assert category_of("BTC/USDT:USDT") == "linear"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
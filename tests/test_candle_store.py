@@ -0,0 +1,132 @@
+"""
+Unit tests for CandleStore
+Tests incremental on-disk OHLCV storage
+"""
+
+import pytest
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from mcp_server.candle_store import CandleStore, candles_to_list
+
+HOUR_MS = 60 * 60 * 1000
+
+
+def make_candles(start_ts: int, count: int, base_price: float = 100.0):
+    """Generate hourly candles starting at start_ts"""
+    return [
+        [start_ts + i * HOUR_MS, base_price + i, base_price + i + 1, base_price + i - 1, base_price + i + 0.5, 10.0 + i]
+        for i in range(count)
+    ]
+
+
+class TestCandleStore:
+    """Test suite for CandleStore"""
+
+    def test_merge_and_window(self, tmp_path):
+        """Merged candles are returned as a window"""
+        store = CandleStore(base_dir=str(tmp_path), enabled=True)
+        store.merge("BTC/USDT", "1h", make_candles(0, 10))
+
+        window = store.get_window("BTC/USDT", "1h", 5)
+        assert window.shape == (5, 6)
+        assert int(window[-1, 0]) == 9 * HOUR_MS
+        assert store.get_window("BTC/USDT", "1h", 11) is None
+
+    def test_forming_bar_is_replaced(self, tmp_path):
+        """The still-forming last bar is fixed up by the fresh version"""
+        store = CandleStore(base_dir=str(tmp_path), enabled=True)
+        store.merge("BTC/USDT", "1h", make_candles(0, 10))
+
+        update = make_candles(9 * HOUR_MS, 2, base_price=500.0)
+        series = store.merge("BTC/USDT", "1h", update)
+
+        assert len(series) == 11
+        assert series[9, 4] == 500.5
+        assert np.all(np.diff(series[:, 0]) == HOUR_MS)
+
+    def test_gap_resets_series(self, tmp_path):
+        """Non-contiguous candles reset the stored history"""
+        store = CandleStore(base_dir=str(tmp_path), enabled=True)
+        store.merge("BTC/USDT", "1h", make_candles(0, 10))
+
+        series = store.merge("BTC/USDT", "1h", make_candles(50 * HOUR_MS, 3))
+        assert len(series) == 3
+        assert int(series[0, 0]) == 50 * HOUR_MS
+
+    def test_persistence_between_instances(self, tmp_path):
+        """Series survive a restart via the on-disk file"""
+        store = CandleStore(base_dir=str(tmp_path), enabled=True)
+        store.merge("ETH/USDT", "4h", make_candles(0, 20))
+        assert store.flush(timeout=5)
+
+        reopened = CandleStore(base_dir=str(tmp_path), enabled=True)
+        assert reopened.last_timestamp("ETH/USDT", "4h") == 19 * HOUR_MS
+        assert reopened.get_stats()["disk_loads"] == 1
+
+    def test_unchanged_merge_skips_write(self, tmp_path):
+        """Re-merging the same bars does not touch the series or the disk"""
+        store = CandleStore(base_dir=str(tmp_path), enabled=True)
+        candles = make_candles(0, 10)
+        first = store.merge("BTC/USDT", "1h", candles)
+        assert store.flush(timeout=5)
+
+        again = store.merge("BTC/USDT", "1h", candles[5:])
+        assert again is first
+        assert store.flush(timeout=5)
+        stats = store.get_stats()
+        assert stats["writes"] == 1 and stats["unchanged_merges"] == 1
+
+        # Изменился формирующийся бар - серия пишется снова
+        store.merge("BTC/USDT", "1h", make_candles(9 * HOUR_MS, 1, base_price=500.0))
+        assert store.flush(timeout=5)
+        assert store.get_stats()["writes"] == 2
+        assert np.load(tmp_path / "BTC_USDT" / "1h.npy")[-1, 4] == 500.5
+
+    def test_writes_are_deferred_and_visible_before_flush(self, tmp_path):
+        """merge() returns before the disk write; pending series stay readable after clear()"""
+        store = CandleStore(base_dir=str(tmp_path), enabled=True)
+        with store._write_cond:
+            # Писатель не может забрать серию, пока условие занято
+            store.merge("BTC/USDT", "1h", make_candles(0, 10))
+            assert store.get_stats()["pending_writes"] == 1
+            assert not (tmp_path / "BTC_USDT" / "1h.npy").exists()
+
+        store.clear()
+        assert store.last_timestamp("BTC/USDT", "1h") == 9 * HOUR_MS
+        assert store.flush(timeout=5)
+        assert (tmp_path / "BTC_USDT" / "1h.npy").exists()
+
+    def test_bars_to_fetch(self, tmp_path):
+        """Only bars newer than the last stored one are requested"""
+        store = CandleStore(base_dir=str(tmp_path), enabled=True)
+        assert store.bars_to_fetch("BTC/USDT", "1h", 200) == 200
+
+        store.merge("BTC/USDT", "1h", make_candles(0, 200))
+        now_ms = 199 * HOUR_MS + 30 * 60 * 1000  # Middle of the last bar
+        assert store.bars_to_fetch("BTC/USDT", "1h", 200, now_ms=now_ms) == 2
+
+        now_ms = 202 * HOUR_MS + 1
+        assert store.bars_to_fetch("BTC/USDT", "1h", 200, now_ms=now_ms) == 5
+
+    def test_max_bars_trim(self, tmp_path):
+        """Old bars are dropped beyond max_bars"""
+        store = CandleStore(base_dir=str(tmp_path), max_bars=50, enabled=True)
+        series = store.merge("BTC/USDT", "1h", make_candles(0, 80))
+        assert len(series) == 50
+        assert int(series[0, 0]) == 30 * HOUR_MS
+
+    def test_candles_to_list_format(self):
+        """Conversion keeps CCXT row format with int timestamps"""
+        rows = candles_to_list(np.array(make_candles(0, 2), dtype=np.float64))
+        assert isinstance(rows[0][0], int)
+        assert rows[1][4] == 101.5
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,102 @@
+"""
+Unit tests for ComputePool
+Tests offloading CPU-bound analysis from the event loop
+"""
+
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from mcp_server.compute_pool import ComputePool, get_pool_workers
+from mcp_server.technical_analysis import TechnicalAnalysis, analyze_window
+from tests.helpers import make_candles
+
+def thread_name() -> str:
+    return threading.current_thread().name
+
+
+def fail() -> None:
+    raise ValueError("boom")
+
+
+class TestComputePool:
+    """Test suite for ComputePool"""
+
+    def test_modes_and_workers(self, monkeypatch):
+        monkeypatch.setenv("ANALYSIS_POOL", "bogus")
+        monkeypatch.setenv("ANALYSIS_WORKERS", "3")
+        pool = ComputePool()
+        assert pool.mode == "thread"
+        assert pool.workers == 3
+
+        monkeypatch.setenv("ANALYSIS_WORKERS", "")
+        assert get_pool_workers() >= 1
+        assert ComputePool(mode="process", workers=2).get_stats()["started"] is False
+
+    def test_thread_pool_runs_off_loop(self):
+        pool = ComputePool(mode="thread", workers=2)
+        try:
+            name = asyncio.run(pool.run(thread_name))
+        finally:
+            pool.shutdown()
+        assert name.startswith("analysis")
+        assert pool.get_stats()["tasks"] == 1
+
+    def test_off_mode_runs_inline(self):
+        pool = ComputePool(mode="off")
+        assert asyncio.run(pool.run(thread_name)) == threading.current_thread().name
+        assert pool.get_stats()["inline"] == 1
+
+    def test_event_loop_stays_responsive(self):
+        """While the pool is busy the loop keeps serving other coroutines"""
+        pool = ComputePool(mode="thread", workers=2)
+
+        async def run():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0.01)
+
+            task = asyncio.create_task(ticker())
+            await asyncio.gather(pool.run(time.sleep, 0.2), pool.run(time.sleep, 0.2))
+            task.cancel()
+            return ticks
+
+        try:
+            assert asyncio.run(run()) >= 5
+        finally:
+            pool.shutdown()
+
+    def test_errors_propagate(self):
+        pool = ComputePool(mode="thread", workers=1)
+        try:
+            with pytest.raises(ValueError, match="boom"):
+                asyncio.run(pool.run(fail))
+        finally:
+            pool.shutdown()
+        assert pool.get_stats()["errors"] == 1
+
+    def test_process_pool_matches_inline_analysis(self):
+        """analyze_window in a spawned worker gives the same result as the in-process path"""
+        candles = make_candles()
+        expected = TechnicalAnalysis(None)._compute_timeframe_analysis("BTC/USDT", "1h", True, candles)
+
+        pool = ComputePool(mode="process", workers=1)
+        try:
+            result = asyncio.run(pool.run(analyze_window, "BTC/USDT", "1h", True, candles))
+        finally:
+            pool.shutdown()
+
+        assert result["indicators"]["rsi"] == expected["indicators"]["rsi"]
+        assert result["signal"] == expected["signal"]
+        assert result["order_blocks"] == expected["order_blocks"]
@@ -0,0 +1,198 @@
+"""
+Unit tests for CorrelationMatrix
+Tests vectorized pairwise correlation/beta, per-bar refresh and O(1) lookups
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from mcp_server.correlation_matrix import CorrelationMatrix, pairwise_stats
+from mcp_server.technical_analysis import TechnicalAnalysis
+
+HOUR_MS = 60 * 60 * 1000
+NOW_MS = 1_700_000_000_000 + 30 * 60 * 1000  # середина формирующегося часового бара
+
+
+def make_series(symbols, count=40, seed=9):
+    """Свечи с общим рыночным фактором, последний бар - формирующийся"""
+    rng = np.random.default_rng(seed)
+    market = rng.normal(0, 0.01, count)
+    forming = NOW_MS - NOW_MS % HOUR_MS
+    ts = forming - HOUR_MS * np.arange(count - 1, -1, -1)
+    series = {}
+    for k, symbol in enumerate(symbols):
+        returns = market * (0.5 + 0.5 * k) + rng.normal(0, 0.005, count)
+        close = 100 * np.exp(np.cumsum(returns))
+        series[symbol] = np.column_stack([ts, close, close * 1.01, close * 0.99, close, np.full(count, 10.0)])
+    return series
+
+
+class FakeFetcher:
+    def __init__(self, series):
+        self.series = series
+        self.calls = []
+
+    async def __call__(self, symbol, timeframe, limit):
+        self.calls.append(symbol)
+        if symbol not in self.series:
+            raise ConnectionError(f"unknown symbol {symbol}")
+        return self.series[symbol][-limit:].tolist()
+
+
+class FakeClient:
+    def __init__(self, series):
+        self.fetch = FakeFetcher(series)
+
+    async def get_ohlcv(self, symbol, timeframe, limit=100):
+        return await self.fetch(symbol, timeframe, limit)
+
+
+class TestCorrelationMatrix:
+    """Test suite for CorrelationMatrix"""
+
+    def test_pairwise_stats_match_pandas_with_gaps(self):
+        rng = np.random.default_rng(3)
+        returns = rng.normal(0, 0.01, (4, 30))
+        returns[1] += returns[0]
+        returns[0, [2, 7]] = np.nan
+        returns[2, [7, 11, 20]] = np.nan
+
+        corr, beta, n = pairwise_stats(returns)
+        frame = pd.DataFrame(returns.T)
+        expected = frame.corr().to_numpy()
+
+        np.testing.assert_allclose(corr, expected, rtol=1e-9, atol=1e-12)
+        assert n[0, 2] == 30 - 4
+        # beta[i, j] = cov(i, j) / var(j) по общим наблюдениям
+        both = frame[[1, 2]].dropna()
+        assert beta[1, 2] == pytest.approx(both[1].cov(both[2]) / both[2].var(), rel=1e-9)
+
+    def test_degenerate_series_are_nan(self):
+        returns = np.array([[0.01, 0.02, -0.01], [0.0, 0.0, 0.0], [np.nan, 0.01, np.nan]])
+        corr, beta, _ = pairwise_stats(returns)
+        assert np.isnan(corr[0, 1]) and np.isnan(beta[0, 1])
+        assert np.isnan(corr[0, 2])
+        assert corr[0, 0] == pytest.approx(1.0)
+
+    def test_lookup_matches_direct_correlation(self):
+        series = make_series(["BTC/USDT", "ETH/USDT", "SOL/USDT"])
+        matrix = CorrelationMatrix(FakeFetcher(series), "1h", 24, clock=lambda: NOW_MS / 1000)
+        asyncio.run(matrix.ensure(series))
+
+        # Только закрытые бары: формирующийся исключён
+        closes = pd.DataFrame({s: c[-25:-1, 4] for s, c in series.items()})
+        returns = closes.pct_change().dropna()
+        assert matrix.correlation("ETH/USDT", "BTC/USDT") == pytest.approx(
+            returns["ETH/USDT"].corr(returns["BTC/USDT"]), rel=1e-9
+        )
+        assert matrix.beta("SOL/USDT", "BTC/USDT") == pytest.approx(
+            returns["SOL/USDT"].cov(returns["BTC/USDT"]) / returns["BTC/USDT"].var(), rel=1e-9
+        )
+        assert matrix.mean_return("BTC/USDT") == pytest.approx(returns["BTC/USDT"].mean(), rel=1e-9)
+        assert matrix.correlation("ETH/USDT", "XRP/USDT") is None
+
+    def test_refresh_once_per_bar(self):
+        series = make_series(["BTC/USDT", "ETH/USDT", "SOL/USDT"])
+        fetcher = FakeFetcher(series)
+        now = [NOW_MS / 1000]
+        matrix = CorrelationMatrix(fetcher, "1h", 24, clock=lambda: now[0])
+
+        asyncio.run(matrix.ensure(["BTC/USDT", "ETH/USDT"]))
+        asyncio.run(matrix.ensure(["ETH/USDT", "BTC/USDT"]))
+        assert fetcher.calls == ["BTC/USDT", "ETH/USDT"]
+
+        # Новый символ в том же баре догружается без перезагрузки остальных
+        asyncio.run(matrix.ensure(["SOL/USDT", "BTC/USDT"]))
+        assert fetcher.calls[2:] == ["SOL/USDT"]
+        assert matrix.get_stats()["symbols"] == 3
+
+        # После закрытия бара перезагружаются только запрошенные символы
+        now[0] += 3600
+        asyncio.run(matrix.ensure(["BTC/USDT"]))
+        assert fetcher.calls[3:] == ["BTC/USDT"]
+        assert matrix.get_stats()["refreshes"] == 2
+        assert matrix.correlation("ETH/USDT", "BTC/USDT") is None
+
+        # Остальные - при следующем запросе
+        asyncio.run(matrix.ensure(["ETH/USDT", "BTC/USDT"]))
+        assert fetcher.calls[4:] == ["ETH/USDT"]
+        assert matrix.correlation("ETH/USDT", "BTC/USDT") is not None
+
+    def test_universe_is_bounded_by_recent_requests(self):
+        series = make_series(["BTC/USDT", "ETH/USDT", "SOL/USDT", "XRP/USDT"])
+        fetcher = FakeFetcher(series)
+        matrix = CorrelationMatrix(fetcher, "1h", 24, max_symbols=3, clock=lambda: NOW_MS / 1000)
+
+        asyncio.run(matrix.ensure(["BTC/USDT", "ETH/USDT", "SOL/USDT"]))
+        asyncio.run(matrix.ensure(["BTC/USDT"]))
+        asyncio.run(matrix.ensure(["XRP/USDT", "SOL/USDT"]))
+
+        # ETH дольше всех не запрашивался - вытеснен
+        assert sorted(matrix.symbols()) == ["BTC/USDT", "SOL/USDT", "XRP/USDT"]
+        assert matrix.get_stats()["evictions"] == 1
+        assert matrix.correlation("XRP/USDT", "BTC/USDT") is not None
+
+    def test_fetch_errors_are_isolated(self):
+        series = make_series(["BTC/USDT", "ETH/USDT"])
+        matrix = CorrelationMatrix(FakeFetcher(series), "1h", 24, clock=lambda: NOW_MS / 1000)
+        asyncio.run(matrix.ensure(["BTC/USDT", "ETH/USDT", "DEAD/USDT"]))
+
+        assert matrix.symbols() == ["BTC/USDT", "ETH/USDT"]
+        assert matrix.correlation("DEAD/USDT", "BTC/USDT") is None
+        assert matrix.get_stats()["fetch_errors"] == 1
+        with pytest.raises(ValueError):
+            CorrelationMatrix(FakeFetcher(series), "1M")
+
+    def test_technical_analysis_uses_shared_matrix(self, monkeypatch):
+        series = make_series(["BTC/USDT", "ETH/USDT", "SOL/USDT"])
+        client = FakeClient(series)
+        ta = TechnicalAnalysis(client)
+        matrix = ta.correlation_matrix("1h", 24)
+        matrix.clock = lambda: NOW_MS / 1000
+
+        result = asyncio.run(ta.get_btc_correlation("ETH/USDT"))
+        assert {"correlation", "correlation_level", "beta", "alt_avg_return", "btc_avg_return"} <= set(result)
+        assert result["correlation"] == round(matrix.correlation("ETH/USDT", "BTC/USDT"), 3)
+
+        # BTC и ETH уже в матрице - для SOL загружается только SOL
+        asyncio.run(ta.get_btc_correlation("SOL/USDT"))
+        assert client.fetch.calls == ["ETH/USDT", "BTC/USDT", "SOL/USDT"]
+        assert asyncio.run(ta.get_correlation("ETH/USDT", "SOL/USDT")) == matrix.correlation("ETH/USDT", "SOL/USDT")
+        assert asyncio.run(ta.get_correlation("ETH/USDT", "DEAD/USDT")) == 0.0
+
+    def test_concurrent_ensure_does_not_block_or_refetch(self):
+        series = make_series(["BTC/USDT", "ETH/USDT", "SOL/USDT"])
+        fetcher = FakeFetcher(series)
+        matrix = CorrelationMatrix(fetcher, "1h", 24, clock=lambda: NOW_MS / 1000)
+
+        async def scenario():
+            await matrix.ensure(["BTC/USDT", "ETH/USDT"])
+            release = asyncio.Event()
+
+            async def slow_fetch(symbol, timeframe, limit):
+                fetcher.calls.append(symbol)
+                await release.wait()
+                return series[symbol][-limit:].tolist()
+
+            matrix.fetcher = slow_fetch
+            first = asyncio.ensure_future(matrix.ensure(["SOL/USDT", "BTC/USDT"]))
+            second = asyncio.ensure_future(matrix.ensure(["SOL/USDT"]))
+            await asyncio.sleep(0)
+            # Загрузка SOL не держит блокировку: символы в матрице читаются сразу
+            await asyncio.wait_for(matrix.ensure(["ETH/USDT", "BTC/USDT"]), timeout=1)
+            assert not first.done() and not second.done()
+            release.set()
+            await asyncio.gather(first, second)
+
+        asyncio.run(scenario())
+        # SOL запрошен один раз - второй вызов дождался загрузки первого
+        assert fetcher.calls == ["BTC/USDT", "ETH/USDT", "SOL/USDT"]
+        assert matrix.correlation("SOL/USDT", "BTC/USDT") is not None
@@ -0,0 +1,145 @@
+"""
+Unit tests for CvdAccumulator
+Tests cursor-based incremental CVD, multi-window queries and on-demand history
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from mcp_server.cvd_accumulator import CvdAccumulator, CvdSeries, cvd_signal
+from mcp_server.technical_analysis import TechnicalAnalysis
+from mcp_server.trade_tape import order_flow
+
+NOW_MS = 1_700_000_000_000
+
+
+def make_trades(count: int = 3000, seed: int = 6, span_ms: int = 2 * 3600_000):
+    rng = np.random.default_rng(seed)
+    # Несколько сделок в одну миллисекунду - проверка курсора
+    ts = np.sort(NOW_MS - rng.integers(0, span_ms, count))
+    price = 100 * np.exp(np.cumsum(rng.normal(0, 0.0005, count)))
+    size = rng.exponential(1.0, count)
+    side = rng.choice(np.array([1, -1], dtype=np.int8), count)
+    return ts, price, size, side
+
+
+class FakeSource:
+    """Источник сделок: последние limit сделок, опубликованных к моменту now"""
+
+    def __init__(self, trades):
+        self.trades = trades
+        self.published = len(trades[0])
+        self.calls = []
+
+    async def __call__(self, symbol, limit, since_ms):
+        self.calls.append((limit, since_ms))
+        ts, price, size, side = (a[:self.published] for a in self.trades)
+        window = slice(max(0, len(ts) - limit), len(ts))
+        ts, price, size, side = ts[window], price[window], size[window], side[window]
+        if since_ms is not None:
+            start = int(np.searchsorted(ts, since_ms, side="left"))
+            ts, price, size, side = ts[start:], price[start:], size[start:], side[start:]
+        return ts, price, size, side
+
+
+def assert_flow_equal(actual, expected):
+    assert actual["trades_count"] == expected["trades_count"]
+    assert actual["aggressive_buys"] == expected["aggressive_buys"]
+    for key in ("price_change", "cvd_delta", "buy_volume", "sell_volume"):
+        assert actual[key] == pytest.approx(expected[key], rel=1e-9, abs=1e-9)
+
+
+class TestCvdAccumulator:
+    """Test suite for CvdAccumulator"""
+
+    def test_incremental_ingest_matches_full_window(self):
+        ts, price, size, side = make_trades()
+        series = CvdSeries()
+        # Перекрывающиеся пакеты, граница часто внутри одной миллисекунды
+        for end in range(500, len(ts) + 1, 250):
+            begin = max(0, end - 700)
+            series.ingest(ts[begin:end], price[begin:end], size[begin:end], side[begin:end])
+        assert len(series) == len(ts)
+
+        assert_flow_equal(series.last(1000), order_flow(price[-1000:], size[-1000:], side[-1000:]))
+        since = int(ts[-1]) - 300_000
+        start = int(np.searchsorted(ts, since))
+        assert_flow_equal(series.since(since), order_flow(price[start:], size[start:], side[start:]))
+
+    def test_gap_restarts_series(self):
+        ts, price, size, side = make_trades()
+        series = CvdSeries()
+        series.ingest(ts[:1000], price[:1000], size[:1000], side[:1000])
+        series.ingest(ts[2000:], price[2000:], size[2000:], side[2000:])
+        assert series.resets == 1
+        assert len(series) == len(ts) - 2000
+        assert series.covered_from == ts[2000]
+
+    def test_retention_and_growth(self):
+        ts, price, size, side = make_trades(5000)
+        series = CvdSeries(max_trades=1500)
+        for end in range(100, 5001, 100):
+            begin = max(0, end - 120)
+            series.ingest(ts[begin:end], price[begin:end], size[begin:end], side[begin:end])
+        assert len(series) == 1500
+        assert series.covered_from == ts[-1500]
+        assert_flow_equal(series.last(1500), order_flow(price[-1500:], size[-1500:], side[-1500:]))
+
+    def test_accumulator_reads_only_after_cursor(self):
+        trades = make_trades()
+        source = FakeSource(trades)
+        source.published = 2000
+        now = [NOW_MS / 1000]
+        acc = CvdAccumulator(source, batch_limit=1000, min_interval=1.0, clock=lambda: now[0])
+
+        asyncio.run(acc.update("BTC/USDT"))
+        asyncio.run(acc.update("BTC/USDT"))  # в пределах min_interval - без запроса
+        assert len(source.calls) == 1 and acc.get_stats()["throttled"] == 1
+
+        source.published = 2600
+        now[0] += 5
+        series = asyncio.run(acc.update("BTC/USDT"))
+        assert source.calls[-1] == (1000, int(trades[0][1999]))
+        assert len(series) == 1600  # первая загрузка - последние 1000 сделок, затем 600 новых
+        assert acc.get_stats()["trades"] == 1600
+
+    def test_longer_window_deepens_history_once(self):
+        trades = make_trades()
+        source = FakeSource(trades)
+        acc = CvdAccumulator(source, batch_limit=500, history_limit=5000, clock=lambda: NOW_MS / 1000)
+
+        asyncio.run(acc.update("BTC/USDT"))
+        windows = acc.windows("BTC/USDT")
+        assert windows["1m"]["covered"] and not windows["1h"]["covered"]
+
+        flow, covered = asyncio.run(acc.window("BTC/USDT", 3600))
+        ts, price, size, side = trades
+        start = int(np.searchsorted(ts, NOW_MS - 3600_000))
+        assert covered is True
+        assert_flow_equal(flow, order_flow(price[start:], size[start:], side[start:]))
+        assert acc.get_stats()["deep_fetches"] == 1
+
+        # Окно длиннее всей истории источника: одно углубление, дальше covered=False без запросов
+        _, covered = asyncio.run(acc.window("BTC/USDT", 6 * 3600))
+        _, covered_again = asyncio.run(acc.window("BTC/USDT", 6 * 3600))
+        assert covered is False and covered_again is False
+        assert acc.get_stats()["deep_fetches"] == 2
+
+    def test_get_cvd_divergence_schema(self):
+        trades = make_trades()
+        ta = TechnicalAnalysis(None)
+        ta.cvd_accumulator = CvdAccumulator(FakeSource(trades), clock=lambda: NOW_MS / 1000)
+
+        result = asyncio.run(ta.get_cvd_divergence("BTC/USDT", limit=1000))
+        _, price, size, side = (a[-1000:] for a in trades)
+        expected = cvd_signal(order_flow(price, size, side))
+        assert {k: result[k] for k in expected} == expected
+        assert set(result["windows"]) == {"1m", "5m", "1h"}
+        assert "covered" in asyncio.run(ta.get_cvd_divergence("BTC/USDT", window_seconds=300))
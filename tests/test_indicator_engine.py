@@ -0,0 +1,154 @@
+"""
+Unit tests for indicator_engine
+Compares the vectorized single-pass engine with the ta library
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+import sys
+import ta
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from mcp_server.indicator_engine import (
+    compute_indicators, compute_indicators_stack, ewm, indicators_at, linear_recurrence
+)
+from mcp_server.market_scanner import MarketScanner
+
+
+def make_ohlcv(n: int, seed: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.01, n))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.01, n))
+    volume = rng.uniform(10, 1000, n)
+    return pd.DataFrame({"open": open_, "high": high, "low": low, "close": close, "volume": volume})
+
+
+def reference_indicators(df: pd.DataFrame) -> dict:
+    """Прежняя реализация на библиотеке ta"""
+    macd = ta.trend.MACD(df['close'])
+    bb = ta.volatility.BollingerBands(df['close'])
+    adx = ta.trend.ADXIndicator(df['high'], df['low'], df['close'])
+    stoch = ta.momentum.StochasticOscillator(df['high'], df['low'], df['close'])
+    return {
+        'rsi': {f'rsi_{w}': ta.momentum.rsi(df['close'], window=w).iloc[-1] for w in (7, 14, 21)},
+        'macd': {
+            'macd_line': macd.macd().iloc[-1],
+            'signal_line': macd.macd_signal().iloc[-1],
+            'histogram': macd.macd_diff().iloc[-1],
+        },
+        'bollinger_bands': {
+            'upper': bb.bollinger_hband().iloc[-1],
+            'middle': bb.bollinger_mavg().iloc[-1],
+            'lower': bb.bollinger_lband().iloc[-1],
+        },
+        'ema': {f'ema_{w}': ta.trend.ema_indicator(df['close'], window=w).iloc[-1] for w in (9, 20, 50, 100, 200)},
+        'atr': {f'atr_{w}': ta.volatility.average_true_range(df['high'], df['low'], df['close'], window=w).iloc[-1]
+                for w in (7, 14)},
+        'adx': {'adx': adx.adx().iloc[-1], 'adx_pos': adx.adx_pos().iloc[-1], 'adx_neg': adx.adx_neg().iloc[-1]},
+        'stochastic': {'stoch_k': stoch.stoch().iloc[-1], 'stoch_d': stoch.stoch_signal().iloc[-1]},
+        'volume': {'obv': ta.volume.on_balance_volume(df['close'], df['volume']).iloc[-1]},
+    }
+
+
+def engine_indicators(df: pd.DataFrame) -> dict:
+    return compute_indicators(df['high'].values, df['low'].values, df['close'].values, df['volume'].values)
+
+
+class TestIndicatorEngine:
+    """Test suite for indicator_engine"""
+
+    @pytest.mark.parametrize("n", [40, 120, 1000])
+    def test_matches_ta_library(self, n):
+        """Все значения совпадают с ta (включая NaN для коротких рядов)"""
+        df = make_ohlcv(n)
+        expected = reference_indicators(df)
+        actual = engine_indicators(df)
+
+        for group, values in expected.items():
+            for key, value in values.items():
+                np.testing.assert_allclose(actual[group][key], value, rtol=1e-9, atol=1e-9, err_msg=f"{group}.{key}")
+
+    def test_schema_and_derived_fields(self):
+        """Схема словаря прежняя, производные поля согласованы"""
+        df = make_ohlcv(250)
+        result = engine_indicators(df)
+
+        assert set(result) == {'rsi', 'macd', 'bollinger_bands', 'ema', 'atr', 'adx', 'stochastic', 'volume', 'vwap'}
+        assert result['ema']['alignment'] in ('bullish', 'bearish', 'mixed')
+        assert result['macd']['crossover'] == ('bullish' if result['macd']['macd_line'] > result['macd']['signal_line'] else 'bearish')
+        assert isinstance(result['bollinger_bands']['squeeze'], bool)
+        assert result['volume']['volume_sma'] == pytest.approx(df['volume'].tail(20).mean())
+        assert result['volume']['window_used'] == 20
+
+    def test_ewm_matches_pandas(self):
+        """Блочное решение рекуррентности совпадает с pandas ewm"""
+        values = make_ohlcv(3000)['close']
+        for alpha in (2 / 201, 1 / 14, 0.5):
+            expected = values.ewm(alpha=alpha, adjust=False).mean().values
+            np.testing.assert_allclose(ewm(values.values, alpha), expected, rtol=1e-10)
+
+    def test_linear_recurrence_edge_cases(self):
+        """a = 0 и a = 1 обрабатываются без деления"""
+        x = np.array([1.0, 2.0, 3.0])
+        assert linear_recurrence(5.0, x, 0.0).tolist() == [5.0, 1.0, 2.0, 3.0]
+        assert linear_recurrence(5.0, x, 1.0).tolist() == [5.0, 6.0, 8.0, 11.0]
+        assert linear_recurrence(5.0, np.array([]), 0.5).tolist() == [5.0]
+
+    def test_flat_series(self):
+        """Плоский ряд не даёт предупреждений и бесконечностей в RSI/ADX"""
+        n = 60
+        flat = np.full(n, 100.0)
+        result = compute_indicators(flat, flat, flat, np.ones(n))
+
+        assert result['rsi']['rsi_14'] == 100.0
+        assert result['adx']['adx'] == 0.0
+        assert result['atr']['atr_14'] == 0.0
+
+    def test_batch_matches_single_symbol(self):
+        """Расчёт по массиву (символы x бары x OHLCV) совпадает с расчётом по одному символу"""
+        frames = [make_ohlcv(200, seed=s) for s in range(8)]
+        stack = np.stack([np.column_stack([np.arange(200), df.values]) for df in frames])
+
+        batch = compute_indicators_stack(stack)
+        assert batch['rsi_14'].shape == (8,)
+
+        for i, df in enumerate(frames):
+            single = engine_indicators(df)
+            from_batch = indicators_at(batch, i)
+            from_batch['volume']['window_used'] = 20
+            for group, values in single.items():
+                if isinstance(values, dict):
+                    for key, value in values.items():
+                        if isinstance(value, float):
+                            np.testing.assert_allclose(from_batch[group][key], value, rtol=1e-12)
+                        else:
+                            assert from_batch[group][key] == value, f"{group}.{key}"
+
+    def test_scanner_prefilter_mask_matches_criteria_check(self):
+        """Векторный предфильтр сканера принимает те же решения, что и _check_indicator_criteria"""
+        scanner = MarketScanner.__new__(MarketScanner)
+        frames = [make_ohlcv(200, seed=s) for s in range(30)]
+        stack = np.stack([np.column_stack([np.arange(200), df.values]) for df in frames])
+        batch = compute_indicators_stack(stack)
+
+        criteria_sets = [
+            {'rsi_range': [40, 60]},
+            {'macd_crossover': 'bullish'},
+            {'price_vs_ema50': 'below', 'rsi_range': [0, 55]},
+        ]
+        for criteria in criteria_sets:
+            mask = scanner._indicator_criteria_mask(batch, criteria)
+            for i in range(len(frames)):
+                indicators = indicators_at(batch, i)
+                analysis = {'timeframes': {'4h': {'indicators': indicators, 'current_price': float(stack[i, -1, 4])}}}
+                assert bool(mask[i]) == scanner._check_indicator_criteria(analysis, criteria)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
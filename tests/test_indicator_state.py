@@ -0,0 +1,127 @@
+"""
+Unit tests for indicator_state
+Checks that O(1) streaming updates reproduce the batch indicator engine
+"""
+
+import functools
+import math
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from mcp_server.indicator_engine import compute_indicators_stack
+from mcp_server.indicator_state import IndicatorState, load_states, save_states
+from mcp_server.kline_stream import KlineStream
+from tests.helpers import MIN_MS, make_candles
+
+# Минутные бары от начала минуты
+minute_candles = functools.partial(make_candles, seed=3, start_ts=1_700_000_040_000, step_ms=MIN_MS)
+
+
+def assert_matches_batch(values: dict, candles: np.ndarray) -> None:
+    batch = compute_indicators_stack(candles)
+    assert set(values) == set(batch)
+    for name, expected in batch.items():
+        actual, expected = values[name], float(expected)
+        if math.isnan(expected):
+            assert math.isnan(actual), name
+        else:
+            assert actual == pytest.approx(expected, rel=1e-9, abs=1e-9), name
+
+
+class TestIndicatorState:
+    """Test suite for IndicatorState"""
+
+    @pytest.mark.parametrize("n", [1, 15, 27, 34, 200, 600])
+    def test_streaming_matches_batch(self, n):
+        """Seed on a prefix and stream the rest - same values as full recompute (incl. short histories)"""
+        candles = minute_candles(n)
+        state = IndicatorState("BTC/USDT", "1m")
+        state.seed(candles[:n // 2])
+        for bar in candles[n // 2:]:
+            assert state.update(bar)
+
+        assert state.count == n
+        assert_matches_batch(state.values(), candles)
+
+    def test_preview_does_not_mutate(self):
+        """Forming bar updates are applied to a copy"""
+        candles = minute_candles(120)
+        state = IndicatorState("BTC/USDT", "1m")
+        state.seed(candles[:-1])
+        before = state.to_dict()
+
+        forming = candles[-1].copy()
+        first = state.preview(forming)
+        forming[4] *= 1.02
+        forming[2] = max(forming[2], forming[4])
+        second = state.preview(forming)
+
+        assert state.to_dict() == before
+        assert first['ema']['ema_9'] != second['ema']['ema_9']
+        full = np.vstack([candles[:-1], forming])
+        assert second['rsi']['rsi_14'] == pytest.approx(float(compute_indicators_stack(full)['rsi_14']), rel=1e-9)
+        assert second['volume']['window_used'] == 20
+
+    def test_stale_bars_ignored(self):
+        """Bars not newer than the last applied one do not change state"""
+        candles = minute_candles(60)
+        state = IndicatorState("BTC/USDT", "1m")
+        assert state.seed(candles) == 60
+        before = state.to_dict()
+
+        assert not state.update(candles[-1])
+        assert not state.update(candles[10])
+        assert state.to_dict() == before
+
+        with pytest.raises(ValueError):
+            IndicatorState("BTC/USDT", "1m").values()
+
+    def test_serialization_round_trip(self, tmp_path):
+        """State survives to_dict/from_dict and save/load and keeps streaming"""
+        candles = minute_candles(300)
+        state = IndicatorState("ETH/USDT", "5m", volume_window=30)
+        state.seed(candles[:250])
+
+        path = tmp_path / "states" / "indicators.json"
+        assert save_states([state], path) == 1
+        restored = load_states(path)[("ETH/USDT", "5m")]
+        assert restored.volume_window == 30
+
+        for bar in candles[250:]:
+            state.update(bar)
+            restored.update(bar)
+        assert restored.to_dict() == state.to_dict()
+
+        (tmp_path / "broken.json").write_text("{not json")
+        assert load_states(tmp_path / "broken.json") == {}
+        assert load_states(tmp_path / "missing.json") == {}
+
+    def test_kline_stream_indicators_follow_buffer(self):
+        """KlineStream keeps the state current as bars close and drops it on gaps"""
+        candles = minute_candles(260)
+        stream = KlineStream(enabled=True)
+        stream._subscribed.add(("BTC/USDT", "1m"))
+        stream.seed("BTC/USDT", "1m", candles[:249].tolist())
+        stream.apply_bar("BTC/USDT", "1m", candles[249].tolist())
+
+        assert stream.get_indicators("BTC/USDT", "1m", min_bars=300) is None
+        first = stream.get_indicators("BTC/USDT", "1m")
+        assert first['ema']['ema_200'] == pytest.approx(float(compute_indicators_stack(candles[:250])['ema_200']), rel=1e-9)
+
+        for bar in candles[250:]:
+            stream.apply_bar("BTC/USDT", "1m", bar.tolist())
+        latest = stream.get_indicators("BTC/USDT", "1m")
+        assert latest['adx']['adx'] == pytest.approx(float(compute_indicators_stack(candles)['adx']), rel=1e-9)
+        assert stream.get_stats()["indicator_states"] == 1
+
+        gap_bar = candles[-1].copy()
+        gap_bar[0] += 5 * MIN_MS
+        stream.apply_bar("BTC/USDT", "1m", gap_bar.tolist())
+        assert stream.get_indicators("BTC/USDT", "1m") is None
+        assert stream.get_stats()["indicator_states"] == 0
@@ -0,0 +1,130 @@
+"""
+Unit tests for KlineStream
+Tests WebSocket candle buffers, gap detection and REST backfill
+"""
+
+import asyncio
+import pytest
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from mcp_server.kline_stream import KlineStream, merge_bars, to_exchange_symbol
+
+import numpy as np
+
+MIN_MS = 60 * 1000
+
+
+def make_candles(start_ts: int, count: int, base_price: float = 100.0):
+    """Generate 1m candles starting at start_ts"""
+    return [
+        [start_ts + i * MIN_MS, base_price + i, base_price + i + 1, base_price + i - 1, base_price + i + 0.5, 10.0]
+        for i in range(count)
+    ]
+
+
+def make_stream(fetcher=None) -> KlineStream:
+    """Stream with a subscription registered without connecting"""
+    stream = KlineStream(fetcher=fetcher, enabled=True)
+    stream._subscribed.add(("BTC/USDT", "1m"))
+    stream._symbol_map["BTCUSDT"] = "BTC/USDT"
+    stream._interval_map["1"] = "1m"
+    return stream
+
+
+class TestKlineStream:
+    """Test suite for KlineStream"""
+
+    def test_exchange_symbol(self):
+        """CCXT symbols are converted to Bybit topic symbols"""
+        assert to_exchange_symbol("BTC/USDT") == "BTCUSDT"
+        assert to_exchange_symbol("ETH/USDT:USDT") == "ETHUSDT"
+
+    def test_seed_and_stream_updates_make_buffer_warm(self):
+        """REST seed plus stream activity gives a warm buffer"""
+        stream = make_stream()
+        stream.seed("BTC/USDT", "1m", make_candles(0, 50))
+        assert not stream.is_warm("BTC/USDT", "1m", 50)  # no stream activity yet
+
+        # Update of the forming bar, then the next bar
+        assert not stream.apply_bar("BTC/USDT", "1m", [49 * MIN_MS, 1, 2, 0.5, 1.5, 99])
+        assert not stream.apply_bar("BTC/USDT", "1m", [50 * MIN_MS, 1, 2, 0.5, 1.7, 5])
+
+        candles = stream.get_ohlcv("BTC/USDT", "1m", 51)
+        assert candles is not None
+        assert candles[-2][5] == 99
+        assert candles[-1][0] == 50 * MIN_MS
+        assert stream.get_ohlcv("BTC/USDT", "1m", 52) is None
+
+    def test_handle_message_parses_bybit_payload(self):
+        """Raw kline messages update the buffer"""
+        stream = make_stream()
+        stream.seed("BTC/USDT", "1m", make_candles(0, 5))
+        stream._handle_message({
+            "topic": "kline.1.BTCUSDT",
+            "data": [{"start": 4 * MIN_MS, "open": "1", "high": "3", "low": "0.5", "close": "2.5",
+                      "volume": "42", "confirm": False}]
+        })
+        candles = stream.get_ohlcv("BTC/USDT", "1m", 5)
+        assert candles[-1][4] == 2.5
+        assert candles[-1][5] == 42
+
+    def test_gap_blocks_buffer_until_backfilled(self):
+        """A gap makes the buffer cold until REST backfill closes it"""
+        history = make_candles(0, 20)
+        fetched = []
+
+        async def fetcher(symbol, timeframe, limit):
+            fetched.append(limit)
+            return history[-limit:]
+
+        stream = make_stream(fetcher)
+        stream.seed("BTC/USDT", "1m", history[:10])
+        stream.apply_bar("BTC/USDT", "1m", history[9])
+
+        gap = stream.apply_bar("BTC/USDT", "1m", history[15])
+        assert gap
+        assert not stream.is_warm("BTC/USDT", "1m", 5)
+
+        assert asyncio.run(stream.backfill("BTC/USDT", "1m"))
+        assert fetched == [16]
+        candles = stream.get_ohlcv("BTC/USDT", "1m", 16)
+        assert candles is not None
+        assert np.all(np.diff([c[0] for c in candles]) == MIN_MS)
+
+    def test_merge_bars_keeps_contiguous_tail(self):
+        """Merging keeps newest version and drops history before a gap"""
+        existing = np.array(make_candles(0, 5))
+        new = np.array(make_candles(10 * MIN_MS, 3))
+        merged = merge_bars(existing, new, MIN_MS)
+        assert len(merged) == 3
+        assert merged[0, 0] == 10 * MIN_MS
+
+    def test_disabled_stream_returns_none(self):
+        """Disabled stream never serves candles"""
+        stream = KlineStream(enabled=False)
+        assert stream.get_ohlcv("BTC/USDT", "1m", 1) is None
+        assert asyncio.run(stream.subscribe(["BTC/USDT"], ["1m"])) == 0
+
+    def test_subscribe_skips_symbols_of_another_category(self):
+        """Spot stream never subscribes perpetual symbols (BTCUSDT spot bars != linear)"""
+        stream = KlineStream(enabled=True, category="spot")
+        sent = []
+        stream._subscribe_blocking = lambda topics: sent.append(topics)
+
+        assert asyncio.run(stream.subscribe(["ETH/USDT:USDT", "BTC/USDT"], ["1m"])) == 1
+        assert sent == [{"1": ["BTCUSDT"]}]
+        assert not stream.is_subscribed("ETH/USDT:USDT", "1m")
+
+        linear = KlineStream(enabled=True, category="linear")
+        linear._subscribe_blocking = lambda topics: sent.append(topics)
+        assert asyncio.run(linear.subscribe(["ETH/USDT:USDT", "BTC/USDT"], ["1m"])) == 1
+        assert linear.is_subscribed("ETH/USDT:USDT", "1m")
+        assert not linear.is_subscribed("BTC/USDT", "1m")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
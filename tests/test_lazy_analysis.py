@@ -0,0 +1,140 @@
+"""
+Unit tests for lazy analysis sections
+Tests on-demand section computation, memoization and unchanged JSON schema
+"""
+
+import asyncio
+import copy
+import json
+import pickle
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from mcp_server.analysis_cache import AnalysisCache
+from mcp_server.compute_pool import ComputePool
+from mcp_server.lazy_analysis import LazySections
+from mcp_server.technical_analysis import TechnicalAnalysis, _copy_analysis
+from tests.helpers import FakeClient, make_candles
+
+SMC_SECTIONS = {"order_blocks", "fair_value_gaps", "structure", "liquidity_grabs"}
+
+
+class Counter:
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+def make_analyzer(lazy: bool = True) -> TechnicalAnalysis:
+    ta = TechnicalAnalysis(FakeClient(make_candles()))
+    ta.analysis_cache = AnalysisCache(enabled=True)
+    ta.compute_pool = ComputePool(mode="off")
+    ta.lazy_sections = lazy
+    return ta
+
+
+class TestLazySections:
+    """Test suite for LazySections"""
+
+    def test_sections_computed_once_on_read(self):
+        section = Counter([1, 2])
+        lazy = LazySections({"signal": "BUY"}, {"order_blocks": section})
+
+        assert "order_blocks" in lazy and len(lazy) == 2
+        assert "<pending>" in repr(lazy)
+        assert section.calls == 0
+        assert lazy.get("order_blocks") == [1, 2]
+        assert lazy["order_blocks"] == [1, 2]
+        assert section.calls == 1 and lazy.pending == ()
+        assert lazy.get("missing", {}) == {}
+
+    def test_serialization_sees_full_dict(self):
+        lazy = LazySections({"a": 1}, {"b": lambda: {"c": 2}})
+        assert json.loads(json.dumps({"tf": lazy})) == {"tf": {"a": 1, "b": {"c": 2}}}
+
+        for clone in (pickle.loads(pickle.dumps(LazySections({"a": 1}, {"b": lambda: 2}))),
+                      copy.deepcopy(LazySections({"a": 1}, {"b": lambda: 2}))):
+            assert type(clone) is dict and clone == {"a": 1, "b": 2}
+        assert LazySections({"a": 1}, {"b": lambda: 2}) == {"a": 1, "b": 2}
+        assert dict(LazySections({"a": 1}, {"b": lambda: 2})) == {"a": 1, "b": 2}
+
+    def test_copy_memoizes_in_original(self):
+        section = Counter("value")
+        original = LazySections({"a": 1}, {"b": section})
+        first, second = original.copy(), original.copy()
+        first["extra"] = True
+
+        assert first["b"] == "value" and second["b"] == "value"
+        assert section.calls == 1
+        assert original.pending == ()
+        assert "extra" not in original
+
+        del second["b"]
+        assert "b" not in second and original["b"] == "value"
+
+    def test_timeframe_analysis_defers_smc_sections(self):
+        ta = make_analyzer()
+        calls = []
+        find_order_blocks = ta.find_order_blocks
+        ta.find_order_blocks = lambda df: calls.append(1) or find_order_blocks(df)
+
+        analysis = asyncio.run(ta._analyze_timeframe("BTC/USDT", "1h", include_patterns=True))
+        assert isinstance(analysis, LazySections)
+        assert set(analysis.pending) == SMC_SECTIONS
+        assert analysis["signal"] and analysis["indicators"]
+        assert calls == []
+
+        # Секция считается один раз и запоминается в кеше для следующих вызовов
+        blocks = analysis["order_blocks"]
+        again = asyncio.run(ta._analyze_timeframe("BTC/USDT", "1h", include_patterns=True))
+        assert again["order_blocks"] == blocks
+        assert calls == [1]
+
+    def test_lazy_result_matches_eager_schema(self):
+        lazy = asyncio.run(make_analyzer(True)._analyze_timeframe("BTC/USDT", "1h", include_patterns=True))
+        eager = asyncio.run(make_analyzer(False)._analyze_timeframe("BTC/USDT", "1h", include_patterns=True))
+        assert type(eager) is dict
+        assert json.loads(json.dumps(lazy, default=str)) == json.loads(json.dumps(eager, default=str))
+
+    def test_copy_analysis_keeps_sections_lazy(self):
+        analysis = asyncio.run(make_analyzer()._analyze_timeframe("BTC/USDT", "4h", include_patterns=False))
+        result = _copy_analysis({"symbol": "BTC/USDT", "timeframes": {"4h": analysis}})
+        copied = result["timeframes"]["4h"]
+
+        assert set(copied.pending) == SMC_SECTIONS
+        copied["volume_profile"] = {"poc": 1.0}
+        assert "volume_profile" not in analysis
+        assert copied["structure"]["current_structure"] in ("bullish", "bearish", "neutral")
+        assert "structure" not in analysis.pending
+
+    def test_resolve_sections_runs_in_pool(self):
+        ta = make_analyzer()
+        ta.compute_pool = ComputePool(mode="thread", workers=1)
+        threads = []
+        find_order_blocks = ta.find_order_blocks
+        ta.find_order_blocks = lambda df: threads.append(threading.get_ident()) or find_order_blocks(df)
+
+        async def scenario():
+            analysis = await ta._analyze_timeframe("BTC/USDT", "4h", include_patterns=False)
+            result = {"symbol": "BTC/USDT", "timeframes": {"4h": analysis}}
+            await ta.resolve_sections(result, ["order_blocks"])
+            assert set(analysis.pending) == SMC_SECTIONS - {"order_blocks"}
+            await ta.resolve_sections(result)
+            assert analysis.pending == ()
+
+        try:
+            asyncio.run(scenario())
+        finally:
+            ta.compute_pool.shutdown()
+        # Секция посчитана в потоке пула, не в потоке event loop
+        assert len(threads) == 1 and threads[0] != threading.get_ident()
@@ -0,0 +1,135 @@
+"""
+Unit tests for the density-based level engine
+Tests pivot density levels, incremental updates and nearest-level lookups
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from mcp_server.level_engine import LevelEngine, LevelMap, timeframe_weight
+from mcp_server.market_scanner import MarketScanner
+from mcp_server.structure_analyzer import StructureAnalyzer
+from mcp_server.technical_analysis import TechnicalAnalysis
+from tests.helpers import HOUR_MS, make_candles
+
+
+def range_candles(count: int = 120) -> np.ndarray:
+    """Пила между 90 и 110: пивоты только у границ диапазона"""
+    phase = np.arange(count) % 20
+    close = np.where(phase < 10, 90 + 2 * phase, 130 - 2 * phase).astype(float)
+    ts = np.arange(count) * HOUR_MS
+    return np.column_stack([ts, close, close + 0.5, close - 0.5, close, np.ones(count)])
+
+
+class TestLevelEngine:
+    """Test suite for level engine"""
+
+    def test_range_boundaries_become_levels(self):
+        level_map = LevelMap()
+        level_map.add_candles(range_candles())
+        prices = [level["price"] for level in level_map.levels()]
+
+        assert len(prices) == 2
+        assert prices[0] == pytest.approx(89.5, rel=0.002)
+        assert prices[1] == pytest.approx(110.5, rel=0.002)
+        assert all(level["touches"] >= 5 for level in level_map.levels())
+
+    def test_nearest_levels_and_support_resistance(self):
+        level_map = LevelMap()
+        level_map.add_candles(make_candles(400))
+        prices = np.array([level["price"] for level in level_map.levels()])
+        price = float(prices[len(prices) // 2]) * 1.0005
+
+        below = level_map.nearest_below(price)
+        above = level_map.nearest_above(price)
+        assert below["price"] == prices[prices < price].max()
+        assert above["price"] == prices[prices > price].min()
+
+        sr = level_map.support_resistance(price, count=3)
+        assert sr["support"] == sorted(prices[prices < price])[-3:]
+        assert sr["resistance"] == sorted(prices[prices > price])[:3]
+        assert LevelMap().nearest_below(price) is None
+
+    def test_incremental_updates_match_full_build(self):
+        candles = make_candles(400)
+        incremental = LevelMap()
+        for end in range(50, len(candles) + 1, 25):
+            incremental.add_candles(candles[max(0, end - 100):end])
+        # Повторное окно не добавляет пивоты
+        assert incremental.add_candles(candles[-100:]) == 0
+
+        full = LevelMap()
+        full.add_candles(candles)
+        assert incremental.pivots == full.pivots
+        np.testing.assert_allclose(incremental.weights, full.weights)
+        assert incremental.levels() == full.levels()
+
+    def test_same_window_skips_swing_detection(self, monkeypatch):
+        candles = make_candles(400)
+        level_map = LevelMap()
+        level_map.add_candles(candles[:-1])
+
+        calls = []
+        swing_points = StructureAnalyzer._swing_points
+        monkeypatch.setattr(StructureAnalyzer, "_swing_points",
+                            staticmethod(lambda *a, **k: calls.append(1) or swing_points(*a, **k)))
+        # Повторный анализ без нового закрытого бара (попадание в кеш анализа)
+        assert level_map.add_candles(candles[:-1]) == 0
+        assert calls == []
+        # Новый закрытый бар - swing'и ищутся снова
+        level_map.add_candles(candles)
+        assert len(calls) == 2
+
+    def test_higher_timeframes_weigh_more(self):
+        assert timeframe_weight("1m") == pytest.approx(1.0)
+        assert timeframe_weight("1h") < timeframe_weight("4h") < timeframe_weight("1d")
+
+        level_map = LevelMap()
+        level_map.add_levels([100.0], timeframe_weight("1h"))
+        level_map.add_levels([120.0], timeframe_weight("1d"))
+        strengths = {round(level["price"]): level["strength"] for level in level_map.levels()}
+        assert strengths[120] == 1.0 and strengths[100] < 0.5
+        # Слабее MIN_LEVEL_STRENGTH уровень не попадает в карту
+        level_map.add_levels([80.0], timeframe_weight("1m"))
+        assert 80 not in {round(level["price"]) for level in level_map.levels()}
+
+    def test_engine_keeps_symbol_maps(self):
+        engine = LevelEngine(max_symbols=2)
+        candles = make_candles(400)
+        engine.update("BTC/USDT", "1h", candles)
+        engine.update("BTC/USDT", "4h", candles[::4])
+        engine.update("ETH/USDT", "1h", candles)
+        engine.update("SOL/USDT", "1h", candles)
+
+        assert engine.get("BTC/USDT") is None  # вытеснен LRU
+        assert engine.get("SOL/USDT").get_stats()["timeframes"] == ["1h"]
+        assert engine.get_stats()["symbols"] == 2
+
+    def test_support_resistance_and_entry_plan(self):
+        candles = range_candles()
+        df = pd.DataFrame(candles[:, 1:], columns=["open", "high", "low", "close", "volume"])
+        ta = TechnicalAnalysis(None)
+        ta.level_engine = LevelEngine()
+        levels = ta._find_support_resistance(df)
+        assert levels["support"] == [pytest.approx(89.5, rel=0.002)]
+        assert levels["resistance"] == [pytest.approx(110.5, rel=0.002)]
+
+        ta.level_engine.update("ETH/USDT", "1h", candles)
+        scanner = MarketScanner(None, ta)
+        analysis = {
+            "timeframes": {"4h": {"indicators": {"atr": {"atr_14": 4.0}}}},
+            "composite_signal": {"signal": "BUY"}
+        }
+        plan = scanner._generate_entry_plan(analysis, {"symbol": "ETH/USDT", "price": 100.0}, 1000.0)
+        assert plan["nearest_support"] == pytest.approx(89.5, rel=0.002)
+        assert plan["stop_anchor"] == "level"
+        assert plan["stop_loss"] == pytest.approx(plan["nearest_support"] - 2.0, rel=1e-3)
+        assert plan["take_profit"] == pytest.approx(plan["nearest_resistance"] - 0.4, rel=1e-3)
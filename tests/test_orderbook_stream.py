@@ -0,0 +1,107 @@
+"""
+Unit tests for LocalOrderBook
+Tests snapshot/delta application, sequence checks and zero-copy reads
+"""
+
+import asyncio
+import pytest
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from mcp_server.orderbook_stream import LocalOrderBook, OrderBookStream, apply_levels
+
+
+def snapshot(u: int = 100):
+    return {
+        "topic": "orderbook.50.BTCUSDT",
+        "type": "snapshot",
+        "data": {
+            "s": "BTCUSDT",
+            "b": [["100.0", "1.0"], ["99.5", "2.0"], ["99.0", "3.0"]],
+            "a": [["100.5", "1.5"], ["101.0", "2.5"]],
+            "u": u
+        }
+    }
+
+
+def delta(u: int, bids=None, asks=None):
+    return {
+        "topic": "orderbook.50.BTCUSDT",
+        "type": "delta",
+        "data": {"s": "BTCUSDT", "b": bids or [], "a": asks or [], "u": u}
+    }
+
+
+class TestLocalOrderBook:
+    """Test suite for LocalOrderBook"""
+
+    def test_snapshot_builds_sorted_book(self):
+        """Snapshot fills both sides sorted from the top"""
+        book = LocalOrderBook("BTC/USDT")
+        assert book.apply(snapshot())
+        assert book.synced
+        assert book.bids[:, 0].tolist() == [100.0, 99.5, 99.0]
+        assert book.asks[:, 0].tolist() == [100.5, 101.0]
+
+    def test_delta_insert_update_delete(self):
+        """Deltas insert, update and delete levels"""
+        book = LocalOrderBook("BTC/USDT")
+        book.apply(snapshot())
+        assert book.apply(delta(101, bids=[["99.75", "4.0"], ["99.5", "0"], ["100.0", "1.2"]], asks=[["101.0", "0"]]))
+
+        assert book.bids.tolist() == [[100.0, 1.2], [99.75, 4.0], [99.0, 3.0]]
+        assert book.asks.tolist() == [[100.5, 1.5]]
+
+    def test_sequence_gap_requires_resync(self):
+        """A skipped update id marks the book unsynced"""
+        book = LocalOrderBook("BTC/USDT")
+        book.apply(snapshot(u=100))
+        assert not book.apply(delta(105, bids=[["99.9", "1"]]))
+        assert not book.synced
+
+        # New snapshot restores the book
+        assert book.apply(snapshot(u=200))
+        assert book.synced
+
+    def test_top_levels_are_read_only_views(self):
+        """Top-N reads share memory with the book and survive later updates"""
+        book = LocalOrderBook("BTC/USDT")
+        book.apply(snapshot())
+        bids, asks = book.top(2)
+
+        assert np.shares_memory(bids, book.bids)
+        assert not bids.flags.writeable
+        book.apply(delta(101, bids=[["100.0", "0"]]))
+        # Readers keep a consistent old version
+        assert bids[0, 0] == 100.0
+        assert book.bids[0, 0] == 99.5
+
+    def test_apply_levels_trims_to_depth(self):
+        """Book sides never exceed the subscribed depth"""
+        levels = apply_levels(np.empty((0, 2)), np.array([[float(p), 1.0] for p in range(10)]), True, depth=3)
+        assert levels[:, 0].tolist() == [9.0, 8.0, 7.0]
+
+    def test_stream_without_subscription_has_no_book(self):
+        """Unknown symbols fall back to REST"""
+        stream = OrderBookStream(enabled=True)
+        assert stream.get_book("BTC/USDT") is None
+        assert not stream.has_live_book("BTC/USDT")
+
+    def test_subscribe_skips_symbols_of_another_category(self):
+        """Perpetual symbols never share the spot book of the same exchange symbol"""
+        stream = OrderBookStream(enabled=True, category="spot")
+        sent = []
+        stream._subscribe_blocking = lambda symbols: sent.append(symbols)
+
+        assert asyncio.run(stream.subscribe(["BTC/USDT:USDT", "BTC/USDT"])) == 1
+        assert sent == [["BTCUSDT"]]
+        assert "BTC/USDT:USDT" not in stream._symbol_map
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
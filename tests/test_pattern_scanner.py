@@ -0,0 +1,160 @@
+"""
+Unit tests for the vectorized candlestick pattern scanner
+Tests full-history labelling, hit statistics and per-symbol reliability
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from mcp_server.analysis_cache import AnalysisCache
+from mcp_server.compute_pool import ComputePool
+import mcp_server.pattern_scanner as pattern_scanner
+from mcp_server.pattern_scanner import (
+    PATTERNS, PatternStats, detect_patterns, hit_counts, label_patterns, pattern_outcomes
+)
+from mcp_server.technical_analysis import TechnicalAnalysis
+from tests.helpers import FakeClient, make_candles
+
+
+def reference_labels(candles, i):
+    """Скалярная проверка бара i (прежние условия, звёзды - относительно первой свечи)"""
+    _, o, h, l, c, _ = candles[i]
+    body, rng = abs(c - o), h - l
+    lower, upper = min(o, c) - l, h - max(o, c)
+    found = set()
+    if rng > 0 and lower > body * 2 and upper < body * 0.5:
+        found.add("Hammer")
+    if rng > 0 and upper > body * 2 and lower < body * 0.5:
+        found.add("Shooting Star")
+    if rng > 0 and body < rng * 0.1:
+        found.add("Doji")
+    if i >= 1:
+        _, po, _, _, pc, _ = candles[i - 1]
+        if pc < po and c > o and c > po and o < pc:
+            found.add("Bullish Engulfing")
+        if pc > po and c < o and c < po and o > pc:
+            found.add("Bearish Engulfing")
+    if i >= 2:
+        _, po, _, _, pc, _ = candles[i - 1]
+        _, p2o, _, _, p2c, _ = candles[i - 2]
+        small = abs(pc - po) < abs(p2c - p2o) * 0.3
+        if p2c < p2o and small and c > o and c > (p2o + p2c) / 2:
+            found.add("Morning Star")
+        if p2c > p2o and small and c < o and c < (p2o + p2c) / 2:
+            found.add("Evening Star")
+    return found
+
+
+class TestPatternScanner:
+    """Test suite for pattern scanner"""
+
+    def test_labels_match_scalar_checks_on_every_bar(self):
+        candles = make_candles(500, open_noise=0.006)
+        labels = label_patterns(candles)
+        for i in range(len(candles)):
+            assert {name for name in PATTERNS if labels[name][i]} == reference_labels(candles, i)
+        assert all(labels[name].any() for name in ("Hammer", "Doji", "Bullish Engulfing", "Morning Star"))
+
+    def test_star_patterns_fire(self):
+        candles = np.array([
+            [0, 110.0, 111.0, 99.0, 100.0, 1],   # длинная медвежья
+            [1, 99.0, 100.0, 98.0, 99.5, 1],     # маленькое тело
+            [2, 100.0, 109.0, 99.5, 108.0, 1],   # бычья выше середины первой
+        ])
+        names = [p["name"] for p in detect_patterns(candles)["candlestick"]]
+        assert "Morning Star" in names
+
+        mirrored = candles.copy()
+        mirrored[:, 1:5] = 210.0 - candles[:, [1, 3, 2, 4]]
+        names = [p["name"] for p in detect_patterns(mirrored)["candlestick"]]
+        assert "Evening Star" in names
+
+    def test_hit_counts_match_loop(self):
+        candles = make_candles(500, open_noise=0.006)
+        labels = label_patterns(candles)
+        counts = hit_counts(labels, pattern_outcomes(candles, horizon=5))
+        close = candles[:, 4]
+
+        for k, (name, (kind, _, _)) in enumerate(PATTERNS.items()):
+            count = hits = 0
+            for i in np.flatnonzero(labels[name]):
+                if i + 5 >= len(close):
+                    continue
+                move = close[i + 5] - close[i]
+                count += 1
+                if kind == "bullish":
+                    hits += move > 0
+                elif kind == "bearish":
+                    hits += move < 0
+                else:
+                    hits += i >= 5 and np.sign(move) * np.sign(close[i] - close[i - 5]) < 0
+            assert tuple(counts[k]) == (count, hits), name
+
+    def test_detect_patterns_reports_window_reliability(self):
+        candles = make_candles(500, open_noise=0.006)
+        labels = label_patterns(candles)
+        last = int(np.flatnonzero(labels["Hammer"])[-1])
+        result = detect_patterns(candles[:last + 1])
+
+        hammer = next(p for p in result["candlestick"] if p["name"] == "Hammer")
+        stats = result["stats"]["Hammer"]
+        assert hammer["type"] == "bullish"
+        assert hammer["samples"] == stats["count"] > 0
+        assert hammer["reliability"] == pytest.approx((stats["hits"] + 0.65 * 20) / (stats["count"] + 20), abs=1e-3)
+
+        df = pd.DataFrame(candles[:last + 1, 1:], columns=["open", "high", "low", "close", "volume"])
+        assert TechnicalAnalysis(None)._detect_patterns(df)["candlestick"] == result["candlestick"]
+
+    def test_symbol_stats_accumulate_incrementally(self):
+        candles = make_candles(800, open_noise=0.006)
+        incremental = PatternStats(horizon=5)
+        for end in range(200, len(candles) + 1, 50):
+            incremental.update("BTC/USDT", "1h", candles[end - 200:end])
+        assert incremental.update("BTC/USDT", "1h", candles[-200:]) == 0
+
+        full = PatternStats(horizon=5)
+        full.update("BTC/USDT", "1h", candles)
+        assert incremental.get("BTC/USDT") == full.get("BTC/USDT")
+        assert full.get("BTC/USDT")["Doji"]["count"] > 10
+        assert full.get("ETH/USDT") is None
+
+    def test_same_window_skips_labelling(self, monkeypatch):
+        candles = make_candles(300, open_noise=0.006)
+        stats = PatternStats(horizon=5)
+        stats.update("BTC/USDT", "1h", candles[:-1])
+
+        calls = []
+        monkeypatch.setattr(pattern_scanner, "label_patterns",
+                            lambda c: calls.append(1) or label_patterns(c))
+        # Повторный анализ без нового закрытого бара (попадание в кеш анализа)
+        assert stats.update("BTC/USDT", "1h", candles[:-1]) == 0
+        assert calls == []
+        assert stats.update("BTC/USDT", "1h", candles) == 1
+        assert calls == [1]
+
+    def test_analysis_uses_symbol_reliability(self):
+        candles = make_candles(800, open_noise=0.006)
+        labels = label_patterns(candles)
+        end = int(np.flatnonzero(labels["Doji"])[-1]) + 1
+        ta = TechnicalAnalysis(FakeClient(candles[:end]))
+        ta.analysis_cache = AnalysisCache(enabled=False)
+        ta.compute_pool = ComputePool(mode="off")
+        ta.pattern_stats = PatternStats()
+        ta.pattern_stats.update("BTC/USDT", "1h", candles[:end - 200])
+
+        analysis = asyncio.run(ta._analyze_timeframe("BTC/USDT", "1h", include_patterns=True))
+        stats = ta.pattern_stats.get("BTC/USDT")
+        doji = next(p for p in analysis["patterns"]["candlestick"] if p["name"] == "Doji")
+        assert analysis["patterns"]["stats"] == stats
+        assert doji["samples"] == stats["Doji"]["count"]
+        assert doji["reliability"] == stats["Doji"]["reliability"]
+        # Статистика символа шире одного окна
+        assert stats["Doji"]["count"] > detect_patterns(candles[end - 200:end])["stats"]["Doji"]["count"]
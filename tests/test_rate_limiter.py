@@ -0,0 +1,132 @@
+"""
+Unit tests for RateLimiter
+Tests token buckets, endpoint groups and pybit session wrapper
+"""
+
+import asyncio
+import threading
+import time
+import pytest
+import sys
+from pathlib import Path
+from unittest.mock import Mock
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from mcp_server.rate_limiter import RateLimiter, RateLimitedSession, TokenBucket
+
+TEST_LIMITS = {
+    "ip": {"rate": 1000.0, "capacity": 1000.0},
+    "market": {"rate": 100.0, "capacity": 5.0},
+    "order": {"rate": 100.0, "capacity": 1.0},
+}
+
+
+class TestTokenBucket:
+    """Test suite for TokenBucket"""
+
+    def test_burst_is_free_then_waits(self):
+        """Requests within capacity do not wait, next ones are spaced by rate"""
+        bucket = TokenBucket("market", rate=10.0, capacity=3.0)
+        assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+
+        wait = bucket.reserve()
+        assert 0.09 <= wait <= 0.1
+        assert bucket.reserve() > wait
+
+        stats = bucket.get_stats()
+        assert stats["acquired"] == 5
+        assert stats["delayed"] == 2
+
+    def test_penalize_pauses_bucket(self):
+        """Rate limit feedback delays next requests"""
+        bucket = TokenBucket("market", rate=10.0, capacity=10.0)
+        bucket.penalize(1.0)
+        assert bucket.reserve() >= 1.0
+        assert bucket.get_stats()["rate_limited"] == 1
+
+
+class TestRateLimiter:
+    """Test suite for RateLimiter"""
+
+    def test_async_acquire_spaces_requests(self):
+        """Concurrent async callers are throttled to the group rate"""
+        limiter = RateLimiter(limits=TEST_LIMITS, enabled=True)
+
+        async def run():
+            start = time.monotonic()
+            await asyncio.gather(*[limiter.acquire("market") for _ in range(10)])
+            return time.monotonic() - start
+
+        elapsed = asyncio.run(run())
+        # 5 бесплатных токенов, ещё 5 по 10ms
+        assert elapsed >= 0.04
+        stats = limiter.get_stats()["groups"]["market"]
+        assert stats["acquired"] == 10
+        assert stats["delayed"] == 5
+        assert stats["queue_depth"] == 0
+        assert stats["max_queue_depth"] >= 1
+
+    def test_groups_are_independent(self):
+        """Exhausting one group does not delay another"""
+        limiter = RateLimiter(limits=TEST_LIMITS, enabled=True)
+        limiter.acquire_sync("order")
+        assert limiter.acquire_sync("market") == 0.0
+        assert limiter.acquire_sync("order") > 0.0
+
+    def test_disabled_limiter_never_waits(self):
+        """Disabled limiter is a no-op"""
+        limiter = RateLimiter(limits=TEST_LIMITS, enabled=False)
+        assert all(limiter.acquire_sync("order") == 0.0 for _ in range(5))
+
+    def test_limited_session_routes_methods_by_group(self):
+        """pybit methods are throttled in their endpoint group"""
+        limiter = RateLimiter(limits=TEST_LIMITS, enabled=True)
+        raw = Mock()
+        raw.place_order.return_value = {"retCode": 0}
+        session = RateLimitedSession(raw, limiter)
+
+        assert session.place_order(symbol="BTCUSDT") == {"retCode": 0}
+        session.get_tickers(category="spot")
+
+        raw.place_order.assert_called_once_with(symbol="BTCUSDT")
+        groups = limiter.get_stats()["groups"]
+        assert groups["order"]["acquired"] == 1
+        assert groups["market"]["acquired"] == 1
+        assert groups["ip"]["acquired"] == 2
+
+
+    def test_session_call_does_not_block_event_loop(self):
+        """Throttled pybit call waits via await and runs the request in a thread"""
+        limiter = RateLimiter(limits={**TEST_LIMITS, "order": {"rate": 10.0, "capacity": 1.0}}, enabled=True)
+        threads = []
+        raw = Mock()
+        raw.place_order.side_effect = lambda **kwargs: threads.append(threading.get_ident()) or {"retCode": 0}
+        session = RateLimitedSession(raw, limiter)
+
+        async def scenario():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0.01)
+
+            ticking = asyncio.ensure_future(ticker())
+            await session.call("place_order", symbol="BTCUSDT")
+            # Второй ордер ждёт токен ~0.1с - loop в это время работает
+            result = await session.call("place_order", symbol="ETHUSDT")
+            ticking.cancel()
+            return result, ticks
+
+        result, ticks = asyncio.run(scenario())
+        assert result == {"retCode": 0}
+        assert ticks >= 5
+        assert threads and threading.get_ident() not in threads
+        assert limiter.get_stats()["groups"]["order"]["acquired"] == 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,188 @@
+"""
+Unit tests for RequestPolicy
+Tests jittered retries, circuit breaking and hedged fallback
+"""
+
+import asyncio
+import pytest
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from mcp_server.bybit_rest import BybitAPIError, BybitHTTPError
+from mcp_server.request_policy import (
+    CircuitOpenError, RequestPolicy, backoff_delay, is_network_error, is_transport_error
+)
+import ccxt.async_support as ccxt
+
+
+def make_policy(**kwargs) -> RequestPolicy:
+    """Policy with tiny delays for tests"""
+    params = dict(max_attempts=3, base_delay=0.001, max_delay=0.002,
+                  failure_threshold=3, recovery_timeout=60, hedge_after=0)
+    params.update(kwargs)
+    return RequestPolicy(**params)
+
+
+class Flaky:
+    """Request that fails a number of times before succeeding"""
+
+    def __init__(self, failures: int, error: Exception = None, delay: float = 0):
+        self.failures = failures
+        self.error = error or Exception("Cannot connect to host api.bybit.com")
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.calls <= self.failures:
+            raise self.error
+        return "ok"
+
+
+class TestRequestPolicy:
+    """Test suite for RequestPolicy"""
+
+    def test_retries_until_success(self):
+        """Transient errors are retried with jittered backoff"""
+        policy = make_policy()
+        request = Flaky(failures=2)
+
+        assert asyncio.run(policy.call("ccxt:fetch_ticker", request)) == "ok"
+        assert request.calls == 3
+        stats = policy.get_stats()["endpoints"]["ccxt:fetch_ticker"]
+        assert stats["retries"] == 2
+        assert stats["circuit"] == "closed"
+        assert all(0 <= backoff_delay(a, 0.5, 4.0) <= min(4.0, 0.5 * 2 ** a) for a in range(6))
+
+    def test_open_circuit_fails_fast(self):
+        """After the threshold the endpoint is rejected without a request"""
+        policy = make_policy()
+        request = Flaky(failures=100)
+
+        with pytest.raises(Exception, match="DNS/Network Error"):
+            asyncio.run(policy.call("http:kline", request))
+        assert request.calls == 3
+
+        with pytest.raises(CircuitOpenError):
+            asyncio.run(policy.call("http:kline", request))
+        assert request.calls == 3
+        assert policy.get_stats()["endpoints"]["http:kline"]["fast_failures"] == 1
+
+    def test_fallback_after_network_errors_and_while_open(self):
+        """Exhausted network retries and an open circuit go to direct HTTP"""
+        policy = make_policy()
+        request = Flaky(failures=100)
+        fallback = Flaky(failures=0)
+
+        assert asyncio.run(policy.call("ccxt:fetch_ohlcv", request, fallback=fallback)) == "ok"
+        assert asyncio.run(policy.call("ccxt:fetch_ohlcv", request, fallback=fallback)) == "ok"
+        assert request.calls == 3
+        assert fallback.calls == 2
+
+    def test_fatal_error_is_not_retried(self):
+        """Errors raised by on_error propagate immediately"""
+        policy = make_policy()
+        request = Flaky(failures=100, error=Exception('bybit {"retCode":10003,"retMsg":"invalid"}'))
+
+        def on_error(error):
+            raise Exception("Bybit API Key is INVALID!")
+
+        with pytest.raises(Exception, match="INVALID"):
+            asyncio.run(policy.call("ccxt:fetch_ticker", request, on_error=on_error))
+        assert request.calls == 1
+        assert policy.breaker("ccxt:fetch_ticker").state == "closed"
+
+    def test_slow_primary_is_hedged(self):
+        """A slow primary request races the fallback and the first result wins"""
+        policy = make_policy(hedge_after=0.01)
+        primary = Flaky(failures=0, delay=1.0)
+
+        async def fallback():
+            return "fallback"
+
+        assert asyncio.run(policy.call("ccxt:fetch_tickers", primary, fallback=fallback)) == "fallback"
+        stats = policy.get_stats()["endpoints"]["ccxt:fetch_tickers"]
+        assert stats["hedged"] == 1
+        assert stats["hedge_wins"] == 1
+
+    def test_hedge_win_counts_as_primary_failure(self):
+        """A fallback win never closes the breaker; the slow primary counts as a timeout"""
+        policy = make_policy(hedge_after=0.01, recovery_timeout=0.01)
+        breaker = policy.breaker("http:tickers")
+        for _ in range(3):
+            breaker.record_failure()
+        assert breaker.state == "open"
+        asyncio.run(asyncio.sleep(0.02))
+
+        async def fallback():
+            return "fallback"
+
+        # Slow half-open probe: the fallback answers and the breaker opens again
+        assert asyncio.run(policy.call("http:tickers", Flaky(failures=0, delay=1.0), fallback=fallback)) == "fallback"
+        assert breaker.state == "open"
+
+        fast = make_policy(hedge_after=0.01)
+        for _ in range(3):
+            asyncio.run(fast.call("http:kline", Flaky(failures=0, delay=1.0), fallback=fallback))
+        assert fast.breaker("http:kline").state == "open"
+
+    def test_half_open_probe_closes_circuit(self):
+        """After the cooldown a single successful probe closes the breaker"""
+        policy = make_policy(recovery_timeout=0.01, max_attempts=3)
+        request = Flaky(failures=3)
+
+        with pytest.raises(Exception):
+            asyncio.run(policy.call("http:tickers", request))
+        assert policy.breaker("http:tickers").state == "open"
+
+        asyncio.run(asyncio.sleep(0.02))
+        assert asyncio.run(policy.call("http:tickers", request)) == "ok"
+        assert policy.breaker("http:tickers").state == "closed"
+        assert is_network_error(OSError("connection reset"))
+
+
+    def test_data_errors_do_not_open_circuit(self):
+        """Empty data, bad symbols and parse errors are raised without retries or breaker failures"""
+        policy = make_policy()
+        errors = [ValueError("No OHLCV data"), ccxt.BadSymbol("bybit does not have market XYZ/USDT"),
+                  BybitAPIError(10001, "params error", "/v5/market/kline")]
+
+        for _ in range(3):
+            for error in errors:
+                request = Flaky(failures=1, error=error)
+                with pytest.raises(type(error)):
+                    asyncio.run(policy.call("http:kline", request))
+                assert request.calls == 1
+
+        breaker = policy.breaker("http:kline")
+        assert breaker.state == "closed" and breaker.failures == 0
+        assert policy.get_stats()["endpoints"]["http:kline"]["request_errors"] == 9
+        # Эндпоинт по-прежнему доступен для остальных символов
+        assert asyncio.run(policy.call("http:kline", Flaky(failures=0))) == "ok"
+
+    def test_transport_error_classification(self):
+        """Only network, 5xx and rate limit errors count toward the breaker"""
+        assert is_transport_error(BybitHTTPError(503, "unavailable", "/v5/market/kline"))
+        assert is_transport_error(BybitHTTPError(429, "too many", "/v5/market/kline"))
+        assert not is_transport_error(BybitHTTPError(404, "not found", "/v5/market/kline"))
+        assert is_transport_error(BybitAPIError(10006, "too many visits", "/v5/market/kline"))
+        assert is_transport_error(ccxt.RequestTimeout("timeout"))
+        assert is_transport_error(asyncio.TimeoutError())
+        assert not is_transport_error(ccxt.BadSymbol("bad symbol"))
+        assert not is_transport_error(KeyError("result"))
+
+        policy = make_policy()
+        request = Flaky(failures=100, error=BybitHTTPError(502, "bad gateway", "/v5/market/kline"))
+        with pytest.raises(BybitHTTPError):
+            asyncio.run(policy.call("http:kline", request))
+        assert request.calls == 3
+        assert policy.breaker("http:kline").state == "open"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
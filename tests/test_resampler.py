@@ -0,0 +1,109 @@
+"""
+Unit tests for Resampler
+Tests UTC-aligned aggregation, fetch planning and incremental updates
+"""
+
+import pytest
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from mcp_server.resampler import (
+    IncrementalResampler, bars_needed, can_resample, plan_fetches, resample
+)
+from mcp_server.kline_stream import KlineStream
+
+import numpy as np
+import pandas as pd
+
+MIN_MS = 60 * 1000
+HOUR_MS = 60 * MIN_MS
+
+
+def make_candles(start_ts: int, count: int, step_ms: int = MIN_MS, seed: int = 1) -> np.ndarray:
+    """Random walk candles with consistent high/low"""
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, count))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) + rng.random(count)
+    low = np.minimum(open_, close) - rng.random(count)
+    ts = start_ts + np.arange(count) * step_ms
+    return np.column_stack([ts, open_, high, low, close, rng.random(count) * 10])
+
+
+class TestResampler:
+    """Test suite for Resampler"""
+
+    def test_resample_matches_pandas(self):
+        """Vectorized aggregation equals pandas resample on UTC boundaries"""
+        candles = make_candles(7 * MIN_MS, 600)  # starts mid-bucket
+        result = resample(candles, "1m", "15m")
+
+        df = pd.DataFrame(candles[:, 1:], columns=["open", "high", "low", "close", "volume"],
+                          index=pd.to_datetime(candles[:, 0], unit="ms"))
+        expected = df.resample("15min").agg(
+            {"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"}
+        ).iloc[1:]  # leading partial bucket is dropped
+
+        assert result[0, 0] == 15 * MIN_MS
+        assert len(result) == len(expected)
+        np.testing.assert_allclose(result[:, 1:], expected.to_numpy())
+
+    def test_weekly_bars_start_on_monday(self):
+        """Weekly buckets align to Monday 00:00 UTC like Bybit"""
+        days = make_candles(0, 30, step_ms=24 * HOUR_MS)  # from Thursday 1970-01-01
+        weekly = resample(days, "1d", "1w")
+        assert pd.Timestamp(int(weekly[0, 0]), unit="ms").day_name() == "Monday"
+        assert weekly[0, 0] == 4 * 24 * HOUR_MS
+
+    def test_bars_needed_counts_forming_bucket(self):
+        """Required base bars include only the opened part of the forming bar"""
+        now = 10 * HOUR_MS + 20 * MIN_MS + 5000
+        assert bars_needed("1m", "1h", 3, now_ms=now) == 2 * 60 + 21
+        assert bars_needed("15m", "1h", 200, now_ms=now) == 199 * 4 + 2
+
+    def test_plan_fetches_reduces_requests(self):
+        """Multi-timeframe analysis fetches fewer timeframes than requested"""
+        now = 10 * HOUR_MS + 20 * MIN_MS
+        fetch, derive = plan_fetches(["5m", "15m", "1h", "4h", "1d"], 200, max_base_bars=1000, now_ms=now)
+
+        assert derive == {"15m": "5m", "4h": "1h"}
+        assert set(fetch) == {"5m", "1h", "1d"}
+        assert fetch["5m"] == bars_needed("5m", "15m", 200, now_ms=now)
+        assert not can_resample("1h", "15m")
+
+    def test_incremental_matches_batch(self):
+        """Streaming updates reproduce the batch aggregation"""
+        candles = make_candles(0, 130)
+        resampler = IncrementalResampler("1m", "1h")
+        bars = {}
+        for row in candles:
+            # Forming bar update followed by the final version
+            resampler.update(np.r_[row[:5], row[5] / 2])
+            bar = resampler.update(row)
+            bars[int(bar[0])] = bar
+
+        expected = resample(candles, "1m", "1h")
+        np.testing.assert_allclose(np.array([bars[k] for k in sorted(bars)]), expected)
+
+    def test_kline_stream_derives_higher_timeframe(self):
+        """Seeding the base buffer rebuilds derived buffers that then update live"""
+        stream = KlineStream(enabled=True)
+        stream._derived[("BTC/USDT", "1m")] = {"5m": IncrementalResampler("1m", "5m")}
+        stream._subscribed.update({("BTC/USDT", "1m"), ("BTC/USDT", "5m")})
+
+        candles = make_candles(0, 52)
+        stream.seed("BTC/USDT", "1m", candles[:50].tolist())
+        assert len(stream._buffers[("BTC/USDT", "5m")]) == 10
+
+        stream.apply_bar("BTC/USDT", "1m", candles[50].tolist())
+        stream.apply_bar("BTC/USDT", "1m", candles[51].tolist())
+        derived = stream.get_ohlcv("BTC/USDT", "5m", 11)
+        assert derived is not None
+        np.testing.assert_allclose(np.array(derived), resample(candles, "1m", "5m"))
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
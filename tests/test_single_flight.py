@@ -0,0 +1,123 @@
+"""
+Unit tests for SingleFlight
+Tests coalescing of concurrent identical calls
+"""
+
+import asyncio
+import pytest
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from mcp_server.single_flight import SingleFlight
+
+
+class TestSingleFlight:
+    """Test suite for SingleFlight"""
+
+    def test_concurrent_calls_share_one_execution(self):
+        """Concurrent calls with the same key run the factory once"""
+        group = SingleFlight("test")
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return [1, 2, 3]
+
+        async def run():
+            return await asyncio.gather(*[group.do(("ohlcv", "BTC"), fetch) for _ in range(5)])
+
+        results = asyncio.run(run())
+
+        assert len(calls) == 1
+        assert all(r == [1, 2, 3] for r in results)
+        stats = group.get_stats()
+        assert stats["executed"] == 1
+        assert stats["absorbed"] == 4
+        assert stats["absorbed_by_kind"] == {"ohlcv": 4}
+        assert stats["in_flight"] == 0
+
+    def test_different_keys_run_separately(self):
+        """Different keys are not coalesced"""
+        group = SingleFlight("test")
+
+        async def fetch(value):
+            await asyncio.sleep(0.01)
+            return value
+
+        async def run():
+            return await asyncio.gather(
+                group.do(("ohlcv", "BTC"), lambda: fetch("BTC")),
+                group.do(("ohlcv", "ETH"), lambda: fetch("ETH"))
+            )
+
+        assert asyncio.run(run()) == ["BTC", "ETH"]
+        assert group.get_stats()["executed"] == 2
+
+    def test_key_released_after_completion(self):
+        """Sequential calls are not coalesced"""
+        group = SingleFlight("test")
+
+        async def fetch():
+            return 42
+
+        async def run():
+            await group.do("key", fetch)
+            await group.do("key", fetch)
+
+        asyncio.run(run())
+        assert group.get_stats()["executed"] == 2
+        assert group.get_stats()["absorbed"] == 0
+
+    def test_exception_propagates_to_all_callers(self):
+        """All waiters receive the shared error"""
+        group = SingleFlight("test")
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        async def run():
+            return await asyncio.gather(*[group.do("key", fetch) for _ in range(3)], return_exceptions=True)
+
+        results = asyncio.run(run())
+        assert all(isinstance(r, ValueError) for r in results)
+
+    def test_share_copies_result_per_caller(self):
+        """Each caller gets its own copy when share is given"""
+        group = SingleFlight("test")
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            return {"value": 1}
+
+        async def run():
+            return await asyncio.gather(*[group.do("key", fetch, share=dict) for _ in range(2)])
+
+        first, second = asyncio.run(run())
+        first["value"] = 2
+        assert second["value"] == 1
+
+    def test_cancelled_caller_does_not_cancel_others(self):
+        """Cancelling one waiter leaves the shared call running"""
+        group = SingleFlight("test")
+
+        async def fetch():
+            await asyncio.sleep(0.02)
+            return "done"
+
+        async def run():
+            first = asyncio.ensure_future(group.do("key", fetch))
+            second = asyncio.ensure_future(group.do("key", fetch))
+            await asyncio.sleep(0)
+            first.cancel()
+            return await second
+
+        assert asyncio.run(run()) == "done"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
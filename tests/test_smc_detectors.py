@@ -0,0 +1,167 @@
+"""
+Unit tests for array-based order block, FVG and liquidity grab detection
+Compares TechnicalAnalysis detectors with the previous per-candle loops
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from mcp_server.indicator_engine import rolling_max, rolling_min, trailing_mean
+from mcp_server.technical_analysis import TechnicalAnalysis, safe_mean
+
+
+def make_ohlcv(n: int, seed: int) -> pd.DataFrame:
+    """Random walk with impulses, gaps, long wicks and volume spikes"""
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0, 0.004, n) + rng.choice([0, 0.02, -0.02], n, p=[0.9, 0.05, 0.05])
+    close = 100 * np.exp(np.cumsum(returns))
+    open_ = np.r_[close[0], close[:-1]] * (1 + rng.normal(0, 0.002, n))
+    wick = rng.exponential(0.003, (2, n)) * rng.choice([1, 4], (2, n), p=[0.85, 0.15])
+    high = np.maximum(open_, close) * (1 + wick[0])
+    low = np.minimum(open_, close) * (1 - wick[1])
+    volume = rng.uniform(10, 100, n) * rng.choice([1, 3], n, p=[0.85, 0.15])
+    return pd.DataFrame({"open": open_, "high": high, "low": low, "close": close, "volume": volume})
+
+
+def reference_order_blocks(df):
+    """Прежняя реализация find_order_blocks"""
+    candles = df.to_dict('records')
+    order_blocks = []
+    for i in range(2, len(candles) - 3):
+        candle, prev = candles[i], candles[i - 1]
+        body = abs(candle['close'] - candle['open'])
+        avg_body = safe_mean([abs(c['close'] - c['open']) for c in candles[max(0, i - 5):i]])
+        strength = "strong" if body > avg_body * 2.5 else "moderate"
+        zone = {"top": prev['high'], "bottom": prev['low'], "price": (prev['high'] + prev['low']) / 2,
+                "index": i - 1, "strength": strength}
+        if candle['close'] > candle['open'] and body > avg_body * 1.5 and prev['close'] < prev['open']:
+            if candle['close'] > prev['high']:
+                order_blocks.append({"type": "bullish_ob", **zone})
+        elif candle['close'] < candle['open'] and body > avg_body * 1.5 and prev['close'] > prev['open']:
+            if candle['close'] < prev['low']:
+                order_blocks.append({"type": "bearish_ob", **zone})
+    price = candles[-1]['close']
+    active = [ob for ob in order_blocks
+              if (ob['type'] == 'bullish_ob' and price > ob['bottom']) or (ob['type'] == 'bearish_ob' and price < ob['top'])]
+    return active[-3:]
+
+
+def reference_fvgs(df):
+    """Прежняя реализация find_fair_value_gaps"""
+    candles = df.to_dict('records')
+    price = candles[-1]['close']
+    fvgs = []
+    for i in range(len(candles) - 2):
+        c1, c3 = candles[i], candles[i + 2]
+        if c3['low'] > c1['high']:
+            pct = ((c3['low'] - c1['high']) / c1['high']) * 100
+            if pct >= 0.1:
+                fvgs.append({"type": "bullish_fvg", "top": c3['low'], "bottom": c1['high'],
+                             "mid": (c3['low'] + c1['high']) / 2, "size_pct": round(pct, 3), "index": i,
+                             "strength": "strong" if pct >= 0.5 else "moderate", "filled": price < c1['high']})
+        elif c3['high'] < c1['low']:
+            pct = ((c1['low'] - c3['high']) / c1['low']) * 100
+            if pct >= 0.1:
+                fvgs.append({"type": "bearish_fvg", "top": c1['low'], "bottom": c3['high'],
+                             "mid": (c1['low'] + c3['high']) / 2, "size_pct": round(pct, 3), "index": i,
+                             "strength": "strong" if pct >= 0.5 else "moderate", "filled": price > c1['low']})
+    active = [fvg for fvg in fvgs if not fvg['filled']]
+    active.sort(key=lambda x: abs(price - x['mid']))
+    return active[:3]
+
+
+def reference_grabs(df, lookback):
+    """Прежняя реализация detect_liquidity_grabs"""
+    candles = df.to_dict('records')
+    price = candles[-1]['close']
+    grabs = []
+    for i in range(lookback, len(candles) - 2):
+        c, nxt = candles[i], candles[i + 1]
+        prev = candles[i - lookback:i]
+        prev_high, prev_low = max(p['high'] for p in prev), min(p['low'] for p in prev)
+        body = abs(c['close'] - c['open'])
+        lower_wick = min(c['open'], c['close']) - c['low']
+        upper_wick = c['high'] - max(c['open'], c['close'])
+        avg_vol = safe_mean([p['volume'] for p in prev])
+        vol_ratio = c['volume'] / avg_vol if avg_vol > 0 else 1.0
+        strength = "strong" if vol_ratio > 1.8 else "moderate"
+        if c['low'] < prev_low * 0.998 and c['close'] > c['open'] and lower_wick > body * 1.5 and vol_ratio > 1.2:
+            if nxt['close'] > nxt['open'] and nxt['close'] > c['close']:
+                grabs.append({"type": "bullish_grab", "spike_low": c['low'], "strength": strength,
+                              "active": price > c['close']})
+        elif c['high'] > prev_high * 1.002 and c['close'] < c['open'] and upper_wick > body * 1.5 and vol_ratio > 1.2:
+            if nxt['close'] < nxt['open'] and nxt['close'] < c['close']:
+                grabs.append({"type": "bearish_grab", "spike_high": c['high'], "strength": strength,
+                              "active": price < c['close']})
+    return [g for g in grabs if g['active']][:3]
+
+
+@pytest.fixture
+def analysis():
+    return TechnicalAnalysis(bybit_client=None)
+
+
+class TestSMCDetectors:
+    """Test suite for vectorized SMC detectors"""
+
+    def test_rolling_primitives(self):
+        """O(n) rolling max/min and cumulative-sum means match naive windows"""
+        values = np.random.default_rng(0).normal(size=103)
+        for window in (1, 5, 7, 50, 103):
+            expected_max = [values[j:j + window].max() for j in range(len(values) - window + 1)]
+            expected_min = [values[j:j + window].min() for j in range(len(values) - window + 1)]
+            np.testing.assert_array_equal(rolling_max(values, window), expected_max)
+            np.testing.assert_array_equal(rolling_min(values, window), expected_min)
+        assert rolling_max(values[:3], 5).size == 0
+
+        means = trailing_mean(values, 5)
+        assert np.isnan(means[0])
+        np.testing.assert_allclose(means[1:], [values[max(0, i - 5):i].mean() for i in range(1, 103)], rtol=1e-12)
+
+        with_nan = values.copy()
+        with_nan[10] = np.nan
+        means = trailing_mean(with_nan, 5)
+        assert np.isnan(means[11:16]).all() and not np.isnan(means[16])
+
+    @pytest.mark.parametrize("seed", range(8))
+    def test_order_blocks_match_loop(self, analysis, seed):
+        df = make_ohlcv(300, seed)
+        assert analysis.find_order_blocks(df) == reference_order_blocks(df)
+
+    @pytest.mark.parametrize("seed", range(8))
+    def test_fvgs_match_loop(self, analysis, seed):
+        df = make_ohlcv(300, seed)
+        assert analysis.find_fair_value_gaps(df) == reference_fvgs(df)
+
+    @pytest.mark.parametrize("seed", range(8))
+    @pytest.mark.parametrize("lookback", [10, 50])
+    def test_liquidity_grabs_match_loop(self, analysis, seed, lookback):
+        df = make_ohlcv(300, seed)
+        assert analysis.detect_liquidity_grabs(df, lookback=lookback) == reference_grabs(df, lookback)
+
+    def test_detectors_find_events(self, analysis):
+        """Generated data actually exercises every branch"""
+        found = {"ob": set(), "fvg": set(), "grab": set()}
+        for seed in range(8):
+            df = make_ohlcv(300, seed)
+            found["ob"] |= {ob["type"] for ob in analysis.find_order_blocks(df)}
+            found["fvg"] |= {fvg["type"] for fvg in analysis.find_fair_value_gaps(df)}
+            found["grab"] |= {grab["type"] for grab in analysis.detect_liquidity_grabs(df, lookback=10)}
+        assert found == {
+            "ob": {"bullish_ob", "bearish_ob"},
+            "fvg": {"bullish_fvg", "bearish_fvg"},
+            "grab": {"bullish_grab", "bearish_grab"}
+        }
+
+    def test_short_history(self, analysis):
+        df = make_ohlcv(19, 1)
+        assert analysis.find_order_blocks(df) == []
+        assert analysis.find_fair_value_gaps(df.iloc[:2]) == []
+        assert analysis.detect_liquidity_grabs(df, lookback=50) == []
+        assert analysis.find_fair_value_gaps(df) == reference_fvgs(df)
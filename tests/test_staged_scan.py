@@ -0,0 +1,154 @@
+"""
+Unit tests for staged scanner evaluation
+Tests score upper bounds, stage pruning and that pruned stages are not computed
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from mcp_server.lazy_analysis import LazySections
+from mcp_server.market_scanner import MarketScanner
+from mcp_server.staged_scan import (
+    PROMOTION_MARGIN, SMC_SECTIONS, StageStats, remaining_max, upper_bound, without_sections
+)
+
+TICKER = {"symbol": "ETH/USDT", "price": 100.0, "change_24h": 1.0, "volume_24h": 1_000_000}
+
+
+class FakeTA:
+    """analyze_asset с ленивыми SMC секциями и счётчиками вызовов"""
+
+    def __init__(self):
+        self.smc_reads = []
+        self.order_flow_calls = 0
+        self.include_order_flow = []
+
+    def _section(self, name, value):
+        def compute():
+            self.smc_reads.append(name)
+            return value
+        return compute
+
+    async def analyze_asset(self, symbol, timeframes, include_patterns=True, include_order_flow=True):
+        self.include_order_flow.append(include_order_flow)
+        h4 = LazySections(
+            {
+                "trend": {"direction": "uptrend"},
+                "indicators": {"atr": {"atr_14": 2.0}, "adx": {"adx": 30}, "volume": {"volume_ratio": 2.0}},
+                "levels": {"support": [99.0], "resistance": [110.0]},
+                "patterns": {"candlestick": []}
+            },
+            {
+                "order_blocks": self._section("order_blocks", [{"type": "bullish_ob"}]),
+                "fair_value_gaps": self._section("fair_value_gaps", []),
+                "structure": self._section("structure", {"bos": [{"type": "bullish_bos"}]}),
+                "liquidity_grabs": self._section("liquidity_grabs", [])
+            }
+        )
+        return {
+            "symbol": symbol,
+            "timeframes": {"4h": h4},
+            "composite_signal": {"signal": "BUY", "confidence": 0.7, "alignment": 0.8, "score": 7, "reasons": []}
+        }
+
+    async def resolve_sections(self, analysis, sections=None):
+        for timeframe in analysis["timeframes"].values():
+            timeframe.resolve(sections)
+        return analysis
+
+    async def analyze_order_flow(self, symbol):
+        self.order_flow_calls += 1
+        return {"cvd_analysis": {"signal": "NONE"}, "btc_correlation": {"correlation": 0.5}}
+
+
+def make_scanner(staged=True):
+    ta = FakeTA()
+    scanner = MarketScanner(object(), ta)
+    scanner.staged_scan = staged
+    return scanner, ta
+
+
+def evaluate(scanner, threshold, stats=None):
+    thresholds = {"long": threshold, "short": threshold}
+    return asyncio.run(scanner._evaluate_ticker(
+        TICKER, {}, "uptrend", None, thresholds, stats if stats is not None else StageStats()
+    ))
+
+
+class TestStagedScan:
+    """Test suite for staged scan"""
+
+    def test_upper_bound_adds_remaining_stages(self):
+        assert remaining_max("indicators") == 8.0
+        assert remaining_max("indicators", extended=False) == 6.0
+        assert remaining_max("order_flow", extended=False) == 0.0
+        assert remaining_max("extended") == 0.0
+        assert upper_bound(10.0, "smc") == pytest.approx(7.0)
+        # Граница не выше максимума шкалы
+        assert upper_bound(19.0, "indicators") == pytest.approx(10.0)
+
+    def test_without_sections_keeps_lazy_sections_pending(self):
+        ta = FakeTA()
+        analysis = asyncio.run(ta.analyze_asset("ETH/USDT", ["4h"]))
+        view = without_sections(analysis)
+
+        assert not any(name in view["timeframes"]["4h"] for name in SMC_SECTIONS)
+        assert view["timeframes"]["4h"]["trend"] == {"direction": "uptrend"}
+        assert set(analysis["timeframes"]["4h"].pending) == set(SMC_SECTIONS)
+        assert ta.smc_reads == []
+
+    def test_stage_stats_record_and_merge(self):
+        total, scan = StageStats(), StageStats()
+        scan.record("indicators", pruned=True)
+        scan.record("indicators")
+        scan.record("smc")
+        total.merge(scan)
+        total.merge(scan)
+
+        stats = total.get_stats()
+        assert stats["indicators"] == {"evaluated": 4, "pruned": 2}
+        assert stats["smc"] == {"evaluated": 2, "pruned": 0}
+        assert stats["order_flow"] == {"evaluated": 0, "pruned": 0}
+
+    def test_unreachable_threshold_prunes_after_indicators(self):
+        scanner, ta = make_scanner()
+        stats = StageStats()
+
+        assert evaluate(scanner, threshold=10.0, stats=stats) is None
+        assert ta.include_order_flow == [False]
+        assert ta.smc_reads == [] and ta.order_flow_calls == 0
+        assert stats.get_stats()["indicators"] == {"evaluated": 1, "pruned": 1}
+        assert stats.get_stats()["smc"]["evaluated"] == 0
+
+    def test_promoted_candidate_matches_full_evaluation(self):
+        scanner, ta = make_scanner()
+        full_scanner, full_ta = make_scanner(staged=False)
+        stats = StageStats()
+
+        staged = evaluate(scanner, threshold=0.0, stats=stats)
+        full = evaluate(full_scanner, threshold=0.0)
+        assert staged["score"] == full["score"]
+        assert staged["score_breakdown"]["order_blocks"] == 1.0
+        assert staged["analysis"]["cvd_analysis"] == {"signal": "NONE"}
+        assert ta.order_flow_calls == 1
+        assert full_ta.include_order_flow == [True] and full_ta.order_flow_calls == 0
+        assert all(stats.get_stats()[stage] == {"evaluated": 1, "pruned": 0}
+                   for stage in ("indicators", "smc", "order_flow"))
+
+    def test_prunes_at_order_flow_when_cvd_does_not_help(self):
+        full_scanner, _ = make_scanner(staged=False)
+        final = evaluate(full_scanner, threshold=0.0)["score"] / 2
+        scanner, ta = make_scanner()
+        stats = StageStats()
+
+        # Порог чуть выше итогового score: до order flow граница (+CVD) его ещё достигает
+        assert evaluate(scanner, threshold=final + PROMOTION_MARGIN + 0.1, stats=stats) is None
+        assert ta.order_flow_calls == 1 and set(ta.smc_reads) == set(SMC_SECTIONS)
+        assert stats.get_stats()["smc"]["pruned"] == 0
+        assert stats.get_stats()["order_flow"] == {"evaluated": 1, "pruned": 1}
@@ -0,0 +1,119 @@
+"""
+Unit tests for StructureAnalyzer
+Tests vectorized swing detection and BOS/ChoCh event history against reference loops
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from mcp_server.structure_analyzer import StructureAnalyzer
+
+
+def make_df(count: int = 300, seed: int = 5) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, count)))
+    # Округление даёт равные экстремумы - проверка строгого сравнения
+    high = np.round(close * (1 + rng.uniform(0, 0.01, count)), 1)
+    low = np.round(close * (1 - rng.uniform(0, 0.01, count)), 1)
+    index = pd.to_datetime(1_700_000_000_000 + np.arange(count) * 3_600_000, unit="ms")
+    return pd.DataFrame({"open": close, "high": high, "low": low, "close": close, "volume": 1.0}, index=index)
+
+
+def reference_swings(values, left, right, highs):
+    """Прежний алгоритм: строгий экстремум окна [i - left, i + right]"""
+    points = []
+    for i in range(left, len(values) - right):
+        others = np.r_[values[i - left:i], values[i + 1:i + right + 1]]
+        if (values[i] > others).all() if highs else (values[i] < others).all():
+            points.append(i)
+    return points
+
+
+def reference_events(df, left, right):
+    """Пошаговый обход баров: активный swing и пробой первым закрытием"""
+    highs = reference_swings(df["high"].to_numpy(), left, right, True)
+    lows = reference_swings(df["low"].to_numpy(), left, right, False)
+    close = df["close"].to_numpy()
+    active = {"bullish": None, "bearish": None}
+    trend, events = None, []
+    for j in range(len(close)):
+        for direction, points, column in (("bearish", lows, "low"), ("bullish", highs, "high")):
+            confirmed = [p for p in points if p + right < j]
+            if confirmed and (active[direction] is None or active[direction][0] != confirmed[-1]):
+                active[direction] = (confirmed[-1], False)
+        for direction, column in (("bearish", "low"), ("bullish", "high")):
+            if active[direction] is None or active[direction][1]:
+                continue
+            swing = active[direction][0]
+            level = df[column].iloc[swing]
+            if (close[j] > level) if direction == "bullish" else (close[j] < level):
+                kind = "choch" if trend is not None and trend != direction else "bos"
+                trend = direction
+                events.append({"type": f"{direction}_{kind}", "level": level, "index": j, "swing_index": swing})
+                active[direction] = (swing, True)
+    return events
+
+
+class TestStructureAnalyzer:
+    """Test suite for StructureAnalyzer"""
+
+    @pytest.mark.parametrize("left,right", [(5, 5), (3, 7), (1, 1)])
+    def test_swings_match_reference_loop(self, left, right):
+        df = make_df()
+        analyzer = StructureAnalyzer(left, right)
+        assert [s["index"] for s in analyzer._find_swing_highs(df)] == reference_swings(df["high"].to_numpy(), left, right, True)
+        assert [s["index"] for s in analyzer._find_swing_lows(df)] == reference_swings(df["low"].to_numpy(), left, right, False)
+
+    def test_swing_dict_fields(self):
+        df = make_df(60)
+        swing = StructureAnalyzer()._find_swing_highs(df)[0]
+        assert swing["price"] == df["high"].iloc[swing["index"]]
+        assert swing["timestamp"] == df.index[swing["index"]]
+        assert StructureAnalyzer()._find_swing_highs(df.iloc[:8]) == []
+
+    @pytest.mark.parametrize("seed", [1, 2, 3])
+    def test_event_history_matches_bar_by_bar_walk(self, seed):
+        df = make_df(250, seed)
+        events = StructureAnalyzer(3, 3).find_structure_events(df)
+        assert events == reference_events(df, 3, 3)
+        assert any(e["type"].endswith("_choch") for e in events)
+        assert all(e["index"] > e["swing_index"] + 3 for e in events)
+
+    def test_detect_structure_breaks_reports_history(self):
+        df = make_df()
+        result = StructureAnalyzer().detect_structure_breaks(df)
+        assert {"bos", "choch", "current_structure", "swing_highs_count", "swing_lows_count"} <= set(result)
+        assert result["last_event"] == result["events"][-1]
+        assert result["structure_trend"] == result["events"][-1]["type"].split("_")[0]
+
+        short = StructureAnalyzer().detect_structure_breaks(df.iloc[:5])
+        assert short["events"] == [] and short["current_structure"] == "neutral"
+
+    def test_invalid_strength(self):
+        with pytest.raises(ValueError):
+            StructureAnalyzer(0, 5).find_structure_events(make_df(50))
+
+    def test_faster_than_reference_loop(self):
+        df = make_df(1000)
+        analyzer = StructureAnalyzer()
+
+        started = time.perf_counter()
+        for _ in range(5):
+            analyzer._find_swing_highs(df)
+        vectorized = time.perf_counter() - started
+
+        started = time.perf_counter()
+        highs = df["high"]
+        for _ in range(5):
+            [i for i in range(5, len(df) - 5) if all(highs.iloc[j] < highs.iloc[i] for j in range(i - 5, i + 6) if j != i)]
+        loop = time.perf_counter() - started
+
+        assert vectorized * 5 < loop
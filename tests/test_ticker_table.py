@@ -0,0 +1,102 @@
+"""
+Unit tests for TickerTable
+Tests versioned sorted snapshots and stream updates
+"""
+
+import pytest
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from mcp_server.ticker_table import TickerTable, to_ccxt_symbol
+
+
+def make_row(symbol: str, price: float, change: float, turnover: float):
+    """Bybit v5 ticker row"""
+    return {
+        "symbol": symbol,
+        "lastPrice": str(price),
+        "price24hPcnt": str(change),
+        "turnover24h": str(turnover),
+        "volume24h": str(turnover / price),
+        "highPrice24h": str(price * 1.1),
+        "lowPrice24h": str(price * 0.9),
+        "bid1Price": str(price * 0.999),
+        "ask1Price": str(price * 1.001)
+    }
+
+
+def make_table() -> TickerTable:
+    table = TickerTable(category="spot", stream_enabled=False, rebuild_interval=0)
+    table.seed([
+        make_row("BTCUSDT", 60000, 0.02, 5e9),
+        make_row("ETHUSDT", 3000, -0.01, 2e9),
+        make_row("SOLUSDT", 150, 0.08, 1e9),
+    ])
+    return table
+
+
+class TestTickerTable:
+    """Test suite for TickerTable"""
+
+    def test_ccxt_symbol_conversion(self):
+        """Bybit symbols map back to CCXT format"""
+        assert to_ccxt_symbol("BTCUSDT", "spot") == "BTC/USDT"
+        assert to_ccxt_symbol("ETHBTC", "spot") == "ETH/BTC"
+        assert to_ccxt_symbol("BTCUSDT", "linear") == "BTC/USDT:USDT"
+        assert to_ccxt_symbol("BTCPERP", "linear") == "BTC/USDC:USDC"
+        assert to_ccxt_symbol("BTC-26DEC25", "linear") is None
+
+    def test_snapshot_is_sorted(self):
+        """Snapshots carry pre-sorted lists in get_all_tickers format"""
+        snapshot = make_table().snapshot()
+        assert [t["symbol"] for t in snapshot.sorted_by("volume")] == ["BTC/USDT", "ETH/USDT", "SOL/USDT"]
+        assert [t["symbol"] for t in snapshot.sorted_by("change")] == ["SOL/USDT", "BTC/USDT", "ETH/USDT"]
+        assert [t["symbol"] for t in snapshot.sorted_by("name")] == ["BTC/USDT", "ETH/USDT", "SOL/USDT"]
+        assert snapshot.tickers["BTC/USDT"]["change_24h"] == pytest.approx(2.0)
+        assert snapshot.tickers["BTC/USDT"]["volume_24h"] == 5e9
+
+    def test_unchanged_table_returns_same_snapshot(self):
+        """Reads without updates reuse the built snapshot"""
+        table = make_table()
+        first = table.snapshot()
+        assert table.snapshot() is first
+        assert table.get_stats()["rebuilds"] == 1
+
+    def test_delta_updates_bump_version(self):
+        """Stream deltas merge into rows and change the version"""
+        table = make_table()
+        before = table.snapshot()
+
+        table.apply_message({
+            "topic": "tickers.ETHUSDT",
+            "type": "delta",
+            "data": {"symbol": "ETHUSDT", "price24hPcnt": "0.1", "lastPrice": "3300"}
+        })
+        after = table.snapshot()
+
+        assert after.version > before.version
+        assert after.sorted_by("change")[0]["symbol"] == "ETH/USDT"
+        assert after.tickers["ETH/USDT"]["price"] == 3300
+        # Unchanged fields are kept from the seed
+        assert after.tickers["ETH/USDT"]["volume_24h"] == 2e9
+        # Old snapshot is untouched
+        assert before.tickers["ETH/USDT"]["price"] == 3000
+
+    def test_freshness_without_stream(self):
+        """REST seeded table expires after rest_ttl"""
+        table = make_table()
+        assert table.is_fresh()
+        table.rest_ttl = 0
+        assert not table.is_fresh()
+
+    def test_raw_rows_for_trading_operations(self):
+        """Snapshot keeps original Bybit rows"""
+        raw = make_table().snapshot().raw
+        assert {row["symbol"] for row in raw} == {"BTCUSDT", "ETHUSDT", "SOLUSDT"}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
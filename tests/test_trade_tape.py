@@ -0,0 +1,144 @@
+"""
+Unit tests for TradeTape
+Tests the trade ring buffer, order flow stats and REST seeding
+"""
+
+import asyncio
+import pytest
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from mcp_server.trade_tape import (
+    TradeRingBuffer, TradeTape, order_flow, trades_to_arrays, whale_stats
+)
+from mcp_server.whale_detector import WhaleDetector
+
+import numpy as np
+
+
+def make_arrays(start_ts: int, count: int):
+    """Alternating buy/sell trades, one per millisecond"""
+    ts = np.arange(start_ts, start_ts + count, dtype=np.int64)
+    price = 100.0 + np.arange(count, dtype=np.float64)
+    size = np.ones(count)
+    side = np.where(np.arange(count) % 2 == 0, 1, -1).astype(np.int8)
+    return ts, price, size, side
+
+
+def make_tape() -> TradeTape:
+    """Tape with a subscription registered and a connected socket"""
+    tape = TradeTape(enabled=True, capacity=100)
+    tape._symbol_map["BTC/USDT"] = "BTCUSDT"
+    tape._buffers["BTCUSDT"] = TradeRingBuffer(100)
+    tape.ws = MagicMock()
+    tape.ws.is_connected.return_value = True
+    return tape
+
+
+class TestTradeTape:
+    """Test suite for TradeTape"""
+
+    def test_ring_buffer_wraps_in_order(self):
+        """Oldest trades are overwritten and reads stay chronological"""
+        buffer = TradeRingBuffer(10)
+        buffer.append(*make_arrays(0, 7))
+        buffer.append(*make_arrays(7, 8))
+
+        ts, price, _, _ = buffer.last()
+        assert len(buffer) == 10
+        assert ts.tolist() == list(range(5, 15))
+        assert buffer.covered_from == 5
+        assert buffer.last(3)[0].tolist() == [12, 13, 14]
+        assert buffer.since(11)[0].tolist() == [11, 12, 13, 14]
+
+    def test_order_flow_matches_trade_loop(self):
+        """Vectorized order flow matches the per-trade CVD loop"""
+        trades = [
+            {"timestamp": 3, "price": 101, "amount": 2, "side": "sell"},
+            {"timestamp": 1, "price": 100, "amount": 1, "side": "buy"},
+            {"timestamp": 2, "price": 99, "amount": 5, "side": "buy"},
+        ]
+        _, price, size, side = trades_to_arrays(trades)
+        flow = order_flow(price, size, side)
+
+        # CVD series: 1, 6, 4 -> change from first to last trade = 3
+        assert flow["cvd_delta"] == 3
+        assert flow["price_change"] == pytest.approx(0.01)
+        assert flow["aggressive_buys"] == 2
+        assert flow["aggressive_sells"] == 1
+        assert flow["buy_volume"] == 6
+
+    def test_whale_stats_match_detector(self):
+        """whale_stats returns the WhaleDetector._detect_large_orders format"""
+        trades = [{"amount": 1, "side": "sell", "timestamp": i, "price": 1} for i in range(30)]
+        trades.append({"amount": 100, "side": "buy", "timestamp": 30, "price": 1})
+        detector = WhaleDetector(MagicMock())
+
+        stats = detector._detect_large_orders(trades)
+        assert stats["count_large_buys"] == 1
+        assert stats["count_large_sells"] == 0
+        assert stats["net_direction"] == "bullish"
+        assert stats["whale_buy_percentage"] == round(100 / 130 * 100, 2)
+
+        _, _, size, side = trades_to_arrays(trades)
+        assert whale_stats(size, side) == stats
+
+    def test_stream_messages_fill_window(self):
+        """publicTrade messages are parsed into the buffer"""
+        tape = make_tape()
+        tape._buffers["BTCUSDT"].covered_from = 0
+        tape._handle_message({
+            "topic": "publicTrade.BTCUSDT",
+            "data": [
+                {"T": 1, "s": "BTCUSDT", "S": "Buy", "v": "0.5", "p": "100"},
+                {"T": 2, "s": "BTCUSDT", "S": "Sell", "v": "0.2", "p": "99"},
+            ]
+        })
+
+        ts, price, size, side = tape.get_window("BTC/USDT", limit=2)
+        assert ts.tolist() == [1, 2]
+        assert side.tolist() == [1, -1]
+        assert tape.get_window("BTC/USDT", limit=3) is None
+        assert tape.order_flow("BTC/USDT", since_ms=0)["trades_count"] == 2
+
+    def test_seed_prepends_older_rest_trades(self):
+        """REST history older than the stream is merged in front of it"""
+        tape = make_tape()
+        tape._buffers["BTCUSDT"].covered_from = 50
+        tape._buffers["BTCUSDT"].append(*make_arrays(50, 10))
+        assert tape.get_window("BTC/USDT", since_ms=20) is None
+
+        tape.seed("BTC/USDT", *make_arrays(20, 35))  # overlaps 50..54
+
+        ts = tape.get_window("BTC/USDT", since_ms=20)[0]
+        assert ts.tolist() == list(range(20, 60))
+        assert tape.get_window("BTC/USDT", limit=40) is not None
+
+    def test_disconnected_or_disabled_tape_returns_none(self):
+        """Reads fall back to REST when the socket is down"""
+        tape = make_tape()
+        tape._buffers["BTCUSDT"].append(*make_arrays(0, 10))
+        tape.ws.is_connected.return_value = False
+        assert tape.get_window("BTC/USDT", limit=5) is None
+
+        disabled = TradeTape(enabled=False)
+        assert disabled.get_window("BTC/USDT", limit=1) is None
+
+    def test_subscribe_skips_symbols_of_another_category(self):
+        """Perpetual symbols never read spot trades of the same exchange symbol"""
+        tape = TradeTape(enabled=True, category="spot")
+        sent = []
+        tape._subscribe_blocking = lambda symbols: sent.append(symbols)
+
+        assert asyncio.run(tape.subscribe(["BTC/USDT:USDT", "BTC/USDT"])) == 1
+        assert sent == [["BTCUSDT"]]
+        assert not tape.is_subscribed("BTC/USDT:USDT")
+        assert tape.is_subscribed("BTC/USDT")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
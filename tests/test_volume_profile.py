@@ -0,0 +1,113 @@
+"""
+Unit tests for the vectorized volume profile
+Tests overlap-weighted volume distribution, value area and incremental updates
+"""
+
+import asyncio
+import functools
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from mcp_server.volume_profile import (
+    VolumeProfile, VolumeProfileAnalyzer, distribute_volume, session_start, value_area
+)
+from tests.helpers import HOUR_MS, FakeClient, make_candles
+
+DAY_START = 1_700_006_400_000  # 2023-11-15 00:00 UTC
+
+
+# Часовые бары, заканчивающиеся в сессии DAY_START
+session_candles = functools.partial(make_candles, seed=4, start_ts=DAY_START - 80 * HOUR_MS)
+
+
+class TestVolumeProfile:
+    """Test suite for volume profile engine"""
+
+    def test_distribution_matches_overlap_loop(self):
+        candles = session_candles(60)
+        edges = np.linspace(candles[:, 3].min(), candles[:, 2].max(), 31)
+        profile = distribute_volume(candles[:, 2], candles[:, 3], candles[:, 5], edges)
+
+        expected = np.zeros(30)
+        for _, _, high, low, _, volume in candles:
+            for i in range(30):
+                overlap = max(0.0, min(high, edges[i + 1]) - max(low, edges[i]))
+                expected[i] += volume * overlap / (high - low)
+
+        np.testing.assert_allclose(profile, expected, rtol=1e-9, atol=1e-9)
+        assert profile.sum() == pytest.approx(candles[:, 5].sum(), rel=1e-9)
+
+    def test_zero_range_bar_lands_in_one_bin(self):
+        edges = np.linspace(0.0, 10.0, 11)
+        profile = distribute_volume(np.array([3.5, 10.0]), np.array([3.5, 10.0]), np.array([7.0, 2.0]), edges)
+        assert profile[3] == 7.0
+        assert profile[9] == 2.0
+        assert profile.sum() == 9.0
+
+    def test_value_area_matches_sorted_accumulation(self):
+        rng = np.random.default_rng(1)
+        mids = np.arange(50) + 0.5
+        volumes = rng.uniform(0, 10, 50)
+
+        # Прежний алгоритм: корзины по убыванию объёма до 70% общего
+        ordered = sorted(zip(mids, volumes), key=lambda x: x[1], reverse=True)
+        total, taken, levels = sum(volumes), 0.0, []
+        for price, vol in ordered:
+            taken += vol
+            levels.append(price)
+            if taken >= total * 0.70:
+                break
+
+        assert value_area(mids, volumes) == (ordered[0][0], max(levels), min(levels))
+
+    def test_incremental_updates_match_batch(self):
+        candles = session_candles(120)
+        incremental = VolumeProfile.from_candles(candles[:80], num_bins=40)
+        batch = VolumeProfile(incremental.origin, incremental.origin + incremental.bin_size * 40, 40)
+        batch.add_bars(candles)
+
+        for bar in candles[80:]:
+            incremental.add_bar(bar)
+
+        # Бары за пределами начального диапазона расширяют сетку тем же шагом
+        new_high = candles[:, 2].max() * 1.05
+        extreme = [candles[-1, 0] + HOUR_MS, new_high, new_high, new_high * 0.99, new_high, 50.0]
+        incremental.add_bar(extreme)
+        batch.add_bar(extreme)
+
+        assert incremental.bars == 121
+        assert len(incremental.volumes) == len(batch.volumes) > 40
+        np.testing.assert_allclose(incremental.volumes, batch.volumes, rtol=1e-9, atol=1e-9)
+        assert incremental.volumes.sum() == pytest.approx(candles[:, 5].sum() + 50.0, rel=1e-9)
+        assert incremental.levels() == pytest.approx(batch.levels())
+
+    def test_analyzer_composite_and_session(self):
+        candles = session_candles(100)
+        analyzer = VolumeProfileAnalyzer(FakeClient(candles))
+
+        composite = asyncio.run(analyzer.calculate_volume_profile("BTC/USDT", num_bins=30))
+        assert {"poc", "value_area_high", "value_area_low", "current_position", "confluence_with_poc"} <= set(composite)
+        assert composite["value_area_low"] <= composite["poc"] <= composite["value_area_high"]
+        assert composite["bins"] == 30 and composite["bars"] == 100
+
+        session = asyncio.run(analyzer.calculate_volume_profile("BTC/USDT", anchor="session"))
+        assert session["anchor"] == "session"
+        assert session["bars"] == 20  # бары с 00:00 UTC
+        assert session_start(candles) == 80
+
+    def test_analyzer_errors(self):
+        analyzer = VolumeProfileAnalyzer(FakeClient(session_candles(5)))
+        assert asyncio.run(analyzer.calculate_volume_profile("BTC/USDT")) == {"error": "Insufficient data"}
+        assert "error" in asyncio.run(analyzer.calculate_volume_profile("BTC/USDT", anchor="weekly"))
+
+        flat = session_candles(20)
+        flat[:, 1:5] = 100.0
+        assert asyncio.run(VolumeProfileAnalyzer(FakeClient(flat)).calculate_volume_profile("BTC/USDT")) == {
+            "error": "Zero price range"
+        }